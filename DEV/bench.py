@@ -0,0 +1,919 @@
+"""Benchmarks do codec
+
+Compara as implementações antigas (ciclos em python) com as atuais
+nas imagens de teste
+
+Uso:
+    python bench.py [benchmark ...]
+"""
+
+import argparse
+from io import BytesIO
+from timeit import repeat
+
+from math import log10
+
+from os import cpu_count
+
+from numpy import kron, concatenate, ndarray, zeros, ones, empty, asarray, array, linalg, float32, float64, int16, uint8, array_equal, round as npround
+
+from scipy.fftpack import dct, idct
+
+from cv2 import filter2D, getGaussianKernel
+
+from imgtools import read_bmp, map_bmp
+from imgtools import add_padding
+from imgtools import converter_to_ycbcr, converter_to_rgb
+from imgtools import down_sample
+from imgtools import calculate_dct, calculate_inv_dct
+from imgtools import DCT_BACKENDS, select_dct_backend, set_dct_backend
+from imgtools import calculate_channel_sparse_inv_dct, IDCT_CLASSES
+from imgtools import quantize, inv_quantize, bisect_quality
+from imgtools import dpcm_encoder, dpcm_decoder
+
+from file_worker import load_q_matrix
+
+from metrics import MSE, PSNR, compute_metrics, ssim, ms_ssim
+
+from codec.entropy import encode_channels, decode_channels, estimate_size
+from codec.encoder import encode, encode_image
+from codec.jfif import encode_jfif
+from codec.sweep import rd_sweep
+from codec.target import encode_to_target
+from codec.rdo import rdo_report
+from codec.stream import stream_jfif
+from codec.jpeg_reader import parse_jpeg
+from codec.decoder import decode, decode_jpeg
+from codec.transcode import requantize, halve_chroma, rotate, encode_jpeg
+
+
+BENCH_IMAGES = ("img/peppers.bmp", "img/barn_mountains.bmp")
+
+
+def _time(function, number: int = 1, repetitions: int = 5) -> float:
+    """Mede o melhor tempo de execução de uma função
+
+    Args:
+        function (Callable): a função a medir
+        number (int, optional): número de execuções por repetição. Default a 1.
+        repetitions (int, optional): número de repetições. Default a 5.
+
+    Returns:
+        float: o melhor tempo por execução em segundos
+    """
+    return min(repeat(function, number=number, repeat=repetitions)) / number
+
+
+def _report(name: str, old_time: float, new_time: float, equal: bool):
+    """Imprime uma linha com a comparação de tempos
+
+    Args:
+        name (str): o nome do caso
+        old_time (float): o tempo da implementação antiga
+        new_time (float): o tempo da implementação nova
+        equal (bool): se os resultados são iguais
+    """
+    print(
+        f"{name:<40} old {old_time * 1000:9.2f} ms"
+        f"  new {new_time * 1000:9.2f} ms"
+        f"  x{old_time / new_time:7.1f}"
+        f"  {'equal' if equal else 'DIFFERENT'}"
+    )
+
+
+def _load_channels(path: str, downsampling: tuple = (4, 2, 0)) -> tuple:
+    """Lê uma imagem e prepara os canais YCbCr subamostrados
+
+    Args:
+        path (str): o caminho da imagem
+        downsampling (tuple, optional): a subamostragem. Default a (4, 2, 0).
+
+    Returns:
+        tuple: os canais Y, Cb e Cr
+    """
+    image = add_padding(read_bmp(path), 32)[0]
+    return down_sample(*converter_to_ycbcr(image), downsampling)
+
+
+def _legacy_block_transform(channel: ndarray, block_size: int, transform) -> ndarray:
+    """Implementação antiga da transformada em blocos (ciclos em python)"""
+    result = zeros(channel.shape, dtype=float32)
+
+    for i in range(0, channel.shape[0], block_size):
+        for j in range(0, channel.shape[1], block_size):
+            result[i:i+block_size, j:j+block_size] = transform(
+                transform(channel[i:i+block_size, j:j+block_size], norm="ortho").T,
+                norm="ortho"
+            ).T
+
+    return result
+
+
+def bench_dct():
+    """Compara a DCT em blocos antiga com a vetorizada"""
+
+    for path in BENCH_IMAGES:
+        channels = _load_channels(path)
+
+        for block_size in (8, 64):
+            old_result = [None]
+            new_result = [None]
+
+            def old():
+                old_result[0] = [_legacy_block_transform(ch, block_size, dct) for ch in channels]
+
+            def new():
+                new_result[0] = calculate_dct(*channels, block_size)
+
+            old_time = _time(old)
+            new_time = _time(new)
+            equal = all(array_equal(a, b) for a, b in zip(old_result[0], new_result[0]))
+            _report(f"dct {block_size}x{block_size} {path}", old_time, new_time, equal)
+
+            coefficients = new_result[0]
+
+            def old_inv():
+                old_result[0] = [_legacy_block_transform(ch, block_size, idct) for ch in coefficients]
+
+            def new_inv():
+                new_result[0] = calculate_inv_dct(*coefficients, block_size)
+
+            old_time = _time(old_inv)
+            new_time = _time(new_inv)
+            equal = all(array_equal(a, b) for a, b in zip(old_result[0], new_result[0]))
+            _report(f"idct {block_size}x{block_size} {path}", old_time, new_time, equal)
+
+
+def _legacy_scaled_q_matrix(q_matrix: ndarray, quality_factor: int) -> ndarray:
+    """Implementação antiga da matriz de quantização escalada (recalculada a cada chamada)"""
+    if quality_factor >= 50:
+        fator_escala = (100 - quality_factor) / 50
+    elif 0 < quality_factor < 50:
+        fator_escala = 50 / quality_factor
+    else:
+        fator_escala = 0
+
+    if fator_escala != 0:
+        q_matriz_with_factor = npround(fator_escala * q_matrix)
+    else:
+        q_matriz_with_factor = ones(q_matrix.shape, dtype=uint8)
+
+    q_matriz_with_factor[q_matriz_with_factor > 255] = 255
+    q_matriz_with_factor[q_matriz_with_factor < 1] = 1
+
+    return npround(q_matriz_with_factor).astype(uint8)
+
+
+def _legacy_quantize(channel: ndarray, q_matrix: ndarray, quality_factor: int) -> ndarray:
+    """Implementação antiga da quantização (ciclos em python)"""
+    ch_quantized = zeros(channel.shape, dtype=int16)
+    q_matriz_with_factor = _legacy_scaled_q_matrix(q_matrix, quality_factor)
+
+    for i in range(0, ch_quantized.shape[0], 8):
+        for j in range(0, ch_quantized.shape[1], 8):
+            ch_quantized[i:i+8, j:j+8] = npround(channel[i:i+8, j:j+8] / q_matriz_with_factor)
+
+    return ch_quantized.astype(int)
+
+
+def _legacy_inv_quantize(ch_quantized: ndarray, q_matrix: ndarray, quality_factor: int) -> ndarray:
+    """Implementação antiga da inversa da quantização (ciclos em python)"""
+    channel = zeros(ch_quantized.shape, dtype=int16)
+    q_matriz_with_factor = _legacy_scaled_q_matrix(q_matrix, quality_factor)
+
+    for i in range(0, channel.shape[0], 8):
+        for j in range(0, channel.shape[1], 8):
+            channel[i:i+8, j:j+8] = ch_quantized[i:i+8, j:j+8] * q_matriz_with_factor
+
+    return npround(channel).astype(float64)
+
+
+def bench_quantize():
+    """Compara a quantização antiga com a vetorizada"""
+
+    q_matrices = (
+        load_q_matrix("q_matrix_y.csv"),
+        load_q_matrix("q_matrix_cbcr.csv"),
+        load_q_matrix("q_matrix_cbcr.csv")
+    )
+
+    for path in BENCH_IMAGES:
+        coefficients = calculate_dct(*_load_channels(path), 8)
+
+        for quality_factor in (25, 75):
+            old_result = [None]
+            new_result = [None]
+
+            def old():
+                old_result[0] = [
+                    _legacy_quantize(ch, q, quality_factor) for ch, q in zip(coefficients, q_matrices)
+                ]
+
+            def new():
+                new_result[0] = [
+                    quantize(ch, q, quality_factor) for ch, q in zip(coefficients, q_matrices)
+                ]
+
+            old_time = _time(old)
+            new_time = _time(new)
+            equal = all(array_equal(a, b) for a, b in zip(old_result[0], new_result[0]))
+            _report(f"quantize q={quality_factor} {path}", old_time, new_time, equal)
+
+            quantized = new_result[0]
+
+            def old_inv():
+                old_result[0] = [
+                    _legacy_inv_quantize(ch, q, quality_factor) for ch, q in zip(quantized, q_matrices)
+                ]
+
+            def new_inv():
+                new_result[0] = [
+                    inv_quantize(ch, q, quality_factor) for ch, q in zip(quantized, q_matrices)
+                ]
+
+            old_time = _time(old_inv)
+            new_time = _time(new_inv)
+            equal = all(array_equal(a, b) for a, b in zip(old_result[0], new_result[0]))
+            _report(f"inv_quantize q={quality_factor} {path}", old_time, new_time, equal)
+
+
+def _legacy_dpcm_encoder(channel: ndarray) -> ndarray:
+    """Implementação antiga da codificação DPCM (ciclos em python)"""
+    aux_channel = channel.copy()
+
+    for i in range(aux_channel.shape[0] - 8, -1, -8):
+        for j in range(aux_channel.shape[1] - 8, -1, -8):
+            if i == 0 and j == 0:
+                break
+            if j != 0:
+                aux_channel[i, j] = aux_channel[i, j] - aux_channel[i, j-8]
+                continue
+            aux_channel[i, j] = aux_channel[i, j] - aux_channel[i-8, aux_channel.shape[1] - 9]
+
+    return aux_channel
+
+
+def _legacy_dpcm_decoder(channel: ndarray) -> ndarray:
+    """Implementação antiga da descodificação DPCM (ciclos em python)"""
+    aux_channel = channel.copy()
+
+    for i in range(0, aux_channel.shape[0], 8):
+        for j in range(0, aux_channel.shape[1], 8):
+            if j == 0 and i == 0:
+                continue
+            if j != 0:
+                aux_channel[i, j] = aux_channel[i, j] + aux_channel[i, j-8]
+                continue
+            if i + 8 >= aux_channel.shape[0]:
+                break
+            aux_channel[i, j] = aux_channel[i, j] + aux_channel[i+8, aux_channel.shape[1] - 9]
+
+    return aux_channel
+
+
+def bench_dpcm():
+    """Compara a codificação DPCM antiga com a vetorizada"""
+
+    q_matrix = load_q_matrix("q_matrix_y.csv")
+
+    for path in BENCH_IMAGES:
+        y_quantized = quantize(calculate_dct(*_load_channels(path), 8)[0], q_matrix, 75)
+
+        for name, old, new in (
+            ("dpcm_encoder", _legacy_dpcm_encoder, dpcm_encoder),
+            ("dpcm_decoder", _legacy_dpcm_decoder, dpcm_decoder),
+        ):
+            old_time = _time(lambda: old(y_quantized), number=10)
+            new_time = _time(lambda: new(y_quantized), number=10)
+            equal = array_equal(old(y_quantized), new(y_quantized))
+            _report(f"{name} Y {path}", old_time, new_time, equal)
+
+
+def bench_entropy():
+    """Mede o tamanho real (bits por pixel) e o débito da codificação entrópica"""
+
+    q_matrices = (
+        load_q_matrix("q_matrix_y.csv"),
+        load_q_matrix("q_matrix_cbcr.csv"),
+        load_q_matrix("q_matrix_cbcr.csv")
+    )
+
+    for path in BENCH_IMAGES:
+        image = read_bmp(path)
+        coefficients = calculate_dct(*_load_channels(path), 8)
+
+        for quality_factor in (25, 75, 95):
+            quantized = [
+                dpcm_encoder(quantize(ch, q, quality_factor)) for ch, q in zip(coefficients, q_matrices)
+            ]
+
+            for optimize in (False, True):
+                encoded = encode_channels(quantized, optimize)
+                encode_time = _time(lambda: encode_channels(quantized, optimize))
+                decode_time = _time(lambda: decode_channels(encoded), repetitions=3)
+
+                print(
+                    f"entropy q={quality_factor} {'opt' if optimize else 'std'} {path:<24}"
+                    f" {len(encoded) * 8 / (image.shape[0] * image.shape[1]):6.3f} bpp"
+                    f"  encode {image.nbytes / 2**20 / encode_time:7.1f} MB/s"
+                    f"  decode {image.nbytes / 2**20 / decode_time:7.1f} MB/s"
+                )
+
+
+def bench_jfif():
+    """Compara o escritor JFIF com o codificador JPEG do Pillow (tempo, tamanho e PSNR)"""
+
+    from PIL import Image
+
+    def psnr(jpeg: bytes, image: ndarray) -> float:
+        decoded = Image.open(BytesIO(jpeg)).convert("RGB")
+        mse = ((asarray(decoded, dtype=float64) - image) ** 2).mean()
+        return 10 * log10(255 ** 2 / mse)
+
+    def pillow(image: Image.Image, quality_factor: int, subsampling: int) -> bytes:
+        output = BytesIO()
+        image.save(output, "JPEG", quality=quality_factor, subsampling=subsampling)
+        return output.getvalue()
+
+    for path in BENCH_IMAGES:
+        image = read_bmp(path)
+        pil_image = Image.fromarray(image)
+
+        for quality_factor in (50, 75, 90):
+            for downsampling, subsampling in (((4, 2, 0), 2), ((4, 4, 4), 0)):
+                ours = encode_jfif(image, quality_factor, downsampling)
+                theirs = pillow(pil_image, quality_factor, subsampling)
+
+                ours_time = _time(lambda: encode_jfif(image, quality_factor, downsampling))
+                theirs_time = _time(lambda: pillow(pil_image, quality_factor, subsampling))
+
+                print(
+                    f"jfif q={quality_factor} {''.join(map(str, downsampling))} {path:<24}"
+                    f" ours {ours_time * 1000:7.2f} ms {len(ours):7d} B {psnr(ours, image):5.2f} dB"
+                    f" | pillow {theirs_time * 1000:7.2f} ms {len(theirs):7d} B {psnr(theirs, image):5.2f} dB"
+                )
+
+
+def bench_transcode():
+    """Compara a transcodificação no domínio dos coeficientes com a descodificação
+    e nova codificação da imagem (tempo e PSNR em relação à imagem original)"""
+
+    def psnr(jpeg: bytes, image: ndarray) -> float:
+        decoded = decode_jpeg(parse_jpeg(jpeg))
+        mse = ((decoded.astype(float64) - image) ** 2).mean()
+        return 10 * log10(255 ** 2 / mse)
+
+    for path in BENCH_IMAGES:
+        image = read_bmp(path)
+        jpeg = parse_jpeg(encode_jfif(image, 90, (4, 4, 4)))
+
+        # a rotação remove as MCUs incompletas da margem
+        rows, cols = image.shape[0] // 8 * 8, image.shape[1] // 8 * 8
+        flipped = image[:rows, :cols][::-1, ::-1]
+
+        # (nome, operação nos coeficientes, operação nos píxeis, imagem de referência)
+        cases = (
+            (
+                "requantize q=50",
+                lambda: encode_jpeg(requantize(jpeg, 50)),
+                lambda: encode_jfif(decode_jpeg(jpeg), 50, (4, 4, 4)),
+                image,
+            ),
+            (
+                "chroma 444 -> 420",
+                lambda: encode_jpeg(halve_chroma(jpeg)),
+                lambda: encode_jfif(decode_jpeg(jpeg), 90, (4, 2, 0)),
+                image,
+            ),
+            (
+                "rotate 180",
+                lambda: encode_jpeg(rotate(jpeg, 2)),
+                lambda: encode_jfif(decode_jpeg(jpeg)[:rows, :cols][::-1, ::-1], 90, (4, 4, 4)),
+                flipped,
+            ),
+        )
+
+        for name, coefficients, pixels, reference in cases:
+            coefficients_time = _time(coefficients, repetitions=3)
+            pixels_time = _time(pixels, repetitions=3)
+
+            print(
+                f"transcode {name:<18} {path:<24}"
+                f" coefficients {coefficients_time * 1000:7.2f} ms {psnr(coefficients(), reference):5.2f} dB"
+                f" | pixels {pixels_time * 1000:7.2f} ms {psnr(pixels(), reference):5.2f} dB"
+            )
+
+
+def bench_headless():
+    """Compara o encode com o visualizador das fases (backend Agg) com o encode sem plots"""
+
+    from contextlib import redirect_stdout
+    from io import StringIO
+
+    import matplotlib
+    matplotlib.use("Agg")
+
+    from matplotlib.pyplot import close
+
+    def viewer(image: ndarray):
+        with redirect_stdout(StringIO()):
+            result = encode(image, 75, (4, 2, 0))
+        close("all")
+        return result
+
+    for path in BENCH_IMAGES:
+        image = read_bmp(path)
+
+        old_time = _time(lambda: viewer(image), repetitions=3)
+        new_time = _time(lambda: encode_image(image, 75, (4, 2, 0)))
+
+        _report(f"encode {path}", old_time, new_time, viewer(image) == encode_image(image, 75, (4, 2, 0)))
+
+
+def bench_threads():
+    """Compara o encode e o decode sequenciais com os três canais em threads
+    (imagens originais e ampliadas 4x4)"""
+
+    print(f"CPUs disponíveis: {cpu_count()}")
+
+    for path in BENCH_IMAGES:
+        original = read_bmp(path)
+
+        for scale in (1, 4):
+            image = kron(original, ones((scale, scale, 1), dtype=uint8))
+            name = f"{path} x{scale}"
+
+            encoded, rows, cols = encode_image(image, 75, (4, 2, 0))
+
+            old_time = _time(lambda: encode_image(image, 75, (4, 2, 0)), repetitions=3)
+            new_time = _time(lambda: encode_image(image, 75, (4, 2, 0), workers=3), repetitions=3)
+            _report(f"encode {name}", old_time, new_time, encoded == encode_image(image, 75, (4, 2, 0), workers=3)[0])
+
+            decoded = decode(encoded, rows, cols, 75)
+
+            old_time = _time(lambda: decode(encoded, rows, cols, 75), repetitions=3)
+            new_time = _time(lambda: decode(encoded, rows, cols, 75, workers=3), repetitions=3)
+            _report(f"decode {name}", old_time, new_time, array_equal(decoded, decode(encoded, rows, cols, 75, workers=3)))
+
+
+def bench_stream():
+    """Compara a memória de pico e o tempo do escritor JFIF com a imagem inteira
+    e do escritor por faixas (imagens originais e repetidas 16 vezes na vertical)"""
+
+    from os.path import join
+    from tempfile import TemporaryDirectory
+    from tracemalloc import start, stop, get_traced_memory, reset_peak
+
+    from PIL import Image
+
+    def peak(function) -> int:
+        reset_peak()
+        function()
+        return get_traced_memory()[1]
+
+    with TemporaryDirectory() as directory:
+        for path in BENCH_IMAGES:
+            original = read_bmp(path)
+
+            for scale in (1, 16):
+                source = join(directory, f"x{scale}.bmp")
+                Image.fromarray(kron(original, ones((scale, 1, 1), dtype=uint8))).save(source)
+                destination = join(directory, "stream.jpg")
+
+                def whole() -> bytes:
+                    return encode_jfif(read_bmp(source), 75, (4, 2, 0))
+
+                def strips() -> bytes:
+                    stream_jfif(source, destination, 75, (4, 2, 0))
+                    with open(destination, "rb") as jpeg_file:
+                        return jpeg_file.read()
+
+                name = f"jfif {path} x{scale}"
+                _report(name, _time(whole, repetitions=3), _time(strips, repetitions=3), whole() == strips())
+
+                start()
+                old_peak, new_peak = peak(whole), peak(strips)
+                stop()
+                print(f"{'':<40} old {old_peak / 2**20:9.2f} MB  new {new_peak / 2**20:9.2f} MB")
+
+
+def bench_reader():
+    """Compara a leitura de um BMP com o Pillow com o leitor nativo (cópia e memory mapping)"""
+
+    from PIL import Image
+
+    def pillow(path: str) -> ndarray:
+        with Image.open(path) as image:
+            return asarray(image)
+
+    for path in BENCH_IMAGES:
+        old_time = _time(lambda: pillow(path), number=20)
+
+        _report(f"read_bmp {path}", old_time, _time(lambda: read_bmp(path), number=20),
+                array_equal(pillow(path), read_bmp(path)))
+        _report(f"map_bmp {path}", old_time, _time(lambda: map_bmp(path), number=20),
+                array_equal(pillow(path), map_bmp(path)))
+
+
+def _legacy_to_ycbcr(img: ndarray) -> tuple:
+    """Implementação antiga da conversão para YCbCr (uma expressão por canal)"""
+    T = array([[0.299, 0.587, 0.114], [-0.168736, -0.331264, 0.5], [0.5, -0.418688, -0.081312]])
+
+    R, G, B = img[:, :, 0], img[:, :, 1], img[:, :, 2]
+
+    Y = npround(T[0, 0] * R + T[0, 1] * G + T[0, 2] * B).astype(uint8)
+    Cb = npround((T[1, 0] * R + T[1, 1] * G + T[1, 2] * B) + 128).astype(uint8)
+    Cr = npround((T[2, 0] * R + T[2, 1] * G + T[2, 2] * B) + 128).astype(uint8)
+
+    return Y, Cb, Cr
+
+
+def _legacy_to_rgb(Y: ndarray, Cb: ndarray, Cr: ndarray) -> tuple:
+    """Implementação antiga da conversão para RGB (inversa recalculada a cada chamada)"""
+    T = linalg.inv(array([[0.299, 0.587, 0.114], [-0.168736, -0.331264, 0.5], [0.5, -0.418688, -0.081312]]))
+
+    Y, Cb, Cr = Y.astype(float32), Cb.astype(float32), Cr.astype(float32)
+
+    R = T[0, 0] * Y + T[0, 1] * (Cb - 128) + T[0, 2] * (Cr - 128)
+    G = T[1, 0] * Y + T[1, 1] * (Cb - 128) + T[1, 2] * (Cr - 128)
+    B = T[2, 0] * Y + T[2, 1] * (Cb - 128) + T[2, 2] * (Cr - 128)
+
+    for channel in (R, G, B):
+        channel[channel > 255] = 255
+        channel[channel < 0] = 0
+
+    return npround(R).astype(uint8), npround(G).astype(uint8), npround(B).astype(uint8)
+
+
+def bench_color():
+    """Compara as conversões de cor antigas com o produto matricial por partes
+    em cada precisão (peppers original e ampliado 4x4, 16 vezes mais pixeis)"""
+
+    original = read_bmp("img/peppers.bmp")
+
+    for scale in (1, 4):
+        image = kron(original, ones((scale, scale, 1), dtype=uint8))
+        ycbcr = _legacy_to_ycbcr(image)
+        out = empty((3,) + image.shape[:2], dtype=uint8)
+
+        old_forward = _time(lambda: _legacy_to_ycbcr(image), repetitions=3)
+        old_inverse = _time(lambda: _legacy_to_rgb(*ycbcr), repetitions=3)
+
+        for precision in ("float64", "float32", "fixed"):
+            name = f"peppers x{scale * scale} {precision}"
+
+            new_time = _time(lambda: converter_to_ycbcr(image, precision, out), repetitions=3)
+            error = max(
+                abs(a.astype(int16) - b).max() for a, b in zip(ycbcr, converter_to_ycbcr(image, precision))
+            )
+            _report(f"ycbcr {name} (max err {error})", old_forward, new_time, error == 0)
+
+            new_time = _time(lambda: converter_to_rgb(*ycbcr, precision=precision, out=out), repetitions=3)
+            error = max(
+                abs(a.astype(int16) - b).max()
+                for a, b in zip(_legacy_to_rgb(*ycbcr), converter_to_rgb(*ycbcr, precision=precision))
+            )
+            _report(f"rgb {name} (max err {error})", old_inverse, new_time, error == 0)
+
+
+def bench_aan():
+    """Compara a DCT inteira AAN (escala compensada na quantização) com a DCT em vírgula
+    flutuante: tempo da DCT + quantização e da inversa, coeficientes quantizados diferentes
+    e PSNR dos canais reconstruídos"""
+
+    q_matrix_y = load_q_matrix("q_matrix_y.csv")
+    q_matrix_cbcr = load_q_matrix("q_matrix_cbcr.csv")
+
+    def forward(channels: tuple, quality_factor: int, method: str) -> list:
+        return [
+            quantize(channel, q_matrix, quality_factor, method)
+            for channel, q_matrix in zip(calculate_dct(*channels, 8, method), (q_matrix_y, q_matrix_cbcr, q_matrix_cbcr))
+        ]
+
+    def inverse(quantized: list, quality_factor: int, method: str) -> tuple:
+        return calculate_inv_dct(*[
+            inv_quantize(channel, q_matrix, quality_factor, method)
+            for channel, q_matrix in zip(quantized, (q_matrix_y, q_matrix_cbcr, q_matrix_cbcr))
+        ], 8, method)
+
+    for path in BENCH_IMAGES:
+        channels = _load_channels(path)
+        original = concatenate([channel.reshape(-1) for channel in channels])
+
+        for quality_factor in (25, 50, 75, 90):
+            name = f"{path} q{quality_factor}"
+            float_q = forward(channels, quality_factor, "float")
+            aan_q = forward(channels, quality_factor, "aan")
+
+            changed = sum((a != b).sum() for a, b in zip(float_q, aan_q)) / original.size * 100
+
+            old_time = _time(lambda: forward(channels, quality_factor, "float"))
+            new_time = _time(lambda: forward(channels, quality_factor, "aan"))
+            _report(f"dct+quant {name}", old_time, new_time, changed == 0)
+
+            old_time = _time(lambda: inverse(float_q, quality_factor, "float"))
+            new_time = _time(lambda: inverse(aan_q, quality_factor, "aan"))
+            _report(f"idct {name}", old_time, new_time, True)
+
+            psnr = list()
+            for method, quantized in (("float", float_q), ("aan", aan_q)):
+                reconstructed = concatenate([
+                    npround(channel).clip(0, 255).reshape(-1) for channel in inverse(quantized, quality_factor, method)
+                ])
+                psnr.append(PSNR(MSE(original[None], reconstructed[None]), original))
+
+            print(f"{'':<40} PSNR float {psnr[0]:.3f} dB  aan {psnr[1]:.3f} dB  coeficientes diferentes {changed:.3f}%")
+
+
+def bench_dct_backends():
+    """Compara os motores da DCT com o scipy.fftpack (DCT 8x8 + inversa dos três canais)
+    e mostra o motor escolhido pela medição automática"""
+
+    for path in BENCH_IMAGES:
+        channels = _load_channels(path)
+        reference = calculate_dct(*channels, 8, backend="fftpack")
+
+        old_time = _time(lambda: calculate_inv_dct(*calculate_dct(*channels, 8, backend="fftpack"), 8, backend="fftpack"))
+
+        for backend in DCT_BACKENDS:
+            if backend == "fftpack":
+                continue
+
+            coefficients = calculate_dct(*channels, 8, backend=backend)
+            error = max(float(abs(a - b).max()) for a, b in zip(coefficients, reference))
+
+            new_time = _time(lambda: calculate_inv_dct(*calculate_dct(*channels, 8, backend=backend), 8, backend=backend))
+            _report(f"{backend} {path}", old_time, new_time, error < 1e-3)
+            print(f"{'':<40} erro máximo dos coeficientes {error:.2e}")
+
+    best, timings = select_dct_backend()
+    set_dct_backend("fftpack")
+
+    print(f"motor escolhido: {best} ({', '.join(f'{name} {time * 1000:.2f} ms' for name, time in timings.items())})")
+
+
+def bench_sparse_idct():
+    """Compara a inversa da DCT esparsa (blocos só com o DC, 4x4 e completos) com a inversa
+    completa dos coeficientes desquantizados e mostra a percentagem de blocos de cada classe"""
+
+    q_matrix_y = load_q_matrix("q_matrix_y.csv")
+    q_matrix_cbcr = load_q_matrix("q_matrix_cbcr.csv")
+
+    for path in BENCH_IMAGES:
+        channels = calculate_dct(*[channel.astype(float32) - 128 for channel in _load_channels(path)], 8)
+
+        for quality_factor in (25, 50, 75, 95):
+            de_quantized = [
+                inv_quantize(quantize(channel, q_matrix, quality_factor), q_matrix, quality_factor)
+                for channel, q_matrix in zip(channels, (q_matrix_y, q_matrix_cbcr, q_matrix_cbcr))
+            ]
+
+            old_result = calculate_inv_dct(*de_quantized, 8)
+            new_result = [calculate_channel_sparse_inv_dct(channel, 8) for channel in de_quantized]
+            equal = all(abs(old - new).max() < 1e-3 for old, (new, _) in zip(old_result, new_result))
+
+            old_time = _time(lambda: calculate_inv_dct(*de_quantized, 8), 5)
+            new_time = _time(lambda: [calculate_channel_sparse_inv_dct(channel, 8, count=False) for channel in de_quantized], 5)
+            _report(f"{path} q{quality_factor}", old_time, new_time, equal)
+
+            histogram = sum(counts for _, counts in new_result)
+            print(f"{'':<40} " + "  ".join(
+                f"{label} {count / histogram.sum():.0%}" for label, count in zip(IDCT_CLASSES, histogram)
+            ))
+
+
+def _legacy_metrics(original: ndarray, reconstructed: ndarray) -> tuple:
+    """As métricas calculadas como antes: MSE em float32, SNR e PSNR a percorrer de novo o original"""
+
+    original32 = original.astype(float32)
+    pixels = original.shape[0] * original.shape[1]
+
+    mse = (original32 - reconstructed.astype(float32)) ** 2
+    mse = mse.sum() / pixels
+
+    snr = log10((original.astype(float32) ** 2).sum() / pixels / mse) * 10
+    psnr = log10(original.astype(float32).max() ** 2 / mse) * 10
+
+    return mse, mse ** 0.5, snr, psnr
+
+
+def bench_metrics():
+    """Compara as métricas numa só passagem (compute_metrics, com os valores de cada canal e de Y)
+    com o cálculo anterior do MSE, RMSE, SNR e PSNR"""
+
+    for path in BENCH_IMAGES:
+        image = read_bmp(path)
+        encoded, rows, cols = encode_image(image, 50, (4, 2, 0))
+        decoded = decode(encoded, rows, cols, 50)
+
+        for scale in (1, 16):
+            original = concatenate([image] * scale)
+            reconstructed = concatenate([decoded] * scale)
+
+            old_result = _legacy_metrics(original, reconstructed)
+            new_result = compute_metrics(original, reconstructed)
+            equal = all(abs(old - new) < 1e-4 * abs(new) for old, new in zip(old_result, new_result[:4]))
+
+            old_time = _time(lambda: _legacy_metrics(original, reconstructed))
+            new_time = _time(lambda: compute_metrics(original, reconstructed))
+            _report(f"{path} x{scale}", old_time, new_time, equal)
+
+
+def _legacy_ssim(original: ndarray, reconstructed: ndarray) -> float:
+    """SSIM da luminância com a janela 11x11 aplicada como um filtro 2D sobre o plano inteiro"""
+
+    weights = getGaussianKernel(11, 1.5)
+    window = weights @ weights.T
+
+    x = original @ array([0.299, 0.587, 0.114])
+    y = reconstructed @ array([0.299, 0.587, 0.114])
+
+    def local(plane):
+        return filter2D(plane, -1, window)[5:-5, 5:-5]
+
+    mu_x, mu_y = local(x), local(y)
+    sigma_xx = local(x * x) - mu_x ** 2
+    sigma_yy = local(y * y) - mu_y ** 2
+    sigma_xy = local(x * y) - mu_x * mu_y
+
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+
+    return float(((2 * mu_x * mu_y + c1) * (2 * sigma_xy + c2) / ((mu_x ** 2 + mu_y ** 2 + c1) * (sigma_xx + sigma_yy + c2))).mean())
+
+
+def bench_ssim():
+    """Compara o SSIM com a janela gaussiana separável por faixas com o filtro 2D sobre o plano
+    inteiro e mostra o custo do SSIM e do MS-SSIM face ao encode + decode"""
+
+    for path in BENCH_IMAGES:
+        image = read_bmp(path)
+
+        codec_time = _time(lambda: decode(*encode_image(image, 50, (4, 2, 0)), 50), 1, 3)
+        encoded, rows, cols = encode_image(image, 50, (4, 2, 0))
+        decoded = decode(encoded, rows, cols, 50)
+
+        for scale in (1, 16):
+            original = concatenate([image] * scale)
+            reconstructed = concatenate([decoded] * scale)
+
+            equal = abs(_legacy_ssim(original, reconstructed) - ssim(original, reconstructed)) < 1e-9
+
+            old_time = _time(lambda: _legacy_ssim(original, reconstructed), 1, 3)
+            new_time = _time(lambda: ssim(original, reconstructed), 1, 3)
+            _report(f"ssim {path} x{scale}", old_time, new_time, equal)
+
+        times = {
+            f"{name} {channel}": _time(lambda: function(image, decoded, channel), 1, 3)
+            for name, function in (("ssim", ssim), ("ms_ssim", ms_ssim)) for channel in ("y", "rgb")
+        }
+        print(f"{'':<40} encode + decode {codec_time * 1000:.1f} ms  " + "  ".join(
+            f"{name} {time * 1000:.1f} ms" for name, time in times.items()
+        ))
+
+
+def _legacy_sweep(image: ndarray, quality_factors, downsamplings) -> list:
+    """Varrimento taxa-distorção com encode_image + decode por ponto"""
+
+    points = list()
+
+    for downsampling in downsamplings:
+        for quality_factor in quality_factors:
+            encoded, rows, cols = encode_image(image, quality_factor, downsampling)
+            decoded = decode(encoded, rows, cols, quality_factor)
+
+            points.append((len(encoded), compute_metrics(image, decoded).psnr, ssim(image, decoded)))
+
+    return points
+
+
+def bench_sweep():
+    """Compara o varrimento taxa-distorção (conversão de cor e DCT partilhadas, quantização
+    vetorizada por grupos de fatores) com encode_image + decode por ponto"""
+
+    quality_factors = list(range(10, 100, 10))
+    downsamplings = ((4, 2, 0), (4, 4, 4))
+
+    for path in BENCH_IMAGES:
+        image = read_bmp(path)
+
+        points = rd_sweep(image, quality_factors, downsamplings)
+        equal = _legacy_sweep(image, quality_factors, downsamplings) == [
+            (point.bytes, point.psnr, point.ssim) for point in points
+        ]
+
+        old_time = _time(lambda: _legacy_sweep(image, quality_factors, downsamplings), 1, 3)
+        new_time = _time(lambda: rd_sweep(image, quality_factors, downsamplings), 1, 3)
+        _report(f"sweep {path} {len(points)} pontos", old_time, new_time, equal)
+
+
+def _legacy_target(image: ndarray, max_bytes: int = None, min_psnr: float = None) -> int:
+    """Bisseção do fator de qualidade com encode_image (e decode para o PSNR) em cada iteração"""
+
+    if max_bytes is not None:
+        return bisect_quality(lambda q: len(encode_image(image, q, (4, 2, 0))[0]) <= max_bytes)
+
+    def psnr(quality_factor):
+        encoded, rows, cols = encode_image(image, quality_factor, (4, 2, 0))
+        return compute_metrics(image, decode(encoded, rows, cols, quality_factor)).psnr
+
+    return bisect_quality(lambda q: psnr(q) >= min_psnr, lowest=True)
+
+
+def bench_target():
+    """Compara a procura do fator de qualidade para um tamanho ou um PSNR (DCT partilhada e
+    tamanho contado pelos símbolos) com encode_image (+ decode) em cada iteração"""
+
+    for path in BENCH_IMAGES:
+        image = read_bmp(path)
+
+        stages = dict()
+        encode_image(image, 75, (4, 2, 0), observer=lambda stage, data: stages.update({stage: data}))
+
+        equal = estimate_size(stages["dpcm"]) == len(encode_channels(stages["dpcm"]))
+        old_time = _time(lambda: encode_channels(stages["dpcm"]), 3, 5)
+        new_time = _time(lambda: estimate_size(stages["dpcm"]), 3, 5)
+        _report(f"estimate_size {path}", old_time, new_time, equal)
+
+        for name, target in (("size 20KB", {"max_bytes": 20 * 1024}), ("psnr 30dB", {"min_psnr": 30})):
+            equal = _legacy_target(image, **target) == encode_to_target(image, (4, 2, 0), **target)[3].quality
+
+            old_time = _time(lambda: _legacy_target(image, **target), 1, 3)
+            new_time = _time(lambda: encode_to_target(image, (4, 2, 0), **target), 1, 3)
+            _report(f"target {name} {path}", old_time, new_time, equal)
+
+
+def bench_rdo():
+    """Mostra a poupança de tamanho e a perda de PSNR da quantização RDO face à quantização
+    simples, o PSNR da quantização simples com o mesmo tamanho (fator de qualidade mais baixo)
+    e o custo no tempo do encode"""
+
+    for path in BENCH_IMAGES:
+        image = read_bmp(path)
+
+        # curva da quantização simples para comparar com o mesmo tamanho
+        curve = rd_sweep(image, list(range(1, 101)))
+
+        for quality_factor in (50, 75):
+            old_time = _time(lambda: encode_image(image, quality_factor, (4, 2, 0)), 1, 3)
+
+            for lmbda in (0.005, 0.01, 0.02):
+                report = rdo_report(image, quality_factor, (4, 2, 0), lmbda)
+                new_time = _time(lambda: encode_image(image, quality_factor, (4, 2, 0), rdo_lambda=lmbda), 1, 3)
+
+                same_size = max((point for point in curve if point.bytes <= report.rdo_bytes), key=lambda point: point.bytes)
+
+                print(
+                    f"rdo {path} q{quality_factor} lambda {lmbda:<6} {report.bytes:7d} -> {report.rdo_bytes:7d} B"
+                    f" ({report.savings:5.1%})  PSNR -{report.psnr_loss:.2f} dB"
+                    f"  (q{same_size.quality}: {same_size.bytes:7d} B, {same_size.psnr - report.rdo_psnr:+.2f} dB)"
+                    f"  encode {old_time * 1000:.1f} -> {new_time * 1000:.1f} ms"
+                )
+
+
+BENCHMARKS = {
+    "dct": bench_dct,
+    "quantize": bench_quantize,
+    "dpcm": bench_dpcm,
+    "entropy": bench_entropy,
+    "jfif": bench_jfif,
+    "transcode": bench_transcode,
+    "headless": bench_headless,
+    "threads": bench_threads,
+    "stream": bench_stream,
+    "reader": bench_reader,
+    "color": bench_color,
+    "aan": bench_aan,
+    "dct_backends": bench_dct_backends,
+    "sparse_idct": bench_sparse_idct,
+    "metrics": bench_metrics,
+    "ssim": bench_ssim,
+    "sweep": bench_sweep,
+    "target": bench_target,
+    "rdo": bench_rdo,
+}
+
+
+def main():
+    """Corre os benchmarks pedidos (todos por omissão)"""
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "benchmarks",
+        help="benchmarks to run (default: all)",
+        nargs="*",
+        metavar="BENCHMARK"
+    )
+    args = parser.parse_args()
+
+    # verificar se os benchmarks pedidos existem
+    for name in args.benchmarks:
+        if name not in BENCHMARKS:
+            parser.error(f"unknown benchmark '{name}' (choose from {', '.join(BENCHMARKS)})")
+
+    for name in args.benchmarks or BENCHMARKS:
+        print(f"== {name}")
+        BENCHMARKS[name]()
+
+
+if __name__ == "__main__":
+    main()
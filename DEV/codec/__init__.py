@@ -2,10 +2,33 @@
 """
 
 # encoder
-from .encoder import encode
+from .encoder import encode, encode_image
 
 # decoder
-from .decoder import decode
+from .decoder import decode, decode_jpeg, jpeg_stage
+
+# container
+from .container import pack_container, unpack_container, write_container, read_container
+
+# jpeg
+from .jfif import encode_jfif, save_jpeg
+from .jpeg_reader import read_jpeg, parse_jpeg, is_jpeg
+from .stream import stream_jfif
+
+# transcode
+from .transcode import requantize, halve_chroma, rotate, crop, encode_jpeg, transcode_file
+
+# batch
+from .batch import run_batch
+
+# rate-distortion sweep
+from .sweep import rd_sweep, run_sweep, write_rd_curve, parse_downsampling, RDPoint, RD_FORMATS
+
+# rate-distortion optimized quantization
+from .rdo import rdo_quantize, rdo_report, RdoReport, RDO_LAMBDA
+
+# constrained encoding
+from .target import encode_to_target, TargetResult
 
 # main function
-from .main_codec import main_codec_function
+from .main_codec import main_codec_function, encode_to_file, decode_from_file
@@ -0,0 +1,176 @@
+"""Contém o modo de processamento em lote, que codifica todas as imagens
+de uma pasta num conjunto de processos, sem interface gráfica
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from os import listdir, cpu_count, makedirs
+from os.path import basename, isdir, join, splitext
+from time import perf_counter
+from typing import List, NamedTuple
+
+from imgtools import read_bmp
+
+from metrics import compute_metrics, ssim
+from metrics.ssim import WINDOW_SIZE
+
+from .encoder import encode_image
+from .decoder import decode
+from .container import write_container
+
+
+class BatchResult(NamedTuple):
+    """O resultado da codificação de uma imagem do lote
+    """
+    name: str
+    error: str = None
+    raw_bytes: int = 0
+    encoded_bytes: int = 0
+    seconds: float = 0
+    mse: float = None
+    psnr: float = None
+    ssim: float = None
+
+
+def _encode_job(
+    path: str, output: str, fator_qualidade: int, downsampling: tuple, optimize_huffman: bool
+) -> BatchResult:
+    """Codifica uma imagem, escreve o ficheiro do codec e calcula as métricas
+    da imagem descodificada (executado num processo do conjunto)
+
+    Args:
+        path (str): o caminho da imagem
+        output (str): o caminho do ficheiro do codec
+        fator_qualidade (int): o fator de qualidade
+        downsampling (tuple): a subamostragem
+        optimize_huffman (bool): usar tabelas de Huffman otimizadas
+
+    Returns:
+        BatchResult: o resultado da imagem
+    """
+
+    name = basename(path)
+
+    try:
+        start = perf_counter()
+
+        image = read_bmp(path)
+        if image is None:
+            return BatchResult(name, "could not read the image")
+
+        encoded, rows, cols = encode_image(image, fator_qualidade, downsampling, optimize_huffman)
+
+        if not write_container(output, encoded, rows, cols, fator_qualidade, downsampling):
+            return BatchResult(name, "could not write the codec file")
+
+        elapsed = perf_counter() - start
+
+        decoded = decode(encoded, rows, cols, fator_qualidade)
+        metrics = compute_metrics(image, decoded)
+
+        # o SSIM precisa de pelo menos uma janela completa
+        similarity = ssim(image, decoded) if min(rows, cols) >= WINDOW_SIZE else None
+
+        return BatchResult(name, None, image.nbytes, len(encoded), elapsed, metrics.mse, metrics.psnr, similarity)
+
+    # uma imagem inválida não interrompe o lote
+    except Exception as error:
+        return BatchResult(name, f"{type(error).__name__}: {error}")
+
+
+def run_batch(
+    directory: str,
+    fator_qualidade: int,
+    downsampling: tuple,
+    workers: int = None,
+    output: str = None,
+    optimize_huffman: bool = False,
+) -> List[BatchResult]:
+    """Codifica todas as imagens BMP de uma pasta num conjunto de processos\n
+    Cada imagem é escrita num ficheiro do codec (.jcsv) assim que termina e os
+    resultados são impressos pela ordem alfabética dos ficheiros, independentemente
+    do processo que os calculou
+
+    Args:
+        directory (str): a pasta com as imagens
+        fator_qualidade (int): o fator de qualidade
+        downsampling (tuple): a subamostragem
+        workers (int, optional): o número de processos. Default a None (número de CPUs).
+        output (str, optional): a pasta dos ficheiros do codec. Default a None (a pasta das imagens).
+        optimize_huffman (bool, optional): usar tabelas de Huffman otimizadas. Default a False.
+
+    Returns:
+        List[BatchResult]: os resultados ordenados pelo nome das imagens ou None caso ocorra um erro
+    """
+
+    if not isdir(directory):
+        print(f"{directory} is not a directory")
+        return
+
+    if workers is not None and workers < 1:
+        print("Number of workers must be positive")
+        return
+
+    output = directory if output is None else output
+    makedirs(output, exist_ok=True)
+
+    names = sorted(name for name in listdir(directory) if name.lower().endswith(".bmp"))
+    if not names:
+        print(f"No BMP images found in {directory}")
+        return []
+
+    jobs = [
+        (join(directory, name), join(output, splitext(name)[0] + ".jcsv"), fator_qualidade, downsampling, optimize_huffman)
+        for name in names
+    ]
+
+    workers = min(workers or cpu_count() or 1, len(jobs))
+    results = list()
+
+    start = perf_counter()
+
+    # um só processo dispensa o conjunto de processos
+    if workers == 1:
+        outcomes = (_encode_job(*job) for job in jobs)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        outcomes = executor.map(_encode_job, *zip(*jobs))
+
+    try:
+        for result in outcomes:
+            results.append(result)
+
+            if result.error is None:
+                print(
+                    f"{result.name}: {result.raw_bytes // 1024}KB -> {result.encoded_bytes // 1024}KB"
+                    f" ({result.seconds * 1000:.1f} ms)  MSE {result.mse:.3f}  PSNR {result.psnr:.2f} dB"
+                    + ("" if result.ssim is None else f"  SSIM {result.ssim:.4f}")
+                )
+            else:
+                print(f"{result.name}: FAILED ({result.error})")
+
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    elapsed = perf_counter() - start
+
+    done = [result for result in results if result.error is None]
+    raw_bytes = sum(result.raw_bytes for result in done)
+    encoded_bytes = sum(result.encoded_bytes for result in done)
+
+    print(f"Imagens codificadas: {len(done)}/{len(results)} ({workers} processos)")
+    if done:
+        print(f"Tempo total: {elapsed:.2f} s ({len(done) / elapsed:.1f} imagens/s, {raw_bytes / 2**20 / elapsed:.1f} MB/s)")
+        print(f"Taxa de compressão: {round((1 - encoded_bytes / raw_bytes) * 100, 1)}%")
+        print(f"PSNR médio: {sum(result.psnr for result in done) / len(done):.2f} dB")
+
+        measured = [result.ssim for result in done if result.ssim is not None]
+        if measured:
+            print(f"SSIM médio: {sum(measured) / len(measured):.4f}")
+
+    failed = [result.name for result in results if result.error is not None]
+    if failed:
+        print(f"Falhas: {', '.join(failed)}")
+
+    return results
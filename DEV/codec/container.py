@@ -0,0 +1,208 @@
+"""Contém o formato de ficheiro do codec, que guarda uma imagem
+comprimida para ser descodificada noutro processo ou máquina
+
+Formato (big-endian):
+    cabeçalho: "JCSV", versão (B), linhas (I), colunas (I), fator de qualidade (B),
+    subamostragem (3B), tabelas de quantização (B), tipo de payload (B)
+    payload: o buffer da codificação entrópica (PAYLOAD_ENTROPY) ou
+    os canais quantizados em int16 (PAYLOAD_INT16)
+"""
+
+from os.path import isdir
+from struct import pack, unpack_from, calcsize, error as StructError
+from typing import NamedTuple, Sequence, Tuple, Union
+
+from numpy import ndarray, frombuffer, int16
+
+MAGIC = b"JCSV"
+VERSION = 1
+
+HEADER = ">4sBIIB3BBB"
+
+# tipos de payload
+PAYLOAD_ENTROPY = 0
+PAYLOAD_INT16 = 1
+
+# tabelas de quantização (Y, CbCr) de cada identificador
+QUANTIZATION_TABLES = {
+    0: ("q_matrix_y.csv", "q_matrix_cbcr.csv"),
+}
+
+
+class Container(NamedTuple):
+    """Conteúdo de um ficheiro do codec
+    """
+    data: Union[bytes, Tuple[ndarray, ...]]
+    width: int
+    height: int
+    quality_factor: int
+    downsampling: Tuple[int, int, int]
+    q_tables: int = 0
+
+
+def pack_container(
+    data: Union[bytes, Sequence[ndarray]],
+    width: int,
+    height: int,
+    quality_factor: int,
+    downsampling: Sequence[int],
+    q_tables: int = 0
+) -> bytes:
+    """Serializa uma imagem codificada no formato do codec
+
+    Args:
+        data (Union[bytes, Sequence[ndarray]]): o buffer da codificação entrópica
+        ou os canais quantizados (guardados em int16)
+        width (int): o número de linhas da imagem original
+        height (int): o número de colunas da imagem original
+        quality_factor (int): o fator de qualidade [0, 100]
+        downsampling (Sequence[int]): a subamostragem usada
+        q_tables (int, optional): o identificador das tabelas de quantização. Default a 0.
+
+    Returns:
+        bytes: o conteúdo do ficheiro
+    """
+
+    if isinstance(data, (bytes, bytearray)):
+        payload_type = PAYLOAD_ENTROPY
+        payload = bytes(data)
+
+    # canais quantizados guardados em int16
+    else:
+        payload_type = PAYLOAD_INT16
+        payload = pack(">B", len(data)) + b"".join(
+            pack(">II", *channel.shape) + channel.astype(">i2").tobytes()
+            for channel in data
+        )
+
+    header = pack(
+        HEADER, MAGIC, VERSION, width, height, quality_factor,
+        *downsampling, q_tables, payload_type
+    )
+
+    return header + payload
+
+
+def unpack_container(buffer: bytes) -> Container:
+    """Lê uma imagem codificada no formato do codec
+
+    Args:
+        buffer (bytes): o conteúdo do ficheiro
+
+    Returns:
+        Container: a imagem codificada ou None caso o formato seja inválido
+    """
+
+    try:
+        magic, version, width, height, quality_factor, ds1, ds2, ds3, q_tables, payload_type = \
+            unpack_from(HEADER, buffer, 0)
+    except StructError:
+        print("File is too short to be a codec file")
+        return
+
+    if magic != MAGIC:
+        print("File is not a codec file")
+        return
+
+    if version != VERSION:
+        print(f"Unsupported codec file version {version}")
+        return
+
+    if q_tables not in QUANTIZATION_TABLES:
+        print(f"Unknown quantization tables {q_tables}")
+        return
+
+    offset = calcsize(HEADER)
+
+    if payload_type == PAYLOAD_ENTROPY:
+        data = bytes(buffer[offset:])
+
+    elif payload_type == PAYLOAD_INT16:
+        channels = list()
+
+        if offset + 1 > len(buffer):
+            print("Truncated codec file")
+            return
+
+        (num_channels,) = unpack_from(">B", buffer, offset)
+        offset += 1
+
+        # ler cada canal
+        for _ in range(num_channels):
+            if offset + 8 > len(buffer):
+                print("Truncated codec file")
+                return
+
+            rows, cols = unpack_from(">II", buffer, offset)
+            offset += 8
+
+            if offset + rows * cols * 2 > len(buffer):
+                print("Truncated codec file")
+                return
+
+            channel = frombuffer(buffer, dtype=">i2", count=rows * cols, offset=offset)
+            channels.append(channel.astype(int16).astype(int).reshape(rows, cols))
+            offset += rows * cols * 2
+
+        data = tuple(channels)
+
+    else:
+        print(f"Unknown payload type {payload_type}")
+        return
+
+    return Container(data, width, height, quality_factor, (ds1, ds2, ds3), q_tables)
+
+
+def write_container(path: str, *args, **kwargs) -> bool:
+    """Escreve uma imagem codificada num ficheiro (ver pack_container)
+
+    Args:
+        path (str): o caminho do ficheiro
+
+    Returns:
+        bool: True se o ficheiro foi escrito
+    """
+
+    if isdir(path):
+        print(f"{path} is a directory")
+        return False
+
+    try:
+        with open(path, "wb") as codec_file:
+            codec_file.write(pack_container(*args, **kwargs))
+
+    except IOError:
+        print(f"An error has occured while writing the file at {path}")
+        return False
+
+    return True
+
+
+def read_container(path: str) -> Container:
+    """Lê uma imagem codificada de um ficheiro
+
+    Args:
+        path (str): o caminho do ficheiro
+
+    Returns:
+        Container: a imagem codificada ou None caso ocorra um erro
+    """
+
+    # não é um ficheiro
+    if isdir(path):
+        print(f"{path} is not a file")
+        return
+
+    try:
+        with open(path, "rb") as codec_file:
+            return unpack_container(codec_file.read())
+
+    # ficheiro não existe
+    except FileNotFoundError:
+        print(f"File at {path} does not exist")
+        return
+
+    # ocorreu outro erro
+    except IOError:
+        print(f"An error has occured while reading the file at {path}")
+        return
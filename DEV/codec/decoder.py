@@ -1,59 +1,135 @@
 """Contém funções de decode para o codec JPEG
 """
 
-from typing import Tuple
-from numpy import ndarray
+from typing import Tuple, Union
+from time import perf_counter
+from numpy import ndarray, clip, round as npround, uint8
 
 from imgtools import converter_to_rgb
 from imgtools import restore_padding
-from imgtools import join_channels
+from imgtools import join_channels, separate_channels
 from imgtools import up_sample
 from imgtools import inv_quantize
-from imgtools import calculate_inv_dct
+from imgtools import calculate_channel_inv_dct, calculate_channel_sparse_inv_dct, IDCT_CLASSES
 from imgtools import dpcm_decoder
+from imgtools import dpcm_encoder
 
 from file_worker import load_q_matrix
 
+from pipeline import map_channels
 
-def decode(data: Tuple[ndarray, ndarray, ndarray], width: int, height: int, quality_factor: int, isMetrics: bool = False) -> ndarray:
+from .entropy import decode_channels
+from .jpeg_reader import JpegImage
+
+
+def _decode_channel(
+    channel: ndarray, q_matrix: ndarray, quality_factor: int, sparse_idct: bool = False, count: bool = False
+) -> Tuple[ndarray, ndarray, ndarray]:
+    """Descodifica um canal desde o DPCM até à inversa da DCT
+
+    Args:
+        channel (ndarray): o canal quantizado com o DC codificado por DPCM
+        q_matrix (ndarray): a matriz de quantização do canal
+        quality_factor (int): o fator de qualidade da matriz de quantização
+        sparse_idct (bool, optional): saltar os coeficientes nulos na inversa da DCT
+        (ver calculate_channel_sparse_inv_dct). Default a False.
+        count (bool, optional): contar os blocos de cada classe da inversa esparsa. Default a False.
+
+    Returns:
+        Tuple[ndarray, ndarray, ndarray]: o canal depois do DPCM, o canal depois da inversa da DCT
+        e o número de blocos de cada classe da inversa (None sem sparse_idct ou sem count)
+    """
+
+    de_dpcm = dpcm_decoder(channel)
+
+    de_quantized = inv_quantize(de_dpcm, q_matrix, quality_factor)
+
+    if sparse_idct:
+        return (de_dpcm, *calculate_channel_sparse_inv_dct(de_quantized, 8, count=count))
+
+    return de_dpcm, calculate_channel_inv_dct(de_quantized, 8), None
+
+
+def decode(
+    data: Union[bytes, Tuple[ndarray, ndarray, ndarray]],
+    width: int,
+    height: int,
+    quality_factor: int,
+    isMetrics: bool = False,
+    workers: int = 1,
+    sparse_idct: bool = False
+) -> ndarray:
     """Decodifica a matriz de bytes dada em formato jpeg
-    para uma imagem
+    para uma imagem\n
+    Os três canais são independentes até à inversa da DCT, pelo que
+    podem ser descodificados num conjunto de threads
 
     Args:
-        data (Tuple[ndarray, ndarray, ndarray]): Os canais da imagem
+        data (Union[bytes, Tuple[ndarray, ndarray, ndarray]]): os canais da imagem
+        codificados entropicamente ou os canais da imagem já separados
         width (int): a largura da imagem original
         height (int): a altura da imagem original
         quality_factor (int): o fator de qualidade da matriz de quantização
+        isMetrics (bool, optional): imprimir os valores intermédios. Default a False.
+        workers (int, optional): o número de threads (um canal por thread). Default a 1.
+        sparse_idct (bool, optional): usar a inversa da DCT esparsa. Default a False.
 
     Returns:
-        ndarray: a imagem descodificada
+        ndarray: a imagem descodificada ou None caso os canais codificados sejam inválidos
     """
 
+    # descodificação entrópica
+    if isinstance(data, (bytes, bytearray)):
+        start = perf_counter()
+        data = decode_channels(data, workers)
+        elapsed = perf_counter() - start
+
+        if data is None:
+            return
+
+        if isMetrics:
+            print(f"Débito da descodificação entrópica: {width * height * 3 / 2**20 / elapsed:.1f} MB/s")
+
     q_matrix_y = load_q_matrix("q_matrix_y.csv")
     q_matrix_cbcr = load_q_matrix("q_matrix_cbcr.csv")
 
-    de_dpcm = (
-        dpcm_decoder(data[0]),
-        dpcm_decoder(data[1]),
-        dpcm_decoder(data[2])
+    decoded = map_channels(
+        _decode_channel,
+        data[:3],
+        (q_matrix_y, q_matrix_cbcr, q_matrix_cbcr),
+        (quality_factor,) * 3,
+        (sparse_idct,) * 3,
+        (isMetrics,) * 3,
+        workers=workers
     )
 
     # terceiro dcpm
     if isMetrics:
-        print(f"INV Y DCPM {de_dpcm[0][8:16,8:16]}")
-    
-    de_quantized = (
-        inv_quantize(de_dpcm[0], q_matrix_y, quality_factor),
-        inv_quantize(de_dpcm[1], q_matrix_cbcr, quality_factor),
-        inv_quantize(de_dpcm[2], q_matrix_cbcr, quality_factor)
-    )
+        print(f"INV Y DCPM {decoded[0][0][8:16,8:16]}")
 
-    inv_dct = calculate_inv_dct(
-        de_quantized[0],
-        de_quantized[1],
-        de_quantized[2],
-        8
-    )
+    # blocos de cada classe da inversa da DCT esparsa
+    if isMetrics and sparse_idct:
+        for name, (_, _, histogram) in zip(("Y", "Cb", "Cr"), decoded):
+            print(f"Blocos da IDCT {name}: " + ", ".join(
+                f"{label} {count} ({count / histogram.sum():.0%})" for label, count in zip(IDCT_CLASSES, histogram)
+            ))
+
+    inv_dct = tuple(channel for _, channel, _ in decoded)
+
+    return _to_image(inv_dct, width, height)
+
+
+def _to_image(inv_dct: Tuple[ndarray, ndarray, ndarray], rows: int, cols: int) -> ndarray:
+    """Reconstrói a imagem RGB a partir dos canais YCbCr depois da inversa da DCT
+
+    Args:
+        inv_dct (Tuple[ndarray, ndarray, ndarray]): os canais Y, Cb e Cr (subamostrados e com padding)
+        rows (int): o número de linhas da imagem original
+        cols (int): o número de colunas da imagem original
+
+    Returns:
+        ndarray: a imagem descodificada
+    """
 
     up_sampled = up_sample(inv_dct[0], inv_dct[1], inv_dct[2])
 
@@ -61,6 +137,76 @@ def decode(data: Tuple[ndarray, ndarray, ndarray], width: int, height: int, qual
 
     image_rgb_padded = join_channels(image_r, image_g, image_b)
 
-    image_rgb = restore_padding(image_rgb_padded, width, height)
+    return restore_padding(image_rgb_padded, rows, cols)
+
+
+def jpeg_stage(jpeg: JpegImage, stage: str) -> Tuple[ndarray, ndarray, ndarray]:
+    """Devolve os canais de um ficheiro JPEG numa das fases do codec,
+    calculados a partir dos coeficientes do ficheiro (sem recodificar a imagem)\n
+    As fases são "dpcm", "quantize" (os coeficientes do ficheiro), "dct"
+    (os coeficientes desquantizados), "ycbcr" (os canais com a subamostragem do ficheiro)
+    e "rgb" (os canais da imagem descodificada)\n
+    As imagens em tons de cinzento devolvem o mesmo canal três vezes
+
+    Args:
+        jpeg (JpegImage): a imagem lida por read_jpeg
+        stage (str): a fase {dpcm, quantize, dct, ycbcr, rgb}
+
+    Returns:
+        Tuple[ndarray, ndarray, ndarray]: os canais na fase pedida ou None caso a fase não exista
+    """
+
+    if stage not in ("dpcm", "quantize", "dct", "ycbcr", "rgb"):
+        print(f"Unknown JPEG stage '{stage}'")
+        return
+
+    if stage == "rgb":
+        return separate_channels(decode_jpeg(jpeg))
+
+    components = jpeg.components * 3 if len(jpeg.components) == 1 else jpeg.components
+
+    if stage == "dpcm":
+        return tuple(dpcm_encoder(component.coefficients) for component in components)
+
+    if stage == "quantize":
+        return tuple(component.coefficients for component in components)
+
+    # as tabelas do ficheiro já estão escaladas (fator 50 = tabela inalterada)
+    de_quantized = tuple(
+        inv_quantize(component.coefficients, component.q_table, 50)
+        for component in components
+    )
+
+    if stage == "dct":
+        return de_quantized
+
+    inv_dct = tuple(calculate_channel_inv_dct(channel, 8) for channel in de_quantized)
+
+    return tuple(channel + 128 for channel in inv_dct)
+
+
+def decode_jpeg(jpeg: JpegImage) -> ndarray:
+    """Descodifica uma imagem lida de um ficheiro JPEG baseline
+
+    Args:
+        jpeg (JpegImage): a imagem lida por read_jpeg
+
+    Returns:
+        ndarray: a imagem RGB descodificada
+    """
+
+    channels = jpeg_stage(jpeg, "ycbcr")
+
+    up_sampled = up_sample(channels[0], channels[1], channels[2])
+
+    # componentes RGB (Adobe sem transformação) ou tons de cinzento
+    if not jpeg.ycbcr:
+        image_r, image_g, image_b = (
+            npround(clip(channel, 0, 255)).astype(uint8) for channel in up_sampled
+        )
+    else:
+        image_r, image_g, image_b = converter_to_rgb(up_sampled[0], up_sampled[1], up_sampled[2])
+
+    image_rgb_padded = join_channels(image_r, image_g, image_b)
 
-    return image_rgb
+    return restore_padding(image_rgb_padded, jpeg.rows, jpeg.cols)
@@ -1,115 +1,134 @@
-from matplotlib.pyplot import show, close
+"""Contém funções de encode para o codec JPEG
+"""
+
+from typing import Callable
+from time import perf_counter
 
 from numpy import ndarray
-from math import ceil
-
-from imgtools import read_bmp
-from imgtools import separate_channels
-from imgtools import create_colormap
-from imgtools import show_img
-from imgtools import add_padding
-from imgtools import converter_to_ycbcr
-from imgtools import down_sample
-from imgtools import calculate_dct
-from imgtools import quantize
+
 from imgtools import dpcm_encoder
 
 from file_worker import load_q_matrix
 
-def encode(image: ndarray, fator_qualidade: int, downsampling: tuple):
+from pipeline import StageGraph
+
+from .entropy import encode_channels
+from .rdo import rdo_quantize
+
+
+def encode_image(
+    image: ndarray,
+    fator_qualidade: int,
+    downsampling: tuple,
+    optimize_huffman: bool = False,
+    observer: Callable[[str, object], None] = None,
+    workers: int = 1,
+    rdo_lambda: float = None,
+):
+    """Codifica uma imagem calculando apenas o necessário para a compressão
+    (sem plots nem prints)\n
+    Caso seja fornecido um observador, este é chamado no fim de cada fase com o
+    nome da fase e o seu resultado: "rgb" (a imagem), "ycbcr", "downsample", "dct",
+    "quantize", "dpcm" (os três canais) e "entropy" (o buffer e o tempo da codificação)\n
+    Os três canais são independentes desde o downsampling até à codificação entrópica,
+    pelo que podem ser calculados num conjunto de threads\n
+    Com rdo_lambda a quantização é otimizada em taxa-distorção (ver codec.rdo.rdo_quantize)
+
+    Args:
+        image (ndarray): a imagem original
+        fator_qualidade (int): o fator de qualidade na quantizaçao
+        downsampling (tuple): o racio de downsampling usado {1,2,4,0}
+        optimize_huffman (bool, optional): usar tabelas de Huffman otimizadas
+        na codificação entrópica. Default a False.
+        observer (Callable[[str, object], None], optional): o observador das fases. Default a None.
+        workers (int, optional): o número de threads (um canal por thread). Default a 1.
+        rdo_lambda (float, optional): o lambda da quantização RDO. Default a None (quantização simples).
+
+    Returns:
+        Tuple[bytes, int, int]: os canais codificados entropicamente e
+        o número de linhas e colunas da imagem original
+    """
+
+    graph = StageGraph(workers=workers)
+
+    ycbcr = graph.source(image) + (graph.stage("padding", 32), graph.stage("ycbcr"))
+
+    stages = (
+        graph.stage("downsample", downsampling),
+        graph.stage("dct", 8),
+        graph.stage("quantize", fator_qualidade),
+        graph.stage("dpcm")
+    )
+
+    # a quantização RDO e o DPCM são calculados fora do grafo
+    if rdo_lambda is not None:
+        stages = stages[:2]
+
+    # as fases intermédias só são pedidas ao grafo quando são observadas
+    if observer is None:
+        channels = tuple(graph.get_many(graph.channels(ycbcr, *stages)))
+    else:
+        requests = [graph.channels(ycbcr, *stages[:i+1]) for i in range(len(stages))]
+        results = graph.get_many([ycbcr] + [key for keys in requests for key in keys])
+
+        observer("rgb", image)
+        observer("ycbcr", results[0])
+
+        for i, name in enumerate(("downsample", "dct", "quantize", "dpcm")[:len(stages)]):
+            observer(name, tuple(results[1 + 3*i:4 + 3*i]))
+
+        channels = tuple(results[-3:])
+
+    if rdo_lambda is not None:
+        q_matrix_y = load_q_matrix("q_matrix_y.csv")
+        q_matrix_cbcr = load_q_matrix("q_matrix_cbcr.csv")
+
+        quantized = tuple(
+            rdo_quantize(channel, q_matrix, fator_qualidade, rdo_lambda, index == 0)
+            for index, (channel, q_matrix) in enumerate(zip(channels, (q_matrix_y, q_matrix_cbcr, q_matrix_cbcr)))
+        )
+        channels = tuple(dpcm_encoder(channel) for channel in quantized)
+
+        if observer is not None:
+            observer("quantize", quantized)
+            observer("dpcm", channels)
+
+    start = perf_counter()
+    encoded = encode_channels(channels, optimize_huffman, workers)
+    if observer is not None:
+        observer("entropy", (encoded, perf_counter() - start))
+
+    return encoded, image.shape[0], image.shape[1]
+
+
+def encode(
+    image: ndarray,
+    fator_qualidade: int,
+    downsampling: tuple,
+    optimize_huffman: bool = False,
+    workers: int = 1,
+    rdo_lambda: float = None,
+):
     """Codifica o arquivo de imagem no caminho fornecido para um formato JPEG
+    mostrando todas as fases intermédias (ver codec.viewer.EncodeViewer)
 
     Args:
         image (ndarray): a imagem original
         fator_qualidade (int): o fator de qualidade na quantizaçao
         downsampling (tuple): o racio de downsampling usado {1,2,4,0}
+        optimize_huffman (bool, optional): usar tabelas de Huffman otimizadas
+        na codificação entrópica. Default a False.
+        workers (int, optional): o número de threads (um canal por thread). Default a 1.
+        rdo_lambda (float, optional): o lambda da quantização RDO. Default a None (quantização simples).
+
+    Returns:
+        Tuple[bytes, int, int]: os canais codificados entropicamente e
+        o número de linhas e colunas da imagem original
     """
-    
-    close("all")
-
-    # Exercicio 3
-    image_r, image_g, image_b = separate_channels(image)
-
-    map_r = create_colormap((0,0,0), (1,0,0), "red")
-    map_g = create_colormap((0,0,0), (0,1,0), "green")
-    map_b = create_colormap((0,0,0), (0,0,1), "blue")
-
-
-    show_img(image_r, map_r, fig_number=1, name="Canal vermelho", sub_plot_config=(2,2,1), plot_title="Conversão para RGB")
-    show_img(image_g, map_g, fig_number=1, name="Canal verde", sub_plot_config=(2,2,2), plot_title="Conversão para RGB")
-    show_img(image_b, map_b, fig_number=1, name="Canal azul", sub_plot_config=(2,2,3), plot_title="Conversão para RGB")
-
-    # Exercício 4 e 5
-
-    image_padded = add_padding(image, 32)[0]
-    image_y, image_cb, image_cr = converter_to_ycbcr(image_padded)
-
-    map_gr = create_colormap((0,0,0), (1,1,1), "grayscale")
-
-    show_img(image_y, map_gr, fig_number=2, name="Canal Y", sub_plot_config=(2,2,1), plot_title="Conversão para YCbCr")
-    show_img(image_cb, map_gr, fig_number=2, name="Canal Cb", sub_plot_config=(2,2,2), plot_title="Conversão para YCbCr")
-    show_img(image_cr, map_gr, fig_number=2, name="Canal Cr", sub_plot_config=(2,2,3), plot_title="Conversão para YCbCr")
-
-    
-    # Exercicio 6
-    y_resized, cb_resized, cr_resized = down_sample(image_y, image_cb, image_cr, downsampling)
-    
-    show_img(y_resized, map_gr, fig_number=3, name="Canal Y", sub_plot_config=(2,2,1), plot_title=f"Downsampling {downsampling}")
-    show_img(cb_resized, map_gr, fig_number=3, name="Canal Cb", sub_plot_config=(2,2,2), plot_title=f"Downsampling {downsampling}")
-    show_img(cr_resized, map_gr, fig_number=3, name="Canal Cr", sub_plot_config=(2,2,3), plot_title=f"Downsampling {downsampling}")
-    
-    # Exercicio 7
-    y_dct_without_blocks, cb_dct_without_blocks, cr_dct_without_blocks = calculate_dct(y_resized, cb_resized, cr_resized)
-    y_dct_blocks_8, cb_dct_blocks_8, cr_dct_blocks_8 = calculate_dct(y_resized, cb_resized, cr_resized, 8)
-    y_dct_blocks_64, cb_dct_blocks_64, cr_dct_blocks_64 = calculate_dct(y_resized, cb_resized, cr_resized, 64)
-    
-    show_img(y_dct_without_blocks, map_gr, fig_number=4, name="Canal Y", sub_plot_config=(2,2,1), plot_title="DCT", log_correction=True)
-    show_img(cb_dct_without_blocks, map_gr, fig_number=4, name="Canal Cb", sub_plot_config=(2,2,2), plot_title="DCT", log_correction=True)
-    show_img(cr_dct_without_blocks, map_gr, fig_number=4, name="Canal Cr", sub_plot_config=(2,2,3), plot_title="DCT", log_correction=True)
-
-    show_img(y_dct_blocks_8, map_gr, fig_number=5, name="Canal Y", sub_plot_config=(2,2,1), plot_title="DCT 8x8", log_correction=True)
-    show_img(cb_dct_blocks_8, map_gr, fig_number=5, name="Canal Cb", sub_plot_config=(2,2,2), plot_title="DCT 8x8", log_correction=True)
-    show_img(cr_dct_blocks_8, map_gr, fig_number=5, name="Canal Cr", sub_plot_config=(2,2,3), plot_title="DCT 8x8", log_correction=True)
-
-    show_img(y_dct_blocks_64, map_gr, fig_number=6, name="Canal Y", sub_plot_config=(2,2,1), plot_title="DCT 64x64", log_correction=True)
-    show_img(cb_dct_blocks_64, map_gr, fig_number=6, name="Canal Cb", sub_plot_config=(2,2,2), plot_title="DCT 64x64", log_correction=True)
-    show_img(cr_dct_blocks_64, map_gr, fig_number=6, name="Canal Cr", sub_plot_config=(2,2,3), plot_title="DCT 64x64", log_correction=True)
-    
-    # Exercicio 8
-    q_matrix_y = load_q_matrix("q_matrix_y.csv")
-    q_matrix_cbcr = load_q_matrix("q_matrix_cbcr.csv")
-    
-    y_quantizated = quantize(y_dct_blocks_8, q_matrix_y, fator_qualidade)
-    cb_quantizated = quantize(cb_dct_blocks_8, q_matrix_cbcr, fator_qualidade)
-    cr_quantizated = quantize(cr_dct_blocks_8, q_matrix_cbcr, fator_qualidade)
-
-    # primeiro print
-    print(f"YQ {y_quantizated[8:16,8:16]}")
-    
-    show_img(y_quantizated, map_gr, fig_number=7, name="Canal Y", log_correction=True, sub_plot_config=(2,2,1), plot_title="Quantização 8x8")
-    show_img(cb_quantizated, map_gr, fig_number=7, name="Canal Cb", log_correction=True, sub_plot_config=(2,2,2), plot_title="Quantização 8x8")
-    show_img(cr_quantizated, map_gr, fig_number=7, name="Canal Cr", log_correction=True, sub_plot_config=(2,2,3), plot_title="Quantização 8x8")
-    
-    # Exercicio 9
-    y_with_dcpm = dpcm_encoder(y_quantizated)
-    cb_with_dcpm = dpcm_encoder(cb_quantizated)
-    cr_with_dcpm = dpcm_encoder(cr_quantizated)
-    
-    show_img(y_with_dcpm, map_gr, fig_number=8, name="Canal Y", log_correction=True, sub_plot_config=(2,2,1), plot_title="Codificação DCPM")
-    show_img(cb_with_dcpm, map_gr, fig_number=8, name="Canal Cb", log_correction=True, sub_plot_config=(2,2,2), plot_title="Codificação DCPM")
-    show_img(cr_with_dcpm, map_gr, fig_number=8, name="Canal Cr", log_correction=True, sub_plot_config=(2,2,3), plot_title="Codificação DCPM")
-
-
-
-    # segundo print
-    print(f"Y DCPM {y_with_dcpm[8:16,8:16]}")
-
-
-    # Taxa de compressao
-    print(f"Taxa de compressão após downsampling {downsampling}: {round((1 - ceil((y_resized.nbytes + cb_resized.nbytes + cr_resized.nbytes) / 1024) / ceil(image.nbytes / 1024)) * 100, 1)}%")
-    print(f"Imagem original: {ceil(image.nbytes / 1024)}KB")
-    print(f"Imagem com 422: {ceil((y_resized.nbytes + cb_resized.nbytes + cr_resized.nbytes) / 1024)}KB")
-
-    show_img(image, fig_number=9, plot_title="Imagem Original", sub_plot_config=(1,1,1))
-
-    return y_with_dcpm, cb_with_dcpm, cr_with_dcpm, image.shape[0], image.shape[1]
+
+    # o viewer (e o matplotlib) só é importado quando as fases são mostradas
+    from .viewer import EncodeViewer
+
+    return encode_image(
+        image, fator_qualidade, downsampling, optimize_huffman, EncodeViewer(downsampling), workers, rdo_lambda
+    )
@@ -0,0 +1,590 @@
+"""Contém a fase de codificação entrópica do codec JPEG:
+varrimento em zigzag, codificação run-length dos coeficientes AC
+e codificação de Huffman para um buffer de bytes
+"""
+
+from struct import pack, unpack_from, error as StructError
+from typing import List, NamedTuple, Sequence, Tuple
+
+from numpy import (
+    ndarray, array, zeros, empty, ones, full, arange, repeat, concatenate, argsort,
+    bincount, frexp, abs as npabs, where, packbits, flatnonzero, insert,
+    uint8, int64
+)
+
+from pipeline import map_channels
+
+from .huffman import HuffmanTable
+from .huffman import STD_DC_LUMINANCE, STD_DC_CHROMINANCE, STD_AC_LUMINANCE, STD_AC_CHROMINANCE
+
+
+# posição natural (linha * 8 + coluna) de cada índice do varrimento em zigzag
+ZIGZAG = array([
+     0,  1,  8, 16,  9,  2,  3, 10,
+    17, 24, 32, 25, 18, 11,  4,  5,
+    12, 19, 26, 33, 40, 48, 41, 34,
+    27, 20, 13,  6,  7, 14, 21, 28,
+    35, 42, 49, 56, 57, 50, 43, 36,
+    29, 22, 15, 23, 30, 37, 44, 51,
+    58, 59, 52, 45, 38, 31, 39, 46,
+    53, 60, 61, 54, 47, 55, 62, 63,
+])
+
+# símbolos especiais dos coeficientes AC
+EOB = 0x00
+ZRL = 0xF0
+
+# tabelas de cada tipo de canal no buffer
+TABLES_LUMINANCE = 0
+TABLES_CHROMINANCE = 1
+TABLES_OPTIMIZED = 2
+
+STANDARD_TABLES = {
+    TABLES_LUMINANCE: (STD_DC_LUMINANCE, STD_AC_LUMINANCE),
+    TABLES_CHROMINANCE: (STD_DC_CHROMINANCE, STD_AC_CHROMINANCE),
+}
+
+
+class BlockSymbols(NamedTuple):
+    """Símbolos de Huffman de um conjunto de blocos, por ordem de escrita\n
+    Cada evento pertence a um bloco, tem uma chave de ordenação dentro do bloco,
+    é codificado com a tabela DC (is_dc) ou AC e é seguido de size bits extra
+    """
+    block: ndarray
+    key: ndarray
+    is_dc: ndarray
+    symbol: ndarray
+    extra: ndarray
+    size: ndarray
+
+
+def channel_to_zigzag(channel: ndarray) -> ndarray:
+    """Separa o canal em blocos 8x8 (por ordem raster) e varre cada bloco em zigzag
+
+    Args:
+        channel (ndarray): o canal com dimensões multiplas de 8
+
+    Returns:
+        ndarray: um array (número de blocos, 64) com os coeficientes em zigzag
+    """
+    rows, cols = channel.shape
+
+    blocks = channel.reshape(rows // 8, 8, cols // 8, 8).swapaxes(1, 2).reshape(-1, 64)
+
+    return blocks[:, ZIGZAG]
+
+
+def zigzag_to_channel(blocks: ndarray, shape: Tuple[int, int]) -> ndarray:
+    """Reverte o varrimento em zigzag e junta os blocos num canal
+
+    Args:
+        blocks (ndarray): um array (número de blocos, 64) em zigzag
+        shape (Tuple[int, int]): a shape do canal
+
+    Returns:
+        ndarray: o canal reconstruído
+    """
+    rows, cols = shape
+
+    natural = empty(blocks.shape, dtype=blocks.dtype)
+    natural[:, ZIGZAG] = blocks
+
+    return natural.reshape(rows // 8, cols // 8, 8, 8).swapaxes(1, 2).reshape(rows, cols)
+
+
+def _magnitude(values: ndarray) -> Tuple[ndarray, ndarray]:
+    """Calcula a categoria (número de bits) e os bits extra de cada valor
+
+    Args:
+        values (ndarray): os valores inteiros
+
+    Returns:
+        Tuple[ndarray, ndarray]: as categorias e os bits extra
+        (complemento para um nos valores negativos)
+    """
+    size = frexp(npabs(values))[1].astype(int64)
+    extra = where(values < 0, values + (1 << size) - 1, values)
+
+    return size, extra
+
+
+def block_symbols(blocks: ndarray, dc_prediction: bool = False) -> BlockSymbols:
+    """Converte blocos em zigzag nos símbolos de Huffman da norma JPEG\n
+    O coeficiente DC é codificado pela sua categoria e os coeficientes AC não nulos
+    por pares (número de zeros anteriores, categoria), com ZRL para sequências
+    de 16 zeros e EOB após o último coeficiente não nulo
+
+    Args:
+        blocks (ndarray): um array (número de blocos, 64) em zigzag
+        dc_prediction (bool, optional): codificar a diferença para o DC do bloco
+        anterior. Default a False (o DC já foi codificado por DPCM)
+
+    Returns:
+        BlockSymbols: os eventos a escrever
+    """
+    blocks = blocks.astype(int64)
+    num_blocks = blocks.shape[0]
+
+    # coeficientes DC
+    dc = blocks[:, 0].copy()
+    if dc_prediction:
+        dc[1:] -= blocks[:-1, 0]
+
+    dc_size, dc_extra = _magnitude(dc)
+
+    # coeficientes AC não nulos (ordenados por bloco e posição)
+    ac = blocks[:, 1:]
+    nz_block, nz_index = (ac != 0).nonzero()
+    nz_pos = nz_index + 1
+    nz_value = ac[nz_block, nz_index]
+    ac_size, ac_extra = _magnitude(nz_value)
+
+    # zeros desde o coeficiente não nulo anterior do mesmo bloco
+    previous = zeros(nz_pos.shape, dtype=int64)
+    if nz_pos.size:
+        same_block = nz_block[1:] == nz_block[:-1]
+        previous[1:] = where(same_block, nz_pos[:-1], 0)
+    run = nz_pos - previous - 1
+
+    # sequências de 16 zeros (ZRL) antes de cada coeficiente
+    zrl_count = run // 16
+    zrl_owner = repeat(arange(nz_pos.size), zrl_count)
+
+    # blocos que terminam com zeros levam EOB
+    last_pos = zeros(num_blocks, dtype=int64)
+    last_pos[nz_block] = nz_pos
+    eob_block = flatnonzero(last_pos != 63)
+
+    num_zrl = zrl_owner.size
+    num_eob = eob_block.size
+
+    block = concatenate((arange(num_blocks), nz_block[zrl_owner], nz_block, eob_block))
+    key = concatenate((
+        ones(num_blocks, dtype=int64),
+        2 * nz_pos[zrl_owner],
+        2 * nz_pos + 1,
+        full(num_eob, 128, dtype=int64),
+    ))
+    is_dc = concatenate((
+        ones(num_blocks, dtype=bool),
+        zeros(num_zrl + nz_pos.size + num_eob, dtype=bool),
+    ))
+    symbol = concatenate((
+        dc_size,
+        full(num_zrl, ZRL, dtype=int64),
+        ((run % 16) << 4) | ac_size,
+        full(num_eob, EOB, dtype=int64),
+    ))
+    extra = concatenate((dc_extra, zeros(num_zrl, dtype=int64), ac_extra, zeros(num_eob, dtype=int64)))
+    size = concatenate((dc_size, zeros(num_zrl, dtype=int64), ac_size, zeros(num_eob, dtype=int64)))
+
+    return BlockSymbols(block, key, is_dc, symbol, extra, size)
+
+
+def symbol_frequencies(symbols: BlockSymbols) -> Tuple[ndarray, ndarray]:
+    """Conta a frequência dos símbolos DC e AC
+
+    Args:
+        symbols (BlockSymbols): os eventos de um ou mais canais
+
+    Returns:
+        Tuple[ndarray, ndarray]: as frequências dos símbolos DC e AC (256 entradas)
+    """
+    dc_freq = bincount(symbols.symbol[symbols.is_dc], minlength=256)
+    ac_freq = bincount(symbols.symbol[~symbols.is_dc], minlength=256)
+
+    return dc_freq, ac_freq
+
+
+def tables_cover(symbols: BlockSymbols, dc_table: HuffmanTable, ac_table: HuffmanTable) -> bool:
+    """Verifica se todas as categorias/símbolos têm código nas tabelas fornecidas
+
+    Args:
+        symbols (BlockSymbols): os eventos a codificar
+        dc_table (HuffmanTable): a tabela DC
+        ac_table (HuffmanTable): a tabela AC
+
+    Returns:
+        bool: True se todos os símbolos puderem ser codificados
+    """
+    if symbols.size.size and symbols.size.max() > 15:
+        return False
+
+    dc_freq, ac_freq = symbol_frequencies(symbols)
+
+    return not ((dc_freq > 0) & (dc_table.sizes == 0)).any() and \
+        not ((ac_freq > 0) & (ac_table.sizes == 0)).any()
+
+
+def symbol_codes(
+    symbols: BlockSymbols, dc_table: HuffmanTable, ac_table: HuffmanTable, block_order: ndarray = None
+) -> Tuple[ndarray, ndarray, ndarray]:
+    """Associa o código de Huffman e os bits extra a cada evento
+
+    Args:
+        symbols (BlockSymbols): os eventos a codificar
+        dc_table (HuffmanTable): a tabela DC
+        ac_table (HuffmanTable): a tabela AC
+        block_order (ndarray, optional): a posição de escrita de cada bloco
+        (para intercalar canais). Default a None (ordem dos blocos)
+
+    Returns:
+        Tuple[ndarray, ndarray, ndarray]: a chave de ordenação global, o valor
+        (código seguido dos bits extra) e o comprimento em bits de cada evento
+    """
+    codes = where(symbols.is_dc, dc_table.codes[symbols.symbol], ac_table.codes[symbols.symbol])
+    lengths = where(symbols.is_dc, dc_table.sizes[symbols.symbol], ac_table.sizes[symbols.symbol])
+
+    order = symbols.block if block_order is None else block_order[symbols.block]
+
+    return (
+        order * 256 + symbols.key,
+        (codes << symbols.size) | symbols.extra,
+        lengths + symbols.size,
+    )
+
+
+def expand_bits(values: ndarray, lengths: ndarray, chunk: int = 1 << 18) -> ndarray:
+    """Expande uma sequência de códigos de comprimento variável nos seus bits
+
+    Args:
+        values (ndarray): o valor de cada código
+        lengths (ndarray): o comprimento em bits de cada código (máximo 32)
+        chunk (int, optional): número de códigos processados de cada vez. Default a 2^18.
+
+    Returns:
+        ndarray: um bit (uint8) por posição, do mais significativo para o menos significativo
+    """
+    bit_chunks = list()
+
+    # expandir cada código nos seus bits, por partes para limitar a memória
+    for start in range(0, values.size, chunk):
+        chunk_values = values[start:start + chunk]
+        chunk_lengths = lengths[start:start + chunk]
+
+        owner = repeat(arange(chunk_values.size), chunk_lengths)
+        ends = chunk_lengths.cumsum()
+        shift = ends[owner] - 1 - arange(owner.size)
+
+        bit_chunks.append(((chunk_values[owner] >> shift) & 1).astype(uint8))
+
+    return concatenate(bit_chunks) if bit_chunks else zeros(0, dtype=uint8)
+
+
+def pack_bits(values: ndarray, lengths: ndarray, stuffing: bool = False, chunk: int = 1 << 18) -> bytes:
+    """Escreve uma sequência de códigos de comprimento variável num buffer de bytes\n
+    O último byte é completado com uns, como na norma JPEG
+
+    Args:
+        values (ndarray): o valor de cada código
+        lengths (ndarray): o comprimento em bits de cada código (máximo 32)
+        stuffing (bool, optional): inserir um 0x00 depois de cada 0xFF. Default a False.
+        chunk (int, optional): número de códigos processados de cada vez. Default a 2^18.
+
+    Returns:
+        bytes: os bits empacotados
+    """
+    bits = expand_bits(values, lengths, chunk)
+
+    # completar o último byte com uns
+    padding = -bits.size % 8
+    if padding:
+        bits = concatenate((bits, ones(padding, dtype=uint8)))
+
+    packed = packbits(bits)
+
+    if stuffing:
+        packed = insert(packed, flatnonzero(packed == 0xFF) + 1, 0)
+
+    return packed.tobytes()
+
+
+def decode_blocks(
+    data: bytes,
+    num_blocks: int,
+    tables: Sequence[Tuple[HuffmanTable, HuffmanTable]],
+    plan: Sequence[int] = (0,),
+    dc_prediction: bool = False,
+) -> List[ndarray]:
+    """Descodifica blocos codificados com Huffman\n
+    Os blocos são lidos por ordem; o bloco i pertence ao componente plan[i % len(plan)],
+    o que permite ler canais intercalados
+
+    Args:
+        data (bytes): os bits empacotados (sem byte stuffing)
+        num_blocks (int): o número total de blocos
+        tables (Sequence[Tuple[HuffmanTable, HuffmanTable]]): as tabelas (DC, AC) de cada componente
+        plan (Sequence[int], optional): o componente de cada bloco num ciclo. Default a (0,).
+        dc_prediction (bool, optional): o DC foi codificado como diferença para
+        o bloco anterior do mesmo componente. Default a False.
+
+    Returns:
+        List[ndarray]: para cada componente, um array (blocos, 64) em zigzag
+    """
+
+    # janela de leitura segura no fim do buffer
+    data = bytes(data) + bytes(8)
+    total_bits = (len(data) - 8) * 8
+
+    lookups = [(dc.lookup(), ac.lookup()) for dc, ac in tables]
+    counts = [0] * len(tables)
+    for i in range(num_blocks):
+        counts[plan[i % len(plan)]] += 1
+
+    results = [zeros((count, 64), dtype=int64) for count in counts]
+    outputs = [result.reshape(-1) for result in results]
+    written = [0] * len(tables)
+    predictions = [0] * len(tables)
+
+    from_bytes = int.from_bytes
+    pos = 0
+
+    for i in range(num_blocks):
+        component = plan[i % len(plan)]
+        dc_lookup, ac_lookup = lookups[component]
+        output = outputs[component]
+        base = written[component] * 64
+        written[component] += 1
+
+        # coeficiente DC
+        byte = pos >> 3
+        window = (from_bytes(data[byte:byte + 5], "big") >> (8 - (pos & 7))) & 0xFFFFFFFF
+        entry = dc_lookup[window >> 16]
+        length = entry & 0xFF
+        if length == 0 or pos > total_bits:
+            raise ValueError("Invalid Huffman code in the bitstream")
+        size = entry >> 8
+
+        value = 0
+        if size:
+            value = (window >> (32 - length - size)) & ((1 << size) - 1)
+            if value < (1 << (size - 1)):
+                value -= (1 << size) - 1
+        pos += length + size
+
+        if dc_prediction:
+            value += predictions[component]
+            predictions[component] = value
+        output[base] = value
+
+        # coeficientes AC
+        k = 1
+        while k < 64:
+            byte = pos >> 3
+            window = (from_bytes(data[byte:byte + 5], "big") >> (8 - (pos & 7))) & 0xFFFFFFFF
+            entry = ac_lookup[window >> 16]
+            length = entry & 0xFF
+            if length == 0 or pos > total_bits:
+                raise ValueError("Invalid Huffman code in the bitstream")
+            symbol = entry >> 8
+
+            # fim de bloco
+            if symbol == EOB:
+                pos += length
+                break
+
+            size = symbol & 15
+            k += symbol >> 4
+
+            if size:
+                value = (window >> (32 - length - size)) & ((1 << size) - 1)
+                if value < (1 << (size - 1)):
+                    value -= (1 << size) - 1
+                if k > 63:
+                    raise ValueError("Invalid Huffman code in the bitstream")
+                output[base + k] = value
+
+            pos += length + size
+            k += 1
+
+    return results
+
+
+def _encode_channel(index: int, channel: ndarray, optimize: bool) -> bytes:
+    """Codifica entropicamente um canal (cabeçalho, tabelas e bits do canal)
+
+    Args:
+        index (int): o índice do canal (0 usa as tabelas de luminância)
+        channel (ndarray): o canal quantizado
+        optimize (bool): usar tabelas de Huffman otimizadas
+
+    Returns:
+        bytes: o segmento do canal no buffer
+    """
+
+    symbols = block_symbols(channel_to_zigzag(channel))
+
+    table_id = TABLES_LUMINANCE if index == 0 else TABLES_CHROMINANCE
+    dc_table, ac_table = STANDARD_TABLES[table_id]
+
+    # usar tabelas otimizadas
+    if optimize or not tables_cover(symbols, dc_table, ac_table):
+        if symbols.size.max() > 15:
+            raise ValueError("Coefficient out of range for entropy coding")
+
+        table_id = TABLES_OPTIMIZED
+        dc_freq, ac_freq = symbol_frequencies(symbols)
+        dc_table = HuffmanTable.from_frequencies(dc_freq)
+        ac_table = HuffmanTable.from_frequencies(ac_freq)
+
+    keys, values, lengths = symbol_codes(symbols, dc_table, ac_table)
+    order = argsort(keys, kind="stable")
+    payload = pack_bits(values[order], lengths[order])
+
+    segment = bytearray(pack(">IIB", channel.shape[0], channel.shape[1], table_id))
+    if table_id == TABLES_OPTIMIZED:
+        segment += dc_table.spec() + ac_table.spec()
+    segment += pack(">I", len(payload))
+    segment += payload
+
+    return bytes(segment)
+
+
+def _channel_size(index: int, channel: ndarray, optimize: bool) -> int:
+    """Calcula o tamanho do segmento de um canal sem escrever os bits\n
+    As tabelas são escolhidas como em _encode_channel e o número de bits é o produto
+    da frequência de cada símbolo pelo comprimento do seu código, mais os bits extra
+
+    Args:
+        index (int): o índice do canal (0 usa as tabelas de luminância)
+        channel (ndarray): o canal quantizado
+        optimize (bool): usar tabelas de Huffman otimizadas
+
+    Returns:
+        int: o tamanho do segmento do canal em bytes
+    """
+
+    symbols = block_symbols(channel_to_zigzag(channel))
+
+    dc_table, ac_table = STANDARD_TABLES[TABLES_LUMINANCE if index == 0 else TABLES_CHROMINANCE]
+    dc_freq, ac_freq = symbol_frequencies(symbols)
+
+    # cabeçalho do canal e comprimento dos bits
+    header = 9 + 4
+
+    if optimize or not tables_cover(symbols, dc_table, ac_table):
+        if symbols.size.max() > 15:
+            raise ValueError("Coefficient out of range for entropy coding")
+
+        dc_table = HuffmanTable.from_frequencies(dc_freq)
+        ac_table = HuffmanTable.from_frequencies(ac_freq)
+        header += len(dc_table.spec()) + len(ac_table.spec())
+
+    bits = int(dc_freq @ dc_table.sizes + ac_freq @ ac_table.sizes + symbols.size.sum())
+
+    return header + (bits + 7) // 8
+
+
+def estimate_size(channels: Sequence[ndarray], optimize: bool = False, workers: int = 1) -> int:
+    """Calcula o tamanho do buffer de encode_channels sem o escrever\n
+    Só são contados os símbolos de cada canal (não há varrimento dos códigos nem
+    empacotamento dos bits), pelo que é bastante mais rápido do que codificar
+    e o resultado é igual a len(encode_channels(channels, optimize))
+
+    Args:
+        channels (Sequence[ndarray]): os canais quantizados (com o DC já codificado por DPCM)
+        optimize (bool, optional): usar tabelas de Huffman otimizadas. Default a False.
+        workers (int, optional): o número de threads (um canal por thread). Default a 1.
+
+    Returns:
+        int: o tamanho do buffer em bytes
+    """
+
+    sizes = map_channels(
+        _channel_size, range(len(channels)), channels, [optimize] * len(channels), workers=workers
+    )
+
+    return 1 + sum(sizes)
+
+
+def encode_channels(channels: Sequence[ndarray], optimize: bool = False, workers: int = 1) -> bytes:
+    """Codifica entropicamente os canais quantizados (com o DC já codificado por DPCM)\n
+    O primeiro canal usa as tabelas de luminância e os restantes as de crominância.
+    Caso optimize seja pedido, ou as tabelas standard não consigam representar
+    algum símbolo, são construídas tabelas ótimas para cada canal
+
+    Formato do buffer (big-endian):
+        número de canais (B)
+        por canal: linhas (I), colunas (I), tipo de tabelas (B),
+        [tabela DC e tabela AC no formato DHT], comprimento (I), bits
+
+    Args:
+        channels (Sequence[ndarray]): os canais quantizados
+        optimize (bool, optional): usar tabelas de Huffman otimizadas. Default a False.
+        workers (int, optional): o número de threads (um canal por thread). Default a 1.
+
+    Returns:
+        bytes: o buffer codificado
+    """
+
+    segments = map_channels(
+        _encode_channel, range(len(channels)), channels, [optimize] * len(channels), workers=workers
+    )
+
+    return pack(">B", len(channels)) + b"".join(segments)
+
+
+def _decode_channel(rows: int, cols: int, tables: tuple, payload: bytes) -> ndarray:
+    """Descodifica os bits de um canal
+
+    Args:
+        rows (int): o número de linhas do canal
+        cols (int): o número de colunas do canal
+        tables (tuple): as tabelas DC e AC do canal
+        payload (bytes): os bits do canal
+
+    Returns:
+        ndarray: o canal quantizado
+    """
+
+    blocks = decode_blocks(payload, (rows // 8) * (cols // 8), [tables])[0]
+
+    return zigzag_to_channel(blocks, (rows, cols))
+
+
+def decode_channels(buffer: bytes, workers: int = 1) -> Tuple[ndarray, ...]:
+    """Descodifica um buffer produzido por encode_channels
+
+    Args:
+        buffer (bytes): o buffer codificado
+        workers (int, optional): o número de threads (um canal por thread). Default a 1.
+
+    Returns:
+        Tuple[ndarray, ...]: os canais quantizados (com o DC codificado por DPCM)
+        ou None caso o buffer esteja truncado ou corrompido
+    """
+
+    segments = list()
+
+    try:
+        (num_channels,) = unpack_from(">B", buffer, 0)
+        offset = 1
+
+        # os cabeçalhos são lidos primeiro para encontrar os bits de cada canal
+        for _ in range(num_channels):
+            rows, cols, table_id = unpack_from(">IIB", buffer, offset)
+            offset += 9
+
+            if table_id == TABLES_OPTIMIZED:
+                dc_table = HuffmanTable.from_spec(buffer, offset)
+                offset += 16 + len(dc_table.values)
+                ac_table = HuffmanTable.from_spec(buffer, offset)
+                offset += 16 + len(ac_table.values)
+            else:
+                dc_table, ac_table = STANDARD_TABLES[table_id]
+
+            (length,) = unpack_from(">I", buffer, offset)
+            offset += 4
+
+            if offset + length > len(buffer):
+                print("Truncated entropy coded payload")
+                return
+
+            segments.append((rows, cols, (dc_table, ac_table), buffer[offset:offset + length]))
+            offset += length
+
+        return tuple(map_channels(_decode_channel, *zip(*segments), workers=workers))
+
+    except (StructError, IndexError, KeyError, ValueError):
+        print("Invalid or corrupted entropy coded payload")
+        return
@@ -0,0 +1,248 @@
+"""Contém a classe HuffmanTable e as tabelas de Huffman
+standard do JPEG (ITU-T T.81, anexo K.3)
+"""
+
+from typing import List, Sequence
+
+from numpy import ndarray, zeros, arange, repeat, array, int64
+
+
+class HuffmanTable:
+    """Guarda uma tabela de Huffman no formato do JPEG
+    """
+
+    def __init__(self, bits: Sequence[int], values: Sequence[int]) -> None:
+        """Construtor da classe HuffmanTable
+
+        HuffmanTable
+        ------------
+        Uma tabela é definida, tal como no segmento DHT, pelo número de códigos
+        de cada comprimento (1 a 16 bits) e pelos símbolos ordenados pelo
+        comprimento do seu código
+
+        Args:
+            bits (Sequence[int]): o número de códigos com 1, 2, ..., 16 bits
+            values (Sequence[int]): os símbolos por ordem crescente de código
+        """
+        self.bits = [int(count) for count in bits]
+        self.values = [int(value) for value in values]
+
+        if len(self.bits) != 16 or sum(self.bits) != len(self.values):
+            raise ValueError("Invalid Huffman table specification")
+
+        # códigos e comprimentos indexados pelo símbolo (comprimento 0 = símbolo inexistente)
+        self.codes = zeros(256, dtype=int64)
+        self.sizes = zeros(256, dtype=int64)
+
+        code = 0
+        k = 0
+        for length in range(1, 17):
+            for _ in range(self.bits[length - 1]):
+                self.codes[self.values[k]] = code
+                self.sizes[self.values[k]] = length
+                code += 1
+                k += 1
+            code <<= 1
+
+        self._lookup = None
+
+    def lookup(self) -> List[int]:
+        """Devolve a tabela de descodificação indexada por uma janela de 16 bits\n
+        Cada entrada guarda (símbolo << 8) | comprimento do código, ou 0 caso
+        a janela não comece por um código válido
+
+        Returns:
+            List[int]: a tabela de descodificação com 65536 entradas
+        """
+
+        if self._lookup is None:
+            table = zeros(1 << 16, dtype=int64)
+            symbols = array(self.values, dtype=int64)
+            sizes = self.sizes[symbols]
+
+            # cada código ocupa todas as janelas que começam por ele
+            spans = 1 << (16 - sizes)
+            starts = self.codes[symbols] << (16 - sizes)
+            entries = (symbols << 8) | sizes
+
+            positions = repeat(starts, spans) + (
+                arange(spans.sum()) - repeat(spans.cumsum() - spans, spans)
+            )
+            table[positions] = repeat(entries, spans)
+
+            self._lookup = table.tolist()
+
+        return self._lookup
+
+    def spec(self) -> bytes:
+        """Serializa a tabela no formato do segmento DHT (16 contagens + símbolos)
+
+        Returns:
+            bytes: a especificação da tabela
+        """
+        return bytes(self.bits) + bytes(self.values)
+
+    @classmethod
+    def from_spec(cls, buffer: bytes, offset: int = 0) -> "HuffmanTable":
+        """Lê uma tabela no formato do segmento DHT
+
+        Args:
+            buffer (bytes): o buffer com a especificação
+            offset (int, optional): a posição onde a especificação começa. Default a 0.
+
+        Returns:
+            HuffmanTable: a tabela lida
+        """
+        bits = list(buffer[offset:offset + 16])
+        values = list(buffer[offset + 16:offset + 16 + sum(bits)])
+
+        return cls(bits, values)
+
+    @classmethod
+    def from_frequencies(cls, frequencies: ndarray) -> "HuffmanTable":
+        """Constrói uma tabela ótima (comprimento máximo de 16 bits) para as
+        frequências de símbolos fornecidas, segundo o anexo K.2 da norma
+
+        Args:
+            frequencies (ndarray): a frequência de cada símbolo (256 entradas)
+
+        Returns:
+            HuffmanTable: a tabela otimizada
+        """
+
+        # o símbolo 256 reservado garante que nenhum código é só composto por uns
+        freq = [int(f) for f in frequencies[:256]] + [1]
+        code_size = [0] * 257
+        others = [-1] * 257
+
+        while True:
+
+            # os dois símbolos menos frequentes (em caso de empate o de maior valor)
+            v1 = v2 = -1
+            for i, f in enumerate(freq):
+                if f == 0:
+                    continue
+                if v1 == -1 or f <= freq[v1]:
+                    v1, v2 = i, v1
+                elif v2 == -1 or f <= freq[v2]:
+                    v2 = i
+
+            if v2 == -1:
+                break
+
+            # juntar as árvores dos dois símbolos
+            freq[v1] += freq[v2]
+            freq[v2] = 0
+
+            code_size[v1] += 1
+            while others[v1] != -1:
+                v1 = others[v1]
+                code_size[v1] += 1
+
+            others[v1] = v2
+
+            code_size[v2] += 1
+            while others[v2] != -1:
+                v2 = others[v2]
+                code_size[v2] += 1
+
+        # contar os códigos de cada comprimento
+        bits = [0] * 33
+        for size in code_size:
+            if size:
+                bits[size] += 1
+
+        # limitar o comprimento dos códigos a 16 bits
+        i = 32
+        while i > 16:
+            while bits[i] > 0:
+                j = i - 2
+                while bits[j] == 0:
+                    j -= 1
+
+                bits[i] -= 2
+                bits[i - 1] += 1
+                bits[j + 1] += 2
+                bits[j] -= 1
+            i -= 1
+
+        # remover o símbolo reservado (o código mais longo)
+        while i > 0 and bits[i] == 0:
+            i -= 1
+        bits[i] = max(bits[i] - 1, 0)
+
+        # símbolos ordenados pelo comprimento do código
+        values = [
+            symbol
+            for size in range(1, 33)
+            for symbol in range(256)
+            if code_size[symbol] == size
+        ]
+
+        return cls(bits[1:17], values)
+
+
+# tabelas standard do anexo K.3
+STD_DC_LUMINANCE = HuffmanTable(
+    (0, 1, 5, 1, 1, 1, 1, 1, 1, 0, 0, 0, 0, 0, 0, 0),
+    range(12)
+)
+
+STD_DC_CHROMINANCE = HuffmanTable(
+    (0, 3, 1, 1, 1, 1, 1, 1, 1, 1, 1, 0, 0, 0, 0, 0),
+    range(12)
+)
+
+STD_AC_LUMINANCE = HuffmanTable(
+    (0, 2, 1, 3, 3, 2, 4, 3, 5, 5, 4, 4, 0, 0, 1, 0x7D),
+    (
+        0x01, 0x02, 0x03, 0x00, 0x04, 0x11, 0x05, 0x12,
+        0x21, 0x31, 0x41, 0x06, 0x13, 0x51, 0x61, 0x07,
+        0x22, 0x71, 0x14, 0x32, 0x81, 0x91, 0xA1, 0x08,
+        0x23, 0x42, 0xB1, 0xC1, 0x15, 0x52, 0xD1, 0xF0,
+        0x24, 0x33, 0x62, 0x72, 0x82, 0x09, 0x0A, 0x16,
+        0x17, 0x18, 0x19, 0x1A, 0x25, 0x26, 0x27, 0x28,
+        0x29, 0x2A, 0x34, 0x35, 0x36, 0x37, 0x38, 0x39,
+        0x3A, 0x43, 0x44, 0x45, 0x46, 0x47, 0x48, 0x49,
+        0x4A, 0x53, 0x54, 0x55, 0x56, 0x57, 0x58, 0x59,
+        0x5A, 0x63, 0x64, 0x65, 0x66, 0x67, 0x68, 0x69,
+        0x6A, 0x73, 0x74, 0x75, 0x76, 0x77, 0x78, 0x79,
+        0x7A, 0x83, 0x84, 0x85, 0x86, 0x87, 0x88, 0x89,
+        0x8A, 0x92, 0x93, 0x94, 0x95, 0x96, 0x97, 0x98,
+        0x99, 0x9A, 0xA2, 0xA3, 0xA4, 0xA5, 0xA6, 0xA7,
+        0xA8, 0xA9, 0xAA, 0xB2, 0xB3, 0xB4, 0xB5, 0xB6,
+        0xB7, 0xB8, 0xB9, 0xBA, 0xC2, 0xC3, 0xC4, 0xC5,
+        0xC6, 0xC7, 0xC8, 0xC9, 0xCA, 0xD2, 0xD3, 0xD4,
+        0xD5, 0xD6, 0xD7, 0xD8, 0xD9, 0xDA, 0xE1, 0xE2,
+        0xE3, 0xE4, 0xE5, 0xE6, 0xE7, 0xE8, 0xE9, 0xEA,
+        0xF1, 0xF2, 0xF3, 0xF4, 0xF5, 0xF6, 0xF7, 0xF8,
+        0xF9, 0xFA,
+    )
+)
+
+STD_AC_CHROMINANCE = HuffmanTable(
+    (0, 2, 1, 2, 4, 4, 3, 4, 7, 5, 4, 4, 0, 1, 2, 0x77),
+    (
+        0x00, 0x01, 0x02, 0x03, 0x11, 0x04, 0x05, 0x21,
+        0x31, 0x06, 0x12, 0x41, 0x51, 0x07, 0x61, 0x71,
+        0x13, 0x22, 0x32, 0x81, 0x08, 0x14, 0x42, 0x91,
+        0xA1, 0xB1, 0xC1, 0x09, 0x23, 0x33, 0x52, 0xF0,
+        0x15, 0x62, 0x72, 0xD1, 0x0A, 0x16, 0x24, 0x34,
+        0xE1, 0x25, 0xF1, 0x17, 0x18, 0x19, 0x1A, 0x26,
+        0x27, 0x28, 0x29, 0x2A, 0x35, 0x36, 0x37, 0x38,
+        0x39, 0x3A, 0x43, 0x44, 0x45, 0x46, 0x47, 0x48,
+        0x49, 0x4A, 0x53, 0x54, 0x55, 0x56, 0x57, 0x58,
+        0x59, 0x5A, 0x63, 0x64, 0x65, 0x66, 0x67, 0x68,
+        0x69, 0x6A, 0x73, 0x74, 0x75, 0x76, 0x77, 0x78,
+        0x79, 0x7A, 0x82, 0x83, 0x84, 0x85, 0x86, 0x87,
+        0x88, 0x89, 0x8A, 0x92, 0x93, 0x94, 0x95, 0x96,
+        0x97, 0x98, 0x99, 0x9A, 0xA2, 0xA3, 0xA4, 0xA5,
+        0xA6, 0xA7, 0xA8, 0xA9, 0xAA, 0xB2, 0xB3, 0xB4,
+        0xB5, 0xB6, 0xB7, 0xB8, 0xB9, 0xBA, 0xC2, 0xC3,
+        0xC4, 0xC5, 0xC6, 0xC7, 0xC8, 0xC9, 0xCA, 0xD2,
+        0xD3, 0xD4, 0xD5, 0xD6, 0xD7, 0xD8, 0xD9, 0xDA,
+        0xE2, 0xE3, 0xE4, 0xE5, 0xE6, 0xE7, 0xE8, 0xE9,
+        0xEA, 0xF2, 0xF3, 0xF4, 0xF5, 0xF6, 0xF7, 0xF8,
+        0xF9, 0xFA,
+    )
+)
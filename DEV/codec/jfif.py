@@ -0,0 +1,364 @@
+"""Contém o escritor de ficheiros JPEG baseline (JFIF) compatível
+com os descodificadores standard (Pillow, OpenCV, libjpeg)
+"""
+
+from os.path import isdir
+from struct import pack
+from typing import List, Sequence, Tuple
+
+from numpy import ndarray, pad, arange, argsort, concatenate, array_equal, float32, uint8
+
+from imgtools import converter_to_ycbcr
+from imgtools import down_sample
+from imgtools import calculate_dct
+from imgtools import quantize, scale_q_matrix
+
+from file_worker import load_q_matrix
+
+from .huffman import HuffmanTable
+from .huffman import STD_DC_LUMINANCE, STD_DC_CHROMINANCE, STD_AC_LUMINANCE, STD_AC_CHROMINANCE
+from .entropy import ZIGZAG, channel_to_zigzag, block_symbols, symbol_frequencies, symbol_codes, pack_bits
+
+
+# marcadores
+SOI = b"\xFF\xD8"
+EOI = b"\xFF\xD9"
+APP0 = b"\xFF\xE0"
+APP14 = b"\xFF\xEE"
+DQT = b"\xFF\xDB"
+SOF0 = b"\xFF\xC0"
+DHT = b"\xFF\xC4"
+SOS = b"\xFF\xDA"
+
+
+def _segment(marker: bytes, payload: bytes) -> bytes:
+    """Cria um segmento com marcador e comprimento
+
+    Args:
+        marker (bytes): o marcador
+        payload (bytes): o conteúdo do segmento
+
+    Returns:
+        bytes: o segmento
+    """
+    return marker + pack(">H", len(payload) + 2) + payload
+
+
+def sampling_factors(downsampling: Sequence[int], shape: Tuple[int, int] = (64, 64)) -> Tuple[int, int]:
+    """Calcula os fatores de amostragem (horizontal, vertical) da luminância
+    para a subamostragem fornecida, tal como é aplicada por down_sample
+
+    Args:
+        downsampling (Sequence[int]): a subamostragem {4 4 4, 4 2 2, 4 2 0, 4 1 1}
+        shape (Tuple[int, int], optional): a shape usada para o cálculo. Default a (64, 64).
+
+    Returns:
+        Tuple[int, int]: os fatores de amostragem ou None caso a subamostragem
+        não possa ser representada num ficheiro JFIF
+    """
+    probe = ndarray(shape, dtype=float32)
+    probe.fill(0)
+
+    try:
+        y, cb, cr = down_sample(probe, probe, probe, tuple(downsampling))
+    except (ZeroDivisionError, ValueError):
+        print("Invalid downsampling ratio")
+        return
+
+    # os canais de crominância têm que ter a mesma subamostragem
+    if cb.shape != cr.shape or y.shape[0] % cb.shape[0] or y.shape[1] % cb.shape[1]:
+        print("Downsampling ratio not supported by baseline JPEG")
+        return
+
+    horizontal = y.shape[1] // cb.shape[1]
+    vertical = y.shape[0] // cb.shape[0]
+
+    if horizontal * vertical + 2 > 10 or horizontal > 4 or vertical > 4:
+        print("Downsampling ratio not supported by baseline JPEG")
+        return
+
+    return horizontal, vertical
+
+
+def mcu_order(block_rows: int, block_cols: int, horizontal: int, vertical: int, mcu_blocks: int, offset: int) -> ndarray:
+    """Calcula a posição de escrita de cada bloco (ordem raster) de um componente
+    numa sequência intercalada de MCUs
+
+    Args:
+        block_rows (int): número de linhas de blocos do componente
+        block_cols (int): número de colunas de blocos do componente
+        horizontal (int): fator de amostragem horizontal do componente
+        vertical (int): fator de amostragem vertical do componente
+        mcu_blocks (int): número total de blocos de cada MCU
+        offset (int): a posição do primeiro bloco do componente dentro da MCU
+
+    Returns:
+        ndarray: a posição global de cada bloco
+    """
+    rows = arange(block_rows)[:, None]
+    cols = arange(block_cols)[None, :]
+    mcus_per_row = block_cols // horizontal
+
+    mcu = (rows // vertical) * mcus_per_row + cols // horizontal
+    within = (rows % vertical) * horizontal + cols % horizontal
+
+    return (mcu * mcu_blocks + offset + within).reshape(-1)
+
+
+def encode_jfif(
+    image: ndarray,
+    quality_factor: int,
+    downsampling: Sequence[int] = (4, 2, 0),
+    optimize: bool = False,
+    q_matrices: Tuple[ndarray, ndarray] = None,
+) -> bytes:
+    """Codifica uma imagem RGB num ficheiro JPEG baseline (JFIF)\n
+    Usa as fases do codec (YCbCr, subamostragem, DCT 8x8 e quantização com as
+    matrizes q_matrix_y.csv / q_matrix_cbcr.csv) e escreve os segmentos
+    SOI, APP0, DQT, SOF0, DHT, SOS e EOI com uma única scan intercalada
+
+    Args:
+        image (ndarray): a imagem RGB (uint8)
+        quality_factor (int): o fator de qualidade [0, 100]
+        downsampling (Sequence[int], optional): a subamostragem. Default a (4, 2, 0).
+        optimize (bool, optional): usar tabelas de Huffman otimizadas. Default a False.
+        q_matrices (Tuple[ndarray, ndarray], optional): as matrizes de quantização (Y, CbCr).
+        Default a None (lidas dos ficheiros csv)
+
+    Returns:
+        bytes: o ficheiro JPEG ou None caso ocorra um erro
+    """
+
+    factors = sampling_factors(downsampling)
+    if factors is None:
+        return
+    horizontal, vertical = factors
+
+    if q_matrices is None:
+        q_matrices = (load_q_matrix("q_matrix_y.csv"), load_q_matrix("q_matrix_cbcr.csv"))
+
+    height, width = image.shape[:2]
+
+    # estender a imagem até um número inteiro de MCUs
+    mcu_height = 8 * vertical
+    mcu_width = 8 * horizontal
+    padded = pad(
+        image,
+        ((0, -height % mcu_height), (0, -width % mcu_width), (0, 0)),
+        mode="edge"
+    )
+
+    # conversão de cor e subamostragem
+    channels = down_sample(*converter_to_ycbcr(padded), tuple(downsampling))
+
+    # deslocamento de nível e DCT
+    channels = calculate_dct(*[channel.astype(float32) - 128 for channel in channels], 8)
+
+    # quantização
+    q_tables = (
+        scale_q_matrix(q_matrices[0], quality_factor),
+        scale_q_matrix(q_matrices[1], quality_factor),
+        scale_q_matrix(q_matrices[1], quality_factor),
+    )
+    quantized = [
+        quantize(channel, q_table, 50)
+        for channel, q_table in zip(channels, q_tables)
+    ]
+
+    return encode_coefficients(
+        height, width, quantized, q_tables, ((horizontal, vertical), (1, 1), (1, 1)), optimize
+    )
+
+
+def encode_coefficients(
+    rows: int,
+    cols: int,
+    quantized: Sequence[ndarray],
+    q_tables: Sequence[ndarray],
+    samplings: Sequence[Tuple[int, int]],
+    optimize: bool = False,
+    ycbcr: bool = True,
+) -> bytes:
+    """Escreve um ficheiro JPEG baseline a partir dos coeficientes já quantizados
+
+    Cada componente é um plano na ordem natural dos blocos (o formato devolvido por
+    quantize), com o DC absoluto e um número inteiro de MCUs. As imagens com um só
+    componente são escritas numa scan não intercalada
+
+    Args:
+        rows (int): o número de linhas da imagem
+        cols (int): o número de colunas da imagem
+        quantized (Sequence[ndarray]): os coeficientes quantizados de cada componente (1 ou 3)
+        q_tables (Sequence[ndarray]): a tabela de quantização (já escalada) de cada componente
+        samplings (Sequence[Tuple[int, int]]): os fatores de amostragem (h, v) de cada componente
+        optimize (bool, optional): usar tabelas de Huffman otimizadas. Default a False.
+        ycbcr (bool, optional): os componentes estão em YCbCr. Default a True.
+
+    Returns:
+        bytes: o ficheiro JPEG
+    """
+
+    # uma imagem em tons de cinzento é sempre escrita com amostragem 1x1
+    if len(quantized) == 1:
+        samplings = ((1, 1),)
+        quantized = [quantized[0][:-(-rows // 8) * 8, :-(-cols // 8) * 8]]
+
+    # símbolos de cada componente pela ordem de escrita
+    mcu_blocks = sum(h * v for h, v in samplings)
+    offsets = [sum(h * v for h, v in samplings[:i]) for i in range(len(samplings))]
+
+    components = list()
+    for channel, (h, v), offset in zip(quantized, samplings, offsets):
+        order = mcu_order(channel.shape[0] // 8, channel.shape[1] // 8, h, v, mcu_blocks, offset)
+        sort = argsort(order, kind="stable")
+
+        blocks = channel_to_zigzag(channel)[sort]
+        components.append((block_symbols(blocks, dc_prediction=True), order[sort]))
+
+    # tabelas de Huffman (luminância e crominância)
+    huffman_ids = [0] + [1] * (len(components) - 1)
+    if optimize:
+        tables = list()
+        for group in ((0,), tuple(range(1, len(components)))):
+            if not group:
+                continue
+            dc_freq = sum(symbol_frequencies(components[i][0])[0] for i in group)
+            ac_freq = sum(symbol_frequencies(components[i][0])[1] for i in group)
+            tables.append((HuffmanTable.from_frequencies(dc_freq), HuffmanTable.from_frequencies(ac_freq)))
+    else:
+        tables = [(STD_DC_LUMINANCE, STD_AC_LUMINANCE), (STD_DC_CHROMINANCE, STD_AC_CHROMINANCE)][:len(set(huffman_ids))]
+
+    # juntar os códigos de todos os componentes pela ordem das MCUs
+    keys, values, lengths = list(), list(), list()
+    for (symbols, order), table_id in zip(components, huffman_ids):
+        key, value, length = symbol_codes(symbols, *tables[table_id], block_order=order)
+        keys.append(key)
+        values.append(value)
+        lengths.append(length)
+
+    keys = concatenate(keys)
+    order = argsort(keys, kind="stable")
+    scan = pack_bits(concatenate(values)[order], concatenate(lengths)[order], stuffing=True)
+
+    unique_tables, q_ids = unique_q_tables(q_tables)
+
+    return jfif_headers(
+        rows, cols, unique_tables, list(zip(samplings, q_ids, huffman_ids)), tables, ycbcr
+    ) + scan + EOI
+
+
+def unique_q_tables(q_tables: Sequence[ndarray]) -> Tuple[List[ndarray], List[int]]:
+    """Encontra as tabelas de quantização distintas dos componentes
+
+    Args:
+        q_tables (Sequence[ndarray]): a tabela de quantização de cada componente
+
+    Returns:
+        Tuple[List[ndarray], List[int]]: as tabelas distintas e o índice da tabela de cada componente
+    """
+    unique_tables = list()
+    q_ids = list()
+    for q_table in q_tables:
+        for table_id, table in enumerate(unique_tables):
+            if array_equal(table, q_table):
+                break
+        else:
+            table_id = len(unique_tables)
+            unique_tables.append(q_table)
+        q_ids.append(table_id)
+
+    return unique_tables, q_ids
+
+
+def jfif_headers(
+    rows: int,
+    cols: int,
+    q_tables: List[ndarray],
+    components: List[Tuple[Tuple[int, int], int, int]],
+    tables: List[Tuple[HuffmanTable, HuffmanTable]],
+    ycbcr: bool = True,
+) -> bytes:
+    """Escreve os segmentos do ficheiro JFIF até ao início dos dados da scan\n
+    Usados também pelo encoder por faixas (ver stream_jfif)
+
+    Args:
+        rows (int): a altura da imagem
+        cols (int): a largura da imagem
+        q_tables (List[ndarray]): as tabelas de quantização (já escaladas)
+        components (List[Tuple[Tuple[int, int], int, int]]): a amostragem, a tabela
+        de quantização e a tabela de Huffman de cada componente
+        tables (List[Tuple[HuffmanTable, HuffmanTable]]): as tabelas (DC, AC) de cada classe
+        ycbcr (bool, optional): os componentes estão em YCbCr. Default a True.
+
+    Returns:
+        bytes: os segmentos
+    """
+
+    # APP0 - versão 1.01, sem unidades de densidade e sem miniatura
+    app0 = _segment(APP0, b"JFIF\x00" + pack(">BBBHHBB", 1, 1, 0, 1, 1, 0, 0))
+
+    # APP14 - componentes RGB sem transformação de cor
+    if not ycbcr and len(components) == 3:
+        app0 += _segment(APP14, b"Adobe" + pack(">HHHB", 100, 0, 0, 0))
+
+    # DQT - tabelas em zigzag com precisão de 8 bits
+    dqt = _segment(DQT, b"".join(
+        pack(">B", table_id) + q_table.reshape(-1)[ZIGZAG].astype(uint8).tobytes()
+        for table_id, q_table in enumerate(q_tables)
+    ))
+
+    # SOF0 - a amostragem e a tabela de quantização de cada componente
+    sof0 = _segment(SOF0, pack(">BHHB", 8, rows, cols, len(components)) + b"".join(
+        pack(">BBB", index + 1, (h << 4) | v, q_id)
+        for index, ((h, v), q_id, _) in enumerate(components)
+    ))
+
+    # DHT - tabelas DC (classe 0) e AC (classe 1)
+    dht = _segment(DHT, b"".join(
+        pack(">B", (table_class << 4) | table_id) + table.spec()
+        for table_id, pair in enumerate(tables)
+        for table_class, table in enumerate(pair)
+    ))
+
+    # SOS - scan com todos os componentes e todos os coeficientes
+    sos = _segment(SOS, pack(">B", len(components)) + b"".join(
+        pack(">BB", index + 1, (huffman_id << 4) | huffman_id)
+        for index, (_, _, huffman_id) in enumerate(components)
+    ) + pack(">BBB", 0, 63, 0))
+
+    return SOI + app0 + dqt + sof0 + dht + sos
+
+
+def save_jpeg(
+    path: str, image: ndarray, quality_factor: int, downsampling: Sequence[int] = (4, 2, 0), optimize: bool = False
+) -> bool:
+    """Codifica uma imagem e escreve-a num ficheiro JPEG baseline
+
+    Args:
+        path (str): o caminho do ficheiro
+        image (ndarray): a imagem RGB
+        quality_factor (int): o fator de qualidade [0, 100]
+        downsampling (Sequence[int], optional): a subamostragem. Default a (4, 2, 0).
+        optimize (bool, optional): usar tabelas de Huffman otimizadas. Default a False.
+
+    Returns:
+        bool: True se o ficheiro foi escrito
+    """
+
+    if isdir(path):
+        print(f"{path} is a directory")
+        return False
+
+    jpeg = encode_jfif(image, quality_factor, downsampling, optimize)
+    if jpeg is None:
+        return False
+
+    try:
+        with open(path, "wb") as jpeg_file:
+            jpeg_file.write(jpeg)
+
+    except IOError:
+        print(f"An error has occured while writing the file at {path}")
+        return False
+
+    return True
@@ -0,0 +1,375 @@
+"""Contém o leitor de ficheiros JPEG baseline, que extrai as tabelas de
+quantização, as tabelas de Huffman e os blocos de coeficientes quantizados
+diretamente do ficheiro (sem passar pelo domínio dos píxeis)
+"""
+
+from math import ceil
+from os.path import isdir
+from struct import unpack_from, error as StructError
+from typing import Dict, List, NamedTuple, Tuple
+
+from numpy import ndarray, zeros, frombuffer, argsort, concatenate, uint8, int64
+
+from .huffman import HuffmanTable
+from .entropy import ZIGZAG, decode_blocks, zigzag_to_channel
+from .jfif import mcu_order
+
+
+JPEG_EXTENSIONS = (".jpg", ".jpeg", ".jpe", ".jfif")
+
+# marcadores de início de frame suportados (baseline e sequencial estendido com Huffman)
+SUPPORTED_FRAMES = (0xC0, 0xC1)
+UNSUPPORTED_FRAMES = (0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF)
+
+
+class JpegComponent(NamedTuple):
+    """Um componente de cor de um ficheiro JPEG
+    """
+    identifier: int
+    horizontal: int
+    vertical: int
+    q_table: ndarray
+    coefficients: ndarray
+
+
+class JpegImage(NamedTuple):
+    """Os coeficientes quantizados e as tabelas de um ficheiro JPEG\n
+    Os coeficientes de cada componente estão na ordem natural dos blocos
+    (o mesmo formato devolvido por quantize), com o DC absoluto, em planos
+    com um número inteiro de MCUs
+    """
+    rows: int
+    cols: int
+    components: Tuple[JpegComponent, ...]
+    ycbcr: bool
+
+
+def is_jpeg(path: str) -> bool:
+    """Verifica se o caminho tem uma extensão de ficheiro JPEG
+
+    Args:
+        path (str): o caminho do ficheiro
+
+    Returns:
+        bool: True se for um ficheiro JPEG
+    """
+    return path.lower().endswith(JPEG_EXTENSIONS)
+
+
+def _scan_end(data: bytes, start: int) -> int:
+    """Encontra o fim dos dados codificados de uma scan (o próximo marcador
+    que não seja um byte stuffing ou um marcador de restart)
+
+    Args:
+        data (bytes): o conteúdo do ficheiro
+        start (int): o início dos dados da scan
+
+    Returns:
+        int: a posição do marcador seguinte
+    """
+    pos = data.find(b"\xFF", start)
+
+    while pos != -1 and pos + 1 < len(data):
+        following = data[pos + 1]
+
+        # byte stuffing ou marcador de restart
+        if following == 0x00 or 0xD0 <= following <= 0xD7:
+            pos = data.find(b"\xFF", pos + 2)
+            continue
+
+        return pos
+
+    return len(data)
+
+
+def _decode_scan(
+    data: bytes,
+    frame: Dict,
+    scan_components: List[Tuple[int, int, int]],
+    dc_tables: Dict[int, HuffmanTable],
+    ac_tables: Dict[int, HuffmanTable],
+    restart_interval: int,
+    planes: Dict[int, ndarray],
+):
+    """Descodifica os dados de uma scan para os planos de blocos dos componentes
+
+    Args:
+        data (bytes): os dados codificados da scan (com byte stuffing e restarts)
+        frame (Dict): a informação do frame
+        scan_components (List[Tuple[int, int, int]]): (componente, tabela DC, tabela AC)
+        dc_tables (Dict[int, HuffmanTable]): as tabelas DC definidas
+        ac_tables (Dict[int, HuffmanTable]): as tabelas AC definidas
+        restart_interval (int): o número de MCUs entre restarts (0 sem restarts)
+        planes (Dict[int, ndarray]): os blocos em zigzag de cada componente (ordem raster)
+    """
+
+    components = frame["components"]
+    h_max = max(component["h"] for component in components.values())
+    v_max = max(component["v"] for component in components.values())
+
+    tables = [(dc_tables[dc_id], ac_tables[ac_id]) for _, dc_id, ac_id in scan_components]
+
+    # scan intercalada: cada MCU tem h x v blocos de cada componente
+    if len(scan_components) > 1:
+        mcus_x = ceil(frame["cols"] / (8 * h_max))
+        mcus_y = ceil(frame["rows"] / (8 * v_max))
+        plan = [
+            index
+            for index, (component_id, _, _) in enumerate(scan_components)
+            for _ in range(components[component_id]["h"] * components[component_id]["v"])
+        ]
+        num_mcus = mcus_x * mcus_y
+
+    # scan de um só componente: os blocos estão em ordem raster
+    else:
+        component = components[scan_components[0][0]]
+        blocks_x = ceil(ceil(frame["cols"] * component["h"] / h_max) / 8)
+        blocks_y = ceil(ceil(frame["rows"] * component["v"] / v_max) / 8)
+        plan = [0]
+        num_mcus = blocks_x * blocks_y
+
+    # separar os intervalos de restart e remover o byte stuffing
+    segments = [data]
+    if restart_interval:
+        segments = list()
+        start = 0
+        pos = data.find(b"\xFF", 0)
+        while pos != -1:
+            if 0xD0 <= data[pos + 1] <= 0xD7:
+                segments.append(data[start:pos])
+                start = pos + 2
+            pos = data.find(b"\xFF", pos + 2)
+        segments.append(data[start:])
+
+    interval = restart_interval or num_mcus
+    decoded = [list() for _ in scan_components]
+
+    for index, segment in enumerate(segments):
+        mcus = min(interval, num_mcus - index * interval)
+        if mcus <= 0:
+            break
+
+        results = decode_blocks(
+            segment.replace(b"\xFF\x00", b"\xFF"),
+            mcus * len(plan),
+            tables,
+            plan,
+            dc_prediction=True
+        )
+
+        for component_blocks, result in zip(decoded, results):
+            component_blocks.append(result)
+
+    # colocar os blocos na posição raster de cada componente
+    for index, (component_id, _, _) in enumerate(scan_components):
+        component = components[component_id]
+        blocks = concatenate(decoded[index])
+        plane = planes[component_id]
+
+        if len(scan_components) > 1:
+            order = mcu_order(
+                plane["block_rows"], plane["block_cols"],
+                component["h"], component["v"],
+                component["h"] * component["v"], 0
+            )
+            plane["blocks"][argsort(order, kind="stable")[:blocks.shape[0]]] = blocks
+
+        else:
+            grid = plane["blocks"].reshape(plane["block_rows"], plane["block_cols"], 64)
+            grid[:blocks_y, :blocks_x] = blocks.reshape(blocks_y, blocks_x, 64)
+
+
+def parse_jpeg(data: bytes) -> JpegImage:
+    """Lê os coeficientes quantizados e as tabelas de um ficheiro JPEG baseline
+
+    Args:
+        data (bytes): o conteúdo do ficheiro
+
+    Returns:
+        JpegImage: a imagem ao nível dos coeficientes ou None caso o ficheiro
+        seja inválido ou não suportado
+    """
+
+    if data[:2] != b"\xFF\xD8":
+        print("File is not a JPEG file")
+        return
+
+    q_tables = dict()
+    dc_tables = dict()
+    ac_tables = dict()
+    restart_interval = 0
+    frame = None
+    planes = dict()
+    ycbcr = None
+
+    pos = 2
+
+    try:
+        while pos < len(data):
+
+            # saltar bytes de preenchimento
+            if data[pos] != 0xFF:
+                print("Invalid JPEG marker")
+                return
+            if data[pos + 1] == 0xFF:
+                pos += 1
+                continue
+
+            marker = data[pos + 1]
+            pos += 2
+
+            # fim da imagem
+            if marker == 0xD9:
+                break
+
+            (length,) = unpack_from(">H", data, pos)
+            segment = data[pos + 2:pos + length]
+            pos += length
+
+            # DQT
+            if marker == 0xDB:
+                offset = 0
+                while offset < len(segment):
+                    precision, table_id = segment[offset] >> 4, segment[offset] & 15
+                    if precision != 0:
+                        print("16-bit quantization tables are not supported")
+                        return
+
+                    table = zeros(64, dtype=uint8)
+                    table[ZIGZAG] = frombuffer(segment, dtype=uint8, count=64, offset=offset + 1)
+                    q_tables[table_id] = table.reshape(8, 8)
+                    offset += 65
+
+            # DHT
+            elif marker == 0xC4:
+                offset = 0
+                while offset < len(segment):
+                    table_class, table_id = segment[offset] >> 4, segment[offset] & 15
+                    table = HuffmanTable.from_spec(segment, offset + 1)
+                    (dc_tables if table_class == 0 else ac_tables)[table_id] = table
+                    offset += 17 + len(table.values)
+
+            # DRI
+            elif marker == 0xDD:
+                (restart_interval,) = unpack_from(">H", segment, 0)
+
+            # APP14 (Adobe) - transformação de cor
+            elif marker == 0xEE and segment[:5] == b"Adobe" and len(segment) >= 12:
+                ycbcr = segment[11] != 0
+
+            # SOF baseline
+            elif marker in SUPPORTED_FRAMES:
+                precision, rows, cols, num_components = unpack_from(">BHHB", segment, 0)
+                if precision != 8:
+                    print("Only 8-bit JPEG files are supported")
+                    return
+
+                if num_components not in (1, 3):
+                    print("Only grayscale and 3 component JPEG files are supported")
+                    return
+
+                frame = {"rows": rows, "cols": cols, "components": dict(), "order": list()}
+                for i in range(num_components):
+                    component_id, sampling, q_id = unpack_from(">BBB", segment, 6 + 3 * i)
+                    frame["components"][component_id] = {"h": sampling >> 4, "v": sampling & 15, "q": q_id}
+                    frame["order"].append(component_id)
+
+                h_max = max(c["h"] for c in frame["components"].values())
+                v_max = max(c["v"] for c in frame["components"].values())
+                mcus_x = ceil(cols / (8 * h_max))
+                mcus_y = ceil(rows / (8 * v_max))
+
+                # planos com um número inteiro de MCUs
+                for component_id, component in frame["components"].items():
+                    block_rows = mcus_y * component["v"]
+                    block_cols = mcus_x * component["h"]
+                    planes[component_id] = {
+                        "block_rows": block_rows,
+                        "block_cols": block_cols,
+                        "blocks": zeros((block_rows * block_cols, 64), dtype=int64),
+                    }
+
+            # SOF não suportados (progressivo, aritmético, sem perdas)
+            elif marker in UNSUPPORTED_FRAMES:
+                print("Only baseline JPEG files are supported (progressive, lossless and arithmetic files are not)")
+                return
+
+            # SOS
+            elif marker == 0xDA:
+                if frame is None:
+                    print("JPEG scan found before the frame header")
+                    return
+
+                num_components = segment[0]
+                scan_components = [
+                    (segment[1 + 2 * i], segment[2 + 2 * i] >> 4, segment[2 + 2 * i] & 15)
+                    for i in range(num_components)
+                ]
+
+                end = _scan_end(data, pos)
+                _decode_scan(
+                    data[pos:end], frame, scan_components,
+                    dc_tables, ac_tables, restart_interval, planes
+                )
+                pos = end
+
+    except (StructError, IndexError, KeyError, ValueError):
+        print("Invalid or corrupted JPEG file")
+        return
+
+    if frame is None:
+        print("JPEG file has no frame header")
+        return
+
+    # por omissão 3 componentes são YCbCr (JFIF)
+    if ycbcr is None:
+        ycbcr = len(frame["order"]) == 3
+
+    components = list()
+    for component_id in frame["order"]:
+        component = frame["components"][component_id]
+        plane = planes[component_id]
+
+        components.append(JpegComponent(
+            component_id,
+            component["h"],
+            component["v"],
+            q_tables[component["q"]],
+            zigzag_to_channel(plane["blocks"], (plane["block_rows"] * 8, plane["block_cols"] * 8)),
+        ))
+
+    return JpegImage(frame["rows"], frame["cols"], tuple(components), ycbcr)
+
+
+def read_jpeg(path: str) -> JpegImage:
+    """Lê um ficheiro JPEG baseline ao nível dos coeficientes
+
+    Args:
+        path (str): o caminho do ficheiro
+
+    Returns:
+        JpegImage: a imagem ao nível dos coeficientes ou None caso ocorra um erro
+    """
+
+    if not is_jpeg(path):
+        print("File format is not of type 'jpg'")
+        return
+
+    # não é um ficheiro
+    if isdir(path):
+        print(f"{path} is not a file")
+        return
+
+    try:
+        with open(path, "rb") as jpeg_file:
+            return parse_jpeg(jpeg_file.read())
+
+    # ficheiro não existe
+    except FileNotFoundError:
+        print(f"File at {path} does not exist")
+        return
+
+    # ocorreu outro erro
+    except IOError:
+        print(f"An error has occured while reading the file at {path}")
+        return
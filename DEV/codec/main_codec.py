@@ -1,13 +1,15 @@
+from numpy import ndarray
+
 from .decoder import decode
-from .encoder import encode
+from .encoder import encode, encode_image
+from .container import write_container, read_container
+from .rdo import rdo_report
 
-from metrics import SNR, PSNR, MSE, RMSE
+from metrics import compute_metrics
 
 from imgtools import read_bmp
 
-from matplotlib.pyplot import show
-
-def main_codec_function(img: str, fator_qualidade: int, downsampling: tuple):
+def main_codec_function(img: str, fator_qualidade: int, downsampling: tuple, optimize_huffman: bool = False, workers: int = 1, rdo_lambda: float = None, sparse_idct: bool = False):
     """Serve como main quando não queremos utilizar flags específicas.
     Aqui chama-se uma função de encode que faz todo o processo para o trabalho de MULTIMÉDIA
     com o chamado hardcode. De seguida aplica o decode e apresenta alguns valores para analisar a qualidade 
@@ -17,28 +19,91 @@ def main_codec_function(img: str, fator_qualidade: int, downsampling: tuple):
         img (str): caminho para a imagem
         fator_qualidade (int): fator de qualidade segundo o qual vai-se fazer a codificação
         downsampling (tuple): o fator de subamostragem
+        optimize_huffman (bool, optional): usar tabelas de Huffman otimizadas. Default a False.
+        workers (int, optional): o número de threads do encode e do decode. Default a 1.
+        rdo_lambda (float, optional): o lambda da quantização RDO. Default a None (quantização simples).
+        sparse_idct (bool, optional): descodificar com a inversa da DCT esparsa. Default a False.
     
     """
 
+    # o viewer (e o matplotlib) só é importado quando as fases são mostradas
+    from matplotlib.pyplot import show
+    from .viewer import show_reconstruction
+
     imagem_original = read_bmp(img)
 
-    y_codificada, cb_codificada, cr_codificada, comprimento, largura = encode(imagem_original, fator_qualidade, downsampling)
+    imagem_codificada, comprimento, largura = encode(imagem_original, fator_qualidade, downsampling, optimize_huffman, workers, rdo_lambda)
 
-    imagem_codificada = (
-        y_codificada,
-        cb_codificada,
-        cr_codificada
-    )
+    imagem_descodificada = decode(imagem_codificada, comprimento, largura, fator_qualidade, True, workers, sparse_idct)
 
-    imagem_descodificada = decode(imagem_codificada, comprimento, largura, fator_qualidade, True)
 
+    show_reconstruction(imagem_original, imagem_descodificada)
 
-    MSE_value = MSE(imagem_original, imagem_descodificada)
+    # todas as métricas numa só passagem pelas imagens
+    metrics = compute_metrics(imagem_original, imagem_descodificada, luminance=True)
 
-    print("MSE: " + str(MSE_value))
-    print("RMSE: " + str(RMSE(MSE_value)))
-    print("SNR: " + str(SNR(MSE_value, imagem_original)))
-    print("PSNR: " + str(PSNR(MSE_value, imagem_original)))
+    print("MSE: " + str(metrics.mse))
+    print("RMSE: " + str(metrics.rmse))
+    print("SNR: " + str(metrics.snr))
+    print("PSNR: " + str(metrics.psnr))
+    print("PSNR (R, G, B): " + ", ".join(f"{value:.3f}" for value in metrics.channel_psnr))
+    print("PSNR Y: " + str(metrics.y_psnr))
+
+    # poupança da quantização RDO face à quantização simples
+    if rdo_lambda is not None:
+        report = rdo_report(imagem_original, fator_qualidade, downsampling, rdo_lambda, optimize_huffman)
+        print(
+            f"RDO (lambda {rdo_lambda}): {report.rdo_bytes} bytes vs {report.bytes} ({report.savings:.1%} smaller),"
+            f" PSNR {report.rdo_psnr:.2f} vs {report.psnr:.2f} dB ({report.psnr_loss:.2f} dB lost)"
+        )
 
     show()
-    
\ No newline at end of file
+    
+
+
+def encode_to_file(img: str, path: str, fator_qualidade: int, downsampling: tuple, optimize_huffman: bool = False, workers: int = 1, rdo_lambda: float = None) -> bool:
+    """Codifica a imagem e guarda o resultado num ficheiro do codec,
+    para ser descodificada noutro processo
+
+    Args:
+        img (str): caminho para a imagem
+        path (str): caminho do ficheiro a escrever
+        fator_qualidade (int): fator de qualidade da codificação
+        downsampling (tuple): o fator de subamostragem
+        optimize_huffman (bool, optional): usar tabelas de Huffman otimizadas. Default a False.
+        workers (int, optional): o número de threads do encode. Default a 1.
+        rdo_lambda (float, optional): o lambda da quantização RDO. Default a None (quantização simples).
+
+    Returns:
+        bool: True se o ficheiro foi escrito
+    """
+
+    imagem_original = read_bmp(img)
+    if imagem_original is None:
+        return False
+
+    # sem visualização: só as fases necessárias à compressão
+    imagem_codificada, comprimento, largura = encode_image(
+        imagem_original, fator_qualidade, downsampling, optimize_huffman, workers=workers, rdo_lambda=rdo_lambda
+    )
+
+    return write_container(path, imagem_codificada, comprimento, largura, fator_qualidade, downsampling)
+
+
+def decode_from_file(path: str, workers: int = 1, sparse_idct: bool = False) -> ndarray:
+    """Descodifica uma imagem guardada num ficheiro do codec
+
+    Args:
+        path (str): caminho do ficheiro do codec
+        workers (int, optional): o número de threads do decode. Default a 1.
+        sparse_idct (bool, optional): descodificar com a inversa da DCT esparsa. Default a False.
+
+    Returns:
+        ndarray: a imagem descodificada ou None caso ocorra um erro
+    """
+
+    container = read_container(path)
+    if container is None:
+        return
+
+    return decode(container.data, container.width, container.height, container.quality_factor, workers=workers, sparse_idct=sparse_idct)
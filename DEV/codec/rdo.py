@@ -0,0 +1,256 @@
+"""Contém a quantização otimizada em taxa-distorção (RDO), que anula ou reduz
+coeficientes AC quando a poupança de bits no modelo de Huffman compensa o erro
+"""
+
+from typing import NamedTuple
+
+from numpy import (
+    ndarray, arange, where, minimum, maximum, frexp, sign, abs as npabs,
+    take_along_axis, flatnonzero, stack, int64, float64, inf
+)
+
+from imgtools import quantize, scale_q_matrix
+
+from .entropy import channel_to_zigzag, zigzag_to_channel, ZIGZAG, EOB, ZRL, STANDARD_TABLES
+from .entropy import TABLES_LUMINANCE, TABLES_CHROMINANCE
+
+
+# lambda por omissão: peso de um bit face ao erro (em unidades do passo AC médio ao quadrado)
+RDO_LAMBDA = 0.01
+
+# comprimento dado aos símbolos sem código nas tabelas standard
+MISSING_CODE_BITS = 16
+
+# posições AC em zigzag
+AC_POSITIONS = arange(1, 64)
+
+
+class RdoReport(NamedTuple):
+    """O tamanho e o PSNR da quantização simples e da quantização RDO de uma imagem
+    """
+    bytes: int
+    rdo_bytes: int
+    psnr: float
+    rdo_psnr: float
+
+    @property
+    def savings(self) -> float:
+        """A fração do tamanho poupada pela quantização RDO"""
+        return 1 - self.rdo_bytes / self.bytes
+
+    @property
+    def psnr_loss(self) -> float:
+        """A perda de PSNR da quantização RDO em dB"""
+        return self.psnr - self.rdo_psnr
+
+
+def _ac_code_sizes(luminance: bool) -> ndarray:
+    """Devolve o comprimento do código de cada símbolo AC da tabela standard do canal
+
+    Args:
+        luminance (bool): usar a tabela de luminância
+
+    Returns:
+        ndarray: os comprimentos (256 entradas), com MISSING_CODE_BITS nos símbolos sem código
+    """
+
+    ac_table = STANDARD_TABLES[TABLES_LUMINANCE if luminance else TABLES_CHROMINANCE][1]
+
+    return where(ac_table.sizes > 0, ac_table.sizes, MISSING_CODE_BITS)
+
+
+def _symbol_bits(code_sizes: ndarray, run: ndarray, size: ndarray) -> ndarray:
+    """Calcula os bits de um coeficiente AC não nulo: os ZRL das sequências de 16 zeros,
+    o código do par (zeros anteriores, categoria) e os bits extra
+
+    Args:
+        code_sizes (ndarray): o comprimento do código de cada símbolo AC
+        run (ndarray): o número de zeros anteriores
+        size (ndarray): a categoria do coeficiente
+
+    Returns:
+        ndarray: o número de bits
+    """
+    return (run // 16) * code_sizes[ZRL] + code_sizes[((run % 16) << 4) | minimum(size, 15)] + size
+
+
+def _rdo_pass(
+    quantized: ndarray, scaled: ndarray, weights: ndarray, code_sizes: ndarray, lmbda: float
+) -> ndarray:
+    """Aplica a cada bloco a alteração que mais reduz o custo taxa-distorção: anular um
+    coeficiente AC, reduzir a sua magnitude em 1 ou anular todos os coeficientes
+    a partir dele (mover o EOB)
+
+    Args:
+        quantized (ndarray): os blocos quantizados em zigzag (blocos, 64), alterados no lugar
+        scaled (ndarray): os coeficientes da DCT divididos pela matriz de quantização (blocos, 64)
+        weights (ndarray): o peso do erro de cada posição em zigzag (o passo ao quadrado)
+        code_sizes (ndarray): o comprimento do código de cada símbolo AC
+        lmbda (float): o peso dos bits face ao erro
+
+    Returns:
+        ndarray: os índices dos blocos alterados
+    """
+
+    ac = quantized[:, 1:]
+    x = scaled[:, 1:]
+    weights = weights[1:]
+    nonzero = ac != 0
+
+    # posição do coeficiente não nulo anterior (0 é o DC) e do seguinte (64 se não existir)
+    positions = where(nonzero, AC_POSITIONS, 0)
+    previous = maximum.accumulate(positions, axis=1)
+    previous[:, 1:] = previous[:, :-1].copy()
+    previous[:, 0] = 0
+
+    following = where(nonzero, AC_POSITIONS, 64)[:, ::-1]
+    following = minimum.accumulate(following, axis=1)[:, ::-1]
+    following[:, :-1] = following[:, 1:].copy()
+    following[:, -1] = 64
+
+    size = frexp(npabs(ac))[1].astype(int64)
+    run = AC_POSITIONS - previous - 1
+    bits = where(nonzero, _symbol_bits(code_sizes, run, size), 0)
+
+    # o EOB só não é escrito quando o último coeficiente (posição 63) é não nulo
+    ends_at_63 = nonzero[:, -1]
+    eob_bits = where(ends_at_63, code_sizes[EOB], 0)
+
+    # aumento do erro quadrático ao anular cada coeficiente
+    zero_error = where(nonzero, x * x - (x - ac) ** 2, 0) * weights
+
+    # anular um coeficiente: o seguinte passa a ter os zeros de ambos
+    last = following == 64
+    next_index = minimum(following, 63) - 1
+    next_size = take_along_axis(size, next_index, axis=1)
+    next_bits = take_along_axis(bits, next_index, axis=1)
+    merged = _symbol_bits(code_sizes, following - previous - 1, next_size)
+
+    zero_rate = where(last, eob_bits[:, None], merged - next_bits) - bits
+    zero_cost = where(nonzero, zero_error + lmbda * zero_rate, inf)
+
+    # reduzir a magnitude em 1 (só muda a taxa quando a categoria diminui)
+    lowered = ac - sign(ac)
+    lower_size = frexp(npabs(lowered))[1].astype(int64)
+    lower_rate = _symbol_bits(code_sizes, run, lower_size) - bits
+    lower_error = ((x - lowered) ** 2 - (x - ac) ** 2) * weights
+    lower_cost = where(npabs(ac) > 1, lower_error + lmbda * lower_rate, inf)
+
+    # anular todos os coeficientes a partir de um coeficiente não nulo
+    tail_error = zero_error[:, ::-1].cumsum(axis=1)[:, ::-1]
+    tail_bits = bits[:, ::-1].cumsum(axis=1)[:, ::-1]
+    tail_cost = where(nonzero, tail_error + lmbda * (eob_bits[:, None] - tail_bits), inf)
+
+    # a melhor alteração de cada bloco (opção * 63 + índice)
+    costs = stack((zero_cost, lower_cost, tail_cost), axis=1).reshape(len(ac), 3 * 63)
+    best = costs.argmin(axis=1)
+
+    changed = flatnonzero(costs[arange(len(ac)), best] < 0)
+    option, index = best[changed] // 63, best[changed] % 63
+
+    # aplicar a alteração escolhida em cada bloco alterado
+    ac[changed, index] = where(option == 1, lowered[changed, index], 0)
+
+    tails = changed[option == 2]
+    ac[tails] = where(arange(63) >= index[option == 2, None], 0, ac[tails])
+
+    return changed
+
+
+def rdo_quantize(
+    channel: ndarray,
+    q_matrix: ndarray,
+    quality_factor: int = 50,
+    lmbda: float = RDO_LAMBDA,
+    luminance: bool = True,
+) -> ndarray:
+    """Quantiza um canal minimizando o custo taxa-distorção (erro + lmbda * bits) de cada bloco\n
+    Parte da quantização de quantize e, em passagens vetorizadas sobre todos os blocos,
+    aplica a cada bloco a alteração de um coeficiente AC (anular, reduzir a magnitude em 1
+    ou mover o EOB) que mais reduz o custo, até nenhuma o reduzir. Os bits são contados
+    com a tabela AC standard do canal (zeros anteriores, ZRL, EOB e bits extra) e o erro é o
+    erro quadrático dos coeficientes (igual ao dos pixeis, porque a DCT é ortonormal) dividido
+    pelo passo AC médio ao quadrado, pelo que lmbda = 0 devolve o resultado de quantize.
+    Os coeficientes DC não são alterados e o resultado é descodificado sem alterações
+
+    Args:
+        channel (ndarray): o canal a quantizar (coeficientes da DCT em vírgula flutuante)
+        q_matrix (ndarray): a matriz de quantização a ser usada
+        quality_factor (int, optional): o fator de qualidade da matriz de quantização. Default a 50.
+        lmbda (float, optional): o peso de um bit face ao erro. Default a RDO_LAMBDA.
+        luminance (bool, optional): contar os bits com a tabela de luminância. Default a True.
+
+    Returns:
+        ndarray: o canal quantizado ou None caso o canal não seja válido
+    """
+
+    if lmbda < 0:
+        print("The RDO lambda must not be negative")
+        return
+
+    quantized = quantize(channel, q_matrix, quality_factor)
+    if quantized is None or lmbda == 0:
+        return quantized
+
+    code_sizes = _ac_code_sizes(luminance)
+
+    blocks = channel_to_zigzag(quantized).astype(int64)
+    steps = scale_q_matrix(q_matrix, quality_factor).astype(float64).ravel()[ZIGZAG]
+    scaled = channel_to_zigzag(channel) / steps
+
+    # o erro de cada coeficiente em unidades do passo AC médio ao quadrado
+    weights = steps ** 2 / (steps[1:] ** 2).mean()
+
+    # só os blocos alterados na passagem anterior são revistos
+    active = arange(len(blocks))
+
+    while active.size:
+        sub_blocks = blocks[active]
+        changed = _rdo_pass(sub_blocks, scaled[active], weights, code_sizes, lmbda)
+
+        blocks[active] = sub_blocks
+        active = active[changed]
+
+    return zigzag_to_channel(blocks, channel.shape).astype(int)
+
+
+def rdo_report(
+    image: ndarray,
+    quality_factor: int,
+    downsampling: tuple,
+    lmbda: float = RDO_LAMBDA,
+    optimize_huffman: bool = False,
+) -> RdoReport:
+    """Compara o tamanho e o PSNR de uma imagem codificada com a quantização simples
+    e com a quantização RDO
+
+    Args:
+        image (ndarray): a imagem original
+        quality_factor (int): o fator de qualidade
+        downsampling (tuple): o racio de downsampling usado {1,2,4,0}
+        lmbda (float, optional): o peso de um bit face ao erro. Default a RDO_LAMBDA.
+        optimize_huffman (bool, optional): usar tabelas de Huffman otimizadas. Default a False.
+
+    Returns:
+        RdoReport: os tamanhos e os PSNR das duas quantizações
+    """
+
+    # importados aqui porque o encoder importa este módulo
+    from .encoder import encode_image
+    from .decoder import decode
+    from metrics import compute_metrics
+
+    results = list()
+
+    for rdo_lambda in (None, lmbda):
+        encoded, rows, cols = encode_image(image, quality_factor, downsampling, optimize_huffman, rdo_lambda=rdo_lambda)
+        decoded = decode(encoded, rows, cols, quality_factor)
+
+        results.append((len(encoded), compute_metrics(image, decoded).psnr))
+
+    return RdoReport(
+        bytes=results[0][0],
+        rdo_bytes=results[1][0],
+        psnr=results[0][1],
+        rdo_psnr=results[1][1],
+    )
@@ -0,0 +1,224 @@
+"""Contém o codificador JPEG baseline por faixas, que lê um ficheiro BMP
+uma linha de MCUs de cada vez e escreve a scan à medida que é codificada,
+com a memória limitada pela largura da imagem e não pela sua altura
+"""
+
+from os.path import isdir
+from typing import List, Sequence, Tuple
+
+from numpy import ndarray, pad, argsort, concatenate, insert, flatnonzero, packbits, zeros, ones, float32, int64, uint8
+
+from imgtools import read_bmp_header, read_bmp_strips
+from imgtools import converter_to_ycbcr
+from imgtools import down_sample
+from imgtools import calculate_dct
+from imgtools import quantize, scale_q_matrix
+
+from file_worker import load_q_matrix
+
+from .huffman import STD_DC_LUMINANCE, STD_DC_CHROMINANCE, STD_AC_LUMINANCE, STD_AC_CHROMINANCE
+from .entropy import channel_to_zigzag, block_symbols, symbol_codes, expand_bits
+from .jfif import EOI, sampling_factors, mcu_order, unique_q_tables, jfif_headers
+
+
+# tabelas de Huffman standard (as tabelas otimizadas precisam de toda a imagem)
+STREAM_TABLES = [(STD_DC_LUMINANCE, STD_AC_LUMINANCE), (STD_DC_CHROMINANCE, STD_AC_CHROMINANCE)]
+
+
+class ScanWriter:
+    """Empacota os códigos da scan em bytes à medida que são produzidos\n
+    Os bits que não completam um byte ficam pendentes para a faixa seguinte
+    e só o último byte da scan é completado com uns
+    """
+
+    def __init__(self) -> None:
+        """Construtor da classe ScanWriter
+        """
+        self.pending = zeros(0, dtype=uint8)
+
+    def write(self, values: ndarray, lengths: ndarray) -> bytes:
+        """Empacota uma sequência de códigos
+
+        Args:
+            values (ndarray): o valor de cada código
+            lengths (ndarray): o comprimento em bits de cada código
+
+        Returns:
+            bytes: os bytes completos (com um 0x00 depois de cada 0xFF)
+        """
+
+        bits = concatenate((self.pending, expand_bits(values, lengths)))
+
+        whole = bits.size - bits.size % 8
+        self.pending = bits[whole:]
+
+        return _stuff(packbits(bits[:whole]))
+
+    def flush(self) -> bytes:
+        """Completa o último byte com uns
+
+        Returns:
+            bytes: o último byte (vazio caso não existam bits pendentes)
+        """
+
+        bits = concatenate((self.pending, ones(-self.pending.size % 8, dtype=uint8)))
+        self.pending = zeros(0, dtype=uint8)
+
+        return _stuff(packbits(bits))
+
+
+def _stuff(packed: ndarray) -> bytes:
+    """Insere um 0x00 depois de cada 0xFF dos dados da scan
+
+    Args:
+        packed (ndarray): os bytes
+
+    Returns:
+        bytes: os bytes com o byte stuffing
+    """
+    return insert(packed, flatnonzero(packed == 0xFF) + 1, 0).tobytes()
+
+
+def encode_strip(
+    strip: ndarray,
+    q_tables: Sequence[ndarray],
+    downsampling: Sequence[int],
+    samplings: Sequence[Tuple[int, int]],
+    predictors: List[int],
+) -> Tuple[ndarray, ndarray]:
+    """Codifica uma faixa com um número inteiro de linhas de MCUs\n
+    Aplica as fases do codec (YCbCr, subamostragem, DCT 8x8 e quantização) e devolve
+    os códigos pela ordem de escrita. O DC de cada componente é previsto a partir
+    do último bloco da faixa anterior, pelo que a scan é igual à da imagem inteira
+
+    Args:
+        strip (ndarray): a faixa RGB, já estendida até um número inteiro de MCUs
+        q_tables (Sequence[ndarray]): a tabela de quantização (já escalada) de cada componente
+        downsampling (Sequence[int]): a subamostragem
+        samplings (Sequence[Tuple[int, int]]): os fatores de amostragem (h, v) de cada componente
+        predictors (List[int]): o último DC de cada componente (atualizado no fim da faixa)
+
+    Returns:
+        Tuple[ndarray, ndarray]: o valor e o comprimento em bits de cada código
+    """
+
+    # conversão de cor e subamostragem
+    channels = down_sample(*converter_to_ycbcr(strip), tuple(downsampling))
+
+    # deslocamento de nível e DCT
+    channels = calculate_dct(*[channel.astype(float32) - 128 for channel in channels], 8)
+
+    mcu_blocks = sum(h * v for h, v in samplings)
+    offsets = [sum(h * v for h, v in samplings[:i]) for i in range(len(samplings))]
+
+    keys, values, lengths = list(), list(), list()
+
+    for index, (channel, q_table, (h, v), offset) in enumerate(zip(channels, q_tables, samplings, offsets)):
+        quantized = quantize(channel, q_table, 50)
+
+        order = mcu_order(quantized.shape[0] // 8, quantized.shape[1] // 8, h, v, mcu_blocks, offset)
+        sort = argsort(order, kind="stable")
+
+        # diferença do DC para o bloco anterior, continuando a previsão da faixa anterior
+        blocks = channel_to_zigzag(quantized)[sort].astype(int64)
+        dc = blocks[:, 0].copy()
+        blocks[1:, 0] -= dc[:-1]
+        blocks[0, 0] -= predictors[index]
+        predictors[index] = int(dc[-1])
+
+        key, value, length = symbol_codes(
+            block_symbols(blocks), *STREAM_TABLES[min(index, 1)], block_order=order[sort]
+        )
+        keys.append(key)
+        values.append(value)
+        lengths.append(length)
+
+    order = argsort(concatenate(keys), kind="stable")
+
+    return concatenate(values)[order], concatenate(lengths)[order]
+
+
+def stream_jfif(
+    source: str,
+    destination: str,
+    quality_factor: int,
+    downsampling: Sequence[int] = (4, 2, 0),
+    q_matrices: Tuple[ndarray, ndarray] = None,
+    strip_mcus: int = 1,
+) -> bool:
+    """Codifica um ficheiro BMP num ficheiro JPEG baseline (JFIF) por faixas\n
+    A imagem é lida em faixas com a altura de uma MCU (16 ou 8 linhas, consoante
+    a subamostragem) e cada faixa é codificada e escrita antes de ler a seguinte,
+    pelo que a memória usada não depende da altura da imagem. O ficheiro é igual
+    ao escrito por save_jpeg (com as tabelas de Huffman standard)
+
+    Args:
+        source (str): o caminho do ficheiro BMP (24 ou 32 bits sem compressão)
+        destination (str): o caminho do ficheiro JPEG
+        quality_factor (int): o fator de qualidade [0, 100]
+        downsampling (Sequence[int], optional): a subamostragem. Default a (4, 2, 0).
+        q_matrices (Tuple[ndarray, ndarray], optional): as matrizes de quantização (Y, CbCr).
+        Default a None (lidas dos ficheiros csv)
+        strip_mcus (int, optional): o número de linhas de MCUs de cada faixa. Default a 1.
+
+    Returns:
+        bool: True se o ficheiro foi escrito
+    """
+
+    if isdir(destination):
+        print(f"{destination} is a directory")
+        return False
+
+    if strip_mcus < 1:
+        print("The number of MCU rows of each strip must be positive")
+        return False
+
+    factors = sampling_factors(downsampling)
+    if factors is None:
+        return False
+    horizontal, vertical = factors
+
+    header = read_bmp_header(source)
+    if header is None:
+        return False
+
+    if q_matrices is None:
+        q_matrices = (load_q_matrix("q_matrix_y.csv"), load_q_matrix("q_matrix_cbcr.csv"))
+
+    q_tables = (
+        scale_q_matrix(q_matrices[0], quality_factor),
+        scale_q_matrix(q_matrices[1], quality_factor),
+        scale_q_matrix(q_matrices[1], quality_factor),
+    )
+    unique_tables, q_ids = unique_q_tables(q_tables)
+
+    samplings = ((horizontal, vertical), (1, 1), (1, 1))
+    components = list(zip(samplings, q_ids, (0, 1, 1)))
+
+    mcu_height = 8 * vertical
+    mcu_width = 8 * horizontal
+
+    writer = ScanWriter()
+    predictors = [0, 0, 0]
+
+    try:
+        with open(destination, "wb") as jpeg_file:
+            jpeg_file.write(jfif_headers(header.rows, header.cols, unique_tables, components, STREAM_TABLES))
+
+            for strip in read_bmp_strips(source, mcu_height * strip_mcus):
+                # estender a faixa até um número inteiro de MCUs (só a última faixa tem menos linhas)
+                strip = pad(
+                    strip,
+                    ((0, -strip.shape[0] % mcu_height), (0, -strip.shape[1] % mcu_width), (0, 0)),
+                    mode="edge"
+                )
+
+                jpeg_file.write(writer.write(*encode_strip(strip, q_tables, downsampling, samplings, predictors)))
+
+            jpeg_file.write(writer.flush() + EOI)
+
+    except IOError:
+        print(f"An error has occured while writing the file at {destination}")
+        return False
+
+    return True
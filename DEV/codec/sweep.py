@@ -0,0 +1,245 @@
+"""Contém o varrimento taxa-distorção (RD), que avalia uma imagem com vários
+fatores de qualidade e subamostragens sem repetir as fases que não dependem
+do fator de qualidade
+"""
+
+import csv
+import json
+from os import listdir, makedirs
+from os.path import basename, isdir, isfile, join, splitext, dirname
+from typing import Dict, List, NamedTuple, Sequence
+
+from numpy import ndarray, stack
+
+from imgtools import read_bmp
+from imgtools import quantize_many, inv_quantize_many
+from imgtools import calculate_channel_sparse_inv_dct
+from imgtools import dpcm_encoder, dpcm_decoder
+
+from file_worker import load_q_matrix
+
+from metrics import compute_metrics, ssim
+from metrics.ssim import WINDOW_SIZE
+
+from pipeline import StageGraph
+
+from .entropy import encode_channels
+from .decoder import _to_image
+
+
+# formatos dos ficheiros com as curvas RD
+RD_FORMATS = ("csv", "json")
+
+# número de fatores de qualidade quantizados de cada vez (limita a memória)
+QUALITY_BATCH = 8
+
+
+class RDPoint(NamedTuple):
+    """Um ponto da curva taxa-distorção de uma imagem
+    """
+    downsampling: str
+    quality: int
+    bytes: int
+    bpp: float
+    mse: float
+    psnr: float
+    y_psnr: float
+    ssim: float = None
+
+
+def parse_downsampling(text: str) -> tuple:
+    """Converte uma subamostragem escrita como "4:2:0" num tuplo
+
+    Args:
+        text (str): a subamostragem
+
+    Returns:
+        tuple: a subamostragem (4, 2, 0) ou None caso o texto seja inválido
+    """
+
+    try:
+        downsampling = tuple(int(value) for value in text.split(":"))
+    except ValueError:
+        downsampling = ()
+
+    if len(downsampling) != 3:
+        print(f"Invalid downsampling '{text}' (expected a:b:c, for example 4:2:0)")
+        return
+
+    return downsampling
+
+
+def rd_sweep(
+    image: ndarray,
+    quality_factors: Sequence[int],
+    downsamplings: Sequence[tuple] = ((4, 2, 0),),
+    optimize_huffman: bool = False,
+    quality_batch: int = QUALITY_BATCH,
+) -> List[RDPoint]:
+    """Calcula a curva taxa-distorção de uma imagem\n
+    A conversão de cor é calculada uma vez e a subamostragem e a DCT uma vez por
+    subamostragem (no grafo das fases). Os fatores de qualidade são quantizados
+    e desquantizados em grupos vetorizados (quantize_many) e cada fator é
+    codificado entropicamente (o tamanho é o do ficheiro do codec) e reconstruído
+    a partir do DPCM para calcular as métricas. Os resultados são iguais aos de encode_image + decode
+
+    Args:
+        image (ndarray): a imagem RGB
+        quality_factors (Sequence[int]): os fatores de qualidade
+        downsamplings (Sequence[tuple], optional): as subamostragens. Default a ((4, 2, 0),).
+        optimize_huffman (bool, optional): usar tabelas de Huffman otimizadas. Default a False.
+        quality_batch (int, optional): o número de fatores quantizados de cada vez. Default a QUALITY_BATCH.
+
+    Returns:
+        List[RDPoint]: um ponto por subamostragem e fator de qualidade
+    """
+
+    rows, cols = image.shape[:2]
+
+    q_matrix_y = load_q_matrix("q_matrix_y.csv")
+    q_matrix_cbcr = load_q_matrix("q_matrix_cbcr.csv")
+    q_matrices = (q_matrix_y, q_matrix_cbcr, q_matrix_cbcr)
+
+    graph = StageGraph()
+    ycbcr = graph.source(image) + (graph.stage("padding", 32), graph.stage("ycbcr"))
+
+    points = list()
+
+    for downsampling in downsamplings:
+        channels = graph.get_many(
+            graph.channels(ycbcr, graph.stage("downsample", downsampling), graph.stage("dct", 8))
+        )
+
+        for start in range(0, len(quality_factors), quality_batch):
+            batch = list(quality_factors[start:start + quality_batch])
+
+            quantized = [quantize_many(channel, q_matrix, batch) for channel, q_matrix in zip(channels, q_matrices)]
+            dpcm = [[dpcm_encoder(channel) for channel in channels_q] for channels_q in quantized]
+
+            # a reconstrução parte do DPCM, tal como no descodificador (ver dpcm_decoder)
+            de_quantized = [
+                inv_quantize_many(stack([dpcm_decoder(channel) for channel in channels_dpcm]), q_matrix, batch)
+                for channels_dpcm, q_matrix in zip(dpcm, q_matrices)
+            ]
+
+            for index, quality_factor in enumerate(batch):
+                encoded = encode_channels(tuple(channels_dpcm[index] for channels_dpcm in dpcm), optimize_huffman)
+
+                decoded = _to_image(
+                    tuple(calculate_channel_sparse_inv_dct(channel[index], 8)[0] for channel in de_quantized),
+                    rows, cols
+                )
+
+                metrics = compute_metrics(image, decoded, luminance=True)
+
+                points.append(RDPoint(
+                    downsampling=":".join(str(value) for value in downsampling),
+                    quality=quality_factor,
+                    bytes=len(encoded),
+                    bpp=len(encoded) * 8 / (rows * cols),
+                    mse=metrics.mse,
+                    psnr=metrics.psnr,
+                    y_psnr=metrics.y_psnr,
+                    ssim=ssim(image, decoded) if min(rows, cols) >= WINDOW_SIZE else None,
+                ))
+
+    return points
+
+
+def write_rd_curve(points: Sequence[RDPoint], path: str) -> bool:
+    """Escreve uma curva taxa-distorção num ficheiro CSV ou JSON (pela extensão)
+
+    Args:
+        points (Sequence[RDPoint]): os pontos da curva
+        path (str): o caminho do ficheiro (.csv ou .json)
+
+    Returns:
+        bool: True se o ficheiro foi escrito
+    """
+
+    extension = splitext(path)[1][1:].lower()
+    if extension not in RD_FORMATS:
+        print(f"Unknown RD curve format '{extension}' (choose from {', '.join(RD_FORMATS)})")
+        return False
+
+    try:
+        with open(path, "w", newline="") as rd_file:
+            if extension == "json":
+                json.dump([point._asdict() for point in points], rd_file, indent=2)
+            else:
+                writer = csv.writer(rd_file)
+                writer.writerow(RDPoint._fields)
+                writer.writerows(points)
+
+    except IOError:
+        print(f"An error has occured while writing the file at {path}")
+        return False
+
+    return True
+
+
+def run_sweep(
+    path: str,
+    quality_factors: Sequence[int],
+    downsamplings: Sequence[tuple] = ((4, 2, 0),),
+    output: str = None,
+    file_format: str = "csv",
+    optimize_huffman: bool = False,
+) -> Dict[str, List[RDPoint]]:
+    """Calcula e escreve a curva taxa-distorção de uma imagem BMP ou de todas
+    as imagens BMP de uma pasta (um ficheiro <imagem>.rd.csv ou .rd.json por imagem)
+
+    Args:
+        path (str): o caminho da imagem ou da pasta
+        quality_factors (Sequence[int]): os fatores de qualidade
+        downsamplings (Sequence[tuple], optional): as subamostragens. Default a ((4, 2, 0),).
+        output (str, optional): a pasta dos ficheiros. Default a None (a pasta das imagens).
+        file_format (str, optional): o formato dos ficheiros {csv, json}. Default a "csv".
+        optimize_huffman (bool, optional): usar tabelas de Huffman otimizadas. Default a False.
+
+    Returns:
+        Dict[str, List[RDPoint]]: a curva de cada imagem ou None caso ocorra um erro
+    """
+
+    if file_format not in RD_FORMATS:
+        print(f"Unknown RD curve format '{file_format}' (choose from {', '.join(RD_FORMATS)})")
+        return
+
+    if any(not 0 <= quality_factor <= 100 for quality_factor in quality_factors):
+        print("Quality factors must be in [0, 100]")
+        return
+
+    if isdir(path):
+        paths = [join(path, name) for name in sorted(listdir(path)) if name.lower().endswith(".bmp")]
+    elif isfile(path):
+        paths = [path]
+    else:
+        print(f"{path} is not a file nor a directory")
+        return
+
+    curves = dict()
+
+    for image_path in paths:
+        image = read_bmp(image_path)
+        if image is None:
+            continue
+
+        points = rd_sweep(image, quality_factors, downsamplings, optimize_huffman)
+
+        directory = dirname(image_path) if output is None else output
+        makedirs(directory or ".", exist_ok=True)
+
+        name = splitext(basename(image_path))[0]
+        if not write_rd_curve(points, join(directory, f"{name}.rd.{file_format}")):
+            continue
+
+        curves[basename(image_path)] = points
+
+        for point in points:
+            print(
+                f"{basename(image_path)} {point.downsampling} q{point.quality}: {point.bytes // 1024}KB"
+                f" ({point.bpp:.3f} bpp)  PSNR {point.psnr:.2f} dB"
+                + ("" if point.ssim is None else f"  SSIM {point.ssim:.4f}")
+            )
+
+    return curves
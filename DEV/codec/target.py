@@ -0,0 +1,129 @@
+"""Contém a codificação com restrições (tamanho máximo e/ou PSNR mínimo), que procura
+o fator de qualidade por bisseção sem recodificar a imagem em cada iteração
+"""
+
+from typing import NamedTuple, Tuple
+
+from numpy import ndarray
+
+from imgtools import quantize, bisect_quality
+from imgtools import dpcm_encoder
+
+from file_worker import load_q_matrix
+
+from metrics import compute_metrics
+
+from pipeline import StageGraph
+
+from .entropy import encode_channels, estimate_size
+from .decoder import _decode_channel, _to_image
+
+
+class TargetResult(NamedTuple):
+    """O fator de qualidade escolhido para as restrições e os seus valores
+    """
+    quality: int
+    bytes: int
+    psnr: float
+    evaluations: int
+
+
+def encode_to_target(
+    image: ndarray,
+    downsampling: tuple,
+    max_bytes: int = None,
+    min_psnr: float = None,
+    optimize_huffman: bool = False,
+    workers: int = 1,
+) -> Tuple[bytes, int, int, TargetResult]:
+    """Codifica uma imagem com o fator de qualidade mais alto que não ultrapassa
+    max_bytes e/ou com o mais baixo que atinge min_psnr\n
+    A conversão de cor e a DCT são calculadas uma só vez; cada iteração da bisseção
+    (ver bisect_quality) só quantiza os coeficientes, aplica o DPCM e conta os bits dos
+    símbolos (estimate_size, sem escrever o buffer) ou reconstrói a imagem para o PSNR.
+    Com as duas restrições é escolhido o fator mais alto que satisfaz ambas.
+    O resultado é igual ao de encode_image com o fator escolhido
+
+    Args:
+        image (ndarray): a imagem original
+        downsampling (tuple): o racio de downsampling usado {1,2,4,0}
+        max_bytes (int, optional): o tamanho máximo do buffer. Default a None.
+        min_psnr (float, optional): o PSNR mínimo em dB. Default a None.
+        optimize_huffman (bool, optional): usar tabelas de Huffman otimizadas. Default a False.
+        workers (int, optional): o número de threads (um canal por thread). Default a 1.
+
+    Returns:
+        Tuple[bytes, int, int, TargetResult]: os canais codificados entropicamente, o número
+        de linhas e colunas da imagem original e o fator escolhido, ou None caso as restrições
+        não possam ser satisfeitas
+    """
+
+    if max_bytes is None and min_psnr is None:
+        print("A target size or a target PSNR must be given")
+        return
+
+    rows, cols = image.shape[:2]
+
+    q_matrix_y = load_q_matrix("q_matrix_y.csv")
+    q_matrix_cbcr = load_q_matrix("q_matrix_cbcr.csv")
+    q_matrices = (q_matrix_y, q_matrix_cbcr, q_matrix_cbcr)
+
+    graph = StageGraph(workers=workers)
+    ycbcr = graph.source(image) + (graph.stage("padding", 32), graph.stage("ycbcr"))
+
+    # os coeficientes da DCT são partilhados por todas as iterações
+    channels = graph.get_many(graph.channels(ycbcr, graph.stage("downsample", downsampling), graph.stage("dct", 8)))
+
+    # canais depois do DPCM e valores de cada fator já avaliado
+    dpcm, sizes, psnrs = dict(), dict(), dict()
+
+    def channels_dpcm(quality_factor: int) -> tuple:
+        if quality_factor not in dpcm:
+            dpcm[quality_factor] = tuple(
+                dpcm_encoder(quantize(channel, q_matrix, quality_factor))
+                for channel, q_matrix in zip(channels, q_matrices)
+            )
+        return dpcm[quality_factor]
+
+    def size(quality_factor: int) -> int:
+        if quality_factor not in sizes:
+            sizes[quality_factor] = estimate_size(channels_dpcm(quality_factor), optimize_huffman, workers)
+        return sizes[quality_factor]
+
+    def psnr(quality_factor: int) -> float:
+        if quality_factor not in psnrs:
+            decoded = _to_image(tuple(
+                _decode_channel(channel, q_matrix, quality_factor)[1]
+                for channel, q_matrix in zip(channels_dpcm(quality_factor), q_matrices)
+            ), rows, cols)
+            psnrs[quality_factor] = compute_metrics(image, decoded).psnr
+        return psnrs[quality_factor]
+
+    quality_factor = 100
+
+    if max_bytes is not None:
+        quality_factor = bisect_quality(lambda q: size(q) <= max_bytes)
+        if quality_factor is None:
+            print(f"The image cannot be encoded in {max_bytes} bytes (minimum: {size(1)} bytes)")
+            return
+
+    if min_psnr is not None:
+        lowest = bisect_quality(lambda q: psnr(q) >= min_psnr, lowest=True, high=quality_factor)
+        if lowest is None:
+            print(f"A PSNR of {min_psnr} dB cannot be reached" + (
+                "" if max_bytes is None else f" in {max_bytes} bytes"
+            ) + f" (maximum: {psnr(quality_factor):.2f} dB)")
+            return
+
+        # sem tamanho máximo basta o fator mais baixo que atinge o PSNR
+        if max_bytes is None:
+            quality_factor = lowest
+
+    encoded = encode_channels(channels_dpcm(quality_factor), optimize_huffman, workers)
+
+    return encoded, rows, cols, TargetResult(
+        quality=quality_factor,
+        bytes=len(encoded),
+        psnr=None if min_psnr is None else psnr(quality_factor),
+        evaluations=len(dpcm),
+    )
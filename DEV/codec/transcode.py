@@ -0,0 +1,388 @@
+"""Contém operações de transcodificação de ficheiros JPEG no domínio dos
+coeficientes quantizados (sem IDCT/DCT nem conversão de cor), evitando a
+perda de qualidade de uma descodificação seguida de nova codificação
+"""
+
+from math import ceil, sqrt
+from typing import Sequence, Tuple
+
+from numpy import ndarray, arange, cos, pi, sqrt as npsqrt, kron, eye, pad, einsum, float64
+
+from imgtools import quantize, inv_quantize, scale_q_matrix
+
+from file_worker import load_q_matrix
+
+from .jpeg_reader import JpegImage, JpegComponent, read_jpeg
+from .jfif import encode_coefficients
+
+
+def _dct_matrix(size: int) -> ndarray:
+    """Calcula a matriz da DCT-II ortonormada
+
+    Args:
+        size (int): a dimensão da transformada
+
+    Returns:
+        ndarray: a matriz (size, size)
+    """
+    k = arange(size)[:, None]
+    n = arange(size)[None, :]
+
+    matrix = npsqrt(2 / size) * cos(pi * (2 * n + 1) * k / (2 * size))
+    matrix[0] /= sqrt(2)
+
+    return matrix
+
+
+def _halving_matrix() -> ndarray:
+    """Calcula a matriz (8, 16) que transforma os coeficientes de dois blocos
+    vizinhos nos coeficientes de um bloco com metade da resolução\n
+    Os dois blocos são juntos num bloco de 16 (DCT de 16 pontos) do qual se
+    guardam as 8 frequências mais baixas (com a escala da DCT de 8 pontos)
+
+    Returns:
+        ndarray: a matriz de redução
+    """
+    merge = _dct_matrix(16) @ kron(eye(2), _dct_matrix(8).T)
+
+    return merge[:8] / sqrt(2)
+
+
+def _components(jpeg: JpegImage, coefficients: Sequence[ndarray], samplings: Sequence[Tuple[int, int]] = None) -> Tuple[JpegComponent, ...]:
+    """Cria os componentes de uma imagem com novos coeficientes
+
+    Args:
+        jpeg (JpegImage): a imagem original
+        coefficients (Sequence[ndarray]): os novos coeficientes de cada componente
+        samplings (Sequence[Tuple[int, int]], optional): os novos fatores de amostragem. Default a None.
+
+    Returns:
+        Tuple[JpegComponent, ...]: os componentes
+    """
+    if samplings is None:
+        samplings = [(component.horizontal, component.vertical) for component in jpeg.components]
+
+    return tuple(
+        component._replace(horizontal=h, vertical=v, coefficients=channel)
+        for component, channel, (h, v) in zip(jpeg.components, coefficients, samplings)
+    )
+
+
+def requantize(jpeg: JpegImage, quality_factor: int, q_matrices: Tuple[ndarray, ndarray] = None) -> JpegImage:
+    """Quantiza novamente os coeficientes com as matrizes do codec escaladas
+    para outro fator de qualidade\n
+    Os coeficientes são desquantizados com a tabela do ficheiro e quantizados com a
+    nova tabela, sem passar pelo domínio dos píxeis
+
+    Args:
+        jpeg (JpegImage): a imagem lida por read_jpeg
+        quality_factor (int): o novo fator de qualidade [0, 100]
+        q_matrices (Tuple[ndarray, ndarray], optional): as matrizes de quantização (Y, CbCr).
+        Default a None (lidas dos ficheiros csv)
+
+    Returns:
+        JpegImage: a imagem com os novos coeficientes e tabelas ou None caso ocorra um erro
+    """
+
+    if quality_factor > 100 or quality_factor < 0:
+        print("Quality factor must be a percentage value")
+        return
+
+    if q_matrices is None:
+        q_matrices = (load_q_matrix("q_matrix_y.csv"), load_q_matrix("q_matrix_cbcr.csv"))
+
+    components = list()
+    for index, component in enumerate(jpeg.components):
+        q_table = scale_q_matrix(q_matrices[min(index, 1)], quality_factor)
+
+        # as tabelas já escaladas são usadas com o fator 50 (tabela inalterada)
+        coefficients = quantize(inv_quantize(component.coefficients, component.q_table, 50), q_table, 50)
+
+        components.append(component._replace(q_table=q_table, coefficients=coefficients))
+
+    return jpeg._replace(components=tuple(components))
+
+
+def halve_chroma(jpeg: JpegImage, horizontal: bool = True, vertical: bool = True) -> JpegImage:
+    """Reduz para metade a resolução dos canais de crominância (por exemplo de
+    4:4:4 para 4:2:0) juntando blocos vizinhos no domínio da DCT
+
+    Args:
+        jpeg (JpegImage): a imagem lida por read_jpeg
+        horizontal (bool, optional): reduzir a resolução horizontal. Default a True.
+        vertical (bool, optional): reduzir a resolução vertical. Default a True.
+
+    Returns:
+        JpegImage: a imagem com a nova subamostragem ou None caso ocorra um erro
+    """
+
+    if len(jpeg.components) != 3:
+        print("Chroma subsampling requires a 3 component image")
+        return
+
+    luma, *chroma = jpeg.components
+    if any((component.horizontal, component.vertical) != (1, 1) for component in chroma):
+        print("Chroma components must have 1x1 sampling factors")
+        return
+
+    h = luma.horizontal * (2 if horizontal else 1)
+    v = luma.vertical * (2 if vertical else 1)
+    if h > 4 or v > 4 or h * v + 2 > 10:
+        print("Downsampling ratio not supported by baseline JPEG")
+        return
+
+    mcus_x = ceil(jpeg.cols / (8 * h))
+    mcus_y = ceil(jpeg.rows / (8 * v))
+    halving = _halving_matrix()
+
+    # a luminância é estendida com blocos nulos até ao novo número de MCUs
+    y_coefficients = luma.coefficients[:mcus_y * v * 8, :mcus_x * h * 8]
+    y_coefficients = pad(
+        y_coefficients,
+        ((0, mcus_y * v * 8 - y_coefficients.shape[0]), (0, mcus_x * h * 8 - y_coefficients.shape[1]))
+    )
+
+    coefficients = [y_coefficients]
+    for component in chroma:
+        fx = 2 if horizontal else 1
+        fy = 2 if vertical else 1
+
+        # repetir os blocos da margem até um número par de blocos
+        blocks = inv_quantize(component.coefficients, component.q_table, 50)
+        blocks = blocks.reshape(blocks.shape[0] // 8, 8, blocks.shape[1] // 8, 8)[:mcus_y * fy, :, :mcus_x * fx]
+        blocks = pad(
+            blocks,
+            ((0, mcus_y * fy - blocks.shape[0]), (0, 0), (0, mcus_x * fx - blocks.shape[2]), (0, 0)),
+            mode="edge"
+        )
+
+        # juntar os pares de blocos em cada direção
+        if vertical:
+            blocks = blocks.reshape(mcus_y, 16, mcus_x * fx, 8)
+            blocks = einsum("ij,mjxk->mixk", halving, blocks)
+        if horizontal:
+            blocks = blocks.reshape(mcus_y, 8, mcus_x, 16)
+            blocks = blocks @ halving.T
+
+        channel = blocks.reshape(mcus_y * 8, mcus_x * 8).astype(float64)
+        coefficients.append(quantize(channel, component.q_table, 50))
+
+    samplings = [(h, v), (1, 1), (1, 1)]
+
+    return jpeg._replace(components=_components(jpeg, coefficients, samplings))
+
+
+def _trim(jpeg: JpegImage, rows: bool, cols: bool) -> JpegImage:
+    """Remove as MCUs incompletas da margem inferior e/ou direita
+
+    Args:
+        jpeg (JpegImage): a imagem
+        rows (bool): cortar as linhas incompletas
+        cols (bool): cortar as colunas incompletas
+
+    Returns:
+        JpegImage: a imagem cortada ou None caso fique vazia
+    """
+
+    h_max = max(component.horizontal for component in jpeg.components)
+    v_max = max(component.vertical for component in jpeg.components)
+
+    new_rows = jpeg.rows - jpeg.rows % (8 * v_max) if rows else jpeg.rows
+    new_cols = jpeg.cols - jpeg.cols % (8 * h_max) if cols else jpeg.cols
+
+    if new_rows == 0 or new_cols == 0:
+        print("Image is smaller than one MCU")
+        return
+
+    return crop(jpeg, 0, 0, new_rows, new_cols)
+
+
+def _flip_signs(size: int) -> ndarray:
+    """Devolve os sinais (-1)^k das frequências de um bloco espelhado
+
+    Args:
+        size (int): o tamanho do bloco
+
+    Returns:
+        ndarray: os sinais de cada frequência
+    """
+    return 1 - 2 * (arange(size) % 2)
+
+
+def rotate(jpeg: JpegImage, turns: int = 1) -> JpegImage:
+    """Roda a imagem 90 graus no sentido dos ponteiros do relógio (turns vezes)
+    transpondo e espelhando os blocos de coeficientes\n
+    Espelhar um bloco só troca o sinal das frequências ímpares, pelo que a rotação
+    não tem perdas. As MCUs incompletas que ficariam na margem de cima ou da esquerda
+    são removidas (tal como o jpegtran -trim)
+
+    Args:
+        jpeg (JpegImage): a imagem lida por read_jpeg
+        turns (int, optional): o número de rotações de 90 graus. Default a 1.
+
+    Returns:
+        JpegImage: a imagem rodada ou None caso ocorra um erro
+    """
+
+    turns %= 4
+    if turns == 0:
+        return jpeg
+
+    # 90: transpor e espelhar as colunas; 180: espelhar ambos; 270: transpor e espelhar as linhas
+    transpose = turns in (1, 3)
+    flip_rows = turns in (2, 3)
+    flip_cols = turns in (1, 2)
+
+    # as dimensões que vão ser espelhadas (antes da transposição)
+    jpeg = _trim(jpeg, rows=flip_cols if transpose else flip_rows, cols=flip_rows if transpose else flip_cols)
+    if jpeg is None:
+        return
+
+    signs = _flip_signs(8)
+    components = list()
+
+    for component in jpeg.components:
+        channel = component.coefficients
+        blocks = channel.reshape(channel.shape[0] // 8, 8, channel.shape[1] // 8, 8)
+        h, v = component.horizontal, component.vertical
+        q_table = component.q_table
+
+        # a tabela de quantização também é transposta
+        if transpose:
+            blocks = blocks.transpose(2, 3, 0, 1)
+            h, v = v, h
+            q_table = q_table.T.copy()
+
+        if flip_rows:
+            blocks = blocks[::-1] * signs[None, :, None, None]
+
+        if flip_cols:
+            blocks = blocks[:, :, ::-1] * signs[None, None, None, :]
+
+        components.append(component._replace(
+            horizontal=h,
+            vertical=v,
+            q_table=q_table,
+            coefficients=blocks.reshape(blocks.shape[0] * 8, blocks.shape[2] * 8).copy(),
+        ))
+
+    rows, cols = (jpeg.cols, jpeg.rows) if transpose else (jpeg.rows, jpeg.cols)
+
+    return jpeg._replace(rows=rows, cols=cols, components=tuple(components))
+
+
+def crop(jpeg: JpegImage, top: int, left: int, rows: int, cols: int) -> JpegImage:
+    """Corta a imagem sem recodificar os blocos\n
+    O canto superior esquerdo tem que estar alinhado com as MCUs
+    (múltiplo de 8 vezes o fator de amostragem máximo)
+
+    Args:
+        jpeg (JpegImage): a imagem lida por read_jpeg
+        top (int): a primeira linha
+        left (int): a primeira coluna
+        rows (int): o número de linhas
+        cols (int): o número de colunas
+
+    Returns:
+        JpegImage: a imagem cortada ou None caso ocorra um erro
+    """
+
+    h_max = max(component.horizontal for component in jpeg.components)
+    v_max = max(component.vertical for component in jpeg.components)
+
+    if top % (8 * v_max) or left % (8 * h_max):
+        print(f"Crop origin must be aligned to the {8 * h_max}x{8 * v_max} MCU grid")
+        return
+
+    if top < 0 or left < 0 or rows <= 0 or cols <= 0 or top + rows > jpeg.rows or left + cols > jpeg.cols:
+        print("Crop region is outside of the image")
+        return
+
+    mcu_top = top // (8 * v_max)
+    mcu_left = left // (8 * h_max)
+    mcus_y = ceil(rows / (8 * v_max))
+    mcus_x = ceil(cols / (8 * h_max))
+
+    coefficients = [
+        component.coefficients[
+            mcu_top * component.vertical * 8:(mcu_top + mcus_y) * component.vertical * 8,
+            mcu_left * component.horizontal * 8:(mcu_left + mcus_x) * component.horizontal * 8,
+        ]
+        for component in jpeg.components
+    ]
+
+    return jpeg._replace(rows=rows, cols=cols, components=_components(jpeg, coefficients))
+
+
+def encode_jpeg(jpeg: JpegImage, optimize: bool = False) -> bytes:
+    """Escreve uma imagem (lida ou transcodificada) num ficheiro JPEG baseline
+
+    Args:
+        jpeg (JpegImage): a imagem
+        optimize (bool, optional): usar tabelas de Huffman otimizadas. Default a False.
+
+    Returns:
+        bytes: o ficheiro JPEG
+    """
+    return encode_coefficients(
+        jpeg.rows,
+        jpeg.cols,
+        [component.coefficients for component in jpeg.components],
+        [component.q_table for component in jpeg.components],
+        [(component.horizontal, component.vertical) for component in jpeg.components],
+        optimize,
+        jpeg.ycbcr,
+    )
+
+
+def transcode_file(
+    source: str,
+    destination: str,
+    quality_factor: int = None,
+    chroma: bool = False,
+    turns: int = 0,
+    region: Tuple[int, int, int, int] = None,
+    optimize: bool = False,
+) -> bool:
+    """Transcodifica um ficheiro JPEG baseline no domínio dos coeficientes\n
+    As operações são aplicadas pela ordem corte, rotação, subamostragem e quantização
+
+    Args:
+        source (str): o ficheiro de entrada
+        destination (str): o ficheiro de saída
+        quality_factor (int, optional): o novo fator de qualidade. Default a None (mantém as tabelas).
+        chroma (bool, optional): reduzir a resolução da crominância para metade. Default a False.
+        turns (int, optional): o número de rotações de 90 graus. Default a 0.
+        region (Tuple[int, int, int, int], optional): o corte (topo, esquerda, linhas, colunas). Default a None.
+        optimize (bool, optional): usar tabelas de Huffman otimizadas. Default a False.
+
+    Returns:
+        bool: True se o ficheiro foi escrito
+    """
+
+    jpeg = read_jpeg(source)
+
+    if jpeg is not None and region is not None:
+        jpeg = crop(jpeg, *region)
+
+    if jpeg is not None and turns:
+        jpeg = rotate(jpeg, turns)
+
+    if jpeg is not None and chroma:
+        jpeg = halve_chroma(jpeg)
+
+    if jpeg is not None and quality_factor is not None:
+        jpeg = requantize(jpeg, quality_factor)
+
+    if jpeg is None:
+        return False
+
+    try:
+        with open(destination, "wb") as jpeg_file:
+            jpeg_file.write(encode_jpeg(jpeg, optimize))
+
+    except IOError:
+        print(f"An error has occured while writing the file at {destination}")
+        return False
+
+    return True
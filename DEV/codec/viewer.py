@@ -0,0 +1,154 @@
+"""Contém o visualizador das fases do codec, que é ligado ao encode como
+observador e é o único módulo do codec que importa o matplotlib
+"""
+
+from math import ceil
+
+from numpy import ndarray, mean, float32
+
+from matplotlib.pyplot import close
+
+from imgtools import show_img
+from imgtools import separate_channels
+from imgtools import create_colormap
+from imgtools import converter_to_ycbcr
+from imgtools import add_padding
+from imgtools import calculate_dct
+
+
+class EncodeViewer:
+    """Observador das fases do encode que mostra cada fase numa figura
+    e imprime as estatísticas da compressão
+    """
+
+    def __init__(self, downsampling: tuple) -> None:
+        """Construtor da classe EncodeViewer
+
+        EncodeViewer
+        ------------
+        As transformações usadas apenas para visualização (DCT do canal inteiro
+        e em blocos 64x64) só são calculadas por este observador
+
+        Args:
+            downsampling (tuple): o racio de downsampling usado na codificação
+        """
+        self.downsampling = downsampling
+        self.map_gr = create_colormap((0,0,0), (1,1,1), "grayscale")
+
+        self.image = None
+        self.resized = None
+
+        close("all")
+
+    def __call__(self, stage: str, data) -> None:
+        """Mostra o resultado de uma fase do encode
+
+        Args:
+            stage (str): o nome da fase
+            data (object): o resultado da fase
+        """
+        getattr(self, f"_{stage}")(data)
+
+    def _show_channels(self, channels: tuple, fig_number: int, plot_title: str, log_correction: bool = False):
+        """Mostra os três canais numa figura
+
+        Args:
+            channels (tuple): os canais Y, Cb e Cr
+            fig_number (int): o número da figura
+            plot_title (str): o título da figura
+            log_correction (bool, optional): usar uma correção logarítmica. Default a False.
+        """
+        for i, (channel, name) in enumerate(zip(channels, ("Canal Y", "Canal Cb", "Canal Cr"))):
+            show_img(
+                channel, self.map_gr, fig_number=fig_number, name=name,
+                sub_plot_config=(2,2,i+1), plot_title=plot_title, log_correction=log_correction
+            )
+
+    def _rgb(self, image: ndarray):
+        self.image = image
+
+        image_r, image_g, image_b = separate_channels(image)
+
+        map_r = create_colormap((0,0,0), (1,0,0), "red")
+        map_g = create_colormap((0,0,0), (0,1,0), "green")
+        map_b = create_colormap((0,0,0), (0,0,1), "blue")
+
+        show_img(image_r, map_r, fig_number=1, name="Canal vermelho", sub_plot_config=(2,2,1), plot_title="Conversão para RGB")
+        show_img(image_g, map_g, fig_number=1, name="Canal verde", sub_plot_config=(2,2,2), plot_title="Conversão para RGB")
+        show_img(image_b, map_b, fig_number=1, name="Canal azul", sub_plot_config=(2,2,3), plot_title="Conversão para RGB")
+
+    def _ycbcr(self, channels: tuple):
+        self._show_channels(channels, 2, "Conversão para YCbCr")
+
+    def _downsample(self, channels: tuple):
+        self.resized = channels
+        self._show_channels(channels, 3, f"Downsampling {self.downsampling}")
+
+        # DCT do canal inteiro e em blocos 64x64 (só para visualização)
+        self._show_channels(calculate_dct(*channels), 4, "DCT", True)
+        self._show_channels(calculate_dct(*channels, 64), 6, "DCT 64x64", True)
+
+    def _dct(self, channels: tuple):
+        self._show_channels(channels, 5, "DCT 8x8", True)
+
+    def _quantize(self, channels: tuple):
+        # primeiro print
+        print(f"YQ {channels[0][8:16,8:16]}")
+
+        self._show_channels(channels, 7, "Quantização 8x8", True)
+
+    def _dpcm(self, channels: tuple):
+        self._show_channels(channels, 8, "Codificação DCPM", True)
+
+        # segundo print
+        print(f"Y DCPM {channels[0][8:16,8:16]}")
+
+    def _entropy(self, data: tuple):
+        encoded, elapsed = data
+        image = self.image
+        resized_bytes = sum(channel.nbytes for channel in self.resized)
+
+        # Taxa de compressao
+        print(f"Taxa de compressão após downsampling {self.downsampling}: {round((1 - ceil(resized_bytes / 1024) / ceil(image.nbytes / 1024)) * 100, 1)}%")
+        print(f"Imagem original: {ceil(image.nbytes / 1024)}KB")
+        print(f"Imagem com 422: {ceil(resized_bytes / 1024)}KB")
+        print(f"Imagem codificada: {ceil(len(encoded) / 1024)}KB ({round((1 - len(encoded) / image.nbytes) * 100, 1)}% de compressão)")
+        print(f"Bits por pixel: {len(encoded) * 8 / (image.shape[0] * image.shape[1]):.3f}")
+        print(f"Débito da codificação entrópica: {image.nbytes / 2**20 / elapsed:.1f} MB/s")
+
+        show_img(image, fig_number=9, plot_title="Imagem Original", sub_plot_config=(1,1,1))
+
+
+def show_reconstruction(imagem_original: ndarray, imagem_reconstruida: ndarray):
+    """Mostra a imagem reconstruída e as diferenças (no canal Y) para a original
+
+    Args:
+        imagem_original (ndarray): a imagem original
+        imagem_reconstruida (ndarray): a imagem reconstruida
+    """
+
+    imagem_original_com_padding,_,_ = add_padding(imagem_original, 32)
+    imagem_reconstruida_com_padding,_,_ = add_padding(imagem_reconstruida, 32)
+
+    imagem_O = converter_to_ycbcr(imagem_original_com_padding)
+    imagem_R = converter_to_ycbcr(imagem_reconstruida_com_padding)
+
+    differences = abs(imagem_O[0].astype(float32) - imagem_R[0])
+
+    # quarto print
+    print(f"Média de diferenças: {mean(differences)}")
+
+    show_img(
+        imagem_reconstruida,
+        fig_number=11,
+        sub_plot_config=(1,1,1),
+        plot_title="Imagem Reconstruída"
+    )
+
+    show_img(
+        differences,
+        create_colormap((0,0,0), (1,1,1)),
+        fig_number=12,
+        sub_plot_config=(1,1,1),
+        plot_title="Diferenças Original-Reconstruído"
+    )
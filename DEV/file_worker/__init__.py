@@ -5,8 +5,16 @@ de configuração
 # file_parser
 from .file_reader import read_config, load_grammar, load_q_matrix
 
-# lex_analysis
-from .analysis import lex, synt, semantic
-
 # token
 from .stoken import Token
+
+
+def __getattr__(name: str):
+    """Carrega a análise do ficheiro de configuração só quando é usada, já que
+    depende do codec e do matplotlib (o codec só precisa do file_reader)
+    """
+    if name in ("lex", "synt", "semantic"):
+        from . import analysis
+        return getattr(analysis, name)
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
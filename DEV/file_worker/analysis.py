@@ -7,21 +7,15 @@ from re import finditer, split, sub
 
 from matplotlib.pyplot import show
 
-from codec import decode
+from codec import decode, is_jpeg, read_jpeg, decode_jpeg, jpeg_stage
 
-from imgtools import read_bmp
-from imgtools import separate_channels
 from imgtools import show_img
-from imgtools import converter_to_ycbcr
-from imgtools import add_padding
 from imgtools import create_colormap
-from imgtools import down_sample
-from imgtools import calculate_dct
-from imgtools import quantize
-from imgtools import dpcm_encoder
+
+from pipeline import StageCache, StageGraph, DEFAULT_BUDGET
+from pipeline import DiskCache, DEFAULT_DISK_BUDGET
 
 from .stoken import Token
-from .file_reader import load_q_matrix
 
 
 def lex(buffer: str) -> List[Token]:
@@ -237,16 +231,30 @@ def synt(buffer: List[Token], productions: dict) -> bool:
     return False
 
 
-def semantic(buffer: List[Token]):
-    """Faz a análise semântica dos tokens fornecidos
+def semantic(
+    buffer: List[Token],
+    cache_budget: int = DEFAULT_BUDGET,
+    cache_dir: str = None,
+    cache_dir_budget: int = DEFAULT_DISK_BUDGET
+):
+    """Faz a análise semântica dos tokens fornecidos\n
+    Os resultados intermédios das fases são partilhados por todos os
+    comandos da sessão através de uma cache LRU e, caso seja dada uma pasta,
+    entre execuções através de uma cache em disco
 
     Args:
         buffer (List[Token]): a lista de tokens depois da análise sintática
+        cache_budget (int, optional): o orçamento de memória da cache em bytes. Default a DEFAULT_BUDGET.
+        cache_dir (str, optional): a pasta da cache em disco. Default a None (sem cache em disco).
+        cache_dir_budget (int, optional): o orçamento da cache em disco em bytes. Default a DEFAULT_DISK_BUDGET.
     """
 
     # juntar os comandos em blocos
     blocks = create_blocks(buffer)
 
+    disk = None if cache_dir is None else DiskCache(cache_dir, cache_dir_budget)
+    cache = StageCache(cache_budget, disk)
+
     temp_encoded_img = None
 
     # interpretar comandos
@@ -269,7 +277,8 @@ def semantic(buffer: List[Token]):
                 block[1:],
                 plot_title,
                 plot_size,
-                i+1
+                i+1,
+                cache
             )
 
             if temp_encoded_img is None:
@@ -283,6 +292,8 @@ def semantic(buffer: List[Token]):
             decoded_image,
             plot_title="Decoded Image"
         )
+
+    print(cache.summary())
             
     # mostrar todos os plots
     show()
@@ -327,26 +338,42 @@ def create_blocks(buffer: List[Token]) -> List[List]:
 
 
 
-def semantic_plot(block: list, plot_title: str, plot_size: tuple, figure_identifier: int):
-    """Interpreta os comandos num bloco "PLOT"
+def semantic_plot(block: list, plot_title: str, plot_size: tuple, figure_identifier: int, cache: StageCache = None):
+    """Interpreta os comandos num bloco "PLOT"\n
+    Cada comando é traduzido num pedido ao grafo das fases (a imagem seguida
+    das fases pedidas), pelo que só é calculado o canal mostrado e os prefixos
+    comuns a vários comandos só são calculados uma vez
 
     Args:
         block (list): a lista de comandos do bloco PLOT
         plot_title (str): o titulo do plot
         plot_size (tuple): a configuração de disposição dos plots
         figure_identifier (int): o identificador da figura
+        cache (StageCache, optional): a cache das fases. Default a None (uma cache só para o bloco).
     """
 
-    separated_image = None
+    graph = StageGraph(StageCache() if cache is None else cache)
+
+    # os canais separados: a chave da separação e as fases aplicadas a cada canal
+    separated = None
     command = None
     log_correction = False
 
     # iterar pelos comandos do bloco
     for j, command in enumerate(block):
 
-        # ler a imagem
-        image = read_bmp(command["IMAGE"])
-        if image is None:
+        # ler a imagem (os ficheiros JPEG são lidos ao nível dos coeficientes)
+        jpeg = None
+        if is_jpeg(command["IMAGE"]):
+            jpeg = read_jpeg(command["IMAGE"])
+            if jpeg is None:
+                return
+
+            image_key = graph.source(decode_jpeg(jpeg))
+        else:
+            image_key = graph.read(command["IMAGE"])
+
+        if image_key is None:
             return
 
         # extrair o canal
@@ -368,9 +395,8 @@ def semantic_plot(block: list, plot_title: str, plot_size: tuple, figure_identif
 
         # adicionar padding à imagem
         if "PADDING" in command:
-            image, o_width, o_height = add_padding(
-                image, command["PADDING"]
-            )
+            o_width, o_height = graph.get(image_key).shape[:2]
+            image_key += (graph.stage("padding", command["PADDING"]),)
 
         # extrair nome do subplot
         name = command["NAME"] if "NAME" in command else None
@@ -381,9 +407,9 @@ def semantic_plot(block: list, plot_title: str, plot_size: tuple, figure_identif
             print("Color channel must be selected if RGB color mode is selected")
             return
 
-        # colormode YCbCr
-        if "RGB" in command:
-            separated_image = separate_channels(image)
+        # colormode RGB
+        if "RGB" in command and jpeg is None:
+            separated = (image_key + (graph.stage("rgb"),), ())
 
 
         # extrair o colormap e ter em conta erros
@@ -397,8 +423,8 @@ def semantic_plot(block: list, plot_title: str, plot_size: tuple, figure_identif
             return
 
         # colormode YCbCr
-        if "YCC" in command:
-            separated_image = converter_to_ycbcr(image)
+        if "YCC" in command and jpeg is None:
+            separated = (image_key + (graph.stage("ycbcr"),), ())
 
 
         # extrair a subsampling string e ter em conta erros
@@ -406,37 +432,21 @@ def semantic_plot(block: list, plot_title: str, plot_size: tuple, figure_identif
             print("Color channel must be selected if downsampling is selected")
             return
 
-        # subamostragem
-        if "SUBSAMPLE" in command:
-
-            # caso a imagem ainda não esteja separada
-            if separated_image is None:
-                separated_image = separate_channels(image)
+        # caso a imagem ainda não esteja separada
+        if separated is None and jpeg is None and any(key in command for key in ("SUBSAMPLE", "DCT", "QUANTIZE", "DPCM")):
+            separated = (image_key + (graph.stage("rgb"),), ())
 
-            separated_image = down_sample(
-                separated_image[0],
-                separated_image[1],
-                separated_image[2],
-                command["SUBSAMPLE"]
-            )
+        # subamostragem
+        if "SUBSAMPLE" in command and jpeg is None:
+            separated = (separated[0], separated[1] + (graph.stage("downsample", command["SUBSAMPLE"]),))
 
         # extrair o numero de blocos da dct
         if "DCT" in command and channel is None:
             print("Color channel must be selected if downsampling is selected")
             return
 
-        if "DCT" in command:
-
-            # caso a imagem ainda não esteja separada
-            if separated_image is None:
-                separated_image = separate_channels(image)
-
-            separated_image = calculate_dct(
-                separated_image[0],
-                separated_image[1],
-                separated_image[2],
-                command["DCT"]
-            )
+        if "DCT" in command and jpeg is None:
+            separated = (separated[0], separated[1] + (graph.stage("dct", command["DCT"]),))
             log_correction = True
 
         # quantizar a imagem e prevenir erros de não ter canal selecionado
@@ -444,25 +454,13 @@ def semantic_plot(block: list, plot_title: str, plot_size: tuple, figure_identif
             print("Color channel must be selected if quantization technique is selected")
             return
 
-        if "QUANTIZE" in command:
-
-            # caso a imagem ainda não esteja separada
-            if separated_image is None:
-                separated_image = separate_channels(image)
-
-            q_matrix_y = load_q_matrix("q_matrix_y.csv")
-            q_matrix_cbcr = load_q_matrix("q_matrix_cbcr.csv")
+        if "QUANTIZE" in command and jpeg is None:
 
             if command["QUANTIZE"] > 100 or command["QUANTIZE"] < 0:
                 print("Quality factor must be a percentage value")
                 return
 
-
-            separated_image = (
-                quantize(separated_image[0], q_matrix_y, command["QUANTIZE"]),
-                quantize(separated_image[1], q_matrix_cbcr, command["QUANTIZE"]),
-                quantize(separated_image[2], q_matrix_cbcr, command["QUANTIZE"])
-            )
+            separated = (separated[0], separated[1] + (graph.stage("quantize", command["QUANTIZE"]),))
             log_correction = True
 
 
@@ -471,26 +469,29 @@ def semantic_plot(block: list, plot_title: str, plot_size: tuple, figure_identif
             print("Color channel must be selected if DPCM encoding is selected")
             return
 
-        if "DPCM" in command:
+        if "DPCM" in command and jpeg is None:
+            separated = (separated[0], separated[1] + (graph.stage("dpcm"),))
+            log_correction = True
 
-            # caso a imagem ainda não esteja separada
-            if separated_image is None:
-                separated_image = separate_channels(image)
 
-            # CHAMADA DA FUNCAO
-            separated_image = (
-                dpcm_encoder(separated_image[0]),
-                dpcm_encoder(separated_image[1]),
-                dpcm_encoder(separated_image[2])
-            )
-            log_correction = True
 
 
+        # ficheiros JPEG: as fases vêm dos coeficientes do ficheiro, com as
+        # tabelas de quantização e a subamostragem do próprio ficheiro
+        if jpeg is not None and channel is not None:
+            stage = "ycbcr" if "YCC" in command else "rgb"
+            for key, key_stage in (("DCT", "dct"), ("QUANTIZE", "quantize"), ("DPCM", "dpcm")):
+                if key in command:
+                    stage = key_stage
 
+            separated = (graph.source(jpeg_stage(jpeg, stage), image_key + (("jpeg", stage),)), ())
+            log_correction = stage in ("dct", "quantize", "dpcm")
 
-        # mostrar a imagem
-        if separated_image is not None:
-            image = separated_image[channel]
+        # mostrar a imagem (só é calculado o canal mostrado)
+        if separated is not None and channel is not None:
+            image = graph.get(separated[0] + (("channel", channel),) + separated[1])
+        else:
+            image = graph.get(image_key)
 
         show_img(
             image,
@@ -503,7 +504,7 @@ def semantic_plot(block: list, plot_title: str, plot_size: tuple, figure_identif
         )
 
     # caso tenham sido aplicados niveis de encoding na image
-    if command is not None and "YCC" in command and "SUBSAMPLE" in command and "PADDING" in command and "DCT" in command and "QUANTIZE" in command and "DPCM" in command:
-        return separated_image, o_width, o_height, command["QUANTIZE"]
+    if command is not None and jpeg is None and "YCC" in command and "SUBSAMPLE" in command and "PADDING" in command and "DCT" in command and "QUANTIZE" in command and "DPCM" in command:
+        return tuple(graph.get_many(graph.channels(separated[0], *separated[1]))), o_width, o_height, command["QUANTIZE"]
 
     return None
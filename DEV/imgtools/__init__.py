@@ -2,22 +2,33 @@
 """
 
 # reader
-from .reader import read_bmp
+from .reader import read_bmp, read_bmp_header, read_bmp_strips, map_bmp, BmpHeader
 
 # color
 from .color import create_colormap, separate_channels, join_channels, converter_to_rgb, converter_to_ycbcr
 
 # extender
-from .extender import add_padding, restore_padding, down_sample, up_sample
-
-# viewer
-from .viewer import show_img
+from .extender import add_padding, restore_padding, down_sample, down_sample_channel, up_sample
 
 # dct
-from .dct import calculate_dct, calculate_inv_dct
+from .dct import calculate_dct, calculate_channel_dct, calculate_inv_dct, calculate_channel_inv_dct, DCT_METHODS
+from .dct import DCT_BACKENDS, register_dct_backend, set_dct_backend, get_dct_backend, select_dct_backend
+from .dct import calculate_channel_sparse_inv_dct, block_classes, IDCT_CLASSES
 
 # quantization
-from .quantization import quantize, inv_quantize
+from .quantization import quantize, inv_quantize, scale_q_matrix, aan_q_matrix, aan_inv_q_matrix
+from .quantization import quantize_many, inv_quantize_many, bisect_quality
 
 # dpcm
 from .dcpm import dpcm_encoder, dpcm_decoder
+
+
+def __getattr__(name: str):
+    """Carrega o viewer só quando é usado, para que o codec possa ser
+    importado sem o matplotlib
+    """
+    if name == "show_img":
+        from .viewer import show_img
+        return show_img
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
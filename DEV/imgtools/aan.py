@@ -0,0 +1,197 @@
+"""Contém a DCT rápida em vírgula fixa de Arai, Agui e Nakajima (AAN)
+para blocos 8x8, tal como no libjpeg (jfdctfst.c e jidctfst.c)
+
+Os coeficientes calculados estão multiplicados por 2^DCT_SCALE_BITS * 8 * AAN_MATRIX[u, v]
+(a escala da transformada), que é compensada nas matrizes de quantização
+(ver imgtools.quantization.aan_q_matrix e aan_inv_q_matrix)
+"""
+
+from math import cos, pi, sqrt
+from typing import List
+
+from numpy import ndarray, array, outer, stack, ascontiguousarray, int64
+
+
+# bits da parte fracionária das constantes das multiplicações
+CONST_BITS = 13
+
+# bits da parte fracionária das amostras de entrada da DCT (precisão das passagens)
+DCT_SCALE_BITS = 6
+
+# bits da parte fracionária dos coeficientes de entrada da inversa
+IDCT_SCALE_BITS = 8
+
+# fatores de escala da transformada: 1 e cos(k * pi / 16) * sqrt(2)
+AAN_SCALES = array([1.0] + [cos(k * pi / 16) * sqrt(2) for k in range(1, 8)])
+AAN_MATRIX = outer(AAN_SCALES, AAN_SCALES)
+
+
+def _fix(value: float) -> int:
+    """Converte uma constante para vírgula fixa
+
+    Args:
+        value (float): a constante
+
+    Returns:
+        int: a constante multiplicada por 2^CONST_BITS
+    """
+    return int(round(value * (1 << CONST_BITS)))
+
+
+FIX_0_382683433 = _fix(0.382683433)
+FIX_0_541196100 = _fix(0.541196100)
+FIX_0_707106781 = _fix(0.707106781)
+FIX_1_306562965 = _fix(1.306562965)
+FIX_1_082392200 = _fix(1.082392200)
+FIX_1_414213562 = _fix(1.414213562)
+FIX_1_847759065 = _fix(1.847759065)
+FIX_2_613125930 = _fix(2.613125930)
+
+
+def _multiply(values: ndarray, constant: int) -> ndarray:
+    """Multiplica por uma constante em vírgula fixa, com arredondamento
+
+    Args:
+        values (ndarray): os valores inteiros
+        constant (int): a constante em vírgula fixa
+
+    Returns:
+        ndarray: o produto inteiro
+    """
+    return (values * constant + (1 << (CONST_BITS - 1))) >> CONST_BITS
+
+
+def _forward_pass(d: List[ndarray]) -> List[ndarray]:
+    """Uma passagem 1D da DCT AAN sobre os 8 elementos de todos os blocos
+
+    Args:
+        d (List[ndarray]): os 8 elementos de entrada
+
+    Returns:
+        List[ndarray]: os 8 coeficientes (escalados)
+    """
+
+    tmp0, tmp7 = d[0] + d[7], d[0] - d[7]
+    tmp1, tmp6 = d[1] + d[6], d[1] - d[6]
+    tmp2, tmp5 = d[2] + d[5], d[2] - d[5]
+    tmp3, tmp4 = d[3] + d[4], d[3] - d[4]
+
+    # parte par
+    tmp10, tmp13 = tmp0 + tmp3, tmp0 - tmp3
+    tmp11, tmp12 = tmp1 + tmp2, tmp1 - tmp2
+
+    z1 = _multiply(tmp12 + tmp13, FIX_0_707106781)
+
+    out = [None] * 8
+    out[0], out[4] = tmp10 + tmp11, tmp10 - tmp11
+    out[2], out[6] = tmp13 + z1, tmp13 - z1
+
+    # parte ímpar
+    tmp10 = tmp4 + tmp5
+    tmp11 = tmp5 + tmp6
+    tmp12 = tmp6 + tmp7
+
+    z5 = _multiply(tmp10 - tmp12, FIX_0_382683433)
+    z2 = _multiply(tmp10, FIX_0_541196100) + z5
+    z4 = _multiply(tmp12, FIX_1_306562965) + z5
+    z3 = _multiply(tmp11, FIX_0_707106781)
+
+    z11, z13 = tmp7 + z3, tmp7 - z3
+
+    out[5], out[3] = z13 + z2, z13 - z2
+    out[1], out[7] = z11 + z4, z11 - z4
+
+    return out
+
+
+def _inverse_pass(d: List[ndarray]) -> List[ndarray]:
+    """Uma passagem 1D da inversa da DCT AAN sobre os 8 coeficientes de todos os blocos
+
+    Args:
+        d (List[ndarray]): os 8 coeficientes (escalados)
+
+    Returns:
+        List[ndarray]: os 8 elementos
+    """
+
+    # parte par
+    tmp10, tmp11 = d[0] + d[4], d[0] - d[4]
+    tmp13 = d[2] + d[6]
+    tmp12 = _multiply(d[2] - d[6], FIX_1_414213562) - tmp13
+
+    tmp0, tmp3 = tmp10 + tmp13, tmp10 - tmp13
+    tmp1, tmp2 = tmp11 + tmp12, tmp11 - tmp12
+
+    # parte ímpar
+    z13, z10 = d[5] + d[3], d[5] - d[3]
+    z11, z12 = d[1] + d[7], d[1] - d[7]
+
+    tmp7 = z11 + z13
+    tmp11 = _multiply(z11 - z13, FIX_1_414213562)
+
+    z5 = _multiply(z10 + z12, FIX_1_847759065)
+    tmp10 = _multiply(z12, FIX_1_082392200) - z5
+    tmp12 = _multiply(z10, -FIX_2_613125930) + z5
+
+    tmp6 = tmp12 - tmp7
+    tmp5 = tmp11 - tmp6
+    tmp4 = tmp10 + tmp5
+
+    return [
+        tmp0 + tmp7, tmp1 + tmp6, tmp2 + tmp5, tmp3 - tmp4,
+        tmp3 + tmp4, tmp2 - tmp5, tmp1 - tmp6, tmp0 - tmp7,
+    ]
+
+
+def _separable(blocks: ndarray, one_pass) -> ndarray:
+    """Aplica uma passagem 1D às linhas e depois às colunas de todos os blocos\n
+    Os blocos estão em formato planar (8, 8, ...), pelo que cada elemento
+    de todos os blocos é um array contíguo
+
+    Args:
+        blocks (ndarray): os blocos (8, 8, ...)
+        one_pass (Callable): a passagem 1D
+
+    Returns:
+        ndarray: os blocos transformados (8, 8, ...) em int64
+    """
+
+    blocks = ascontiguousarray(blocks, dtype=int64)
+
+    rows = stack(one_pass([blocks[:, k] for k in range(8)]), axis=1)
+
+    return stack(one_pass([rows[k] for k in range(8)]))
+
+
+def aan_dct_blocks(blocks: ndarray) -> ndarray:
+    """Calcula a DCT AAN de blocos 8x8 em aritmética inteira\n
+    O resultado é 2^DCT_SCALE_BITS * 8 * AAN_MATRIX * DCT (ortonormal) dos blocos
+
+    Args:
+        blocks (ndarray): os blocos em formato planar (8, 8, ...) com valores inteiros
+
+    Returns:
+        ndarray: os coeficientes escalados (8, 8, ...) em int64
+    """
+    return _separable(blocks.astype(int64) << DCT_SCALE_BITS, _forward_pass)
+
+
+def aan_idct_blocks(blocks: ndarray) -> ndarray:
+    """Calcula a inversa da DCT AAN de blocos 8x8 em aritmética inteira\n
+    Os coeficientes de entrada são os coeficientes da DCT (ortonormal) multiplicados
+    por AAN_MATRIX * 2^IDCT_SCALE_BITS (ver aan_inv_q_matrix)
+
+    Args:
+        blocks (ndarray): os coeficientes escalados em formato planar (8, 8, ...)
+
+    Returns:
+        ndarray: os blocos reconstruídos (8, 8, ...) arredondados em int64
+    """
+
+    shift = IDCT_SCALE_BITS + 3
+    result = _separable(blocks, _inverse_pass)
+
+    result += 1 << (shift - 1)
+    result >>= shift
+
+    return result
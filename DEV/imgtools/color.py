@@ -4,17 +4,43 @@ Contém as funções para a conversão entre modelo RGB e YCbCr
 e vice-versa
 """
 
-from typing import Tuple
+from typing import Tuple, TYPE_CHECKING
 
-from matplotlib.colors import LinearSegmentedColormap
-from numpy import ndarray, zeros, array, linalg, round as npround, uint8, float32
+from numpy import ndarray, zeros, empty, array, linalg, matmul, clip, rint, right_shift
+from numpy import round as npround, uint8, int64, float32, float64
+
+if TYPE_CHECKING:
+    from matplotlib.colors import LinearSegmentedColormap
+
+
+# matriz que transforma RGB em YCbCr e a sua inversa (calculada uma só vez)
+YCBCR_MATRIX = array(
+    [
+        [0.299, 0.587, 0.114],
+        [-0.168736, -0.331264, 0.5],
+        [0.5, -0.418688, -0.081312],
+    ]
+)
+RGB_MATRIX = linalg.inv(YCBCR_MATRIX)
+
+# deslocamento das componentes cromáticas
+CHROMA_OFFSET = array([0, 128, 128])
+
+# precisões do cálculo: vírgula flutuante ou vírgula fixa com inteiros (como no libjpeg)
+PRECISIONS = {"float64": float64, "float32": float32, "fixed": int64}
+
+# bits da parte fracionária dos coeficientes em vírgula fixa
+FIXED_BITS = 16
+
+# número de pixeis convertidos de cada vez (limita a memória dos buffers intermédios)
+CHUNK_PIXELS = 1 << 16
 
 def create_colormap(
         first_color: Tuple[float, float, float],
         second_color: Tuple[float, float, float],
         name:str = "colormap",
         rgb_quantization: int = 256,
-    ) -> LinearSegmentedColormap:
+    ) -> "LinearSegmentedColormap":
 
     """Cria um colorido de segmento linear com os valores de cores RGB fornecidos\n
     o mapa de cor será nomeado com o nome dado
@@ -29,6 +55,9 @@ def create_colormap(
         LinearSegmentedColormap: Um objeto LinearSegmentedColormap ou None se ocorrer um erro
     """
 
+    # o matplotlib só é importado quando é criado um colormap
+    from matplotlib.colors import LinearSegmentedColormap
+
     # try to create a colormap
     try:
         cmap = LinearSegmentedColormap.from_list(
@@ -115,109 +144,124 @@ def join_channels(ch1: ndarray, ch2: ndarray, ch3: ndarray) -> ndarray:
     return img
 
 
-
-def converter_to_ycbcr(img: ndarray) -> Tuple[ndarray, ndarray, ndarray]:
-    """Converte uma imagem no modelo RGB para o modelo YCbCr
-    \n
-    As componentes serão valores de vírgula flutuante
+def _convert(
+    planes: Tuple[ndarray, ndarray, ndarray],
+    matrix: ndarray,
+    offset_in: ndarray,
+    offset_out: ndarray,
+    precision: str,
+    out: ndarray,
+) -> Tuple[ndarray, ndarray, ndarray]:
+    """Aplica uma transformação de cor a três planos com um produto matricial\n
+    Os pixeis são convertidos por partes em dois buffers reutilizados, pelo que
+    a memória intermédia não depende do tamanho da imagem, e cada parte é
+    arredondada, limitada a [0, 255] e escrita diretamente no plano de saída
 
     Args:
-        img (ndarray): a matriz da imagem
+        planes (Tuple[ndarray, ndarray, ndarray]): os planos de entrada
+        matrix (ndarray): a matriz da transformação (3x3)
+        offset_in (ndarray): o deslocamento subtraído a cada plano de entrada
+        offset_out (ndarray): o deslocamento somado a cada plano de saída
+        precision (str): a precisão do cálculo {float64, float32, fixed}
+        out (ndarray): os planos de saída (3, linhas, colunas) em uint8 ou None
 
     Returns:
-        Tuple[ndarray, ndarray, ndarray]: a componente luma (Y),
-        e as componentes cromáticas (Cb, Cr)
+        Tuple[ndarray, ndarray, ndarray]: os três planos convertidos
+        ou None caso ocorra um erro
     """
 
-    # array that transforms RGB into YCbCr
-    T = array(
-        [
-            [0.299, 0.587, 0.114],
-            [-0.168736, -0.331264, 0.5],
-            [0.5, -0.418688, -0.081312],
-        ]
-    )
+    if precision not in PRECISIONS:
+        print(f"Unknown precision '{precision}' (choose from {', '.join(PRECISIONS)})")
+        return
 
-    # different channels from RGB image
-    R = img[:,:,0]
-    G = img[:,:,1]
-    B = img[:,:,2]
+    rows, cols = planes[0].shape[:2]
 
-    # calculate Y matrix 
-    Y = T[0,0] * R + T[0,1] * G + T[0,2] * B
+    if any(plane.shape != (rows, cols) for plane in planes):
+        print("Given channels have different shapes")
+        return
 
-    # calculate the chromatic parts of the model
-    Cb = (T[1,0] * R + T[1,1] * G + T[1,2] * B) + 128
-    Cr = (T[2,0] * R + T[2,1] * G + T[2,2] * B) + 128
+    if out is None:
+        out = empty((3, rows, cols), dtype=uint8)
 
-    # round everthing to int type
-    Y = npround(Y).astype(uint8)
-    Cb = npround(Cb).astype(uint8)
-    Cr = npround(Cr).astype(uint8)
+    elif out.shape != (3, rows, cols) or out.dtype != uint8:
+        print("Output buffer must be a uint8 array with shape (3, rows, cols)")
+        return
 
+    dtype = PRECISIONS[precision]
+    fixed = precision == "fixed"
 
-    Y[Y > 255] = 255
-    Y[Y < 0] = 0
-    Cb[Cb > 255] = 255
-    Cb[Cb < 0] = 0
-    Cr[Cr > 255] = 255
-    Cr[Cr < 0] = 0
+    # coeficientes escalados por 2^FIXED_BITS, com metade de uma unidade para arredondar no deslocamento
+    if fixed:
+        matrix = npround(matrix * (1 << FIXED_BITS)).astype(int64)
+        offset_out = (offset_out.astype(int64) << FIXED_BITS) + (1 << (FIXED_BITS - 1))
 
-    return Y, Cb, Cr
+    matrix = matrix.astype(dtype)
+    offset_in = offset_in.astype(dtype)[:, None]
+    offset_out = offset_out.astype(dtype)[:, None]
 
+    step = max(1, CHUNK_PIXELS // max(cols, 1))
+    source = empty((3, min(step, rows) * cols), dtype=dtype)
+    result = empty(source.shape, dtype=dtype)
 
-def converter_to_rgb(Y: ndarray, Cb: ndarray, Cr: ndarray) -> Tuple[ndarray, ndarray, ndarray]:
-    """Converte uma imagem no modelo YCbCr para o modelo RGB
-    \n
-    As compontentes convertidas estarão no intervalo [0,1]
+    for top in range(0, rows, step):
+        count = min(step, rows - top)
+        chunk = source[:, :count * cols]
+        converted = result[:, :count * cols]
 
-    Args:
-        Y (ndarray): a componente luma 
-        Cb (ndarray): a componente cromática (variação de azul relativamente à luma)
-        Cr (ndarray): a componente cromática (variação de vermelho relativamente à luma)
+        for index, plane in enumerate(planes):
+            plane = plane[top:top + count]
+            chunk[index].reshape(count, cols)[...] = rint(plane) if fixed and plane.dtype.kind == "f" else plane
 
-    Returns:
-        Tuple[ndarray, ndarray, ndarray]: o canal Red, o canal Green, o canal Blue
-    """
+        chunk -= offset_in
+        matmul(matrix, chunk, out=converted)
+        converted += offset_out
 
-    # array that transforms RGB into YCbCr
-    T = array(
-        [
-            [0.299, 0.587, 0.114],
-            [-0.168736, -0.331264, 0.5],
-            [0.5, -0.418688, -0.081312],
-        ]
-    )
+        if fixed:
+            right_shift(converted, FIXED_BITS, out=converted)
+        else:
+            npround(converted, out=converted)
 
-    # calculate inverse matrix from T
-    T_inverse = linalg.inv(T)
+        clip(converted, 0, 255, out=converted)
+        out[:, top:top + count] = converted.reshape(3, count, cols)
 
-    Y  = Y.astype(float32)
-    Cb = Cb.astype(float32)
-    Cr = Cr.astype(float32)
+    return out[0], out[1], out[2]
 
-    # calculate the different channels R,G,B
-    R = T_inverse[0,0]*Y + T_inverse[0,1]*(Cb-128) + T_inverse[0,2]*(Cr-128)
-    G = T_inverse[1,0]*Y + T_inverse[1,1]*(Cb-128) + T_inverse[1,2]*(Cr-128)
-    B = T_inverse[2,0]*Y + T_inverse[2,1]*(Cb-128) + T_inverse[2,2]*(Cr-128)
 
+def converter_to_ycbcr(img: ndarray, precision: str = "float64", out: ndarray = None) -> Tuple[ndarray, ndarray, ndarray]:
+    """Converte uma imagem no modelo RGB para o modelo YCbCr
+    \n
+    As componentes são arredondadas e limitadas ao intervalo [0, 255] (uint8)
 
-    # make sure everything is in the [0,255] range
-    # R *= 255
-    # G *= 255
-    # B *= 255
+    Args:
+        img (ndarray): a matriz da imagem
+        precision (str, optional): a precisão do cálculo {float64, float32, fixed}. Default a "float64".
+        out (ndarray, optional): os planos de saída (3, linhas, colunas) em uint8. Default a None.
+
+    Returns:
+        Tuple[ndarray, ndarray, ndarray]: a componente luma (Y),
+        e as componentes cromáticas (Cb, Cr) ou None caso ocorra um erro
+    """
+    return _convert(
+        (img[:, :, 0], img[:, :, 1], img[:, :, 2]), YCBCR_MATRIX, zeros(3), CHROMA_OFFSET, precision, out
+    )
 
-    R[R > 255] = 255
-    R[R < 0] = 0
-    G[G > 255] = 255
-    G[G < 0] = 0
-    B[B > 255] = 255
-    B[B < 0] = 0
 
-    # round everthing to int type
-    R = npround(R).astype(uint8)
-    G = npround(G).astype(uint8)
-    B = npround(B).astype(uint8)
+def converter_to_rgb(
+    Y: ndarray, Cb: ndarray, Cr: ndarray, precision: str = "float64", out: ndarray = None
+) -> Tuple[ndarray, ndarray, ndarray]:
+    """Converte uma imagem no modelo YCbCr para o modelo RGB
+    \n
+    As componentes são arredondadas e limitadas ao intervalo [0, 255] (uint8)
 
-    return R, G, B
+    Args:
+        Y (ndarray): a componente luma
+        Cb (ndarray): a componente cromática (variação de azul relativamente à luma)
+        Cr (ndarray): a componente cromática (variação de vermelho relativamente à luma)
+        precision (str, optional): a precisão do cálculo {float64, float32, fixed}. Default a "float64".
+        out (ndarray, optional): os planos de saída (3, linhas, colunas) em uint8. Default a None.
 
+    Returns:
+        Tuple[ndarray, ndarray, ndarray]: o canal Red, o canal Green, o canal Blue
+        ou None caso ocorra um erro
+    """
+    return _convert((Y, Cb, Cr), RGB_MATRIX, CHROMA_OFFSET, zeros(3), precision, out)
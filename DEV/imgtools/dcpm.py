@@ -1,10 +1,35 @@
 """Contém funções para codificar imagens usando codificação diferencial DPCM
 """
 
-from numpy import ndarray, array
+from numpy import ndarray, array, cumsum
+
+
+def _check_shape(channel: ndarray) -> bool:
+    """Verifica se o canal é bidimensional e tem dimensões multiplas de 8
+
+    Args:
+        channel (ndarray): o canal
+
+    Returns:
+        bool: True se o formato for válido
+    """
+
+    if len(channel.shape) != 2:
+        print("Matrix must be 2 dimentional")
+        return False
+
+    if channel.shape[0] % 8 != 0 or channel.shape[1] % 8 != 0:
+        print("Matrix shape must be multiple of 8")
+        return False
+
+    return True
+
 
 def dpcm_encoder(channel: ndarray) -> ndarray:
-    """Codifica os coeficientes DC do canal fornecido
+    """Codifica os coeficientes DC do canal fornecido\n
+    Cada coeficiente DC passa a ser a diferença para o DC do bloco anterior
+    na mesma linha de blocos. O primeiro bloco de cada linha é codificado
+    relativamente à amostra da coluna shape[1] - 9 da linha de blocos anterior
 
     Args:
         channel (ndarray): o canal a ser codificado
@@ -13,25 +38,33 @@ def dpcm_encoder(channel: ndarray) -> ndarray:
         ndarray: o canal codificado
     """
 
+    if not _check_shape(channel):
+        return
+
     aux_channel = array(channel)
 
-    for i in range(aux_channel.shape[0] - 8, -1, -8):
-        for j in range(aux_channel.shape[1] - 8, -1, -8):
+    # reticulado dos coeficientes DC (vista sobre o canal original)
+    dc = channel[::8, ::8]
+    encoded = array(dc)
 
-            if i == 0 and j == 0:
-                break
+    # diferença para o bloco anterior na mesma linha de blocos
+    encoded[:, 1:] = dc[:, 1:] - dc[:, :-1]
 
-            if j != 0:
-                aux_channel[i, j] = aux_channel[i, j] - aux_channel[i, j-8]
-                continue
+    # o primeiro bloco de cada linha usa a amostra da linha de blocos anterior
+    encoded[1:, 0] = dc[1:, 0] - channel[:-8:8, channel.shape[1] - 9]
 
-            aux_channel[i, j] = aux_channel[i, j] - aux_channel[i-8, aux_channel.shape[1] - 9]
+    aux_channel[::8, ::8] = encoded
 
     return aux_channel
 
 
 def dpcm_decoder(channel: ndarray) -> ndarray:
-    """Descodifica os coeficientes DC de um canal previamente codificado
+    """Descodifica os coeficientes DC de um canal previamente codificado\n
+    Os coeficientes são acumulados ao longo de cada linha de blocos. O primeiro
+    bloco de cada linha é somado à amostra da coluna shape[1] - 9 da linha de
+    blocos seguinte e a última linha de blocos não é alterada (tal como na
+    implementação original, para que os dados já codificados continuem a ser
+    descodificados da mesma forma)
 
     Args:
         channel (ndarray): o canal a descodificar
@@ -40,22 +73,23 @@ def dpcm_decoder(channel: ndarray) -> ndarray:
         ndarray: o canal descodificado
     """
 
-    aux_channel = array(channel)
+    if not _check_shape(channel):
+        return
 
+    aux_channel = array(channel)
 
-    for i in range(0 , aux_channel.shape[0], 8):
-        for j in range(0, aux_channel.shape[1], 8):
+    decoded = array(channel[::8, ::8])
+    block_rows = decoded.shape[0]
 
-            if j == 0 and i == 0:
-                continue
+    # a última linha de blocos só é descodificada se for também a primeira
+    last_row = max(block_rows - 1, 1)
 
-            if j != 0:
-                aux_channel[i, j] = aux_channel[i, j] + aux_channel[i, j-8]
-                continue
+    # somar ao primeiro bloco de cada linha a amostra da linha de blocos seguinte
+    decoded[1:last_row, 0] += channel[16::8, channel.shape[1] - 9][:last_row - 1]
 
-            if i + 8 >= aux_channel.shape[0]:
-                break
+    # acumular as diferenças ao longo de cada linha de blocos
+    decoded[:last_row] = cumsum(decoded[:last_row], axis=1, dtype=decoded.dtype)
 
-            aux_channel[i, j] = aux_channel[i, j] + aux_channel[i+8, aux_channel.shape[1] - 9]
+    aux_channel[::8, ::8] = decoded
 
     return aux_channel
@@ -1,15 +1,409 @@
-"""Contém funções relacionadas com a Transformada 
+"""Contém funções relacionadas com a Transformada
 de Coseno Discreta
 """
 
-from typing import Tuple
-from numpy import ndarray, float32, zeros
+from functools import lru_cache
+from timeit import repeat
+from typing import Dict, NamedTuple, Tuple, Callable
 
+from numpy import ndarray, float32, float64, int32, uint8, empty, zeros, rint, arange, cos, sqrt, matmul, pi
+from numpy import bincount, nonzero, where, kron, bitwise_or, count_nonzero
+from numpy.random import default_rng
+
+from scipy import fft
 from scipy.fftpack import dct, idct
 
+from .aan import aan_dct_blocks, aan_idct_blocks, AAN_MATRIX, DCT_SCALE_BITS, IDCT_SCALE_BITS
+
+
+# métodos de cálculo: vírgula flutuante (scipy) ou DCT inteira AAN com a escala
+# compensada na quantização (ver imgtools.aan)
+DCT_METHODS = ("float", "aan")
+
+# classes dos blocos na inversa esparsa: só o DC, coeficientes só nas 4x4 frequências
+# mais baixas e os restantes (ver block_classes)
+IDCT_CLASSES = ("dc", "4x4", "full")
+
+# tamanho da região de baixas frequências da inversa reduzida
+REDUCED_SIZE = 4
+
+# fração de blocos completos a partir da qual a inversa completa de todo o canal
+# é mais rápida do que separar os blocos por classes (ver bench.py sparse_idct)
+FULL_SHARE = 0.2
+
+# a fração de blocos completos é estimada numa linha de blocos em cada SAMPLE_STEP
+SAMPLE_STEP = 4
+
+# linha de 8 coeficientes de um bloco vista como um inteiro de 64 bits (um byte por coeficiente):
+# bytes das REDUCED_SIZE colunas mais baixas, das restantes e das colunas AC baixas da primeira linha
+LOW_COLUMNS = (1 << 8 * REDUCED_SIZE) - 1
+HIGH_COLUMNS = ((1 << 64) - 1) ^ LOW_COLUMNS
+LOW_AC_COLUMNS = LOW_COLUMNS & ~0xFF
+
+
+class DctBackend(NamedTuple):
+    """Um motor de cálculo da DCT 2D ortonormal\n
+    As funções recebem os blocos como um array (linhas/B, B, colunas/B, B)
+    e o número de threads e devolvem os blocos transformados com a mesma shape
+    """
+    forward: Callable
+    inverse: Callable
+    block_sizes: Tuple[int, ...] = None
+
+
+def _fftpack_forward(blocks: ndarray, workers: int) -> ndarray:
+    return dct(dct(blocks, axis=3, norm="ortho"), axis=1, norm="ortho")
+
+
+def _fftpack_inverse(blocks: ndarray, workers: int) -> ndarray:
+    return idct(idct(blocks, axis=3, norm="ortho"), axis=1, norm="ortho")
+
+
+def _fft_forward(blocks: ndarray, workers: int) -> ndarray:
+    return fft.dct(fft.dct(blocks, axis=3, norm="ortho", workers=workers), axis=1, norm="ortho", workers=workers)
+
+
+def _fft_inverse(blocks: ndarray, workers: int) -> ndarray:
+    return fft.idct(fft.idct(blocks, axis=3, norm="ortho", workers=workers), axis=1, norm="ortho", workers=workers)
+
+
+@lru_cache(maxsize=16)
+def dct_basis(size: int) -> ndarray:
+    """Calcula a matriz da DCT-II ortonormal de um tamanho fornecido
+
+    Args:
+        size (int): o tamanho da transformada
+
+    Returns:
+        ndarray: a matriz (size, size) em float64 (só de leitura)
+    """
+
+    k = arange(size)[:, None]
+    n = arange(size)[None, :]
+
+    basis = cos(pi * (2 * n + 1) * k / (2 * size)) * sqrt(2 / size)
+    basis[0] /= sqrt(2)
+
+    basis.setflags(write=False)
+
+    return basis
+
+
+def _matmul_forward(blocks: ndarray, workers: int) -> ndarray:
+    # (linhas/B, colunas/B, B, B): C @ bloco @ C^T para todos os blocos
+    grouped = blocks.transpose(0, 2, 1, 3).astype(float64)
+    return matmul(matmul(dct_basis(blocks.shape[1]), grouped), dct_basis(blocks.shape[3]).T).transpose(0, 2, 1, 3)
+
+
+def _matmul_inverse(blocks: ndarray, workers: int) -> ndarray:
+    # C^T @ bloco @ C para todos os blocos
+    grouped = blocks.transpose(0, 2, 1, 3).astype(float64)
+    return matmul(matmul(dct_basis(blocks.shape[1]).T, grouped), dct_basis(blocks.shape[3])).transpose(0, 2, 1, 3)
+
+
+def _fixed_forward(blocks: ndarray, workers: int) -> ndarray:
+    # DCT AAN em formato planar (8, 8, linhas/8, colunas/8) e remoção da escala da transformada
+    planar = aan_dct_blocks(rint(blocks).transpose(1, 3, 0, 2))
+    return (planar / (AAN_MATRIX * (8 << DCT_SCALE_BITS))[:, :, None, None]).transpose(2, 0, 3, 1)
+
+
+def _fixed_inverse(blocks: ndarray, workers: int) -> ndarray:
+    # coeficientes com a escala de entrada da inversa AAN, em inteiros
+    planar = rint(blocks.transpose(1, 3, 0, 2) * (AAN_MATRIX * (1 << IDCT_SCALE_BITS))[:, :, None, None])
+    return aan_idct_blocks(planar).transpose(2, 0, 3, 1)
+
+
+# os motores disponíveis: o scipy.fftpack (por omissão), o scipy.fft (com threads),
+# o produto pelas matrizes da base em NumPy e a DCT inteira AAN (só blocos 8x8,
+# os restantes tamanhos são calculados com o scipy.fftpack)
+DCT_BACKENDS: Dict[str, DctBackend] = {
+    "fftpack": DctBackend(_fftpack_forward, _fftpack_inverse),
+    "fft": DctBackend(_fft_forward, _fft_inverse),
+    "matmul": DctBackend(_matmul_forward, _matmul_inverse),
+    "fixed": DctBackend(_fixed_forward, _fixed_inverse, (8,)),
+}
+
+# o motor usado quando não é indicado nenhum (ver set_dct_backend)
+_config = {"backend": "fftpack", "workers": 1}
+
+
+def register_dct_backend(name: str, forward: Callable, inverse: Callable, block_sizes: Tuple[int, ...] = None) -> None:
+    """Regista um motor de cálculo da DCT
+
+    Args:
+        name (str): o nome do motor
+        forward (Callable): a DCT 2D dos blocos (linhas/B, B, colunas/B, B) com o número de threads
+        inverse (Callable): a inversa da DCT 2D dos blocos
+        block_sizes (Tuple[int, ...], optional): os tamanhos de bloco suportados. Default a None (todos).
+    """
+    DCT_BACKENDS[name] = DctBackend(forward, inverse, block_sizes)
+
+
+def set_dct_backend(name: str, workers: int = 1) -> bool:
+    """Escolhe o motor usado por omissão pelas funções da DCT
+
+    Args:
+        name (str): o nome do motor
+        workers (int, optional): o número de threads (usado pelo scipy.fft). Default a 1.
+
+    Returns:
+        bool: True se o motor existir
+    """
+
+    if name not in DCT_BACKENDS:
+        print(f"Unknown DCT backend '{name}' (choose from {', '.join(DCT_BACKENDS)})")
+        return False
+
+    _config["backend"] = name
+    _config["workers"] = workers
+
+    return True
+
+
+def get_dct_backend() -> str:
+    """Devolve o nome do motor usado por omissão
+
+    Returns:
+        str: o nome do motor
+    """
+    return _config["backend"]
+
+
+def select_dct_backend(
+    candidates: Tuple[str, ...] = ("fftpack", "fft", "matmul"),
+    block_size: int = 8,
+    shape: Tuple[int, int] = (256, 256),
+    workers: int = 1,
+) -> Tuple[str, Dict[str, float]]:
+    """Escolhe o motor mais rápido nesta máquina com um micro-benchmark\n
+    Mede a DCT e a inversa de um canal aleatório com cada motor e passa a usar
+    o mais rápido por omissão. A DCT inteira ("fixed") só é considerada caso seja
+    indicada, já que não é tão precisa como as restantes
+
+    Args:
+        candidates (Tuple[str, ...], optional): os motores a comparar. Default aos motores em vírgula flutuante.
+        block_size (int, optional): o tamanho dos blocos. Default a 8.
+        shape (Tuple[int, int], optional): a shape do canal de teste. Default a (256, 256).
+        workers (int, optional): o número de threads. Default a 1.
+
+    Returns:
+        Tuple[str, Dict[str, float]]: o motor escolhido e o tempo de cada motor em segundos
+        ou (None, None) caso nenhum motor exista
+    """
+
+    channel = default_rng(0).integers(0, 256, shape).astype(float32)
+
+    timings = dict()
+    for name in candidates:
+        if name not in DCT_BACKENDS:
+            print(f"Unknown DCT backend '{name}' (choose from {', '.join(DCT_BACKENDS)})")
+            continue
+
+        def run():
+            coefficients = calculate_channel_dct(channel, block_size, backend=name, workers=workers)
+            calculate_channel_inv_dct(coefficients, block_size, backend=name, workers=workers)
+
+        timings[name] = min(repeat(run, number=3, repeat=3)) / 3
+
+    if not timings:
+        return None, None
+
+    best = min(timings, key=timings.get)
+    set_dct_backend(best, workers)
+
+    return best, timings
+
+
+def _resolve(backend: str, workers: int) -> Tuple[DctBackend, int]:
+    """Encontra o motor e o número de threads de uma chamada
+
+    Args:
+        backend (str): o nome do motor ou None (o motor por omissão)
+        workers (int): o número de threads ou None (o número por omissão)
+
+    Returns:
+        Tuple[DctBackend, int]: o motor e o número de threads ou (None, None) caso o motor não exista
+    """
+
+    name = _config["backend"] if backend is None else backend
+
+    if name not in DCT_BACKENDS:
+        print(f"Unknown DCT backend '{name}' (choose from {', '.join(DCT_BACKENDS)})")
+        return None, None
+
+    return DCT_BACKENDS[name], _config["workers"] if workers is None else workers
+
+
+def _apply(backend: DctBackend, blocks: ndarray, inverse: bool, workers: int) -> ndarray:
+    """Aplica um motor a um grupo de blocos com o mesmo tamanho\n
+    Os tamanhos não suportados pelo motor são calculados com o scipy.fftpack
+
+    Args:
+        backend (DctBackend): o motor
+        blocks (ndarray): os blocos (linhas/B, B, colunas/B, B)
+        inverse (bool): calcular a inversa
+        workers (int): o número de threads
+
+    Returns:
+        ndarray: os blocos transformados
+    """
+
+    if backend.block_sizes is not None and (
+        blocks.shape[1] not in backend.block_sizes or blocks.shape[3] not in backend.block_sizes
+    ):
+        backend = DCT_BACKENDS["fftpack"]
+
+    return (backend.inverse if inverse else backend.forward)(blocks, workers)
+
+
+def _block_transform(channel: ndarray, block_size: int, backend: DctBackend, inverse: bool, workers: int) -> ndarray:
+    """Aplica uma transformada separável a todos os blocos de um canal de uma só vez\n
+    O canal é visto como um array (linhas/B, B, colunas/B, B) e a transformada
+    é aplicada primeiro ao longo das colunas de cada bloco e depois ao longo das
+    linhas, pela mesma ordem que o cálculo bloco a bloco
+
+    Caso as dimensões do canal não sejam multiplas do tamanho do bloco, os blocos
+    incompletos das margens são agrupados em regiões de blocos com o mesmo tamanho
+
+    Args:
+        channel (ndarray): o canal a transformar
+        block_size (int): o tamanho dos blocos
+        backend (DctBackend): o motor de cálculo
+        inverse (bool): calcular a inversa
+        workers (int): o número de threads
+
+    Returns:
+        ndarray: o canal transformado em float32
+    """
+
+    rows, cols = channel.shape
+    result = empty(channel.shape, dtype=float32)
+
+    # limites da região com blocos completos
+    full_rows = rows - rows % block_size
+    full_cols = cols - cols % block_size
+
+    # regiões de blocos com o mesmo tamanho: interior, margem direita, margem inferior e canto
+    row_regions = ((0, full_rows, block_size), (full_rows, rows, rows - full_rows))
+    col_regions = ((0, full_cols, block_size), (full_cols, cols, cols - full_cols))
+
+    for row_start, row_end, block_rows in row_regions:
+        for col_start, col_end, block_cols in col_regions:
+
+            # região vazia
+            if row_start == row_end or col_start == col_end:
+                continue
+
+            # vista em blocos da região (sem cópia quando possível)
+            blocks = channel[row_start:row_end, col_start:col_end].reshape(
+                (row_end - row_start) // block_rows,
+                block_rows,
+                (col_end - col_start) // block_cols,
+                block_cols
+            )
+
+            # transformada separável aplicada a todos os blocos
+            transformed = _apply(backend, blocks, inverse, workers)
+
+            result[row_start:row_end, col_start:col_end] = transformed.reshape(
+                row_end - row_start, col_end - col_start
+            )
+
+    return result
+
+
+def _aan_transform(channel: ndarray, transform: Callable) -> ndarray:
+    """Aplica uma transformada AAN a todos os blocos 8x8 de um canal
+
+    Args:
+        channel (ndarray): o canal (dimensões múltiplas de 8)
+        transform (Callable): aan_dct_blocks ou aan_idct_blocks
+
+    Returns:
+        ndarray: o canal transformado em int64
+    """
+
+    rows, cols = channel.shape
+
+    # blocos em formato planar (8, 8, linhas/8, colunas/8) com os valores arredondados a inteiros
+    blocks = rint(channel).reshape(rows // 8, 8, cols // 8, 8).transpose(1, 3, 0, 2)
+
+    return transform(blocks).transpose(2, 0, 3, 1).reshape(rows, cols)
+
+
+def _check_method(channel: ndarray, block_size: int, method: str) -> bool:
+    """Verifica os argumentos de uma transformada
+
+    Args:
+        channel (ndarray): o canal
+        block_size (int): o tamanho dos blocos
+        method (str): o método de cálculo
+
+    Returns:
+        bool: True se os argumentos forem válidos
+    """
+
+    if method not in DCT_METHODS:
+        print(f"Unknown DCT method '{method}' (choose from {', '.join(DCT_METHODS)})")
+        return False
+
+    if block_size is not None and block_size % 8 != 0:
+        print("Given block size is not a multiple of 8")
+        return False
+
+    if block_size is not None and (channel.shape[0] * channel.shape[1]) % block_size != 0:
+        print("Image channels' shapes are not multiples of the given block size")
+        return False
+
+    if method == "aan" and (block_size != 8 or channel.shape[0] % 8 or channel.shape[1] % 8):
+        print("The AAN DCT is only calculated in 8x8 blocks of channels with shapes multiple of 8")
+        return False
+
+    return True
+
+
+def calculate_channel_dct(
+    channel: ndarray, block_size: int = None, method: str = "float", backend: str = None, workers: int = None
+) -> ndarray:
+    """Calcula a DCT de um só canal em blocos de um tamanho fornecido\n
+    Caso não seja fornecido é calculada a dct no canal todo\n
+    Os blocos têm que ser multiplos de 8\n
+    Com o método "aan" os coeficientes são inteiros e estão escalados pela
+    transformada, pelo que têm que ser quantizados com quantize(..., method="aan")
+
+    Args:
+        channel (ndarray): o canal com valores no intervalo [0, 255]
+        block_size (int, optional): o tamanho dos blocos em que a
+        dct vai ser calculada. Default a None.
+        method (str, optional): o método de cálculo {float, aan}. Default a "float".
+        backend (str, optional): o motor da DCT em vírgula flutuante (ver DCT_BACKENDS).
+        Default a None (o motor escolhido com set_dct_backend)
+        workers (int, optional): o número de threads do motor. Default a None (o escolhido com set_dct_backend).
+
+    Returns:
+        ndarray: o canal com a DCT calculada
+    """
+
+    if not _check_method(channel, block_size, method):
+        return
+
+    if method == "aan":
+        return _aan_transform(channel, aan_dct_blocks).astype(int32)
+
+    backend, workers = _resolve(backend, workers)
+    if backend is None:
+        return
+
+    # caso não seja passado um tamanho de bloco
+    if block_size is None:
+        return _apply(backend, channel[None, :, None, :], False, workers).reshape(channel.shape)
+
+    return _block_transform(channel, block_size, backend, False, workers)
+
 
 def calculate_dct(
-    y_channel: ndarray, cb_channel: ndarray, cr_channel: ndarray, block_size: int = None
+    y_channel: ndarray, cb_channel: ndarray, cr_channel: ndarray, block_size: int = None, method: str = "float",
+    backend: str = None, workers: int = None
 ) -> Tuple[ndarray, ndarray, ndarray]:
     """Calcula a DCT em blocos de um tamanho fornecido\n
     Caso não seja fornecido é calculada a dct no canal todo\n
@@ -23,80 +417,69 @@ def calculate_dct(
         cr_channel (ndarray): o canal cr
         block_size (int, optional): o tamanho dos blocos em que a
         dct vai ser calculada. Default a None.
+        method (str, optional): o método de cálculo {float, aan}. Default a "float".
+        backend (str, optional): o motor da DCT (ver DCT_BACKENDS). Default a None (o motor por omissão).
+        workers (int, optional): o número de threads do motor. Default a None (o número por omissão).
 
     Returns:
         Tuple[ndarray, ndarray, ndarray]: os canais com a DCT calculada
     """
 
-    if block_size is not None and block_size % 8 != 0:
-        print("Given block size is not a multiple of 8")
-        return
+    channels = list()
 
-    if block_size is not None and (y_channel.shape[0] * y_channel.shape[1]) % block_size != 0:
-        print("Image channels' shapes are not multiples of the given block size")
-        return
+    # calcular a dct de cada canal (o primeiro erro interrompe o cálculo)
+    for channel in (y_channel, cb_channel, cr_channel):
+        channel_dct = calculate_channel_dct(channel, block_size, method, backend, workers)
+        if channel_dct is None:
+            return
 
-    if block_size is not None and (cb_channel.shape[0] * cb_channel.shape[1]) % block_size != 0:
-        print("Image channels' shapes are not multiples of the given block size")
+        channels.append(channel_dct)
+
+    return tuple(channels)
+
+
+def calculate_channel_inv_dct(
+    channel_dct: ndarray, block_size: int = None, method: str = "float", backend: str = None, workers: int = None
+) -> ndarray:
+    """Calcula a inversa da DCT de um só canal em blocos de um tamanho fornecido\n
+    Caso não seja fornecido é calculada a inversa da dct no canal todo
+    Os blocos têm que ser multiplos de 8\n
+    Com o método "aan" os coeficientes têm que estar escalados pela transformada,
+    tal como são devolvidos por inv_quantize(..., method="aan")
+
+    Args:
+        channel_dct (ndarray): o canal com a dct calculada
+        block_size (int, optional): o tamanho dos blocos em que a
+        dct foi calculada anteriormente. Default a None.
+        method (str, optional): o método de cálculo {float, aan}. Default a "float".
+        backend (str, optional): o motor da DCT em vírgula flutuante (ver DCT_BACKENDS).
+        Default a None (o motor escolhido com set_dct_backend)
+        workers (int, optional): o número de threads do motor. Default a None (o escolhido com set_dct_backend).
+
+    Returns:
+        ndarray: o canal original (sem a dct)
+    """
+
+    if not _check_method(channel_dct, block_size, method):
         return
 
-    if block_size is not None and (cr_channel.shape[0] * cr_channel.shape[1]) % block_size != 0:
-        print("Image channels' shapes are not multiples of the given block size")
+    if method == "aan":
+        return _aan_transform(channel_dct, aan_idct_blocks).astype(float32)
+
+    backend, workers = _resolve(backend, workers)
+    if backend is None:
         return
 
     # caso não seja passado um tamanho de bloco
     if block_size is None:
-        y_dct = dct(dct(y_channel, norm="ortho").T, norm="ortho").T
-        cb_dct = dct(dct(cb_channel, norm="ortho").T, norm="ortho").T
-        cr_dct = dct(dct(cr_channel, norm="ortho").T, norm="ortho").T
-
-        return y_dct, cb_dct, cr_dct
-
-
-    # alocar espaço para os arrays onde a dct vai ser calculada
-    y_dct = zeros(y_channel.shape, dtype=float32)
-    cb_dct = zeros(cb_channel.shape, dtype=float32)
-    cr_dct = zeros(cr_channel.shape, dtype=float32)
-
-    # calcular a dct para o canal Y em blocos de tamanho block_size fornecido
-    for i in range(0, y_dct.shape[0], block_size):
-        for j in range(0, y_dct.shape[1], block_size):
-            y_dct[i:i+block_size, j:j+block_size] = dct(
-                dct(
-                    y_channel[i:i+block_size, j:j+block_size],
-                    norm="ortho"
-                ).T,
-                norm="ortho"
-            ).T
-
-    # calcular a dct para o canal Y em blocos de tamanho block_size fornecido
-    for i in range(0, cb_dct.shape[0], block_size):
-        for j in range(0, cb_dct.shape[1], block_size):
-            cb_dct[i:i+block_size, j:j+block_size] = dct(
-                dct(
-                    cb_channel[i:i+block_size, j:j+block_size],
-                    norm="ortho"
-                ).T,
-                norm="ortho"
-            ).T
-
-    # calcular a dct para o canal Y em blocos de tamanho block_size fornecido
-    for i in range(0, cr_dct.shape[0], block_size):
-        for j in range(0, cr_dct.shape[1], block_size):
-            cr_dct[i:i+block_size, j:j+block_size] = dct(
-                dct(
-                    cr_channel[i:i+block_size, j:j+block_size],
-                    norm="ortho"
-                ).T,
-                norm="ortho"
-            ).T
-
-
-    return y_dct, cb_dct, cr_dct
+        return _apply(backend, channel_dct[None, :, None, :], True, workers).reshape(channel_dct.shape)
+
+    return _block_transform(channel_dct, block_size, backend, True, workers)
 
 
 def calculate_inv_dct(
-    y_dct: ndarray, cb_dct: ndarray, cr_dct: ndarray, block_size: int = None
+    y_dct: ndarray, cb_dct: ndarray, cr_dct: ndarray, block_size: int = None, method: str = "float",
+    backend: str = None, workers: int = None
 ) -> Tuple[ndarray, ndarray, ndarray]:
     """Calcula a inversa da DCT em blocos de um tamanho fornecido\n
     Caso não seja fornecido é calculada a inversa da dct no canal todo
@@ -108,73 +491,206 @@ def calculate_inv_dct(
         cr_dct (ndarray): o canal Cr com a dct calculada
         block_size (int): o tamanho dos blocos em que a
         dct foi calculada anteriormente
-        
+        method (str, optional): o método de cálculo {float, aan}. Default a "float".
+        backend (str, optional): o motor da DCT (ver DCT_BACKENDS). Default a None (o motor por omissão).
+        workers (int, optional): o número de threads do motor. Default a None (o número por omissão).
+
     Returns:
         Tuple[ndarray, ndarray, ndarray]: os canais originais (sem a dct)
     """
 
-    if block_size is not None and block_size % 8 != 0:
-        print("Given block size is not a multiple of 8")
-        return
+    channels = list()
 
-    if block_size is not None and (y_dct.shape[0] * y_dct.shape[1]) % block_size != 0:
-        print("Image channels' shapes are not multiples of the given block size")
-        return
+    # calcular a inversa da dct de cada canal (o primeiro erro interrompe o cálculo)
+    for channel_dct in (y_dct, cb_dct, cr_dct):
+        channel = calculate_channel_inv_dct(channel_dct, block_size, method, backend, workers)
+        if channel is None:
+            return
 
-    if block_size is not None and (cb_dct.shape[0] * cb_dct.shape[1]) % block_size != 0:
-        print("Image channels' shapes are not multiples of the given block size")
+        channels.append(channel)
+
+    return tuple(channels)
+
+
+def _row_words(block_rows: ndarray) -> ndarray:
+    """Indica os coeficientes diferentes de zero de cada linha dos blocos 8x8 num só inteiro\n
+    Cada linha de 8 coeficientes ocupa 8 bytes da máscara (um por coeficiente), pelo que é
+    lida como um inteiro de 64 bits e as reduções por bloco são OR de 8 inteiros por bloco
+
+    Args:
+        block_rows (ndarray): as linhas de blocos do canal (linhas/8, 8, colunas), pode ser
+        uma vista com só algumas linhas de blocos
+
+    Returns:
+        ndarray: as linhas dos blocos (linhas/8, 8, colunas/8) em uint64 (little-endian)
+    """
+    return (block_rows != 0).view("<u8")
+
+
+def _full_blocks(channel_dct: ndarray, block_size: int, step: int = 1) -> ndarray:
+    """Indica os blocos com coeficientes diferentes de zero fora das
+    REDUCED_SIZE x REDUCED_SIZE frequências mais baixas
+
+    Args:
+        channel_dct (ndarray): o canal com a dct calculada (dimensões multiplas do bloco)
+        block_size (int): o tamanho dos blocos
+        step (int, optional): considerar só uma linha de blocos em cada step. Default a 1.
+
+    Returns:
+        ndarray: a máscara dos blocos (linhas/B/step, colunas/B)
+    """
+
+    rows, cols = channel_dct.shape
+    block_rows = channel_dct.reshape(rows // block_size, block_size, cols)[::step]
+
+    if block_size == 8:
+        words = _row_words(block_rows)
+
+        return (bitwise_or.reduce(words[:, REDUCED_SIZE:], axis=1) |
+                (bitwise_or.reduce(words[:, :REDUCED_SIZE], axis=1) & HIGH_COLUMNS)) != 0
+
+    nonzero = (block_rows != 0).reshape(-1, block_size, cols // block_size, block_size)
+
+    # as reduções são feitas primeiro ao longo das linhas dos blocos (fatias inteiras do canal)
+    return nonzero[:, REDUCED_SIZE:].any(axis=1).any(axis=2) | \
+        nonzero[:, :REDUCED_SIZE].any(axis=1)[:, :, REDUCED_SIZE:].any(axis=2)
+
+
+def block_classes(channel_dct: ndarray, block_size: int = 8) -> ndarray:
+    """Classifica os blocos de um canal pelo último coeficiente diferente de zero\n
+    Classe 0 (dc): só o DC pode ser diferente de zero, classe 1 (4x4): todos os
+    coeficientes diferentes de zero estão nas REDUCED_SIZE x REDUCED_SIZE frequências
+    mais baixas, classe 2 (full): os restantes blocos
+
+    Args:
+        channel_dct (ndarray): o canal com a dct calculada (dimensões multiplas do bloco)
+        block_size (int, optional): o tamanho dos blocos. Default a 8.
+
+    Returns:
+        ndarray: a classe de cada bloco (linhas/B, colunas/B) em uint8
+    """
+
+    high = _full_blocks(channel_dct, block_size)
+
+    # AC nas baixas frequências: linhas 1 a 3 ou colunas 1 a 3 da primeira linha
+    if block_size == 8:
+        words = _row_words(channel_dct.reshape(channel_dct.shape[0] // 8, 8, channel_dct.shape[1]))
+        low = ((bitwise_or.reduce(words[:, 1:REDUCED_SIZE], axis=1) & LOW_COLUMNS) |
+               (words[:, 0] & LOW_AC_COLUMNS)) != 0
+    else:
+        rows, cols = channel_dct.shape
+        nonzero = (channel_dct != 0).reshape(rows // block_size, block_size, cols // block_size, block_size)
+        low = nonzero[:, 1:REDUCED_SIZE, :, :REDUCED_SIZE].any(axis=1).any(axis=2) | \
+            nonzero[:, 0, :, 1:REDUCED_SIZE].any(axis=2)
+
+    return where(high, 2, low).astype(uint8)
+
+
+@lru_cache(maxsize=16)
+def _reduced_basis(block_size: int) -> ndarray:
+    """Calcula a matriz da inversa reduzida às REDUCED_SIZE x REDUCED_SIZE frequências mais baixas\n
+    As linhas correspondem às primeiras REDUCED_SIZE linhas de coeficientes de um bloco
+    (achatadas e cortadas depois da última frequência baixa), pelo que a inversa de todos
+    os blocos é um único produto de matrizes
+
+    Args:
+        block_size (int): o tamanho dos blocos
+
+    Returns:
+        ndarray: a matriz ((REDUCED_SIZE - 1) * B + REDUCED_SIZE, B * B) em float64
+    """
+
+    basis = dct_basis(block_size)[:REDUCED_SIZE]
+
+    reduced = zeros(((REDUCED_SIZE - 1) * block_size + REDUCED_SIZE, block_size * block_size))
+    for u in range(REDUCED_SIZE):
+        reduced[u * block_size:u * block_size + REDUCED_SIZE] = kron(basis[u], basis)
+
+    reduced.setflags(write=False)
+
+    return reduced
+
+
+def calculate_channel_sparse_inv_dct(
+    channel_dct: ndarray, block_size: int = 8, backend: str = None, workers: int = None, count: bool = True
+) -> Tuple[ndarray, ndarray]:
+    """Calcula a inversa da DCT em blocos saltando os coeficientes nulos\n
+    Depois da quantização a maioria dos blocos só tem o DC ou poucos coeficientes
+    de baixa frequência. Os blocos são classificados (ver block_classes) e cada classe
+    é calculada de uma só vez: os blocos só com o DC são preenchidos com DC / B,
+    os blocos 4x4 usam a inversa reduzida (um produto de matrizes) e os restantes
+    a inversa completa do motor escolhido. Caso mais de FULL_SHARE dos blocos precisem
+    da inversa completa (estimado numa amostra das linhas de blocos), é calculada a inversa
+    de todo o canal sem classificar os blocos
+
+    Args:
+        channel_dct (ndarray): o canal com a dct calculada
+        block_size (int, optional): o tamanho dos blocos. Default a 8.
+        backend (str, optional): o motor da inversa completa (ver DCT_BACKENDS). Default a None (o motor por omissão).
+        workers (int, optional): o número de threads do motor. Default a None (o número por omissão).
+        count (bool, optional): contar os blocos de cada classe também quando é calculada a inversa
+        de todo o canal. Default a True.
+
+    Returns:
+        Tuple[ndarray, ndarray]: o canal original (sem a dct) e o número de blocos de cada classe
+        (IDCT_CLASSES, None caso não sejam contados) ou None caso ocorra um erro
+    """
+
+    if not _check_method(channel_dct, block_size, "float"):
         return
 
-    if block_size is not None and (cr_dct.shape[0] * cr_dct.shape[1]) % block_size != 0:
-        print("Image channels' shapes are not multiples of the given block size")
+    rows, cols = channel_dct.shape
+
+    # só os canais com blocos completos são classificados
+    if block_size is None or block_size <= REDUCED_SIZE or rows % block_size or cols % block_size:
+        channel = calculate_channel_inv_dct(channel_dct, block_size, backend=backend, workers=workers)
+        if channel is None:
+            return
+
+        histogram = zeros(len(IDCT_CLASSES), dtype=int)
+        histogram[-1] = channel.size // (block_size or channel.size)
+
+        return channel, histogram
+
+    backend, workers = _resolve(backend, workers)
+    if backend is None:
         return
 
-    # caso não seja passado um tamanho de bloco
-    if block_size is None:
-        y_channel = idct(idct(y_dct, norm="ortho").T, norm="ortho").T
-        cb_channel = idct(idct(cb_dct, norm="ortho").T, norm="ortho").T
-        cr_channel = idct(idct(cr_dct, norm="ortho").T, norm="ortho").T
-
-        return y_channel, cb_channel, cr_channel
-
-
-    # alocar espaço para os arrays onde a dct vai ser calculada
-    y_channel = zeros(y_dct.shape, dtype=float32)
-    cb_channel = zeros(cb_dct.shape, dtype=float32)
-    cr_channel = zeros(cr_dct.shape, dtype=float32)
-
-    # calcular a dct para o canal Y em blocos de tamanho block_size fornecido
-    for i in range(0, y_channel.shape[0], block_size):
-        for j in range(0, y_channel.shape[1], block_size):
-            y_channel[i:i+block_size, j:j+block_size] = idct(
-                idct(
-                    y_dct[i:i+block_size, j:j+block_size],
-                    norm="ortho"
-                ).T,
-                norm="ortho"
-            ).T
-
-    # calcular a dct para o canal Y em blocos de tamanho block_size fornecido
-    for i in range(0, cb_channel.shape[0], block_size):
-        for j in range(0, cb_channel.shape[1], block_size):
-            cb_channel[i:i+block_size, j:j+block_size] = idct(
-                idct(
-                    cb_dct[i:i+block_size, j:j+block_size],
-                    norm="ortho"
-                ).T,
-                norm="ortho"
-            ).T
-
-    # calcular a dct para o canal Y em blocos de tamanho block_size fornecido
-    for i in range(0, cr_channel.shape[0], block_size):
-        for j in range(0, cr_channel.shape[1], block_size):
-            cr_channel[i:i+block_size, j:j+block_size] = idct(
-                idct(
-                    cr_dct[i:i+block_size, j:j+block_size],
-                    norm="ortho"
-                ).T,
-                norm="ortho"
-            ).T
-
-
-    return y_channel, cb_channel, cr_channel
+    sample = _full_blocks(channel_dct, block_size, SAMPLE_STEP)
+
+    if count_nonzero(sample) > FULL_SHARE * sample.size:
+        channel = _block_transform(channel_dct, block_size, backend, True, workers)
+
+        histogram = None
+        if count:
+            histogram = bincount(block_classes(channel_dct, block_size).reshape(-1), minlength=len(IDCT_CLASSES))
+
+        return channel, histogram
+
+    classes = block_classes(channel_dct, block_size)
+    histogram = bincount(classes.reshape(-1), minlength=len(IDCT_CLASSES))
+
+    # os blocos são lidos e escritos diretamente nas vistas (linhas/B, B, colunas/B, B)
+    blocks = channel_dct.reshape(rows // block_size, block_size, cols // block_size, block_size)
+
+    channel = empty(channel_dct.shape, dtype=float32)
+    result = channel.reshape(blocks.shape)
+
+    # só o DC: todos os blocos são preenchidos com DC / B (uma escrita contígua do canal)
+    # e os das outras classes são depois substituídos
+    result[...] = (blocks[:, 0, :, 0] / block_size)[:, None, :, None]
+
+    # inversa reduzida às frequências mais baixas
+    block_rows, block_cols = nonzero(classes == 1)
+    if block_rows.size:
+        basis = _reduced_basis(block_size)
+        low = blocks[block_rows, :REDUCED_SIZE, block_cols, :].reshape(-1, REDUCED_SIZE * block_size)
+        result[block_rows, :, block_cols, :] = (low[:, :basis.shape[0]] @ basis).reshape(-1, block_size, block_size)
+
+    # inversa completa, com os blocos vistos como uma coluna de blocos (N, B, 1, B)
+    block_rows, block_cols = nonzero(classes == 2)
+    if block_rows.size:
+        full = blocks[block_rows, :, block_cols, :][:, :, None, :]
+        result[block_rows, :, block_cols, :] = _apply(backend, full, True, workers)[:, :, 0, :]
+
+    return channel, histogram
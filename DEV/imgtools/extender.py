@@ -66,22 +66,27 @@ def restore_padding(img: ndarray, width: int, height: int) -> ndarray:
 
 
 
-def down_sample(
-    channel1: ndarray, channel2: ndarray, channel3: ndarray, scale: Tuple[int, int, int]
-) -> Tuple[ndarray, ndarray, ndarray]:
-    """Faz a subamostragem da imagem com a escala fornecida
+def down_sample_channel(
+    channel: ndarray, index: int, scale: Tuple[int, int, int], shape: Tuple[int, int] = None
+) -> ndarray:
+    """Faz a subamostragem de um só canal com a escala fornecida\n
+    O primeiro canal (Y) não é alterado e o tamanho dos outros é calculado
+    a partir da shape do primeiro canal
 
     Args:
-        channel1 (ndarray): o primeiro canal
-        channel2 (ndarray): o segundo canal
-        channel3 (ndarray): o terceiro canal
+        channel (ndarray): o canal
+        index (int): o índice do canal {0, 1, 2}
         scale (Tuple[int, int, int]): a escala para a sub-amostragem {0,1,2,4}
+        shape (Tuple[int, int], optional): a shape do primeiro canal. Default a None (a shape do canal).
 
     Returns:
-        Tuple[ndarray, ndarray, ndarray]: os canais com a respetiva asubamostragem
+        ndarray: o canal com a respetiva subamostragem
     """
 
-    width, height = channel1.shape
+    if index == 0:
+        return channel
+
+    width, height = channel.shape if shape is None else shape
 
     height_divide_cr = int(scale[0] / scale[1])
     height_divide_cb = height_divide_cr
@@ -94,14 +99,36 @@ def down_sample(
         width_divide_cr = height_divide_cr
         width_divide_cb = width_divide_cr
 
-    channel2_resized = resize(
-        channel2, (int(height / height_divide_cb), int(width / width_divide_cb)), interpolation=INTER_LINEAR
-    )
-    channel3_resized = resize(
-        channel3, (int(height / height_divide_cr), int(width / width_divide_cr)), interpolation=INTER_LINEAR
+    if index == 1:
+        return resize(
+            channel, (int(height / height_divide_cb), int(width / width_divide_cb)), interpolation=INTER_LINEAR
+        )
+
+    return resize(
+        channel, (int(height / height_divide_cr), int(width / width_divide_cr)), interpolation=INTER_LINEAR
     )
 
-    return channel1, channel2_resized, channel3_resized
+
+def down_sample(
+    channel1: ndarray, channel2: ndarray, channel3: ndarray, scale: Tuple[int, int, int]
+) -> Tuple[ndarray, ndarray, ndarray]:
+    """Faz a subamostragem da imagem com a escala fornecida
+
+    Args:
+        channel1 (ndarray): o primeiro canal
+        channel2 (ndarray): o segundo canal
+        channel3 (ndarray): o terceiro canal
+        scale (Tuple[int, int, int]): a escala para a sub-amostragem {0,1,2,4}
+
+    Returns:
+        Tuple[ndarray, ndarray, ndarray]: os canais com a respetiva asubamostragem
+    """
+
+    return (
+        channel1,
+        down_sample_channel(channel2, 1, scale, channel1.shape),
+        down_sample_channel(channel3, 2, scale, channel1.shape)
+    )
 
 
 def up_sample(
@@ -1,12 +1,196 @@
 """Contém funções para aplicar quantização em imagens
 """
 
-from numpy import ndarray, zeros, int16, round as npround, ones, uint8, float64
+from functools import lru_cache
+
+from typing import Callable, Sequence
+
+from numpy import ndarray, frombuffer, int16, int64, round as npround, ones, uint8, float64, stack
+
+from .aan import AAN_MATRIX, DCT_SCALE_BITS, IDCT_SCALE_BITS
+
+
+# métodos de quantização: coeficientes da DCT em vírgula flutuante ou escalados pela DCT AAN
+Q_METHODS = ("float", "aan")
+
+
+def _scale_factor(quality_factor: int) -> float:
+    """Calcula o fator de escala da matriz de quantização para
+    o fator de qualidade fornecido
+
+    Args:
+        quality_factor (int): o fator de qualidade [0, 100]
+
+    Returns:
+        float: o fator de escala (0 indica uma matriz de uns)
+    """
+
+    if quality_factor >= 50:
+        return (100 - quality_factor) / 50
+
+    if 0 < quality_factor < 50:
+        return 50 / quality_factor
+
+    return 0
+
+
+@lru_cache(maxsize=64)
+def _cached_q_matrix(q_bytes: bytes, dtype: str, shape: tuple, quality_factor: int) -> ndarray:
+    """Constrói a matriz de quantização escalada a partir do conteúdo
+    da matriz base (chave da cache)
+
+    Args:
+        q_bytes (bytes): o conteúdo da matriz base
+        dtype (str): o tipo de dados da matriz base
+        shape (tuple): a shape da matriz base
+        quality_factor (int): o fator de qualidade
+
+    Returns:
+        ndarray: a matriz de quantização escalada em uint8 (só de leitura)
+    """
+
+    q_matrix = frombuffer(q_bytes, dtype=dtype).reshape(shape)
+    fator_escala = _scale_factor(quality_factor)
+
+    if fator_escala != 0:
+        q_matriz_with_factor = npround(fator_escala * q_matrix)
+    else:
+        q_matriz_with_factor = ones(q_matrix.shape)
+
+    q_matriz_with_factor[q_matriz_with_factor > 255] = 255
+    q_matriz_with_factor[q_matriz_with_factor < 1] = 1
+
+    q_matriz_with_factor = npround(q_matriz_with_factor).astype(uint8)
+
+    # a matriz é partilhada por todas as chamadas
+    q_matriz_with_factor.setflags(write=False)
+
+    return q_matriz_with_factor
+
+
+def scale_q_matrix(q_matrix: ndarray, quality_factor: int) -> ndarray:
+    """Devolve a matriz de quantização escalada pelo fator de qualidade\n
+    O resultado é memorizado pelo conteúdo da matriz e pelo fator de qualidade,
+    pelo que codificar várias imagens com a mesma qualidade só constrói a matriz uma vez
+
+    Args:
+        q_matrix (ndarray): a matriz de quantização base
+        quality_factor (int): o fator de qualidade [0, 100]
+
+    Returns:
+        ndarray: a matriz escalada em uint8 (só de leitura)
+    """
+    return _cached_q_matrix(
+        q_matrix.tobytes(), q_matrix.dtype.str, q_matrix.shape, quality_factor
+    )
+
+
+def aan_q_matrix(q_matrix: ndarray, quality_factor: int) -> ndarray:
+    """Devolve os divisores da quantização dos coeficientes da DCT AAN\n
+    A escala da transformada (2^DCT_SCALE_BITS * 8 * AAN_MATRIX) é incluída na
+    matriz escalada, pelo que a quantização é uma só divisão por coeficiente
+
+    Args:
+        q_matrix (ndarray): a matriz de quantização base
+        quality_factor (int): o fator de qualidade [0, 100]
+
+    Returns:
+        ndarray: os divisores em float64 (só de leitura)
+    """
+    return _cached_aan_tables(q_matrix.tobytes(), q_matrix.dtype.str, q_matrix.shape, quality_factor)[0]
+
+
+def aan_inv_q_matrix(q_matrix: ndarray, quality_factor: int) -> ndarray:
+    """Devolve os multiplicadores da inversa da quantização para a inversa da DCT AAN\n
+    A escala de entrada da transformada (AAN_MATRIX * 2^IDCT_SCALE_BITS) é incluída
+    na matriz escalada, como no libjpeg
+
+    Args:
+        q_matrix (ndarray): a matriz de quantização base
+        quality_factor (int): o fator de qualidade [0, 100]
+
+    Returns:
+        ndarray: os multiplicadores inteiros em int64 (só de leitura)
+    """
+    return _cached_aan_tables(q_matrix.tobytes(), q_matrix.dtype.str, q_matrix.shape, quality_factor)[1]
+
+
+@lru_cache(maxsize=64)
+def _cached_aan_tables(q_bytes: bytes, dtype: str, shape: tuple, quality_factor: int) -> tuple:
+    """Constrói as matrizes da quantização AAN a partir do conteúdo
+    da matriz base (chave da cache)
+
+    Args:
+        q_bytes (bytes): o conteúdo da matriz base
+        dtype (str): o tipo de dados da matriz base
+        shape (tuple): a shape da matriz base
+        quality_factor (int): o fator de qualidade
+
+    Returns:
+        tuple: os divisores da quantização e os multiplicadores da inversa
+    """
+
+    scaled = _cached_q_matrix(q_bytes, dtype, shape, quality_factor).astype(float64)
+
+    divisors = scaled * AAN_MATRIX * (8 << DCT_SCALE_BITS)
+    multipliers = npround(scaled * AAN_MATRIX * (1 << IDCT_SCALE_BITS)).astype(int64)
+
+    divisors.setflags(write=False)
+    multipliers.setflags(write=False)
+
+    return divisors, multipliers
+
+
+def _check_method(method: str) -> bool:
+    """Verifica o método de quantização
+
+    Args:
+        method (str): o método
+
+    Returns:
+        bool: True se o método existir
+    """
+
+    if method not in Q_METHODS:
+        print(f"Unknown quantization method '{method}' (choose from {', '.join(Q_METHODS)})")
+        return False
+
+    return True
+
+
+def _check_shapes(channel: ndarray, q_matrix: ndarray) -> bool:
+    """Verifica se o canal e a matriz de quantização têm formatos compatíveis
+
+    Args:
+        channel (ndarray): o canal
+        q_matrix (ndarray): a matriz de quantização
+
+    Returns:
+        bool: True se os formatos forem válidos
+    """
+
+    # garantir que as matrizes têm 2 dimensões
+    if len(channel.shape) != 2:
+        print("Matrix must be 2 dimentional")
+        return False
+
+    # verificar se as dimensões das matrizes são multiplas de 8
+    if channel.shape[0] % 8 != 0 or channel.shape[1] % 8 != 0:
+        print("Matrix shape must be multiple of 8")
+        return False
+
+    if q_matrix.shape != (8, 8):
+        print("Quantization matrix shape must be 8x8")
+        return False
+
+    return True
+
 
 def quantize(
         channel: ndarray,
         q_matrix: ndarray,
-        quality_factor: int
+        quality_factor: int = 50,
+        method: str = "float"
 ) -> ndarray:
     """Aplica a técnica de quantização ao canal da imagem
     fornecido
@@ -18,64 +202,36 @@ def quantize(
     Args:
         channel (ndarray): o canal a quantizar
         q_matrix (ndarray): a matriz de quantização a ser usada
-        quality_factor (int): o fator de qualidade das matrizes de quantização
+        quality_factor (int, optional): o fator de qualidade das matrizes de quantização. Default a 50.
+        method (str, optional): o método da DCT do canal {float, aan}. Default a "float".
 
     Returns:
         ndarray: o canal da imagem devidamente quantizado
     """
 
-    # garantir que as matrizes têm 2 dimensões
-    if len(channel.shape) != 2:
-        print("Matrix must be 2 dimentional")
-        return
-
-    # verificar se as dimensões das matrizes são multiplas de 8
-
-    if sum(channel.shape) % 8 != 0:
-        print("Matrix shape must be multiple of 8")
+    if not _check_method(method) or not _check_shapes(channel, q_matrix):
         return
 
-    if sum(q_matrix.shape) != 16:
-        print("Quantization matrix shape must be 8x8")
-        return
-
-    # alocar espaço para guardar outras matrizes
-    ch_quantized = zeros(channel.shape, dtype=int16)
-
-    if quality_factor >= 50:
-        fator_escala = (100 - quality_factor) / 50
-    elif quality_factor < 50 and quality_factor > 0:
-        fator_escala = 50 / quality_factor
-    elif quality_factor == 0:
-        fator_escala = 0
+    if method == "aan":
+        q_matriz_with_factor = aan_q_matrix(q_matrix, quality_factor)
     else:
-        fator_escala = 0
+        q_matriz_with_factor = scale_q_matrix(q_matrix, quality_factor)
 
-    if fator_escala != 0:
-        q_matriz_with_factor = npround(fator_escala * q_matrix)
-    else:
-        q_matriz_with_factor = ones(q_matrix.shape, dtype=uint8)
+    # vista do canal em blocos 8x8 (linhas/8, 8, colunas/8, 8)
+    blocks = channel.reshape(channel.shape[0] // 8, 8, channel.shape[1] // 8, 8)
 
-    q_matriz_with_factor[q_matriz_with_factor > 255] = 255
-    q_matriz_with_factor[q_matriz_with_factor < 1] = 1
+    # fazer a quantização de todos os blocos de uma só vez
+    ch_quantized = npround(blocks / q_matriz_with_factor[:, None, :])
 
-    q_matriz_with_factor = npround(q_matriz_with_factor).astype(uint8)
-
-    # fazer a quantização das matrizes de imagem
-    for i in range(0, ch_quantized.shape[0], 8):
-        for j in range(0, ch_quantized.shape[1], 8):
-            ch_quantized[i:i+8, j:j+8] = npround(
-                channel[i:i+8, j:j+8] / q_matriz_with_factor
-            )
-    
-    return ch_quantized.astype(int)
+    return ch_quantized.astype(int16).astype(int).reshape(channel.shape)
 
 
 
 def inv_quantize(
         ch_quantized: ndarray,
         q_matrix: ndarray,
-        quality_factor: int
+        quality_factor: int = 50,
+        method: str = "float"
 ) -> ndarray:
     """Reverte a técnica de quantização aplicada anteriormente
     ao canal da imagem fornecido
@@ -87,54 +243,128 @@ def inv_quantize(
     Args:
         ch_quantized (ndarray): o canal para inverter a quantização
         q_matrix (ndarray): a matriz de quantização a ser usada
-        quality_factor (int): o fator de qualidade da matriz de quatização
+        quality_factor (int, optional): o fator de qualidade da matriz de quatização. Default a 50.
+        method (str, optional): o método da inversa da DCT {float, aan}. Default a "float".
+        Com "aan" os coeficientes são devolvidos escalados para calculate_channel_inv_dct(..., method="aan")
 
     Returns:
         ndarray: o canal da imagem devidamente quantizado
     """
 
-    # garantir que as matrizes têm 2 dimensões
-    if len(ch_quantized.shape) != 2:
-        print("Matrix must be 2 dimentional")
+    if not _check_method(method) or not _check_shapes(ch_quantized, q_matrix):
         return
 
-    # verificar se as dimensões das matrizes são multiplas de 8
+    # vista do canal em blocos 8x8 (linhas/8, 8, colunas/8, 8)
+    blocks = ch_quantized.reshape(ch_quantized.shape[0] // 8, 8, ch_quantized.shape[1] // 8, 8)
 
-    if sum(ch_quantized.shape) % 8 != 0:
-        print("Matrix shape must be multiple of 8")
+    if method == "aan":
+        return (blocks * aan_inv_q_matrix(q_matrix, quality_factor)[:, None, :]).reshape(ch_quantized.shape)
+
+    q_matriz_with_factor = scale_q_matrix(q_matrix, quality_factor)
+
+    # reverter a quantização de todos os blocos de uma só vez
+    channel = (blocks * q_matriz_with_factor[:, None, :]).astype(int16)
+
+    return channel.astype(float64).reshape(ch_quantized.shape)
+
+
+def _stacked_q_matrices(q_matrix: ndarray, quality_factors: Sequence[int]) -> ndarray:
+    """Empilha as matrizes escaladas de vários fatores de qualidade, com os eixos
+    prontos para os blocos (fatores, 1, 8, 1, 8)
+    """
+    return stack([scale_q_matrix(q_matrix, quality_factor) for quality_factor in quality_factors])[:, None, :, None, :]
+
+
+def quantize_many(channel: ndarray, q_matrix: ndarray, quality_factors: Sequence[int]) -> ndarray:
+    """Quantiza um canal com vários fatores de qualidade de uma só vez\n
+    O resultado de cada fator é igual ao de quantize, mas todos os fatores são
+    calculados numa só operação sobre os mesmos coeficientes
+
+    Args:
+        channel (ndarray): o canal a quantizar (coeficientes da DCT em vírgula flutuante)
+        q_matrix (ndarray): a matriz de quantização a ser usada
+        quality_factors (Sequence[int]): os fatores de qualidade
+
+    Returns:
+        ndarray: os canais quantizados (fatores, linhas, colunas)
+    """
+
+    if not _check_shapes(channel, q_matrix):
         return
 
-    if sum(q_matrix.shape) != 16:
-        print("Quantization matrix shape must be 8x8")
+    rows, cols = channel.shape
+    blocks = channel.reshape(1, rows // 8, 8, cols // 8, 8)
+
+    quantized = npround(blocks / _stacked_q_matrices(q_matrix, quality_factors))
+
+    return quantized.astype(int16).astype(int).reshape(len(quality_factors), rows, cols)
+
+
+def inv_quantize_many(ch_quantized: ndarray, q_matrix: ndarray, quality_factors: Sequence[int]) -> ndarray:
+    """Reverte a quantização de vários canais, cada um com o seu fator de qualidade\n
+    O resultado de cada fator é igual ao de inv_quantize
+
+    Args:
+        ch_quantized (ndarray): os canais quantizados (fatores, linhas, colunas)
+        q_matrix (ndarray): a matriz de quantização a ser usada
+        quality_factors (Sequence[int]): o fator de qualidade de cada canal
+
+    Returns:
+        ndarray: os canais desquantizados (fatores, linhas, colunas) em float64
+    """
+
+    if len(ch_quantized) != len(quality_factors):
+        print("There must be one quantized channel per quality factor")
         return
 
-    # alocar espaço para guardar outras matrizes
-    channel = zeros(ch_quantized.shape, dtype=int16)
+    if not _check_shapes(ch_quantized[0], q_matrix):
+        return
 
-    # fazer a quantização das matrizes de imagem
-    if quality_factor >= 50:
-        fator_escala = (100 - quality_factor) / 50
-    elif quality_factor < 50 and quality_factor > 0:
-        fator_escala = 50 / quality_factor
-    elif quality_factor == 0:
-        fator_escala = 0
-    else:
-        fator_escala = 0
-    
-    if fator_escala != 0:
-        q_matriz_with_factor = npround(fator_escala * q_matrix)
-    else:
-        q_matriz_with_factor = ones(q_matrix.shape)
-        
-    q_matriz_with_factor[q_matriz_with_factor > 255] = 255
-    q_matriz_with_factor[q_matriz_with_factor < 1] = 1
-    
-    q_matriz_with_factor = npround(q_matriz_with_factor).astype(uint8)
+    count, rows, cols = ch_quantized.shape
+    blocks = ch_quantized.reshape(count, rows // 8, 8, cols // 8, 8)
+
+    channel = (blocks * _stacked_q_matrices(q_matrix, quality_factors)).astype(int16)
+
+    return channel.astype(float64).reshape(ch_quantized.shape)
+
+
+def bisect_quality(fits: Callable[[int], bool], lowest: bool = False, low: int = 1, high: int = 100) -> int:
+    """Procura por bisseção o fator de qualidade mais alto que satisfaz uma restrição\n
+    A restrição tem de ser monótona no fator de qualidade: um tamanho máximo só é
+    satisfeito até um fator (o mais alto é o procurado) e um PSNR mínimo só a partir
+    de um fator (com lowest é procurado o mais baixo). Os fatores entre 1 e 100
+    correspondem a matrizes cada vez mais finas (o fator 0 é igual ao 100)
+
+    Args:
+        fits (Callable[[int], bool]): a restrição, avaliada num fator de qualidade
+        lowest (bool, optional): procurar o fator mais baixo. Default a False.
+        low (int, optional): o fator mais baixo do intervalo. Default a 1.
+        high (int, optional): o fator mais alto do intervalo. Default a 100.
+
+    Returns:
+        int: o fator de qualidade ou None caso nenhum fator do intervalo satisfaça a restrição
+    """
+
+    if not 0 <= low <= high <= 100:
+        print("Quality factors must be in [0, 100]")
+        return
+
+    best = None
+
+    # cada avaliação divide o intervalo a metade (no máximo 7 avaliações entre 1 e 100)
+    while low <= high:
+        middle = (low + high) // 2
+
+        if fits(middle):
+            best = middle
+            if lowest:
+                high = middle - 1
+            else:
+                low = middle + 1
+
+        elif lowest:
+            low = middle + 1
+        else:
+            high = middle - 1
 
-    for i in range(0, channel.shape[0], 8):
-        for j in range(0, channel.shape[1], 8):
-            channel[i:i+8, j:j+8] = ch_quantized[i:i+8, j:j+8] * q_matriz_with_factor
-    
-    channel = npround(channel).astype(float64)
-                
-    return channel
+    return best
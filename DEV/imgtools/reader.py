@@ -1,14 +1,38 @@
 """Contém funções para fins de leitura de imagem
 """
 
-from os.path import isfile
+from os.path import isfile, getsize
+from struct import unpack_from, error as StructError
+from typing import Iterator, NamedTuple, Tuple
 
-from matplotlib.pyplot import imread
-from numpy import ndarray
+from cv2 import cvtColor, COLOR_BGR2RGB
+from numpy import ndarray, asarray, ascontiguousarray, memmap, uint8
+from PIL import Image
+
+
+# compressões suportadas pelo leitor nativo (BI_RGB e BI_BITFIELDS)
+BI_RGB = 0
+BI_BITFIELDS = 3
+
+# máscaras BGRX, as únicas aceites em BI_BITFIELDS
+BGRX_MASKS = (0x00FF0000, 0x0000FF00, 0x000000FF)
+
+
+class BmpHeader(NamedTuple):
+    """Os campos do cabeçalho de um ficheiro BMP necessários para ler os pixeis
+    """
+    rows: int
+    cols: int
+    bits: int
+    top_down: bool
+    offset: int
+    stride: int
 
 
 def read_bmp(path: str) -> ndarray:
-    """Lê um arquivo BMP
+    """Lê um arquivo BMP\n
+    Os ficheiros de 24 e 32 bits sem compressão são lidos pelo leitor nativo (map_bmp)
+    e os restantes (paletas, RLE, ...) pelo Pillow
 
     Args:
         path (str): O caminho para o arquivo BMP
@@ -26,4 +50,139 @@ def read_bmp(path: str) -> ndarray:
         print("Given path is not a file")
         return
 
-    return imread(path)
+    header, _ = _parse_header(path)
+    if header is not None:
+        image = map_bmp(path)
+        if image is None:
+            return
+
+        # copiar as linhas em BGR e trocar os canais com o OpenCV é mais rápido
+        # do que copiar a vista RGB elemento a elemento
+        return cvtColor(ascontiguousarray(image[:, :, ::-1]), COLOR_BGR2RGB)
+
+    # leitura com o Pillow (sem importar o matplotlib), tal como o imread
+    with Image.open(path) as image:
+        if image.mode not in ("RGBA", "RGBX", "RGB", "L"):
+            image = image.convert("RGBA")
+
+        return asarray(image)
+
+
+def _parse_header(path: str) -> Tuple[BmpHeader, str]:
+    """Interpreta o cabeçalho de um ficheiro BMP
+
+    Args:
+        path (str): O caminho para o arquivo BMP
+
+    Returns:
+        Tuple[BmpHeader, str]: o cabeçalho ou None e a mensagem de erro
+    """
+
+    try:
+        with open(path, "rb") as bmp_file:
+            header = bmp_file.read(14 + 124)
+
+        if header[:2] != b"BM":
+            raise ValueError
+
+        offset, = unpack_from("<I", header, 10)
+        info_size, cols, rows, _, bits, compression = unpack_from("<IiiHHI", header, 14)
+
+        # as máscaras seguem o BITMAPINFOHEADER ou fazem parte dos cabeçalhos V4/V5
+        if compression == BI_BITFIELDS:
+            masks = unpack_from("<III", header, 54)
+
+    except (OSError, StructError, ValueError):
+        return None, "Invalid BMP file"
+
+    if info_size < 40 or bits not in (24, 32) or cols <= 0 or rows == 0 or \
+            compression not in (BI_RGB, BI_BITFIELDS) or \
+            (compression == BI_BITFIELDS and (bits != 32 or masks != BGRX_MASKS)):
+        return None, "Only uncompressed 24 and 32-bit BMP files are supported"
+
+    # cada linha ocupa um múltiplo de 4 bytes
+    stride = (cols * bits + 31) // 32 * 4
+
+    if offset + abs(rows) * stride > getsize(path):
+        return None, "Invalid BMP file"
+
+    return BmpHeader(abs(rows), cols, bits, rows < 0, offset, stride), None
+
+
+def read_bmp_header(path: str) -> BmpHeader:
+    """Lê o cabeçalho de um ficheiro BMP de 24 ou 32 bits sem compressão
+
+    Args:
+        path (str): O caminho para o arquivo BMP
+
+    Returns:
+        BmpHeader: as dimensões, a organização das linhas e a posição dos pixeis
+            ou None se o arquivo for inválido ou não for suportado
+    """
+
+    if not path.endswith(".bmp"):
+        print("File format is not of type 'bmp'")
+        return
+
+    if not isfile(path):
+        print("Given path is not a file")
+        return
+
+    header, error = _parse_header(path)
+    if header is None:
+        print(error)
+
+    return header
+
+
+def map_bmp(path: str) -> ndarray:
+    """Mapeia os pixeis de um ficheiro BMP de 24 ou 32 bits sem os ler\n
+    A matriz devolvida é uma vista (só de leitura) sobre um memory mapping do ficheiro:
+    a ordem das linhas (de baixo para cima), o alinhamento das linhas a 4 bytes e a ordem
+    BGR(X) são resolvidos pelos strides, pelo que cortar a matriz em faixas ou blocos
+    só lê do disco as linhas usadas
+
+    Args:
+        path (str): O caminho para o arquivo BMP
+
+    Returns:
+        ndarray: Uma vista (linhas, colunas, 3) com os valores de pixel em formato RGB
+            ou None se o arquivo for inválido ou não for suportado
+    """
+
+    header = read_bmp_header(path)
+    if header is None:
+        return
+
+    rows = memmap(path, dtype=uint8, mode="r", offset=header.offset, shape=(header.rows, header.stride))
+
+    # as linhas de um BMP estão guardadas de baixo para cima (exceto com altura negativa)
+    if not header.top_down:
+        rows = rows[::-1]
+
+    channels = header.bits // 8
+    pixels = rows[:, :header.cols * channels].reshape(header.rows, header.cols, channels)
+
+    # BGR(X) para RGB
+    return pixels[:, :, 2::-1]
+
+
+def read_bmp_strips(path: str, strip_rows: int) -> Iterator[ndarray]:
+    """Lê um arquivo BMP por faixas horizontais, de cima para baixo\n
+    As faixas são vistas sobre o memory mapping do ficheiro, pelo que a memória
+    usada não depende da altura da imagem
+
+    Args:
+        path (str): O caminho para o arquivo BMP
+        strip_rows (int): o número de linhas de cada faixa (a última pode ter menos)
+
+    Yields:
+        ndarray: as faixas com os valores de pixel em formato RGB
+    """
+
+    image = map_bmp(path)
+    if image is None:
+        return
+
+    for top in range(0, image.shape[0], strip_rows):
+        yield image[top:top + strip_rows]
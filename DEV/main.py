@@ -13,19 +13,20 @@ from os.path import basename
 
 from imgtools import show_img
 from imgtools import read_bmp
-from imgtools import create_colormap, separate_channels
-from imgtools import converter_to_ycbcr
-from imgtools import add_padding
-from imgtools import down_sample
-from imgtools import calculate_dct
-from imgtools import quantize
-from imgtools import dpcm_encoder
+from imgtools import create_colormap
+from imgtools import DCT_BACKENDS, set_dct_backend, select_dct_backend
 
-from file_worker import read_config, load_grammar, load_q_matrix, semantic, lex, synt
+from file_worker import read_config, load_grammar, semantic, lex, synt
+
+from pipeline import StageGraph
 
 from matplotlib.pyplot import close
 
-from codec import main_codec_function
+from codec import main_codec_function, encode_to_file, decode_from_file, save_jpeg, stream_jfif
+from codec import is_jpeg, read_jpeg, decode_jpeg, jpeg_stage
+from codec import run_batch
+from codec import run_sweep, parse_downsampling, RD_FORMATS
+from codec import encode_to_target, write_container
 
 def main(): 
     """Função principal onde todas as outras serão chamadas
@@ -65,6 +66,27 @@ def main():
         metavar="PATH"
     )
 
+    action_group.add_argument(
+        "--decode-from",
+        help="decode and show an image stored in a codec file",
+        type=str,
+        metavar="PATH"
+    )
+
+    action_group.add_argument(
+        "--batch",
+        help="encode every BMP image in a directory without plots (with -q and -s)",
+        type=str,
+        metavar="DIR"
+    )
+
+    action_group.add_argument(
+        "--rd-sweep",
+        help="write the rate-distortion curve of a BMP image or of every BMP image in a directory",
+        type=str,
+        metavar="PATH"
+    )
+
     # selecionar ação
     color_group = parser.add_argument_group()
     color_group.add_argument(
@@ -142,6 +164,136 @@ def main():
         action="store_true"
     )
 
+    parser.add_argument(
+        "-o", "--optimize-huffman",
+        help="use optimized Huffman tables when encoding (with -e)",
+        action="store_true"
+    )
+
+    parser.add_argument(
+        "--encode-to",
+        help="store the encoded image in a codec file instead of decoding it (with -e)",
+        type=str,
+        metavar="PATH"
+    )
+
+    parser.add_argument(
+        "--rdo",
+        help="use rate-distortion optimized quantization with the given lambda and report the savings (with -e, e.g. 0.01)",
+        type=float,
+        metavar="LAMBDA"
+    )
+
+    parser.add_argument(
+        "--target-size",
+        help="encode with the highest quality factor whose encoded data fits in the given size (with -e, instead of -q)",
+        type=float,
+        metavar="KB"
+    )
+
+    parser.add_argument(
+        "--target-psnr",
+        help="encode with the lowest quality factor that reaches the given PSNR (with -e, instead of -q)",
+        type=float,
+        metavar="DB"
+    )
+
+    parser.add_argument(
+        "--jpeg-to",
+        help="write the image as a baseline JPEG (JFIF) file (with -e)",
+        type=str,
+        metavar="PATH"
+    )
+
+    parser.add_argument(
+        "--stream",
+        help="encode the BMP in strips of one MCU row, with memory bounded by the image width (with --jpeg-to)",
+        action="store_true"
+    )
+
+    parser.add_argument(
+        "--sparse-idct",
+        help="decode with the sparse inverse DCT, which skips the zero coefficients of each block and prints the block classes with -e (with -e and --decode-from)",
+        action="store_true"
+    )
+
+    parser.add_argument(
+        "--workers",
+        help="number of processes used by --batch (default: number of CPUs)",
+        type=int,
+        metavar="N"
+    )
+
+    parser.add_argument(
+        "--output",
+        help="directory for the codec files of --batch and the curves of --rd-sweep (default: the image directory)",
+        type=str,
+        metavar="DIR"
+    )
+
+    parser.add_argument(
+        "--qualities",
+        help="quality factors evaluated by --rd-sweep (default: 10 20 ... 90)",
+        type=int,
+        nargs="+",
+        default=list(range(10, 100, 10)),
+        metavar="Q"
+    )
+
+    parser.add_argument(
+        "--modes",
+        help="downsampling modes evaluated by --rd-sweep (default: 4:2:0)",
+        type=str,
+        nargs="+",
+        default=["4:2:0"],
+        metavar="A:B:C"
+    )
+
+    parser.add_argument(
+        "--rd-format",
+        help="format of the rate-distortion curves written by --rd-sweep (default: csv)",
+        choices=RD_FORMATS,
+        default="csv"
+    )
+
+    parser.add_argument(
+        "--threads",
+        help="number of threads used to encode and decode the three channels (with -e and --decode-from)",
+        type=int,
+        default=1,
+        metavar="N"
+    )
+
+    parser.add_argument(
+        "--dct-backend",
+        help="DCT implementation ('auto' times the floating point ones and picks the fastest; default: fftpack)",
+        choices=[*DCT_BACKENDS, "auto"],
+        default="fftpack"
+    )
+
+    parser.add_argument(
+        "--cache-size",
+        help="memory budget in MB of the stage cache shared by the commands of a configuration file (default: 512)",
+        type=int,
+        default=512,
+        metavar="MB"
+    )
+
+    parser.add_argument(
+        "--cache-dir",
+        help="directory of a persistent stage cache reused across runs of configuration files",
+        type=str,
+        metavar="DIR"
+    )
+
+    parser.add_argument(
+        "--cache-dir-size",
+        help="disk budget in MB of the persistent stage cache (default: 2048)",
+        type=int,
+        default=2048,
+        metavar="MB"
+    )
+
     args = parser.parse_args()
 
     #  verificar se argumentos são usados com seus parents corretos
@@ -181,15 +333,141 @@ def main():
             return
         
 
+    if args.threads < 1:
+        parser.print_usage()
+        print(f"{basename(__file__)}: error: number of threads must be positive")
+        return
+
+    # a codificação por faixas só escreve ficheiros JPEG
+    if args.stream and not (args.encode and args.jpeg_to):
+        parser.print_usage()
+        print(f"{basename(__file__)}: error: --stream only applies to JPEG files (with -e and --jpeg-to)")
+        return
+
+    # a quantização RDO só se aplica ao encode do codec
+    if args.rdo is not None and not args.encode:
+        parser.print_usage()
+        print(f"{basename(__file__)}: error: --rdo only applies to the codec encoder (with -e)")
+        return
+
+    # a inversa esparsa só se aplica às imagens descodificadas
+    if args.sparse_idct and not (args.decode_from or (args.encode and not args.encode_to and not args.jpeg_to)):
+        parser.print_usage()
+        print(f"{basename(__file__)}: error: --sparse-idct only applies to decoded images (with -e or --decode-from)")
+        return
+
+    # motor da DCT usado por todas as fases (o scipy.fft usa as threads de --threads)
+    if args.dct_backend == "auto":
+        select_dct_backend(workers=args.threads)
+    else:
+        set_dct_backend(args.dct_backend, args.threads)
+
+    # codificar todas as imagens de uma pasta
+    if args.batch:
+        if args.quantize is None or args.downsample is None:
+            parser.print_usage()
+            print(f"{basename(__file__)}: error: a downsampling ratio and a quality factor must be given")
+            return
+
+        run_batch(args.batch, args.quantize, args.downsample, args.workers, args.output, args.optimize_huffman)
+        return
+
+    # curvas taxa-distorção de uma imagem ou de uma pasta
+    if args.rd_sweep:
+        modes = [parse_downsampling(mode) for mode in args.modes]
+        if None in modes:
+            parser.print_usage()
+            return
+
+        run_sweep(args.rd_sweep, args.qualities, modes, args.output, args.rd_format, args.optimize_huffman)
+        return
+
     # utilizar encode geral
     if args.encode:
 
+        targets = args.target_size is not None or args.target_psnr is not None
+
         # tratamento de parâmetros em falta
-        if args.image is None or args.quantize is None or args.downsample is None:
+        if args.image is None or (args.quantize is None and not targets) or args.downsample is None:
             print(f"{basename(__file__)}: error: an image path, a subsampling rate and a quality factor must be given")
             return
 
-        main_codec_function(args.image, args.quantize, args.downsample)
+        if args.rdo is not None and (targets or args.jpeg_to):
+            print(f"{basename(__file__)}: error: --rdo only applies to the codec files (without targets and --jpeg-to)")
+            return
+
+        # procurar o fator de qualidade para um tamanho máximo e/ou um PSNR mínimo
+        if targets:
+            if args.jpeg_to:
+                print(f"{basename(__file__)}: error: the targets apply to the codec file (without --jpeg-to)")
+                return
+
+            image = read_bmp(args.image)
+            if image is None:
+                return
+
+            max_bytes = None if args.target_size is None else int(args.target_size * 1024)
+
+            result = encode_to_target(
+                image, tuple(args.downsample), max_bytes, args.target_psnr, args.optimize_huffman, args.threads
+            )
+            if result is None:
+                return
+
+            encoded, rows, cols, target = result
+            print(
+                f"Quality factor {target.quality}: {target.bytes / 1024:.1f}KB"
+                + ("" if target.psnr is None else f", PSNR {target.psnr:.2f} dB")
+                + f" ({target.evaluations} quality factors evaluated)"
+            )
+
+            if args.encode_to:
+                write_container(args.encode_to, encoded, rows, cols, target.quality, args.downsample)
+                return
+
+            main_codec_function(
+                args.image, target.quality, args.downsample, args.optimize_huffman, args.threads,
+                sparse_idct=args.sparse_idct
+            )
+            return
+
+        # escrever um ficheiro JPEG baseline por faixas, sem ler a imagem inteira
+        if args.jpeg_to and args.stream:
+            if args.optimize_huffman:
+                print(f"{basename(__file__)}: error: optimized Huffman tables need the whole image (without --stream)")
+                return
+
+            stream_jfif(args.image, args.jpeg_to, args.quantize, args.downsample)
+            return
+
+        # escrever um ficheiro JPEG baseline
+        if args.jpeg_to:
+            image = read_bmp(args.image)
+            if image is None:
+                return
+
+            save_jpeg(args.jpeg_to, image, args.quantize, args.downsample, args.optimize_huffman)
+            return
+
+        # guardar a imagem codificada num ficheiro
+        if args.encode_to:
+            encode_to_file(
+                args.image, args.encode_to, args.quantize, args.downsample, args.optimize_huffman, args.threads, args.rdo
+            )
+            return
+
+        main_codec_function(
+            args.image, args.quantize, args.downsample, args.optimize_huffman, args.threads, args.rdo, args.sparse_idct
+        )
+        return
+
+    # descodificar uma imagem guardada num ficheiro
+    if args.decode_from:
+        image = decode_from_file(args.decode_from, args.threads, args.sparse_idct)
+        if image is None:
+            return
+
+        show_img(image, name=args.name)
         return
 
 
@@ -198,9 +476,20 @@ def main():
     # o utilizador escolhe ver a imagem
     if args.image:
 
-        # ler a imagem
-        image = read_bmp(args.image)
-        if image is None:
+        graph = StageGraph()
+
+        # ler a imagem (os ficheiros JPEG são lidos ao nível dos coeficientes)
+        jpeg = None
+        if is_jpeg(args.image):
+            jpeg = read_jpeg(args.image)
+            if jpeg is None:
+                return
+
+            image_key = graph.source(decode_jpeg(jpeg))
+        else:
+            image_key = graph.read(args.image)
+
+        if image_key is None:
             return
 
         if args.name:
@@ -210,7 +499,7 @@ def main():
 
         # add padding to the image
         if args.padding:
-            image, *_ = add_padding(image, args.padding)
+            image_key += (graph.stage("padding", args.padding),)
 
         # utilizador quer usar um colormap
         if args.colormap:
@@ -220,83 +509,64 @@ def main():
             if colormap is None:
                 return
 
-            # converter a imagem para ycbcr
-            if args.ycbcr:
-                channels = converter_to_ycbcr(image)
-
-            if not args.ycbcr:
-                # separar os canais
-                channels = separate_channels(image)
-
-                # ocorreu um erro
-                if channels is None:
-                    return
-
-            # fazer downsampling da imagem
-            if args.channel and args.downsample is not None:
-                channels = down_sample(channels[0], channels[1], channels[2], args.downsample)
-
-                # ocorreu um erro
-                if channels is None:
-                    return
-
-            # calcular a dct
-            if args.channel and args.dct is not None:
-                dct_block = None if args.dct == 0 else args.dct
-                log_correction = True
-
-                channels = calculate_dct(channels[0], channels[1], channels[2], dct_block)
-
-                # ocorreu um erro
-                if channels is None:
-                    return
+            if args.channel not in (1, 2, 3):
+                parser.print_usage()
+                print(f"{basename(__file__)}: error: color channel must be 1, 2 or 3")
+                return
 
-            # quantizar os canais
-            if args.channel and args.quantize:
-                q_matrix_y = load_q_matrix("q_matrix_y.csv")
-                q_matrix_cbcr = load_q_matrix("q_matrix_cbcr.csv")
+            # ficheiros JPEG: as fases vêm dos coeficientes do ficheiro, com as
+            # tabelas de quantização e a subamostragem do próprio ficheiro
+            if jpeg is not None:
+                stage = "ycbcr" if args.ycbcr else "rgb"
+                if args.dct is not None:
+                    stage = "dct"
+                if args.quantize:
+                    stage = "quantize"
+                if args.dcpm:
+                    stage = "dpcm"
+
+                selected_channel = jpeg_stage(jpeg, stage)[args.channel - 1]
+                log_correction = stage in ("dct", "quantize", "dpcm")
+
+            else:
+                # converter a imagem para ycbcr ou separar os canais
+                # (só as fases do canal selecionado são calculadas)
+                channel_key = image_key + (
+                    graph.stage("ycbcr" if args.ycbcr else "rgb"),
+                    graph.stage("channel", args.channel - 1)
+                )
 
-                if args.quantize > 100 or args.quantize < 0:
-                    print(f"{basename(__file__)}: error: quality factor must be a percentage value")
-                    return
+                # fazer downsampling da imagem
+                if args.downsample is not None:
+                    channel_key += (graph.stage("downsample", args.downsample),)
 
-                channels = (
-                    quantize(channels[0], q_matrix_y, args.quantize),
-                    quantize(channels[1], q_matrix_cbcr, args.quantize),
-                    quantize(channels[2], q_matrix_cbcr, args.quantize)
-                )
+                # calcular a dct
+                if args.dct is not None:
+                    dct_block = None if args.dct == 0 else args.dct
+                    log_correction = True
 
-                # ocorreu um erro
-                if channels[0] is None or channels[1] is None or channels[2] is None:
-                    return
+                    channel_key += (graph.stage("dct", dct_block),)
 
-                log_correction = True
+                # quantizar os canais
+                if args.quantize:
+                    if args.quantize > 100 or args.quantize < 0:
+                        print(f"{basename(__file__)}: error: quality factor must be a percentage value")
+                        return
 
+                    channel_key += (graph.stage("quantize", args.quantize),)
+                    log_correction = True
 
-            # codificar os coeficientes DC os canais
-            if args.channel and args.dcpm:
+                # codificar os coeficientes DC os canais
+                if args.dcpm:
+                    channel_key += (graph.stage("dpcm"),)
+                    log_correction = True
 
-                channels = (
-                    dpcm_encoder(channels[0]),
-                    dpcm_encoder(channels[1]),
-                    dpcm_encoder(channels[2])
-                )
+                selected_channel = graph.get(channel_key)
 
                 # ocorreu um erro
-                if channels[0] is None or channels[1] is None or channels[2] is None:
+                if selected_channel is None:
                     return
 
-                log_correction = True
-
-
-            # selecionar o canal dependendo da escolha do utilizador
-            if args.channel == 1:
-                selected_channel = channels[0]
-            if args.channel == 2:
-                selected_channel = channels[1]
-            if args.channel == 3:
-                selected_channel = channels[2]
-
 
             # mostrar a imagem com o colormap
             show_img(selected_channel, colormap, name=name, log_correction=log_correction)
@@ -304,7 +574,7 @@ def main():
 
         # mostrar a imagem sem colormap
         else:
-            show_img(image, name=name, log_correction=log_correction)
+            show_img(graph.get(image_key), name=name, log_correction=log_correction)
 
 
     # usar um ficheiro de configuração
@@ -321,7 +591,7 @@ def main():
         if not synt(tokens, grammar):
             return
 
-        semantic(tokens)
+        semantic(tokens, args.cache_size * 2**20, args.cache_dir, args.cache_dir_size * 2**20)
 
 
 if __name__ == "__main__":
@@ -1,4 +1,6 @@
 from .metrics import MSE
 from .metrics import RMSE
 from .metrics import SNR
-from .metrics import PSNR
\ No newline at end of file
+from .metrics import PSNR
+from .metrics import compute_metrics, block_metrics, ImageMetrics
+from .ssim import ssim, ms_ssim, SSIM_CHANNELS
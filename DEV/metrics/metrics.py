@@ -1,58 +1,205 @@
 """Calcula as métricas relativas à compressão da imagem.
 """
 
-from numpy import sum as npsum, ndarray, float32, round as npround, max as npmax, mean
+from typing import NamedTuple, Tuple
 
-from imgtools import show_img
-from imgtools import create_colormap
-from imgtools import converter_to_ycbcr
-from imgtools import add_padding
+from numpy import sum as npsum, ndarray, float32, float64, max as npmax, zeros, empty, full, arange, add
+from numpy import subtract, multiply, matmul
+from numpy import log10 as nplog10, errstate
 
-from math import sqrt, log10
+from math import sqrt, log10, inf
 
-def MSE(imagem_original: ndarray, imagem_reconstruida: ndarray) -> float:
-    """Calcula a diferença média quadrada de entre os píxeis da imagem original
-    e da imagem reconstruída e apresenta as diferenças numa imagem preto e branco.
+from imgtools.color import YCBCR_MATRIX
+
+
+# número de pixeis processados de cada vez: os buffers em float32 de um grupo (384 KB)
+# ficam na cache, enquanto grupos de 1 << 20 pixeis são mais lentos do que a imagem inteira
+CHUNK_PIXELS = 1 << 15
+
+# pesos da luminância (primeira linha da matriz RGB -> YCbCr)
+Y_WEIGHTS = YCBCR_MATRIX[0]
+Y_WEIGHTS_32 = Y_WEIGHTS.astype(float32)
+
+
+class ImageMetrics(NamedTuple):
+    """As métricas de uma imagem reconstruída\n
+    Tal como em MSE, o erro da imagem é a soma dos erros dos canais a dividir pelo
+    número de pixeis, pelo que mse é a soma de channel_mse. O pico do PSNR é o valor
+    mais alto da imagem original (e da luminância original no PSNR de Y). Os valores
+    da luminância só são calculados quando pedidos (ver compute_metrics)
+    """
+    mse: float
+    rmse: float
+    snr: float
+    psnr: float
+    channel_mse: Tuple[float, ...]
+    channel_psnr: Tuple[float, ...]
+    y_mse: float = None
+    y_psnr: float = None
+
+
+def _ratio(signal: float, noise: float) -> float:
+    """Calcula uma relação sinal-ruído em dB (infinita sem ruído)
+    """
+    return 10 * log10(signal / noise) if noise else inf
+
+
+def compute_metrics(
+    imagem_original: ndarray, imagem_reconstruida: ndarray, chunk_pixels: int = CHUNK_PIXELS, luminance: bool = False
+) -> ImageMetrics:
+    """Calcula o MSE, RMSE, SNR e PSNR (e os valores de cada canal e da luminância)
+    numa só passagem pelas duas imagens\n
+    As imagens são percorridas por grupos de pixeis convertidos para float32 (como no
+    cálculo separado do MSE), pelo que a memória usada não depende do tamanho das imagens
+    e os buffers reutilizados ficam na cache; as imagens até chunk_pixels pixeis são um só
+    grupo. As somas de cada canal são produtos por um vetor de uns (BLAS), muito mais
+    rápidos do que as reduções ao longo do eixo dos pixeis, e são acumuladas em float64
 
     Args:
-        imagem_original (ndarray): a imagem original
-        imagem_reconstruida (ndarray): a imagem reconstruida
+        imagem_original (ndarray): a imagem original (linhas, colunas) ou (linhas, colunas, canais)
+        imagem_reconstruida (ndarray): a imagem reconstruida, com a mesma shape
+        chunk_pixels (int, optional): o número de pixeis de cada grupo. Default a CHUNK_PIXELS.
+        luminance (bool, optional): calcular também o MSE e o PSNR da luminância. Default a False.
 
     Returns:
-        float: as diferenças entre a imagem original e reconstruida
+        ImageMetrics: as métricas (com as da luminância só quando pedidas e nas imagens RGB)
+        ou None caso as imagens tenham shapes diferentes
     """
 
-    imagem_original_com_padding,_,_ = add_padding(imagem_original, 32)
-    imagem_reconstruida_com_padding,_,_ = add_padding(imagem_reconstruida, 32)
+    if imagem_original.shape != imagem_reconstruida.shape:
+        print("The original and reconstructed images must have the same shape")
+        return
+
+    pixels = imagem_original.shape[0] * imagem_original.shape[1]
+    original = imagem_original.reshape(pixels, -1)
+    reconstructed = imagem_reconstruida.reshape(pixels, -1)
+
+    channels = original.shape[1]
+    rgb = luminance and channels == 3
+
+    # somas de cada canal: erro quadrático e potência do original
+    error = zeros(channels)
+    power = zeros(channels)
+    peak = y_error = y_peak = 0.0
+
+    # buffers reutilizados por todos os grupos
+    size = min(chunk_pixels, pixels)
+    ones = full(size, 1.0, dtype=float32)
+    difference_buffer = empty((size, channels), dtype=float32)
+    squared_buffer = empty((size, channels), dtype=float32)
+    y_buffer = empty(size, dtype=float32) if rgb else None
+
+    for start in range(0, pixels, chunk_pixels):
+        chunk = original[start:start + chunk_pixels]
+        count = chunk.shape[0]
+
+        difference = difference_buffer[:count]
+        squared = squared_buffer[:count]
+
+        # as operações convertem os pixeis diretamente para os buffers
+        subtract(chunk, reconstructed[start:start + chunk_pixels], out=difference, dtype=float32)
+
+        error += ones[:count] @ multiply(difference, difference, out=squared)
+        power += ones[:count] @ multiply(chunk, chunk, out=squared, dtype=float32)
+        peak = max(peak, chunk.max())
+
+        if rgb:
+            y_chunk = matmul(difference, Y_WEIGHTS_32, out=y_buffer[:count])
+            y_error += float(y_chunk @ y_chunk)
+            y_peak = max(y_peak, matmul(chunk, Y_WEIGHTS_32, out=y_chunk, dtype=float32).max())
+
+    mse = float(error.sum()) / pixels
+    signal = float(peak) ** 2
+
+    return ImageMetrics(
+        mse=mse,
+        rmse=sqrt(mse),
+        snr=_ratio(float(power.sum()), float(error.sum())),
+        psnr=_ratio(signal, mse),
+        channel_mse=tuple(float(value) / pixels for value in error),
+        channel_psnr=tuple(_ratio(signal, float(value) / pixels) for value in error),
+        y_mse=float(y_error) / pixels if rgb else None,
+        y_psnr=_ratio(float(y_peak) ** 2, float(y_error) / pixels) if rgb else None,
+    )
+
 
-    imagem_O = converter_to_ycbcr(imagem_original_com_padding)
-    imagem_R = converter_to_ycbcr(imagem_reconstruida_com_padding)
+def block_metrics(
+    imagem_original: ndarray, imagem_reconstruida: ndarray, block_size: int = 8, chunk_pixels: int = CHUNK_PIXELS
+) -> Tuple[ndarray, ndarray]:
+    """Calcula o MSE e o PSNR de cada bloco da imagem reconstruída\n
+    Os blocos incompletos das margens usam só os seus pixeis e o pico do PSNR
+    é o valor mais alto da imagem original, como em compute_metrics
 
-    differences = abs(imagem_O[0].astype(float32) - imagem_R[0])
+    Args:
+        imagem_original (ndarray): a imagem original (linhas, colunas) ou (linhas, colunas, canais)
+        imagem_reconstruida (ndarray): a imagem reconstruida, com a mesma shape
+        block_size (int, optional): o tamanho dos blocos. Default a 8.
+        chunk_pixels (int, optional): o número de pixeis de cada faixa. Default a CHUNK_PIXELS.
 
+    Returns:
+        Tuple[ndarray, ndarray]: o MSE e o PSNR de cada bloco (linhas/B, colunas/B) em float64
+        ou None caso as imagens tenham shapes diferentes
+    """
 
-    # quarto print
-    print(f"Média de diferenças: {mean(differences)}")
+    if imagem_original.shape != imagem_reconstruida.shape:
+        print("The original and reconstructed images must have the same shape")
+        return
 
-    show_img(
-        imagem_reconstruida,
-        fig_number=11,
-        sub_plot_config=(1,1,1),
-        plot_title="Imagem Reconstruída"
-    )
+    rows, cols = imagem_original.shape[:2]
+    original = imagem_original.reshape(rows, cols, -1)
+    reconstructed = imagem_reconstruida.reshape(rows, cols, -1)
 
-    show_img(
-        differences,
-        create_colormap((0,0,0), (1,1,1)),
-        fig_number=12,
-        sub_plot_config=(1,1,1),
-        plot_title="Diferenças Original-Reconstruído"
-    )
+    block_rows = -(-rows // block_size)
+    block_cols = -(-cols // block_size)
+    col_starts = arange(0, cols, block_size)
 
+    error = zeros((block_rows, block_cols))
+    peak = 0.0
+
+    channel_ones = full(original.shape[2], 1.0)
+
+    # faixas com um número inteiro de linhas de blocos
+    step = max(1, chunk_pixels // (cols * block_size)) * block_size
+
+    for top in range(0, rows, step):
+        original_rows = original[top:top + step].astype(float64)
+        difference = original_rows - reconstructed[top:top + step]
+
+        squared = (difference * difference) @ channel_ones
+        squared = add.reduceat(add.reduceat(squared, arange(0, squared.shape[0], block_size), axis=0), col_starts, axis=1)
+
+        error[top // block_size:top // block_size + squared.shape[0]] = squared
+        peak = max(peak, original_rows.max())
+
+    # número de pixeis de cada bloco (menos nas margens)
+    heights = zeros(block_rows) + block_size
+    widths = zeros(block_cols) + block_size
+    heights[-1] = rows - (block_rows - 1) * block_size
+    widths[-1] = cols - (block_cols - 1) * block_size
+
+    mse = error / (heights[:, None] * widths[None, :])
+
+    with errstate(divide="ignore"):
+        psnr = 10 * nplog10(peak ** 2 / mse)
+
+    return mse, psnr
+
+def MSE(imagem_original: ndarray, imagem_reconstruida: ndarray) -> float:
+    """Calcula a diferença média quadrada de entre os píxeis da imagem original
+    e da imagem reconstruída (sem plots; ver codec.viewer.show_reconstruction)\n
+    Para calcular todas as métricas de uma só vez ver compute_metrics
+
+    Args:
+        imagem_original (ndarray): a imagem original
+        imagem_reconstruida (ndarray): a imagem reconstruida
+
+    Returns:
+        float: as diferenças entre a imagem original e reconstruida
+    """
 
-    imagem_original = imagem_original.astype(float32)
+    metrics = compute_metrics(imagem_original, imagem_reconstruida)
 
-    return npsum((imagem_original - imagem_reconstruida.astype(float32))**2) / (imagem_original.shape[0]*imagem_original.shape[1])
+    return None if metrics is None else metrics.mse
 
 def RMSE(MSE_value: float) -> float:
     """Calcula a raíz da diferença média quadrada de entre os píxeis da imagem original
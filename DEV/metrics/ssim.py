@@ -0,0 +1,261 @@
+"""Calcula o SSIM e o MS-SSIM (Wang et al.) entre a imagem original e a reconstruída
+"""
+
+from typing import List, Tuple
+
+from cv2 import sepFilter2D, getGaussianKernel, CV_64F
+from numpy import ndarray, float64, zeros, empty, maximum, prod
+
+from .metrics import Y_WEIGHTS
+
+
+# janela gaussiana de 11x11 com desvio padrão de 1.5
+WINDOW_SIZE = 11
+WINDOW_SIGMA = 1.5
+GAUSSIAN = getGaussianKernel(WINDOW_SIZE, WINDOW_SIGMA, CV_64F)
+
+# constantes de estabilização (para a gama [0, 255])
+DATA_RANGE = 255
+C1 = (0.01 * DATA_RANGE) ** 2
+C2 = (0.03 * DATA_RANGE) ** 2
+
+# pesos das escalas do MS-SSIM
+MS_SSIM_WEIGHTS = (0.0448, 0.2856, 0.3001, 0.2363, 0.1333)
+
+# canais em que as métricas são calculadas: luminância ou a média dos canais RGB
+SSIM_CHANNELS = ("y", "rgb")
+
+# número de linhas de cada faixa (limita a memória dos mapas intermédios)
+CHUNK_ROWS = 64
+
+
+def _filter(plane: ndarray) -> ndarray:
+    """Aplica a janela gaussiana separável a um plano, mantendo só a região válida
+
+    Args:
+        plane (ndarray): o plano em float64
+
+    Returns:
+        ndarray: o plano filtrado sem as margens de WINDOW_SIZE // 2 pixeis
+    """
+
+    radius = WINDOW_SIZE // 2
+
+    return sepFilter2D(plane, -1, GAUSSIAN, GAUSSIAN)[radius:-radius, radius:-radius]
+
+
+def _window_sums(x: ndarray, y: ndarray) -> Tuple[float, float]:
+    """Calcula as somas dos mapas de SSIM e de contraste-estrutura de um par de planos
+
+    Args:
+        x (ndarray): o plano original em float64
+        y (ndarray): o plano reconstruído em float64
+
+    Returns:
+        Tuple[float, float]: a soma do SSIM e a soma do contraste-estrutura das janelas
+    """
+
+    mu_x = _filter(x)
+    mu_y = _filter(y)
+
+    mu_xx = mu_x * mu_x
+    mu_yy = mu_y * mu_y
+    mu_xy = mu_x * mu_y
+
+    sigma_xx = _filter(x * x) - mu_xx
+    sigma_yy = _filter(y * y) - mu_yy
+    sigma_xy = _filter(x * y) - mu_xy
+
+    cs = (2 * sigma_xy + C2) / (sigma_xx + sigma_yy + C2)
+    luminance = (2 * mu_xy + C1) / (mu_xx + mu_yy + C1)
+
+    return float((luminance * cs).sum()), float(cs.sum())
+
+
+def _planes(image: ndarray, channel: str) -> List[ndarray]:
+    """Converte (uma faixa de) uma imagem nos planos em float64 em que as métricas são calculadas
+
+    Args:
+        image (ndarray): a imagem (linhas, colunas) ou (linhas, colunas, 3)
+        channel (str): o canal {y, rgb}
+
+    Returns:
+        List[ndarray]: os planos (um só nas imagens de um canal e em "y")
+    """
+
+    if image.ndim == 2:
+        return [image.astype(float64)]
+
+    if channel == "y":
+        return [image @ Y_WEIGHTS]
+
+    return [image[:, :, index].astype(float64) for index in range(image.shape[2])]
+
+
+def _ssim_sums(original, reconstructed, channel: str, chunk_rows: int) -> Tuple[ndarray, ndarray, int]:
+    """Calcula as somas dos mapas de SSIM e de contraste-estrutura por faixas de linhas\n
+    As faixas sobrepõem-se em WINDOW_SIZE - 1 linhas, pelo que cada janela é calculada uma só vez
+
+    Args:
+        original (ndarray): a imagem original
+        reconstructed (ndarray): a imagem reconstruída
+        channel (str): o canal {y, rgb}
+        chunk_rows (int): o número de linhas de janelas de cada faixa
+
+    Returns:
+        Tuple[ndarray, ndarray, int]: as somas de cada plano e o número de janelas de cada plano
+    """
+
+    rows, cols = original.shape[:2]
+    border = WINDOW_SIZE - 1
+
+    ssim_sums, cs_sums = None, None
+
+    for top in range(0, rows - border, chunk_rows):
+        bottom = min(top + chunk_rows, rows - border) + border
+
+        sums = [
+            _window_sums(x, y) for x, y in
+            zip(_planes(original[top:bottom], channel), _planes(reconstructed[top:bottom], channel))
+        ]
+
+        if ssim_sums is None:
+            ssim_sums, cs_sums = zeros(len(sums)), zeros(len(sums))
+
+        ssim_sums += [ssim_sum for ssim_sum, _ in sums]
+        cs_sums += [cs_sum for _, cs_sum in sums]
+
+    return ssim_sums, cs_sums, (rows - border) * (cols - border)
+
+
+def _half(image: ndarray, channel: str, chunk_rows: int) -> List[ndarray]:
+    """Reduz os planos de uma imagem para metade da resolução (média de 2x2 pixeis), por faixas
+
+    Args:
+        image (ndarray): a imagem (ou um plano já em float64)
+        channel (str): o canal {y, rgb}
+        chunk_rows (int): o número de linhas de cada faixa
+
+    Returns:
+        List[ndarray]: os planos reduzidos
+    """
+
+    rows, cols = image.shape[0] // 2, image.shape[1] // 2
+    step = max(1, chunk_rows // 2)
+
+    halves = None
+
+    for top in range(0, rows, step):
+        bottom = min(top + step, rows)
+        planes = _planes(image[2 * top:2 * bottom, :2 * cols], channel)
+
+        if halves is None:
+            halves = [empty((rows, cols)) for _ in planes]
+
+        for half, plane in zip(halves, planes):
+            half[top:bottom] = plane.reshape(bottom - top, 2, cols, 2).mean(axis=(1, 3))
+
+    return halves
+
+
+def _check(imagem_original: ndarray, imagem_reconstruida: ndarray, channel: str, min_size: int) -> bool:
+    """Verifica se as métricas podem ser calculadas para um par de imagens
+
+    Args:
+        imagem_original (ndarray): a imagem original
+        imagem_reconstruida (ndarray): a imagem reconstruida
+        channel (str): o canal {y, rgb}
+        min_size (int): o tamanho mínimo das imagens
+
+    Returns:
+        bool: True se as métricas podem ser calculadas
+    """
+
+    if imagem_original.shape != imagem_reconstruida.shape:
+        print("The original and reconstructed images must have the same shape")
+        return False
+
+    if channel not in SSIM_CHANNELS:
+        print(f"Unknown SSIM channel '{channel}' (choose from {', '.join(SSIM_CHANNELS)})")
+        return False
+
+    if imagem_original.ndim == 3 and imagem_original.shape[2] != 3:
+        print("Only RGB and single channel images are supported")
+        return False
+
+    if min(imagem_original.shape[:2]) < min_size:
+        print(f"The images must be at least {min_size}x{min_size} pixels")
+        return False
+
+    return True
+
+
+def ssim(
+    imagem_original: ndarray, imagem_reconstruida: ndarray, channel: str = "y", chunk_rows: int = CHUNK_ROWS
+) -> float:
+    """Calcula o SSIM médio entre a imagem original e a reconstruída\n
+    As médias, variâncias e covariância locais são calculadas com uma janela gaussiana
+    separável (11x11, sigma de 1.5) sobre planos inteiros, por faixas de linhas,
+    pelo que a memória dos mapas intermédios não depende da altura da imagem
+
+    Args:
+        imagem_original (ndarray): a imagem original (linhas, colunas, 3) ou (linhas, colunas)
+        imagem_reconstruida (ndarray): a imagem reconstruida, com a mesma shape
+        channel (str, optional): a luminância ou a média dos canais RGB {y, rgb}. Default a "y".
+        chunk_rows (int, optional): o número de linhas de janelas de cada faixa. Default a CHUNK_ROWS.
+
+    Returns:
+        float: o SSIM ou None caso as imagens não sejam válidas
+    """
+
+    if not _check(imagem_original, imagem_reconstruida, channel, WINDOW_SIZE):
+        return
+
+    ssim_sums, _, windows = _ssim_sums(imagem_original, imagem_reconstruida, channel, chunk_rows)
+
+    return float(ssim_sums.mean() / windows)
+
+
+def ms_ssim(
+    imagem_original: ndarray, imagem_reconstruida: ndarray, channel: str = "y", chunk_rows: int = CHUNK_ROWS
+) -> float:
+    """Calcula o SSIM multi-escala (MS-SSIM) entre a imagem original e a reconstruída\n
+    O contraste-estrutura é calculado em cada uma das escalas de MS_SSIM_WEIGHTS
+    (reduzindo os planos para metade entre escalas) e o SSIM completo na última.
+    A primeira escala é calculada por faixas diretamente sobre as imagens
+
+    Args:
+        imagem_original (ndarray): a imagem original (linhas, colunas, 3) ou (linhas, colunas)
+        imagem_reconstruida (ndarray): a imagem reconstruida, com a mesma shape
+        channel (str, optional): a luminância ou a média dos canais RGB {y, rgb}. Default a "y".
+        chunk_rows (int, optional): o número de linhas de janelas de cada faixa. Default a CHUNK_ROWS.
+
+    Returns:
+        float: o MS-SSIM ou None caso as imagens não sejam válidas
+    """
+
+    scales = len(MS_SSIM_WEIGHTS)
+
+    if not _check(imagem_original, imagem_reconstruida, channel, WINDOW_SIZE << (scales - 1)):
+        return
+
+    # as escalas seguintes são calculadas sobre os planos já convertidos (um por canal)
+    originals, reconstructeds = [imagem_original], [imagem_reconstruida]
+    values = list()
+
+    for scale in range(scales):
+        if scale > 0:
+            originals = [half for plane in originals for half in _half(plane, channel, chunk_rows)]
+            reconstructeds = [half for plane in reconstructeds for half in _half(plane, channel, chunk_rows)]
+
+        sums = [_ssim_sums(x, y, channel, chunk_rows) for x, y in zip(originals, reconstructeds)]
+
+        ssim_sums = [value for ssim_sum, _, windows in sums for value in ssim_sum / windows]
+        cs_sums = [value for _, cs_sum, windows in sums for value in cs_sum / windows]
+
+        values.append(ssim_sums if scale == scales - 1 else cs_sums)
+
+    # valores de cada plano em cada escala (os negativos são limitados a zero)
+    values = maximum(values, 0) ** [[weight] for weight in MS_SSIM_WEIGHTS]
+
+    return float(prod(values, axis=0).mean())
@@ -0,0 +1,14 @@
+"""Contém ferramentas para executar as fases do codec sem repetir trabalho
+"""
+
+# cache
+from .cache import StageCache, image_digest, DEFAULT_BUDGET
+
+# disk
+from .disk import DiskCache, DEFAULT_DISK_BUDGET, code_version
+
+# graph
+from .graph import StageGraph, Stage, Table, STAGES
+
+# parallel
+from .parallel import map_channels
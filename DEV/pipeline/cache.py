@@ -0,0 +1,248 @@
+"""Contém a cache das fases do codec, que memoriza os resultados intermédios
+pelo conteúdo da imagem e pelos parâmetros das fases aplicadas
+"""
+
+from collections import OrderedDict
+from hashlib import blake2b
+from os import stat
+from os.path import abspath
+from threading import Lock
+from typing import Callable, Hashable, Tuple
+
+from numpy import ndarray, ascontiguousarray
+
+from .disk import DiskCache, MISSING
+
+
+# orçamento de memória por omissão (em bytes)
+DEFAULT_BUDGET = 512 * 2**20
+
+
+def image_digest(image: ndarray) -> str:
+    """Calcula a impressão digital do conteúdo de uma imagem\n
+    A shape e o tipo de dados fazem parte da impressão digital, para que
+    imagens com os mesmos bytes e dimensões diferentes não colidam
+
+    Args:
+        image (ndarray): a imagem
+
+    Returns:
+        str: a impressão digital em hexadecimal
+    """
+
+    digest = blake2b(digest_size=16)
+    digest.update(f"{image.dtype.str}{image.shape}".encode())
+    digest.update(ascontiguousarray(image).data)
+
+    return digest.hexdigest()
+
+
+def _nbytes(value) -> int:
+    """Calcula a memória ocupada pelos arrays de um resultado
+
+    Args:
+        value (object): um array ou um tuplo de resultados
+
+    Returns:
+        int: o número de bytes dos arrays
+    """
+
+    if isinstance(value, ndarray):
+        return value.nbytes
+
+    if isinstance(value, (tuple, list)):
+        return sum(_nbytes(item) for item in value)
+
+    return 0
+
+
+def _freeze(value) -> None:
+    """Torna só de leitura os arrays de um resultado, já que
+    são partilhados por todos os pedidos à cache
+
+    Args:
+        value (object): um array ou um tuplo de resultados
+    """
+
+    if isinstance(value, ndarray):
+        value.setflags(write=False)
+
+    elif isinstance(value, (tuple, list)):
+        for item in value:
+            _freeze(item)
+
+
+class StageCache:
+    """Cache LRU dos resultados das fases, limitada por um orçamento de memória\n
+    As chaves são tuplos com a impressão digital da imagem seguida dos parâmetros
+    das fases pela ordem em que foram aplicadas, pelo que cada prefixo da cadeia
+    de fases é calculado uma só vez por sessão\n
+    Com uma cache em disco, os resultados que não estão em memória são procurados
+    no disco antes de serem calculados e os calculados são também guardados no disco
+    """
+
+    def __init__(self, budget: int = DEFAULT_BUDGET, disk: DiskCache = None) -> None:
+        """Construtor da classe StageCache
+
+        Args:
+            budget (int, optional): o orçamento de memória em bytes. Default a DEFAULT_BUDGET.
+            disk (DiskCache, optional): a cache em disco. Default a None (só em memória).
+        """
+        self.budget = budget
+        self.disk = disk
+        self.size = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def get(self, key: Hashable):
+        """Procura um resultado na memória e depois no disco\n
+        Os resultados lidos do disco passam a estar também em memória
+
+        Args:
+            key (Hashable): a chave (impressão digital e parâmetros das fases)
+
+        Returns:
+            object: o resultado da fase ou MISSING caso não esteja guardado
+        """
+
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key][0]
+
+            self.misses += 1
+
+        value = MISSING if self.disk is None else self.disk.load(key)
+
+        if value is not MISSING:
+            _freeze(value)
+            with self._lock:
+                self._store(key, value)
+
+        return value
+
+    def put(self, key: Hashable, value) -> None:
+        """Guarda um resultado calculado em memória e no disco\n
+        Os resultados None (erros) não são guardados
+
+        Args:
+            key (Hashable): a chave
+            value (object): o resultado (os arrays passam a ser só de leitura)
+        """
+
+        if value is None:
+            return
+
+        _freeze(value)
+
+        with self._lock:
+            self._store(key, value)
+
+        # a escrita no disco não bloqueia os outros canais (a cache em disco tem o seu lock)
+        if self.disk is not None:
+            self.disk.store(key, value)
+
+    def lookup(self, key: Hashable, compute: Callable):
+        """Devolve o resultado memorizado para a chave ou calcula-o e guarda-o\n
+        Os resultados maiores do que o orçamento não são guardados em memória
+
+        Args:
+            key (Hashable): a chave (impressão digital e parâmetros das fases)
+            compute (Callable): a função que calcula o resultado
+
+        Returns:
+            object: o resultado da fase (com os arrays só de leitura)
+        """
+
+        value = self.get(key)
+
+        if value is MISSING:
+            value = compute()
+            self.put(key, value)
+
+        return value
+
+    def _store(self, key: Hashable, value) -> None:
+        """Guarda um resultado, descartando os menos usados recentemente
+        até respeitar o orçamento de memória
+
+        Args:
+            key (Hashable): a chave
+            value (object): o resultado
+        """
+
+        nbytes = _nbytes(value)
+        if nbytes > self.budget:
+            return
+
+        self._entries[key] = (value, nbytes)
+        self.size += nbytes
+
+        while self.size > self.budget:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.size -= evicted
+            self.evictions += 1
+
+    def read(self, path: str, reader: Callable) -> Tuple[ndarray, tuple]:
+        """Lê uma imagem através da cache\n
+        A leitura é memorizada pelo caminho, data de modificação e tamanho do
+        ficheiro e a chave devolvida é a do conteúdo da imagem, pelo que cópias
+        do mesmo ficheiro partilham os resultados das fases
+
+        Args:
+            path (str): o caminho da imagem
+            reader (Callable): a função que lê a imagem (por exemplo read_bmp)
+
+        Returns:
+            Tuple[ndarray, tuple]: a imagem e a chave do seu conteúdo
+            ou (None, None) caso a imagem não seja lida
+        """
+
+        try:
+            info = stat(path)
+        except OSError:
+            # o leitor reporta o erro
+            return reader(path), None
+
+        def read_image():
+            image = reader(path)
+            return None if image is None else (image, (image_digest(image),))
+
+        result = self.lookup(("file", abspath(path), info.st_mtime_ns, info.st_size), read_image)
+
+        return (None, None) if result is None else result
+
+    def summary(self) -> str:
+        """Descreve a utilização da cache
+
+        Returns:
+            str: os hits, misses, descartes e memória ocupada
+        """
+
+        requests = self.hits + self.misses
+        ratio = self.hits / requests * 100 if requests else 0
+
+        summary = (
+            f"Cache das fases: {self.hits} hits, {self.misses} misses ({ratio:.1f}% hits), "
+            f"{self.evictions} descartes, {self.size / 2**20:.1f}/{self.budget / 2**20:.1f} MB"
+        )
+
+        if self.disk is not None:
+            summary += (
+                f"\nCache em disco ({self.disk.directory}): {self.disk.hits} hits, "
+                f"{self.disk.evictions} descartes"
+            )
+
+        return summary
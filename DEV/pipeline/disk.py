@@ -0,0 +1,297 @@
+"""Contém a cache das fases em disco, que guarda os resultados intermédios
+em ficheiros .npy para serem reutilizados entre execuções
+"""
+
+from collections import OrderedDict
+from functools import lru_cache
+from hashlib import blake2b
+from json import dump, load
+from os import listdir, makedirs, remove, replace, stat, utime
+from os.path import dirname, getsize, join
+from pathlib import Path
+from threading import Lock
+from typing import Hashable, Tuple
+
+from numpy import ndarray, save, load as npload
+
+
+# orçamento do disco por omissão (em bytes)
+DEFAULT_DISK_BUDGET = 2 * 2**30
+
+# versão do formato dos ficheiros da cache
+FORMAT_VERSION = 1
+
+# valor devolvido quando a chave não está em disco
+MISSING = object()
+
+
+@lru_cache(maxsize=1)
+def code_version() -> str:
+    """Calcula a versão do código das fases a partir das fontes do imgtools e do file_worker
+    (leitura das imagens e das matrizes de quantização) e das fases do grafo (pipeline/graph.py)\n
+    Alterar qualquer fase invalida os resultados guardados por versões anteriores
+
+    Returns:
+        str: a versão em hexadecimal
+    """
+
+    import imgtools
+    import file_worker
+
+    digest = blake2b(str(FORMAT_VERSION).encode(), digest_size=8)
+
+    sources = [
+        *sorted(Path(dirname(imgtools.__file__)).glob("*.py")),
+        *sorted(Path(dirname(file_worker.__file__)).glob("*.py")),
+        Path(__file__).with_name("graph.py"),
+    ]
+
+    for source in sources:
+        digest.update(f"{source.parent.name}/{source.name}".encode())
+        digest.update(source.read_bytes())
+
+    return digest.hexdigest()
+
+
+def _pack(value, arrays: list):
+    """Descreve a estrutura de um resultado em JSON, separando os arrays
+
+    Args:
+        value (object): um array, um tuplo ou um escalar
+        arrays (list): a lista onde os arrays são acumulados
+
+    Returns:
+        object: a descrição do resultado
+    """
+
+    if isinstance(value, ndarray):
+        arrays.append(value)
+        return {"array": len(arrays) - 1}
+
+    if isinstance(value, (tuple, list)):
+        return {"tuple": [_pack(item, arrays) for item in value]}
+
+    return {"value": value}
+
+
+def _unpack(layout: dict, arrays: list):
+    """Reconstrói um resultado a partir da sua descrição
+
+    Args:
+        layout (dict): a descrição do resultado
+        arrays (list): os arrays do resultado
+
+    Returns:
+        object: o resultado
+    """
+
+    if "array" in layout:
+        return arrays[layout["array"]]
+
+    if "tuple" in layout:
+        return tuple(_unpack(item, arrays) for item in layout["tuple"])
+
+    return layout["value"]
+
+
+class DiskCache:
+    """Cache dos resultados das fases numa pasta, limitada por um orçamento de disco\n
+    Cada resultado é guardado como um ficheiro JSON com a sua estrutura e um ficheiro
+    .npy por array, que é aberto com memory mapping. A pasta só é percorrida na criação:
+    depois o tamanho e a ordem de uso dos resultados são mantidos num índice em memória,
+    pelo qual os resultados menos usados recentemente são apagados quando o orçamento
+    é excedido
+    """
+
+    def __init__(self, directory: str, budget: int = DEFAULT_DISK_BUDGET) -> None:
+        """Construtor da classe DiskCache
+
+        Args:
+            directory (str): a pasta da cache
+            budget (int, optional): o orçamento do disco em bytes. Default a DEFAULT_DISK_BUDGET.
+        """
+        self.directory = directory
+        self.budget = budget
+        self.size = 0
+
+        self.hits = 0
+        self.evictions = 0
+
+        # nome -> (bytes, ficheiros), do menos para o mais usado recentemente
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+        makedirs(directory, exist_ok=True)
+
+        self._scan()
+
+        # o orçamento pode ter sido reduzido desde a última execução
+        with self._lock:
+            self._evict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _name(self, key: Hashable) -> str:
+        """Calcula o nome dos ficheiros de uma chave
+
+        Args:
+            key (Hashable): a chave
+
+        Returns:
+            str: o nome (sem extensão)
+        """
+        return blake2b(f"{code_version()}{key!r}".encode(), digest_size=16).hexdigest()
+
+    def _files(self, name: str, count: int) -> Tuple[int, list]:
+        """Calcula o tamanho dos ficheiros de um resultado
+
+        Args:
+            name (str): o nome do resultado
+            count (int): o número de arrays do resultado
+
+        Returns:
+            Tuple[int, list]: o número de bytes e os nomes dos ficheiros
+        """
+
+        files = [name + ".json"] + [f"{name}_{i}.npy" for i in range(count)]
+
+        return sum(getsize(join(self.directory, file_name)) for file_name in files), files
+
+    def _scan(self) -> None:
+        """Constrói o índice a partir dos resultados guardados na pasta,
+        ordenados pela data do último uso
+        """
+
+        entries = list()
+
+        for file_name in listdir(self.directory):
+            if not file_name.endswith(".json"):
+                continue
+
+            name = file_name[:-5]
+            path = join(self.directory, file_name)
+
+            try:
+                with open(path, "r") as layout_file:
+                    count = load(layout_file)["arrays"]
+
+                entries.append((stat(path).st_mtime_ns, name, *self._files(name, count)))
+            except (OSError, ValueError, KeyError):
+                continue
+
+        for _, name, size, files in sorted(entries):
+            self._entries[name] = (size, files)
+            self.size += size
+
+    def _index(self, name: str, size: int, files: list) -> None:
+        """Regista um resultado no índice como o usado mais recentemente
+
+        Args:
+            name (str): o nome do resultado
+            size (int): o número de bytes dos seus ficheiros
+            files (list): os nomes dos seus ficheiros
+        """
+
+        if name in self._entries:
+            self.size -= self._entries.pop(name)[0]
+
+        self._entries[name] = (size, files)
+        self.size += size
+
+    def load(self, key: Hashable):
+        """Lê um resultado guardado
+
+        Args:
+            key (Hashable): a chave
+
+        Returns:
+            object: o resultado (com os arrays em memory mapping) ou MISSING
+        """
+
+        name = self._name(key)
+        path = join(self.directory, name + ".json")
+
+        try:
+            with open(path, "r") as layout_file:
+                layout = load(layout_file)
+
+            arrays = [
+                npload(join(self.directory, f"{name}_{i}.npy"), mmap_mode="r")
+                for i in range(layout["arrays"])
+            ]
+
+            # marcar o resultado como usado recentemente (também para as próximas execuções)
+            utime(path)
+
+            with self._lock:
+                known = name in self._entries
+                if known:
+                    self._entries.move_to_end(name)
+
+            # resultado guardado por outro processo depois da criação do índice
+            entry = None if known else self._files(name, layout["arrays"])
+
+        except (OSError, ValueError, KeyError):
+            return MISSING
+
+        with self._lock:
+            self.hits += 1
+
+            if entry is not None:
+                self._index(name, *entry)
+                self._evict()
+
+        return _unpack(layout["value"], arrays)
+
+    def store(self, key: Hashable, value) -> None:
+        """Guarda um resultado e apaga os menos usados caso o orçamento seja excedido\n
+        O ficheiro JSON é escrito no fim, pelo que um resultado incompleto nunca é lido
+
+        Args:
+            key (Hashable): a chave
+            value (object): o resultado
+        """
+
+        name = self._name(key)
+        arrays = list()
+        layout = {"value": _pack(value, arrays), "arrays": len(arrays)}
+
+        try:
+            for i, array in enumerate(arrays):
+                temporary = join(self.directory, f"{name}_{i}.tmp.npy")
+                save(temporary, array)
+                replace(temporary, join(self.directory, f"{name}_{i}.npy"))
+
+            temporary = join(self.directory, name + ".json.tmp")
+            with open(temporary, "w") as layout_file:
+                dump(layout, layout_file)
+            replace(temporary, join(self.directory, name + ".json"))
+
+            entry = self._files(name, len(arrays))
+
+        # a cache em disco é opcional, um erro de escrita não interrompe a sessão
+        except (OSError, TypeError) as error:
+            print(f"Could not store a stage in {self.directory}: {error}")
+            return
+
+        with self._lock:
+            self._index(name, *entry)
+            self._evict()
+
+    def _evict(self) -> None:
+        """Apaga os resultados menos usados recentemente do índice e do disco
+        até respeitar o orçamento (chamado com o lock adquirido)
+        """
+
+        while self.size > self.budget and self._entries:
+            _, (size, files) = self._entries.popitem(last=False)
+
+            for file_name in files:
+                try:
+                    remove(join(self.directory, file_name))
+                except OSError:
+                    pass
+
+            self.size -= size
+            self.evictions += 1
@@ -0,0 +1,311 @@
+"""Contém o grafo das fases do codec, que calcula apenas as fases necessárias
+para cada pedido e partilha os prefixos comuns a vários pedidos
+"""
+
+from typing import Callable, Iterable, List, NamedTuple, Tuple
+
+from numpy import ndarray
+
+from imgtools import read_bmp
+from imgtools import add_padding
+from imgtools import separate_channels
+from imgtools import converter_to_ycbcr
+from imgtools import down_sample_channel
+from imgtools import calculate_channel_dct, get_dct_backend
+from imgtools import quantize
+from imgtools import dpcm_encoder
+
+from file_worker import load_q_matrix
+
+from .cache import StageCache, image_digest
+from .disk import MISSING
+from .parallel import map_channels
+
+
+class Stage(NamedTuple):
+    """Uma fase do grafo
+    """
+    function: Callable
+    per_channel: bool = False
+    cached: bool = True
+
+
+class Table:
+    """Uma matriz identificada pelo seu conteúdo, para poder fazer parte
+    das chaves do grafo (por exemplo as matrizes de quantização)
+    """
+
+    def __init__(self, matrix: ndarray) -> None:
+        """Construtor da classe Table
+
+        Args:
+            matrix (ndarray): a matriz
+        """
+        self.matrix = matrix
+        self.digest = image_digest(matrix)
+
+    def __hash__(self) -> int:
+        return hash(self.digest)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Table) and other.digest == self.digest
+
+    def __repr__(self) -> str:
+        return f"Table({self.digest})"
+
+
+def _padding(image: ndarray, min_size: int) -> ndarray:
+    return add_padding(image, min_size)[0]
+
+
+def _select(channels: tuple, index: int) -> ndarray:
+    return channels[index]
+
+
+def _dct(channel: ndarray, index: int, block_size: int = None, backend: str = None) -> ndarray:
+    return calculate_channel_dct(channel, block_size, backend=backend)
+
+
+def _quantize(channel: ndarray, index: int, quality_factor: int, q_matrix_y: Table, q_matrix_cbcr: Table) -> ndarray:
+    return quantize(channel, (q_matrix_y if index == 0 else q_matrix_cbcr).matrix, quality_factor)
+
+
+def _dpcm(channel: ndarray, index: int) -> ndarray:
+    return dpcm_encoder(channel)
+
+
+# as fases do grafo: as fases da imagem recebem o resultado anterior e os parâmetros
+# e as fases dos canais recebem também o índice do canal
+STAGES = {
+    "padding": Stage(_padding),
+    "rgb": Stage(separate_channels),
+    "ycbcr": Stage(converter_to_ycbcr),
+    "channel": Stage(_select, cached=False),
+    "downsample": Stage(down_sample_channel, per_channel=True),
+    "dct": Stage(_dct, per_channel=True),
+    "quantize": Stage(_quantize, per_channel=True),
+    "dpcm": Stage(_dpcm, per_channel=True),
+}
+
+
+class StageGraph:
+    """Grafo declarativo das fases do codec\n
+    Um pedido é uma chave: a chave da imagem seguida das fases pela ordem em que
+    são aplicadas, por exemplo (imagem, ("padding", 32), ("ycbcr",), ("channel", 1), ("dct", 8))
+    para o canal Cb depois da DCT 8x8. Cada prefixo de uma chave é um nó do grafo, pelo que
+    só são calculados os nós de que os pedidos dependem e os prefixos comuns são calculados
+    uma só vez. Os nós de cada nível (por exemplo os três canais) são independentes
+    e podem ser calculados em simultâneo
+    """
+
+    def __init__(self, cache: StageCache = None, workers: int = 1) -> None:
+        """Construtor da classe StageGraph
+
+        Args:
+            cache (StageCache, optional): a cache dos resultados. Default a None (sem memorização entre pedidos).
+            workers (int, optional): o número de threads por nível do grafo. Default a 1.
+        """
+        self.cache = cache
+        self.workers = workers
+
+        self._sources = dict()
+        self._q_tables = None
+
+    def source(self, image, key: tuple = None) -> tuple:
+        """Regista uma imagem (ou canais já calculados) como origem de pedidos\n
+        Com uma cache e sem chave, a chave é a impressão digital do conteúdo da imagem
+
+        Args:
+            image (object): a imagem ou os canais
+            key (tuple, optional): a chave da origem. Default a None (calculada a partir da imagem).
+
+        Returns:
+            tuple: a chave da origem
+        """
+
+        if key is None:
+            key = (f"source:{id(image)}",) if self.cache is None else (image_digest(image),)
+
+        self._sources[key] = image
+
+        return key
+
+    def read(self, path: str, reader: Callable = read_bmp) -> tuple:
+        """Lê uma imagem (através da cache, caso exista) e regista-a como origem
+
+        Args:
+            path (str): o caminho da imagem
+            reader (Callable, optional): a função que lê a imagem. Default a read_bmp.
+
+        Returns:
+            tuple: a chave da imagem ou None caso a imagem não seja lida
+        """
+
+        if self.cache is None:
+            image = reader(path)
+            return None if image is None else self.source(image)
+
+        image, key = self.cache.read(path, reader)
+        if image is None:
+            return
+
+        self._sources[key] = image
+
+        return key
+
+    def stage(self, name: str, *params) -> tuple:
+        """Constrói o elemento de uma chave para uma fase\n
+        As listas são convertidas em tuplos, a quantização recebe as matrizes
+        do codec (q_matrix_y.csv e q_matrix_cbcr.csv) caso não sejam fornecidas
+        e a DCT recebe o motor por omissão (para separar na cache os resultados de cada motor)
+
+        Args:
+            name (str): o nome da fase
+            params (object): os parâmetros da fase
+
+        Returns:
+            tuple: o elemento da chave ou None caso a fase não exista
+        """
+
+        if name not in STAGES:
+            print(f"Unknown stage '{name}'")
+            return
+
+        params = tuple(tuple(param) if isinstance(param, list) else param for param in params)
+
+        if name == "quantize" and len(params) == 1:
+            if self._q_tables is None:
+                self._q_tables = (
+                    Table(load_q_matrix("q_matrix_y.csv")),
+                    Table(load_q_matrix("q_matrix_cbcr.csv"))
+                )
+
+            params += self._q_tables
+
+        if name == "dct" and len(params) == 1:
+            params += (get_dct_backend(),)
+
+        return (name, *params)
+
+    def channels(self, key: tuple, *stages: tuple) -> Tuple[tuple, tuple, tuple]:
+        """Constrói as chaves dos três canais de uma imagem já separada
+
+        Args:
+            key (tuple): a chave dos canais separados (depois de "rgb" ou "ycbcr")
+            stages (tuple): os elementos das fases a aplicar a cada canal
+
+        Returns:
+            Tuple[tuple, tuple, tuple]: as chaves dos três canais
+        """
+        return tuple(key + (("channel", index),) + stages for index in range(3))
+
+    def get(self, key: tuple):
+        """Calcula o resultado de um pedido
+
+        Args:
+            key (tuple): a chave do pedido
+
+        Returns:
+            object: o resultado ou None caso ocorra um erro
+        """
+        return self.get_many([key])[0]
+
+    def get_many(self, keys: Iterable[tuple]) -> List:
+        """Calcula os resultados de vários pedidos, calculando cada nó uma só vez\n
+        Os nós já memorizados não são recalculados (nem os nós de que dependem)
+        e os restantes são calculados por níveis, em simultâneo caso workers > 1
+
+        Args:
+            keys (Iterable[tuple]): as chaves dos pedidos
+
+        Returns:
+            List: os resultados pela ordem dos pedidos (None nos pedidos com erros)
+        """
+
+        keys = list(keys)
+
+        values = dict()
+        pending = set()
+
+        for key in keys:
+            self._plan(key, values, pending)
+
+        levels = sorted({len(key) for key in pending})
+
+        for length in levels:
+            level = [key for key in pending if len(key) == length]
+
+            results = map_channels(
+                self._compute, level, [values[key[:-1]] for key in level], workers=self.workers
+            )
+
+            for key, value in zip(level, results):
+                values[key] = value
+
+                if self.cache is not None and STAGES[key[-1][0]].cached:
+                    self.cache.put(key, value)
+
+        return [values[key] for key in keys]
+
+    def _plan(self, key: tuple, values: dict, pending: set) -> None:
+        """Encontra os nós que têm de ser calculados para um pedido
+
+        Args:
+            key (tuple): a chave do nó
+            values (dict): os resultados já conhecidos
+            pending (set): os nós por calcular
+        """
+
+        while key not in values and key not in pending:
+
+            # a origem do pedido
+            if key in self._sources:
+                values[key] = self._sources[key]
+                return
+
+            if len(key) == 1:
+                print(f"Unknown image source {key[0]}")
+                values[key] = None
+                return
+
+            stage = STAGES.get(key[-1][0])
+            if stage is None:
+                print(f"Unknown stage '{key[-1][0]}'")
+                values[key] = None
+                return
+
+            if self.cache is not None and stage.cached:
+                value = self.cache.get(key)
+                if value is not MISSING:
+                    values[key] = value
+                    return
+
+            pending.add(key)
+            key = key[:-1]
+
+    def _compute(self, key: tuple, parent) -> object:
+        """Calcula um nó a partir do resultado do nó anterior
+
+        Args:
+            key (tuple): a chave do nó
+            parent (object): o resultado do nó anterior
+
+        Returns:
+            object: o resultado do nó ou None caso ocorra um erro
+        """
+
+        if parent is None:
+            return
+
+        name, *params = key[-1]
+        stage = STAGES[name]
+
+        if not stage.per_channel:
+            return stage.function(parent, *params)
+
+        index = next((element[1] for element in reversed(key) if element[0] == "channel"), None)
+        if index is None:
+            print(f"Stage '{name}' must be applied to a single channel")
+            return
+
+        return stage.function(parent, index, *params)
@@ -0,0 +1,29 @@
+"""Contém o mapeamento de funções pelos canais num conjunto de threads
+(as funções do NumPy, SciPy e OpenCV libertam o GIL durante os cálculos)
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, List
+
+
+def map_channels(function: Callable, *iterables: Iterable, workers: int = 1) -> List:
+    """Aplica uma função a cada canal, num conjunto de threads caso workers > 1\n
+    Os resultados mantêm a ordem dos canais e uma exceção num dos canais
+    é propagada tal como na execução sequencial
+
+    Args:
+        function (Callable): a função a aplicar
+        iterables (Iterable): os argumentos de cada canal (tal como no map)
+        workers (int, optional): o número de threads. Default a 1 (sequencial).
+
+    Returns:
+        List: os resultados de cada canal
+    """
+
+    arguments = list(zip(*iterables))
+
+    if workers is None or workers <= 1 or len(arguments) <= 1:
+        return [function(*args) for args in arguments]
+
+    with ThreadPoolExecutor(min(workers, len(arguments))) as executor:
+        return list(executor.map(lambda args: function(*args), arguments))
@@ -1,25 +1,57 @@
 """Tests the codec
 """
 
+import sys
 import unittest
+from subprocess import run
+from os.path import join, exists
+from shutil import copy
+from tempfile import TemporaryDirectory
 
 import numpy as np
 import matplotlib.colors as clr
+import cv2
 
 # imgtools
-from imgtools import read_bmp
+from imgtools import read_bmp, read_bmp_header, read_bmp_strips, map_bmp
 from imgtools import create_colormap, separate_channels, join_channels
 from imgtools import add_padding, restore_padding
 from imgtools import converter_to_rgb, converter_to_ycbcr
 from imgtools import down_sample, up_sample
-from imgtools import calculate_dct
-from imgtools import quantize, inv_quantize
+from imgtools import calculate_dct, calculate_inv_dct
+from imgtools import DCT_BACKENDS, set_dct_backend, get_dct_backend, select_dct_backend
+from imgtools import calculate_channel_sparse_inv_dct, block_classes
+from imgtools import quantize, inv_quantize, scale_q_matrix, quantize_many, inv_quantize_many, bisect_quality
+from imgtools import dpcm_encoder, dpcm_decoder
 
 # file_worker
 from file_worker import read_config, load_q_matrix
 from file_worker import Token
 from file_worker import lex
 
+# codec
+from codec.huffman import HuffmanTable, STD_DC_LUMINANCE, STD_AC_LUMINANCE
+from codec.entropy import channel_to_zigzag, zigzag_to_channel, encode_channels, decode_channels, estimate_size
+from codec.container import pack_container, unpack_container, write_container, read_container
+from codec.jfif import encode_jfif, sampling_factors
+from codec.stream import stream_jfif
+from codec.jpeg_reader import parse_jpeg, read_jpeg
+from codec.decoder import decode, decode_jpeg, jpeg_stage
+from codec.transcode import requantize, halve_chroma, rotate, crop, encode_jpeg
+from codec.batch import run_batch
+from codec.sweep import rd_sweep, run_sweep
+from codec.target import encode_to_target
+from codec.rdo import rdo_quantize, rdo_report
+from codec.encoder import encode_image
+
+# metrics
+from metrics import MSE, SNR, PSNR, compute_metrics, block_metrics, ssim, ms_ssim
+
+from pipeline import StageCache, DiskCache, StageGraph
+from pipeline.disk import MISSING
+
+from scipy.fftpack import dct, idct
+
 
 class TestImgToolsReader(unittest.TestCase):
     """Testa o pacote do leitor de imgtools"""
@@ -40,6 +72,29 @@ class TestImgToolsReader(unittest.TestCase):
         """
         self.assertEqual(read_bmp("test/test_img_none.png"), None)
 
+    def test_map_bmp(self):
+        """Testa se a vista do memory mapping é igual à imagem lida pelo Pillow,
+        sem cópias dos pixeis, e se um ficheiro truncado é rejeitado
+        """
+        from PIL import Image
+
+        image = map_bmp("img/logo.bmp")
+        with Image.open("img/logo.bmp") as reference:
+            np.testing.assert_array_equal(image, np.asarray(reference))
+
+        self.assertIsInstance(image.base, np.memmap)
+        self.assertFalse(image.flags.writeable)
+
+        # uma faixa é uma vista sobre o mesmo mapping
+        self.assertTrue(np.shares_memory(image[16:32], image))
+
+        with TemporaryDirectory() as directory:
+            path = join(directory, "truncated.bmp")
+            with open("img/logo.bmp", "rb") as bmp_file, open(path, "wb") as truncated:
+                truncated.write(bmp_file.read(1000))
+
+            self.assertIsNone(map_bmp(path))
+
 
 class TestImgToolsColor(unittest.TestCase):
     """Testa o módulo de cor de imgtools"""
@@ -205,6 +260,27 @@ class TestImgtoolsConverter(unittest.TestCase):
         )
 
 
+    def test_convert_precision(self):
+        """Testa se as conversões em float32 e em vírgula fixa diferem no máximo
+        um nível da conversão em float64 e se os planos são escritos no buffer fornecido
+        """
+        image = read_bmp("img/peppers.bmp")
+        reference = converter_to_ycbcr(image)
+
+        for precision in ("float32", "fixed"):
+            for a, b in zip(reference, converter_to_ycbcr(image, precision)):
+                self.assertLessEqual(np.abs(a.astype(np.int16) - b).max(), 1)
+
+        out = np.empty((3,) + image.shape[:2], dtype=np.uint8)
+        rgb = converter_to_rgb(*reference, out=out)
+        self.assertTrue(all(np.shares_memory(channel, out) for channel in rgb))
+
+        # a conversão de ida e volta perde apenas o arredondamento do YCbCr
+        self.assertLessEqual(np.abs(np.dstack(rgb).astype(np.int16) - image).max(), 3)
+
+        self.assertIsNone(converter_to_ycbcr(image, "float16"))
+
+
 class TestFileworkerReader(unittest.TestCase):
     """Testa o módulo reader do package file_worker"""
 
@@ -603,6 +679,139 @@ class TestImgtoolsDct(unittest.TestCase):
             decimal=0
         )
 
+    @staticmethod
+    def loop_block_transform(channel, block_size, transform):
+        """Calcula a transformada bloco a bloco com ciclos (implementação de referência)"""
+        result = np.zeros(channel.shape, dtype=np.float32)
+
+        for i in range(0, channel.shape[0], block_size):
+            for j in range(0, channel.shape[1], block_size):
+                result[i:i+block_size, j:j+block_size] = transform(
+                    transform(channel[i:i+block_size, j:j+block_size], norm="ortho").T,
+                    norm="ortho"
+                ).T
+
+        return result
+
+    def test_calculate_dct_matches_loop(self):
+        """Testa se a dct vetorizada é igual bit a bit à calculada bloco a bloco,
+        incluindo blocos incompletos nas margens
+        """
+        rng = np.random.default_rng(0)
+
+        for shape, block_size in (((64, 48), 8), ((40, 72), 8), ((128, 96), 64), ((24, 36), 8)):
+            channel = (rng.random(shape) * 255).astype(np.uint8)
+
+            for result in calculate_dct(channel, channel, channel, block_size):
+                np.testing.assert_array_equal(
+                    result,
+                    self.loop_block_transform(channel, block_size, dct)
+                )
+
+    def test_calculate_inv_dct_matches_loop(self):
+        """Testa se a inversa da dct vetorizada é igual bit a bit à calculada bloco a bloco
+        """
+        rng = np.random.default_rng(1)
+        coefficients = (rng.standard_normal((64, 48)) * 100).astype(np.float32)
+
+        for result in calculate_inv_dct(coefficients, coefficients, coefficients, 8):
+            np.testing.assert_array_equal(
+                result,
+                self.loop_block_transform(coefficients, 8, idct)
+            )
+
+
+    def test_aan(self):
+        """Testa se a DCT inteira AAN, com a escala compensada na quantização,
+        quantiza e reconstrói os blocos como a DCT em vírgula flutuante
+        """
+        q_matrix = load_q_matrix("q_matrix_y.csv")
+        channel = converter_to_ycbcr(read_bmp("img/peppers.bmp"))[0]
+
+        for quality_factor in (50, 90):
+            float_q = quantize(calculate_dct(channel, channel, channel, 8)[0], q_matrix, quality_factor)
+            aan_q = quantize(calculate_dct(channel, channel, channel, 8, "aan")[0], q_matrix, quality_factor, "aan")
+
+            # só os coeficientes a meio de dois níveis podem ser quantizados de forma diferente
+            self.assertLess(np.mean(float_q != aan_q), 0.001)
+            self.assertLessEqual(np.abs(float_q - aan_q).max(), 1)
+
+            float_r = calculate_inv_dct(*[inv_quantize(float_q, q_matrix, quality_factor)] * 3, 8)[0]
+            aan_r = calculate_inv_dct(*[inv_quantize(float_q, q_matrix, quality_factor, "aan")] * 3, 8, "aan")[0]
+            self.assertLessEqual(np.abs(np.round(float_r) - aan_r).max(), 1)
+
+        # a DCT AAN só existe para blocos 8x8
+        self.assertIsNone(calculate_dct(channel, channel, channel, 16, "aan"))
+
+    def test_backends(self):
+        """Testa se os motores da DCT calculam os mesmos coeficientes que o scipy.fftpack
+        e se o motor por omissão pode ser escolhido por configuração ou por medição
+        """
+        channel = converter_to_ycbcr(read_bmp("img/peppers.bmp"))[0][:100, :60].astype(np.float32) - 128
+        reference = calculate_dct(channel, channel, channel, 8)[0]
+
+        tolerances = {"fftpack": 0, "fft": 1e-3, "matmul": 1e-3, "fixed": 0.5}
+        for backend, tolerance in tolerances.items():
+            coefficients = calculate_dct(channel, channel, channel, 8, backend=backend)[0]
+            np.testing.assert_allclose(coefficients, reference, atol=tolerance)
+
+            restored = calculate_inv_dct(reference, reference, reference, 8, backend=backend)[0]
+            np.testing.assert_allclose(restored, channel, atol=tolerance + 1e-3)
+
+        self.assertIsNone(calculate_dct(channel, channel, channel, 8, backend="unknown"))
+
+        try:
+            self.assertFalse(set_dct_backend("unknown"))
+            self.assertTrue(set_dct_backend("matmul"))
+            self.assertEqual(get_dct_backend(), "matmul")
+
+            best, timings = select_dct_backend(shape=(64, 64))
+            self.assertIn(best, DCT_BACKENDS)
+            self.assertEqual(best, min(timings, key=timings.get))
+            self.assertEqual(get_dct_backend(), best)
+        finally:
+            set_dct_backend("fftpack")
+
+    def test_sparse_inv_dct(self):
+        """Testa se a inversa esparsa classifica os blocos pelos coeficientes
+        diferentes de zero e reconstrói os mesmos blocos que a inversa completa
+        """
+        # bloco (0, 0) só com o DC, bloco (0, 1) com coeficientes nas 4x4 frequências
+        # mais baixas e bloco (1, 2) com um coeficiente de alta frequência
+        coefficients = np.zeros((16, 24))
+        coefficients[0, 0] = 80
+        coefficients[1, 10] = coefficients[3, 11] = 12
+        coefficients[8, 16] = 4
+        coefficients[15, 23] = -3
+
+        np.testing.assert_array_equal(block_classes(coefficients), [[0, 1, 0], [0, 0, 2]])
+
+        channel, histogram = calculate_channel_sparse_inv_dct(coefficients)
+        np.testing.assert_array_equal(histogram, [4, 1, 1])
+        np.testing.assert_allclose(channel, calculate_inv_dct(*[coefficients] * 3, 8)[0], atol=1e-4)
+        np.testing.assert_array_equal(channel[:8, :8], 10)
+
+        q_matrix = load_q_matrix("q_matrix_y.csv")
+        ycbcr = converter_to_ycbcr(read_bmp("img/peppers.bmp"))[0][:96, :128].astype(np.float32) - 128
+
+        # qualidade baixa (classes misturadas) e muito alta (inversa de todo o canal)
+        for quality_factor in (25, 100):
+            quantized = inv_quantize(quantize(calculate_dct(ycbcr, ycbcr, ycbcr, 8)[0], q_matrix, quality_factor), q_matrix, quality_factor)
+
+            channel, histogram = calculate_channel_sparse_inv_dct(quantized)
+            self.assertEqual(histogram.sum(), 12 * 16)
+            np.testing.assert_allclose(channel, calculate_inv_dct(*[quantized] * 3, 8)[0], atol=1e-3)
+
+        # sem contagem a inversa de todo o canal não classifica os blocos
+        channel, histogram = calculate_channel_sparse_inv_dct(quantized, count=False)
+        self.assertIsNone(histogram)
+        np.testing.assert_allclose(channel, calculate_inv_dct(*[quantized] * 3, 8)[0], atol=1e-3)
+
+        # o decode só usa a inversa esparsa quando pedido (a diferença é só de arredondamento)
+        encoded, rows, cols = encode_image(read_bmp("img/logo.bmp"), 25, (4, 2, 0))
+        dense = decode(encoded, rows, cols, 25).astype(int)
+        self.assertLessEqual(np.abs(decode(encoded, rows, cols, 25, sparse_idct=True) - dense).max(), 1)
+
 
 class TestImgtoolsQuantization(unittest.TestCase):
     """Testa o módulo quantization do package imgtools
@@ -633,6 +842,849 @@ class TestImgtoolsQuantization(unittest.TestCase):
             np.ones((8,8), dtype=np.uint8) * 8
         )
 
+    def test_quantize_round_trip_matches_loop(self):
+        """Testa se a quantização vetorizada é igual à quantização bloco a bloco
+        """
+        rng = np.random.default_rng(0)
+        channel = (rng.standard_normal((32, 48)) * 200).astype(np.float32)
+        q_matrix = load_q_matrix("q_matrix_y.csv")
+        q_scaled = scale_q_matrix(q_matrix, 75)
+
+        expected = np.zeros(channel.shape, dtype=np.int16)
+        for i in range(0, channel.shape[0], 8):
+            for j in range(0, channel.shape[1], 8):
+                expected[i:i+8, j:j+8] = np.round(channel[i:i+8, j:j+8] / q_scaled)
+
+        quantized = quantize(channel, q_matrix, 75)
+        np.testing.assert_array_equal(quantized, expected)
+
+        np.testing.assert_array_equal(
+            inv_quantize(quantized, q_matrix, 75),
+            expected * np.tile(q_scaled, (4, 6)).astype(np.float64)
+        )
+
+    def test_scale_q_matrix_cached(self):
+        """Testa se a matriz escalada é reutilizada para o mesmo conteúdo e qualidade
+        """
+        self.assertIs(
+            scale_q_matrix(load_q_matrix("q_matrix_y.csv"), 30),
+            scale_q_matrix(load_q_matrix("q_matrix_y.csv"), 30)
+        )
+        self.assertIsNot(
+            scale_q_matrix(load_q_matrix("q_matrix_y.csv"), 30),
+            scale_q_matrix(load_q_matrix("q_matrix_y.csv"), 31)
+        )
+
+    def test_quantize_wrong_shape(self):
+        """Testa se a função retorna None caso o canal não seja multiplo de 8
+        """
+        self.assertEqual(
+            quantize(np.ones((12, 4)), np.ones((8, 8)), 50),
+            None
+        )
+
+
+class TestImgtoolsDpcm(unittest.TestCase):
+    """Testa o módulo dcpm do package imgtools
+    """
+
+    @staticmethod
+    def loop_encoder(channel):
+        """Codificação DPCM com ciclos (implementação de referência)"""
+        aux_channel = np.array(channel)
+
+        for i in range(aux_channel.shape[0] - 8, -1, -8):
+            for j in range(aux_channel.shape[1] - 8, -1, -8):
+                if i == 0 and j == 0:
+                    break
+                if j != 0:
+                    aux_channel[i, j] = aux_channel[i, j] - aux_channel[i, j-8]
+                    continue
+                aux_channel[i, j] = aux_channel[i, j] - aux_channel[i-8, aux_channel.shape[1] - 9]
+
+        return aux_channel
+
+    @staticmethod
+    def loop_decoder(channel):
+        """Descodificação DPCM com ciclos (implementação de referência)"""
+        aux_channel = np.array(channel)
+
+        for i in range(0, aux_channel.shape[0], 8):
+            for j in range(0, aux_channel.shape[1], 8):
+                if j == 0 and i == 0:
+                    continue
+                if j != 0:
+                    aux_channel[i, j] = aux_channel[i, j] + aux_channel[i, j-8]
+                    continue
+                if i + 8 >= aux_channel.shape[0]:
+                    break
+                aux_channel[i, j] = aux_channel[i, j] + aux_channel[i+8, aux_channel.shape[1] - 9]
+
+        return aux_channel
+
+    @staticmethod
+    def random_channels(seed, count=50):
+        """Gera canais quantizados aleatórios com dimensões multiplas de 8"""
+        rng = np.random.default_rng(seed)
+
+        for _ in range(count):
+            shape = (8 * rng.integers(1, 10), 8 * rng.integers(1, 10))
+            yield rng.integers(-1024, 1024, shape)
+
+    def test_dpcm_encoder_matches_loop(self):
+        """Testa se a codificação vetorizada é igual à codificação com ciclos
+        para canais de tamanhos aleatórios
+        """
+        for channel in self.random_channels(0):
+            np.testing.assert_array_equal(dpcm_encoder(channel), self.loop_encoder(channel))
+
+    def test_dpcm_decoder_matches_loop(self):
+        """Testa se a descodificação vetorizada é igual à descodificação com ciclos
+        para canais de tamanhos aleatórios
+        """
+        for channel in self.random_channels(1):
+            np.testing.assert_array_equal(dpcm_decoder(channel), self.loop_decoder(channel))
+
+    def test_dpcm_round_trip(self):
+        """Testa se a primeira linha de blocos é recuperada após codificar e
+        descodificar, e se canais com uma só linha de blocos são recuperados por completo
+        """
+        for channel in self.random_channels(2):
+            decoded = dpcm_decoder(dpcm_encoder(channel))
+            np.testing.assert_array_equal(decoded[:8], channel[:8])
+
+            single_row = channel[:8]
+            np.testing.assert_array_equal(dpcm_decoder(dpcm_encoder(single_row)), single_row)
+
+    def test_dpcm_wrong_shape(self):
+        """Testa se a função retorna None caso o canal não seja multiplo de 8
+        """
+        self.assertEqual(dpcm_encoder(np.ones((12, 8))), None)
+        self.assertEqual(dpcm_decoder(np.ones((8, 12))), None)
+
+
+class TestCodecEntropy(unittest.TestCase):
+    """Testa os módulos huffman e entropy do package codec
+    """
+
+    def test_zigzag_round_trip(self):
+        """Testa se o varrimento em zigzag é revertido corretamente
+        """
+        channel = np.arange(16 * 24).reshape(16, 24)
+        blocks = channel_to_zigzag(channel)
+
+        self.assertListEqual(blocks[0, :4].tolist(), [0, 1, 24, 48])
+        np.testing.assert_array_equal(zigzag_to_channel(blocks, channel.shape), channel)
+
+    def test_standard_table_codes(self):
+        """Testa se os códigos das tabelas standard são gerados corretamente
+        """
+        self.assertEqual((STD_DC_LUMINANCE.codes[0], STD_DC_LUMINANCE.sizes[0]), (0b00, 2))
+        self.assertEqual((STD_DC_LUMINANCE.codes[11], STD_DC_LUMINANCE.sizes[11]), (0b111111110, 9))
+        self.assertEqual((STD_AC_LUMINANCE.codes[0x00], STD_AC_LUMINANCE.sizes[0x00]), (0b1010, 4))
+        self.assertEqual((STD_AC_LUMINANCE.codes[0xF0], STD_AC_LUMINANCE.sizes[0xF0]), (0b11111111001, 11))
+
+    def test_optimized_table(self):
+        """Testa se a tabela otimizada respeita o limite de 16 bits e a desigualdade de Kraft
+        """
+        frequencies = np.zeros(256, dtype=np.int64)
+        frequencies[:40] = [int(1.6 ** i) + 1 for i in range(40)]
+        table = HuffmanTable.from_frequencies(frequencies)
+        sizes = table.sizes[:40]
+
+        self.assertTrue((sizes > 0).all())
+        self.assertLessEqual(sizes.max(), 16)
+        self.assertLess(np.sum(2.0 ** -sizes), 1)
+
+    def test_encode_decode_channels(self):
+        """Testa se a codificação entrópica é revertida sem perdas, com as tabelas
+        standard, com tabelas otimizadas e com valores fora das tabelas standard
+        """
+        rng = np.random.default_rng(0)
+        channels = [
+            np.where(rng.random((32, 48)) < 0.3, rng.integers(-60, 60, (32, 48)), 0),
+            np.where(rng.random((16, 24)) < 0.05, rng.integers(-1023, 1023, (16, 24)), 0),
+            rng.integers(-8000, 8000, (8, 8)),
+        ]
+
+        for optimize in (False, True):
+            decoded = decode_channels(encode_channels(channels, optimize))
+
+            for original, result in zip(channels, decoded):
+                np.testing.assert_array_equal(result, original)
+
+    def test_estimate_size(self):
+        """Testa se o tamanho estimado é igual ao do buffer codificado, com as tabelas
+        standard, com tabelas otimizadas e com valores fora das tabelas standard
+        """
+        rng = np.random.default_rng(1)
+        channels = [
+            np.where(rng.random((32, 48)) < 0.3, rng.integers(-60, 60, (32, 48)), 0),
+            np.where(rng.random((16, 24)) < 0.05, rng.integers(-1023, 1023, (16, 24)), 0),
+            rng.integers(-8000, 8000, (8, 8)),
+        ]
+
+        for optimize in (False, True):
+            self.assertEqual(estimate_size(channels, optimize), len(encode_channels(channels, optimize)))
+            self.assertEqual(estimate_size(channels[:2], optimize), len(encode_channels(channels[:2], optimize)))
+
+
+class TestCodecContainer(unittest.TestCase):
+    """Testa o módulo container do package codec
+    """
+
+    def test_container_entropy_payload(self):
+        """Testa se um buffer codificado entropicamente e o cabeçalho são recuperados
+        """
+        container = unpack_container(pack_container(b"\x01\x02\x03", 383, 511, 75, (4, 2, 0)))
+
+        self.assertEqual(container.data, b"\x01\x02\x03")
+        self.assertTupleEqual(
+            (container.width, container.height, container.quality_factor, container.downsampling),
+            (383, 511, 75, (4, 2, 0))
+        )
+
+    def test_container_int16_payload(self):
+        """Testa se os canais quantizados são guardados em int16 e recuperados
+        """
+        rng = np.random.default_rng(0)
+        channels = (rng.integers(-2000, 2000, (16, 24)), rng.integers(-50, 50, (8, 8)))
+
+        with TemporaryDirectory() as directory:
+            path = join(directory, "image.jcsv")
+            self.assertTrue(write_container(path, channels, 16, 24, 50, (4, 4, 4)))
+            container = read_container(path)
+
+        for original, result in zip(channels, container.data):
+            np.testing.assert_array_equal(result, original)
+
+    def test_container_invalid(self):
+        """Testa se um ficheiro que não é do codec ou que está truncado retorna None
+        """
+        self.assertEqual(unpack_container(b"BM" + bytes(40)), None)
+        self.assertEqual(unpack_container(b"JC"), None)
+        self.assertEqual(read_container("test/test_containerNOT.jcsv"), None)
+
+        # canais int16 truncados no cabeçalho ou nos coeficientes
+        channels = (np.arange(64).reshape(8, 8),) * 3
+        int16_file = pack_container(channels, 8, 8, 50, (4, 4, 4))
+        for size in (len(int16_file) - 1, len(int16_file) - 130, len(int16_file) - 200):
+            self.assertIsNone(unpack_container(int16_file[:size]))
+
+        # payload entrópico truncado: o ficheiro é lido mas o decode devolve None
+        encoded, rows, cols = encode_image(read_bmp("img/logo.bmp"), 50, (4, 2, 0))
+        entropy_file = pack_container(encoded, rows, cols, 50, (4, 2, 0))
+        for size in (len(entropy_file) - 1, len(entropy_file) // 2, len(entropy_file) - len(encoded) + 5):
+            container = unpack_container(entropy_file[:size])
+            self.assertIsNone(decode_channels(container.data))
+            self.assertIsNone(decode(container.data, container.width, container.height, container.quality_factor))
+
+
+class TestCodecJfif(unittest.TestCase):
+    """Testa o módulo jfif do package codec
+    """
+
+    def test_sampling_factors(self):
+        """Testa se os fatores de amostragem correspondem à subamostragem do down_sample
+        """
+        self.assertEqual(sampling_factors((4, 2, 0)), (2, 2))
+        self.assertEqual(sampling_factors((4, 2, 2)), (2, 1))
+        self.assertEqual(sampling_factors((4, 4, 4)), (1, 1))
+        self.assertEqual(sampling_factors((4, 2, 1)), None)
+
+    def test_encode_jfif_standard_decoder(self):
+        """Testa se o ficheiro escrito é lido por um descodificador standard (OpenCV)
+        com uma qualidade próxima da original
+        """
+        image = read_bmp("img/barn_mountains.bmp")
+
+        for downsampling in ((4, 2, 0), (4, 4, 4)):
+            for optimize in (False, True):
+                jpeg = encode_jfif(image, 90, downsampling, optimize)
+                self.assertEqual(jpeg[:2] + jpeg[-2:], b"\xFF\xD8\xFF\xD9")
+
+                decoded = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+                self.assertTupleEqual(decoded.shape, image.shape)
+
+                mse = np.mean((decoded[:, :, ::-1].astype(np.float64) - image) ** 2)
+                self.assertGreater(10 * np.log10(255 ** 2 / mse), 30)
+
+
+class TestCodecStream(unittest.TestCase):
+    """Testa o módulo stream do package codec
+    """
+
+    def test_read_bmp_strips(self):
+        """Testa se as faixas de um BMP de 24 bits (de baixo para cima) e de um BMP
+        de 32 bits (de cima para baixo) formam a imagem lida pelo read_bmp
+        """
+        image = read_bmp("img/logo.bmp")
+
+        with TemporaryDirectory() as directory:
+            path = join(directory, "top_down.bmp")
+
+            # BITMAPINFOHEADER com altura negativa e linhas BGRX
+            rows, cols = image.shape[:2]
+            pixels = np.dstack((image[:, :, ::-1], np.zeros((rows, cols), dtype=np.uint8)))
+            header = b"BM" + np.array([54 + pixels.nbytes, 0, 54], dtype="<u4").tobytes() + \
+                np.array([40, cols, -rows], dtype="<i4").tobytes() + \
+                np.array([1, 32], dtype="<u2").tobytes() + np.zeros(6, dtype="<u4").tobytes()
+
+            with open(path, "wb") as bmp_file:
+                bmp_file.write(header + pixels.tobytes())
+
+            self.assertTupleEqual(read_bmp_header(path)[:4], (rows, cols, 32, True))
+
+            for source in ("img/logo.bmp", path):
+                strips = list(read_bmp_strips(source, 16))
+                self.assertEqual(len(strips), -(-rows // 16))
+                np.testing.assert_array_equal(np.concatenate(strips), image)
+
+    def test_stream_jfif(self):
+        """Testa se o ficheiro escrito por faixas é igual ao escrito com a imagem inteira
+        """
+        image = read_bmp("img/barn_mountains.bmp")
+
+        with TemporaryDirectory() as directory:
+            path = join(directory, "stream.jpg")
+
+            for downsampling in ((4, 2, 0), (4, 2, 2), (4, 4, 4)):
+                self.assertTrue(stream_jfif("img/barn_mountains.bmp", path, 75, downsampling))
+
+                with open(path, "rb") as jpeg_file:
+                    self.assertEqual(jpeg_file.read(), encode_jfif(image, 75, downsampling))
+
+            self.assertFalse(stream_jfif("test/test_img_none.bmp", path, 75))
+
+
+class TestCodecJpegReader(unittest.TestCase):
+    """Testa o módulo jpeg_reader do package codec
+    """
+
+    def test_parse_jpeg_coefficients(self):
+        """Testa se os coeficientes lidos são os quantizados pelo encode_jfif
+        """
+        image = read_bmp("img/peppers.bmp")[:96, :128]
+        q_matrix_y = load_q_matrix("q_matrix_y.csv")
+
+        jpeg = parse_jpeg(encode_jfif(image, 75, (4, 4, 4)))
+        self.assertEqual((jpeg.rows, jpeg.cols), (96, 128))
+
+        y, _, _ = converter_to_ycbcr(image)
+        expected = quantize(calculate_dct(*[y.astype(np.float32) - 128] * 3, 8)[0], q_matrix_y, 75)
+
+        np.testing.assert_array_equal(jpeg.components[0].coefficients, expected)
+        np.testing.assert_array_equal(jpeg.components[0].q_table, scale_q_matrix(q_matrix_y, 75))
+        np.testing.assert_array_equal(jpeg_stage(jpeg, "quantize")[0], expected)
+
+    def test_decode_jpeg_standard_file(self):
+        """Testa a descodificação de ficheiros com restarts e subamostragem
+        comparando com um descodificador standard (OpenCV)
+        """
+        for path in ("img/barn_mountains/barn_mountains_alta.jpg", "img/logo/logo_baixa.jpg"):
+            decoded = decode_jpeg(read_jpeg(path))
+            reference = cv2.imread(path)[:, :, ::-1]
+            self.assertTupleEqual(decoded.shape, reference.shape)
+
+            mse = np.mean((decoded.astype(np.float64) - reference) ** 2)
+            self.assertGreater(10 * np.log10(255 ** 2 / mse), 40)
+
+    def test_read_jpeg_unsupported(self):
+        """Testa se ficheiros progressivos e corrompidos são rejeitados
+        """
+        self.assertIsNone(read_jpeg("img/peppers.jpg"))
+        self.assertIsNone(read_jpeg("img/peppers.bmp"))
+
+        with open("img/logo/logo_baixa.jpg", "rb") as jpeg_file:
+            self.assertIsNone(parse_jpeg(jpeg_file.read()[:1000]))
+
+
+class TestCodecTranscode(unittest.TestCase):
+    """Testa o módulo transcode do package codec
+    """
+
+    def setUp(self):
+        self.image = read_bmp("img/peppers.bmp")[:200, :296]
+        self.jpeg = parse_jpeg(encode_jfif(self.image, 90, (4, 4, 4)))
+        self.decoded = decode_jpeg(self.jpeg)
+
+    def test_rotate_lossless(self):
+        """Testa se a rotação nos coeficientes é igual à rotação da imagem descodificada
+        """
+        for turns in (1, 2, 3):
+            rotated = parse_jpeg(encode_jpeg(rotate(self.jpeg, turns)))
+            np.testing.assert_array_equal(decode_jpeg(rotated), np.rot90(self.decoded, -turns))
+
+    def test_crop_lossless(self):
+        """Testa se o corte nos coeficientes é igual ao corte da imagem descodificada
+        """
+        cropped = parse_jpeg(encode_jpeg(crop(self.jpeg, 16, 32, 100, 150)))
+        np.testing.assert_array_equal(decode_jpeg(cropped), self.decoded[16:116, 32:182])
+
+        self.assertIsNone(crop(self.jpeg, 4, 0, 100, 150))
+
+    def test_requantize_and_halve_chroma(self):
+        """Testa se a nova quantização e a subamostragem mantêm a qualidade da
+        codificação equivalente nos píxeis
+        """
+        same = requantize(self.jpeg, 90)
+        np.testing.assert_array_equal(same.components[0].coefficients, self.jpeg.components[0].coefficients)
+
+        for jpeg, direct in (
+            (requantize(self.jpeg, 50), encode_jfif(self.image, 50, (4, 4, 4))),
+            (halve_chroma(self.jpeg), encode_jfif(self.image, 90, (4, 2, 0))),
+        ):
+            data = encode_jpeg(jpeg)
+            decoded = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)[:, :, ::-1]
+            reference = cv2.imdecode(np.frombuffer(direct, dtype=np.uint8), cv2.IMREAD_COLOR)[:, :, ::-1]
+
+            mse = np.mean((decoded.astype(np.float64) - self.image) ** 2)
+            reference_mse = np.mean((reference.astype(np.float64) - self.image) ** 2)
+            self.assertLess(mse, reference_mse * 1.1)
+
+        self.assertEqual(
+            [(c.horizontal, c.vertical) for c in halve_chroma(self.jpeg).components], [(2, 2), (1, 1), (1, 1)]
+        )
+
+
+class TestCodecBatch(unittest.TestCase):
+    """Testa o módulo batch do package codec
+    """
+
+    def test_run_batch(self):
+        """Testa se o lote escreve os ficheiros do codec, mantém a ordem dos nomes
+        e regista as imagens inválidas sem interromper
+        """
+        with TemporaryDirectory() as directory:
+            for name in ("peppers.bmp", "logo.bmp", "barn_mountains.bmp"):
+                copy(join("img", name), directory)
+
+            with open(join(directory, "invalid.bmp"), "wb") as invalid_file:
+                invalid_file.write(b"not an image")
+
+            results = run_batch(directory, 75, (4, 2, 0), workers=2)
+
+            self.assertEqual(
+                [result.name for result in results],
+                ["barn_mountains.bmp", "invalid.bmp", "logo.bmp", "peppers.bmp"]
+            )
+            self.assertIsNotNone(results[1].error)
+
+            for result in results[:1] + results[2:]:
+                self.assertIsNone(result.error)
+                self.assertGreater(result.psnr, 10)
+
+                container = read_container(join(directory, result.name[:-4] + ".jcsv"))
+                self.assertEqual(len(container.data), result.encoded_bytes)
+
+            self.assertFalse(exists(join(directory, "invalid.jcsv")))
+
+
+class TestCodecSweep(unittest.TestCase):
+    """Testa o módulo sweep do package codec
+    """
+
+    def test_quantize_many(self):
+        """Testa se quantizar vários fatores de qualidade de uma só vez é igual
+        a quantizar cada fator
+        """
+        q_matrix = load_q_matrix("q_matrix_y.csv")
+        channel = np.random.default_rng(0).normal(0, 80, (32, 48))
+
+        quality_factors = [0, 10, 50, 90, 100]
+        quantized = quantize_many(channel, q_matrix, quality_factors)
+        de_quantized = inv_quantize_many(quantized, q_matrix, quality_factors)
+
+        for index, quality_factor in enumerate(quality_factors):
+            np.testing.assert_array_equal(quantized[index], quantize(channel, q_matrix, quality_factor))
+            np.testing.assert_array_equal(de_quantized[index], inv_quantize(quantized[index], q_matrix, quality_factor))
+
+    def test_rd_sweep(self):
+        """Testa se cada ponto da curva tem o tamanho e o PSNR de encode_image + decode
+        e se as curvas são escritas em CSV e JSON
+        """
+        image = read_bmp("img/logo.bmp")
+
+        points = rd_sweep(image, [30, 80], [(4, 2, 0), (4, 4, 4)])
+        self.assertEqual([(point.downsampling, point.quality) for point in points],
+                         [("4:2:0", 30), ("4:2:0", 80), ("4:4:4", 30), ("4:4:4", 80)])
+
+        for point in points:
+            downsampling = tuple(int(value) for value in point.downsampling.split(":"))
+            encoded, rows, cols = encode_image(image, point.quality, downsampling)
+
+            self.assertEqual(point.bytes, len(encoded))
+            self.assertAlmostEqual(point.psnr, compute_metrics(image, decode(encoded, rows, cols, point.quality)).psnr)
+
+        with TemporaryDirectory() as directory:
+            copy(join("img", "logo.bmp"), directory)
+
+            for file_format in ("csv", "json"):
+                curves = run_sweep(directory, [30, 80], output=join(directory, "rd"), file_format=file_format)
+                self.assertEqual(len(curves["logo.bmp"]), 2)
+                self.assertTrue(exists(join(directory, "rd", f"logo.rd.{file_format}")))
+
+            with open(join(directory, "rd", "logo.rd.csv")) as csv_file:
+                self.assertEqual(csv_file.readline().strip(), ",".join(points[0]._fields))
+
+            self.assertIsNone(run_sweep(directory, [30], file_format="xml"))
+
+
+class TestCodecTarget(unittest.TestCase):
+    """Testa o módulo target do package codec
+    """
+
+    def test_bisect_quality(self):
+        """Testa se a bisseção encontra o fator mais alto e o mais baixo de uma restrição
+        """
+        evaluated = list()
+
+        def fits(quality_factor):
+            evaluated.append(quality_factor)
+            return quality_factor <= 37
+
+        self.assertEqual(bisect_quality(fits), 37)
+        self.assertLessEqual(len(evaluated), 7)
+
+        self.assertEqual(bisect_quality(lambda quality_factor: quality_factor >= 81, lowest=True), 81)
+        self.assertEqual(bisect_quality(lambda quality_factor: quality_factor >= 81, lowest=True, high=60), None)
+        self.assertEqual(bisect_quality(lambda quality_factor: True), 100)
+
+    def test_encode_to_target(self):
+        """Testa se o fator escolhido é o mais alto que cabe no tamanho máximo e o mais baixo
+        que atinge o PSNR mínimo, e se o resultado é igual ao de encode_image
+        """
+        image = read_bmp("img/barn_mountains.bmp")
+
+        encoded, rows, cols, target = encode_to_target(image, (4, 2, 0), max_bytes=15000)
+        self.assertEqual(encoded, encode_image(image, target.quality, (4, 2, 0))[0])
+        self.assertLessEqual(target.bytes, 15000)
+        self.assertGreater(len(encode_image(image, target.quality + 1, (4, 2, 0))[0]), 15000)
+
+        encoded, rows, cols, target = encode_to_target(image, (4, 2, 0), min_psnr=30)
+        self.assertGreaterEqual(compute_metrics(image, decode(encoded, rows, cols, target.quality)).psnr, 30)
+        self.assertAlmostEqual(target.psnr, compute_metrics(image, decode(encoded, rows, cols, target.quality)).psnr)
+
+        previous = encode_image(image, target.quality - 1, (4, 2, 0))[0]
+        self.assertLess(compute_metrics(image, decode(previous, rows, cols, target.quality - 1)).psnr, 30)
+
+        self.assertIsNone(encode_to_target(image, (4, 2, 0), max_bytes=100))
+        self.assertIsNone(encode_to_target(image, (4, 2, 0), max_bytes=15000, min_psnr=60))
+
+
+class TestCodecRdo(unittest.TestCase):
+    """Testa o módulo rdo do package codec
+    """
+
+    def test_rdo_quantize(self):
+        """Testa se a quantização RDO só reduz a magnitude dos coeficientes AC
+        e se com lambda 0 é igual à quantização simples
+        """
+        q_matrix = load_q_matrix("q_matrix_y.csv")
+        channel = np.random.default_rng(2).laplace(0, 30, (64, 96))
+
+        plain = quantize(channel, q_matrix, 75)
+        np.testing.assert_array_equal(rdo_quantize(channel, q_matrix, 75, 0), plain)
+
+        optimized = rdo_quantize(channel, q_matrix, 75, 0.05)
+
+        np.testing.assert_array_equal(optimized[::8, ::8], plain[::8, ::8])
+        self.assertTrue((np.abs(optimized) <= np.abs(plain)).all())
+        self.assertTrue((optimized * plain >= 0).all())
+        self.assertLess(np.count_nonzero(optimized), np.count_nonzero(plain))
+
+        self.assertIsNone(rdo_quantize(channel, q_matrix, 75, -1))
+
+    def test_rdo_report(self):
+        """Testa se a quantização RDO reduz o tamanho com pouca perda de PSNR
+        e se o resultado é descodificado pelo descodificador normal
+        """
+        image = read_bmp("img/barn_mountains.bmp")
+
+        report = rdo_report(image, 75, (4, 2, 0), 0.01)
+        self.assertGreater(report.savings, 0.02)
+        self.assertGreaterEqual(report.psnr_loss, 0)
+        self.assertLess(report.psnr_loss, 1)
+
+        encoded, rows, cols = encode_image(image, 75, (4, 2, 0), rdo_lambda=0.01)
+        self.assertEqual(len(encoded), report.rdo_bytes)
+        self.assertAlmostEqual(compute_metrics(image, decode(encoded, rows, cols, 75)).psnr, report.rdo_psnr)
+
+
+class TestCodecHeadless(unittest.TestCase):
+    """Testa o encode sem visualização
+    """
+
+    def test_import_without_matplotlib(self):
+        """Testa se importar o codec e as métricas não importa o matplotlib
+        """
+        result = run(
+            [sys.executable, "-c", "import sys, codec, metrics; sys.exit('matplotlib' in sys.modules)"]
+        )
+        self.assertEqual(result.returncode, 0)
+
+    def test_encode_to_file_without_matplotlib(self):
+        """Testa se codificar para um ficheiro não importa o matplotlib nem abre figuras
+        """
+        with TemporaryDirectory() as directory:
+            result = run([
+                sys.executable, "-c",
+                "import sys, codec; ok = codec.encode_to_file('img/logo.bmp', sys.argv[1], 75, (4, 2, 0));"
+                " sys.exit(not ok or 'matplotlib' in sys.modules)",
+                join(directory, "logo.jcsv")
+            ])
+            self.assertEqual(result.returncode, 0)
+
+    def test_encode_observer(self):
+        """Testa se o observador recebe todas as fases pela ordem do encode
+        """
+        stages = list()
+        image = read_bmp("img/barn_mountains.bmp")
+
+        encoded = encode_image(image, 75, (4, 2, 0), observer=lambda stage, data: stages.append(stage))
+
+        self.assertEqual(stages, ["rgb", "ycbcr", "downsample", "dct", "quantize", "dpcm", "entropy"])
+        self.assertEqual(encoded, encode_image(image, 75, (4, 2, 0)))
+
+    def test_threads(self):
+        """Testa se o encode e o decode com os canais em threads
+        dão o mesmo resultado que a execução sequencial
+        """
+        image = read_bmp("img/logo.bmp")
+
+        encoded, rows, cols = encode_image(image, 50, (4, 2, 2), optimize_huffman=True)
+        threaded, _, _ = encode_image(image, 50, (4, 2, 2), optimize_huffman=True, workers=3)
+
+        self.assertEqual(encoded, threaded)
+        self.assertTrue(np.array_equal(
+            decode(encoded, rows, cols, 50),
+            decode(encoded, rows, cols, 50, workers=3)
+        ))
+
+
+class TestPipelineCache(unittest.TestCase):
+    """Testa a cache das fases do package pipeline
+    """
+
+    def test_lookup(self):
+        """Testa se cada chave só é calculada uma vez e se o resultado fica só de leitura
+        """
+        cache = StageCache()
+        calls = list()
+
+        def compute():
+            calls.append(1)
+            return (np.zeros((8, 8)), np.ones((8, 8)))
+
+        first = cache.lookup(("image", ("dct", 8)), compute)
+        second = cache.lookup(("image", ("dct", 8)), compute)
+
+        self.assertIs(first, second)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertFalse(first[0].flags.writeable)
+
+    def test_budget(self):
+        """Testa se o orçamento de memória descarta a entrada menos usada recentemente
+        """
+        cache = StageCache(budget=2 * 64 * 8)
+
+        for key in "abc":
+            cache.lookup(key, lambda: np.zeros(64))
+            cache.lookup("a", lambda: np.zeros(64))
+
+        self.assertIn("a", cache)
+        self.assertIn("c", cache)
+        self.assertNotIn("b", cache)
+        self.assertEqual(cache.evictions, 1)
+        self.assertLessEqual(cache.size, cache.budget)
+
+    def test_read(self):
+        """Testa se cópias da mesma imagem partilham a chave do conteúdo
+        """
+        cache = StageCache()
+
+        with TemporaryDirectory() as directory:
+            copy("test/test_img.bmp", directory)
+
+            image, key = cache.read("test/test_img.bmp", read_bmp)
+            copied_image, copied_key = cache.read(join(directory, "test_img.bmp"), read_bmp)
+            _, cached_key = cache.read("test/test_img.bmp", read_bmp)
+
+        self.assertEqual(key, copied_key)
+        self.assertEqual(key, cached_key)
+        self.assertTrue(np.array_equal(image, copied_image))
+        self.assertEqual(cache.read("test/missing.bmp", read_bmp), (None, None))
+
+    def test_disk(self):
+        """Testa se os resultados guardados em disco são reutilizados
+        por outra sessão sem serem calculados
+        """
+        value = (np.arange(64, dtype=np.int16).reshape(8, 8), 8, "digest")
+
+        with TemporaryDirectory() as directory:
+            StageCache(disk=DiskCache(directory)).lookup(("image", ("dct", 8)), lambda: value)
+
+            cache = StageCache(disk=DiskCache(directory))
+            loaded = cache.lookup(("image", ("dct", 8)), lambda: self.fail("stage recomputed"))
+
+            self.assertIsInstance(loaded[0], np.memmap)
+            self.assertTrue(np.array_equal(loaded[0], value[0]))
+            self.assertEqual(loaded[1:], value[1:])
+            self.assertEqual(cache.disk.hits, 1)
+
+    def test_disk_budget(self):
+        """Testa se a cache em disco apaga os resultados menos usados recentemente
+        """
+        with TemporaryDirectory() as directory:
+            disk = DiskCache(directory, budget=3 * 1024)
+
+            for key in range(4):
+                disk.store(key, np.zeros(1024, dtype=np.uint8))
+
+            self.assertEqual(disk.evictions, 2)
+            self.assertIs(disk.load(0), MISSING)
+            self.assertIsNot(disk.load(3), MISSING)
+
+            # o índice de outra sessão é construído a partir da pasta e a leitura
+            # de 2 torna 3 o resultado menos usado recentemente
+            disk = DiskCache(directory, budget=3 * 1024)
+            self.assertEqual(len(disk), 2)
+            self.assertIsNot(disk.load(2), MISSING)
+
+            disk.store(4, np.zeros(1024, dtype=np.uint8))
+            self.assertIs(disk.load(3), MISSING)
+            self.assertIsNot(disk.load(2), MISSING)
+            self.assertLessEqual(disk.size, disk.budget)
+
+
+class TestPipelineGraph(unittest.TestCase):
+    """Testa o grafo das fases do package pipeline
+    """
+
+    def setUp(self):
+        self.image = read_bmp("img/logo.bmp")
+
+    def test_stages(self):
+        """Testa se os canais do grafo são iguais aos das funções do imgtools,
+        com e sem threads
+        """
+        image_padded, _, _ = add_padding(self.image, 32)
+        channels = down_sample(*converter_to_ycbcr(image_padded), (4, 2, 0))
+        expected = calculate_dct(*channels, 8)
+
+        for workers in (1, 3):
+            graph = StageGraph(workers=workers)
+            ycbcr = graph.source(self.image) + (graph.stage("padding", 32), graph.stage("ycbcr"))
+
+            result = graph.get_many(graph.channels(ycbcr, graph.stage("downsample", [4, 2, 0]), graph.stage("dct", 8)))
+
+            for channel, expected_channel in zip(result, expected):
+                self.assertTrue(np.array_equal(channel, expected_channel))
+
+    def test_pull(self):
+        """Testa se um pedido só calcula os nós de que depende e se
+        os prefixos comuns são calculados uma só vez
+        """
+        graph = StageGraph(StageCache())
+        ycbcr = graph.source(self.image) + (graph.stage("padding", 32), graph.stage("ycbcr"))
+        y_dct, cb_dct, cr_dct = graph.channels(ycbcr, graph.stage("dct", 8))
+
+        graph.get(cb_dct)
+
+        self.assertIn(cb_dct, graph.cache)
+        self.assertNotIn(y_dct, graph.cache)
+        self.assertNotIn(cr_dct, graph.cache)
+
+        misses = graph.cache.misses
+        graph.get_many([y_dct, cb_dct + (graph.stage("quantize", 75),)])
+
+        # só o Y depois da DCT e o Cb quantizado são calculados
+        self.assertEqual(graph.cache.misses - misses, 2)
+        self.assertIn(ycbcr, graph.cache)
+
+
+
+class TestMetrics(unittest.TestCase):
+    """Testa o package metrics
+    """
+
+    def setUp(self):
+        self.image = read_bmp("img/peppers.bmp")[:100, :140]
+        self.decoded = self.image.copy()
+        self.decoded[::3, ::2] += 7
+
+    def test_compute_metrics(self):
+        """Testa se as métricas calculadas numa só passagem (por grupos de pixeis)
+        são iguais às métricas calculadas separadamente
+        """
+        mse = MSE(self.image, self.decoded)
+
+        metrics = compute_metrics(self.image, self.decoded, chunk_pixels=1000, luminance=True)
+        self.assertAlmostEqual(metrics.mse, mse)
+        self.assertAlmostEqual(metrics.snr, SNR(mse, self.image), places=4)
+        self.assertAlmostEqual(metrics.psnr, PSNR(mse, self.image), places=4)
+        self.assertAlmostEqual(sum(metrics.channel_mse), mse)
+
+        # os valores de cada canal e da luminância
+        difference = self.image.astype(np.float64) - self.decoded
+        for channel in range(3):
+            self.assertAlmostEqual(metrics.channel_mse[channel], np.mean(difference[:, :, channel] ** 2))
+        self.assertAlmostEqual(metrics.y_mse, np.mean((difference @ [0.299, 0.587, 0.114]) ** 2))
+        self.assertIsNone(compute_metrics(self.image, self.decoded).y_mse)
+
+        self.assertEqual(compute_metrics(self.image, self.image).psnr, float("inf"))
+        self.assertIsNone(compute_metrics(self.image, self.decoded[1:]))
+
+    def test_block_metrics(self):
+        """Testa se o MSE de cada bloco (incluindo os blocos incompletos das margens)
+        é calculado corretamente
+        """
+        mse, psnr = block_metrics(self.image, self.decoded, 16, chunk_pixels=2000)
+        self.assertEqual(mse.shape, (7, 9))
+
+        squared = ((self.image.astype(np.float64) - self.decoded) ** 2).sum(axis=2)
+        np.testing.assert_allclose(mse[:6, :8], squared[:96, :128].reshape(6, 16, 8, 16).mean(axis=(1, 3)))
+        self.assertAlmostEqual(mse[-1, -1], squared[96:, 128:].mean())
+        self.assertAlmostEqual(mse[2, -1], squared[32:48, 128:].mean())
+
+        np.testing.assert_allclose(psnr, 10 * np.log10(float(self.image.max()) ** 2 / mse))
+
+    def test_ssim(self):
+        """Testa se o SSIM calculado por faixas é igual ao SSIM com a janela 2D
+        em todo o plano e se o MS-SSIM de imagens iguais é 1
+        """
+        weights = cv2.getGaussianKernel(11, 1.5).ravel()
+        window = np.outer(weights, weights)
+
+        original = self.image @ [0.299, 0.587, 0.114]
+        decoded = self.decoded @ [0.299, 0.587, 0.114]
+
+        # médias, variâncias e covariância de cada janela completa
+        windows = [np.lib.stride_tricks.sliding_window_view(plane, (11, 11)) for plane in (original, decoded)]
+        mu_x, mu_y = (np.einsum("ijkl,kl->ij", view, window) for view in windows)
+        sigma_xx = np.einsum("ijkl,kl->ij", windows[0] ** 2, window) - mu_x ** 2
+        sigma_yy = np.einsum("ijkl,kl->ij", windows[1] ** 2, window) - mu_y ** 2
+        sigma_xy = np.einsum("ijkl,kl->ij", windows[0] * windows[1], window) - mu_x * mu_y
+
+        c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+        expected = np.mean(
+            (2 * mu_x * mu_y + c1) * (2 * sigma_xy + c2) / ((mu_x ** 2 + mu_y ** 2 + c1) * (sigma_xx + sigma_yy + c2))
+        )
+
+        self.assertAlmostEqual(ssim(self.image, self.decoded), expected)
+        self.assertAlmostEqual(ssim(self.image, self.decoded, chunk_rows=7), expected)
+        self.assertLess(ssim(self.image, self.decoded, "rgb"), 1)
+        self.assertIsNone(ssim(self.image, self.decoded, "lab"))
+
+        image = read_bmp("img/peppers.bmp")
+        self.assertAlmostEqual(ms_ssim(image, image), 1)
+        self.assertAlmostEqual(ms_ssim(image, image, "rgb"), 1)
+        self.assertLess(ms_ssim(image, image // 2 * 2), 1)
+
+        # o MS-SSIM precisa de 176x176 pixeis (5 escalas de janelas 11x11)
+        self.assertIsNone(ms_ssim(self.image, self.decoded))
+
 
 if __name__ == "__main__":
     unittest.main()